@@ -0,0 +1,65 @@
+"""
+数据库连接开销微基准
+
+对比旧实现（每次 connect + PRAGMA + close）与线程内复用的 get_connection /
+get_read_connection 执行一次主键查询的单次耗时：
+
+    PYTHONPATH=. python benchmarks/bench_connection_pool.py [次数]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from tg_imagebed.database import connection
+
+
+@contextmanager
+def _legacy_connection():
+    """连接复用前的 get_connection 实现"""
+    conn = sqlite3.connect(connection.DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute('PRAGMA busy_timeout = 5000')
+    conn.execute('PRAGMA journal_mode=WAL')
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _bench(factory, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        with factory() as conn:
+            conn.execute('SELECT * FROM file_storage WHERE encrypted_id = ?', ('bench',)).fetchone()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main(rounds: int = 5000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        with mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp, 'bench.db')):
+            connection.init_database(quiet=True)
+            with connection.get_connection() as conn:
+                conn.execute("INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time) "
+                             "VALUES ('bench', 'f', 'p', 0)")
+            results = [
+                ('legacy connect-per-call', _bench(_legacy_connection, rounds)),
+                ('get_connection (pooled)', _bench(connection.get_connection, rounds)),
+                ('get_read_connection (pooled)', _bench(connection.get_read_connection, rounds)),
+            ]
+            connection.close_thread_connections()
+    baseline = results[0][1]
+    for name, micros in results:
+        print(f'{name:<30} {micros:8.1f} us/call  x{baseline / micros:5.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,76 @@
+"""
+混合负载写吞吐微基准
+
+多个线程并发执行单行 UPDATE（模拟访问计数 / CDN 状态写回），对比各线程自带事务的
+get_connection + db_retry 与经单写线程合并提交的 run_write：
+
+    PYTHONPATH=. python benchmarks/bench_db_writer.py [线程数] [每线程次数]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from tg_imagebed.database import connection
+from tg_imagebed.database.connection import db_retry
+from tg_imagebed.database.writer import run_write, stop_db_writer
+
+_SQL = 'UPDATE file_storage SET access_count = access_count + 1 WHERE encrypted_id = ?'
+
+
+@db_retry(max_attempts=3, base_delay=0.1, max_delay=2.0)
+def _direct_write(key: str) -> None:
+    with connection.get_connection() as conn:
+        conn.execute(_SQL, (key,))
+
+
+def _queued_write(key: str) -> None:
+    run_write(lambda cursor: cursor.execute(_SQL, (key,)))
+
+
+def _bench(write, threads: int, rounds: int) -> float:
+    errors = []
+
+    def worker(n: int) -> None:
+        try:
+            for i in range(rounds):
+                write(f'bench{(n * rounds + i) % 100}')
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close_thread_connections()
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f'  {len(errors)} 个线程失败: {errors[0]}')
+    return threads * rounds / elapsed
+
+
+def main(threads: int = 8, rounds: int = 500) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        with mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp, 'bench.db')):
+            connection.init_database(quiet=True)
+            with connection.get_connection() as conn:
+                conn.executemany("INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time) "
+                                 "VALUES (?, 'f', 'p', 0)", [(f'bench{i}',) for i in range(100)])
+            results = [
+                ('per-thread transactions', _bench(_direct_write, threads, rounds)),
+                ('single writer (group commit)', _bench(_queued_write, threads, rounds)),
+            ]
+            stop_db_writer()
+            connection.close_thread_connections()
+    baseline = results[0][1]
+    for name, rate in results:
+        print(f'{name:<30} {rate:10.0f} writes/s  x{rate / baseline:5.1f}')
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:3]))
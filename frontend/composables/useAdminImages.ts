@@ -67,6 +67,7 @@ export const useAdminImages = () => {
   const currentPage = ref(1)
   const totalPages = ref(1)
   const totalCount = ref(0)
+  const totalApproximate = ref(false)
   const pageSize = ref(50)
 
   const detailModalOpen = ref(false)
@@ -243,6 +244,7 @@ export const useAdminImages = () => {
       images.value = data.images || []
       totalPages.value = data.totalPages || 1
       totalCount.value = data.total ?? images.value.length
+      totalApproximate.value = !!data.totalApproximate
       if (!keepSelection) {
         clearSelection()
       }
@@ -568,6 +570,7 @@ export const useAdminImages = () => {
     currentPage,
     totalPages,
     totalCount,
+    totalApproximate,
     pageSize,
     viewMode,
     advancedPanelOpen,
@@ -146,8 +146,12 @@ export interface AdminImagesData {
   images: AdminImageItem[]
   totalPages: number
   total: number
+  /** 带筛选且命中数超过计数上限时为 true，此时 total 为下限 */
+  totalApproximate?: boolean
   page: number
   limit: number
+  /** 键集分页游标，传回 cursor 参数获取下一页；无更多数据时为 null */
+  nextCursor?: string | null
 }
 
 /** 管理员删除图片响应 */
@@ -15,7 +15,7 @@ import time
 import signal
 import threading
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.exceptions import RequestEntityTooLarge
@@ -39,10 +39,20 @@ from tg_imagebed.bot import start_telegram_bot_thread, _get_bot_status
 from tg_imagebed.utils import acquire_lock, release_lock, add_cache_headers, get_static_file_version
 
 # 导入数据库
-from tg_imagebed.database import init_database, get_all_files_count, get_total_size, init_system_settings
+from tg_imagebed.database import init_database, get_all_files_count, get_total_size, init_system_settings, stop_db_writer
 
 # 导入服务
 from tg_imagebed.services.cdn_service import start_cdn_monitor, stop_cdn_monitor
+from tg_imagebed.services.upload_session_service import start_upload_session_gc, stop_upload_session_gc
+from tg_imagebed.services.image_meta_service import stop_image_meta_workers
+from tg_imagebed.services.writeback_service import start_writeback_worker, stop_writeback_worker
+from tg_imagebed.services.mirror_service import start_mirror_worker, stop_mirror_worker
+from tg_imagebed.services.tiering_service import start_tiering_worker, stop_tiering_worker
+from tg_imagebed.services.migration_service import start_migration_worker, stop_migration_worker
+from tg_imagebed.services.storage_health_service import start_storage_health_prober, stop_storage_health_prober
+from tg_imagebed.services.scrub_service import start_scrub_worker, stop_scrub_worker
+from tg_imagebed.services.deletion_service import start_deletion_gc, stop_deletion_gc
+from tg_imagebed.services.stats_service import start_stats_reconciler, stop_stats_reconciler
 
 # 导入 admin_module（保持兼容）
 from tg_imagebed import admin_module
@@ -78,11 +88,19 @@ def create_app() -> Flask:
         except Exception:
             return 100
 
-    def _apply_request_limit() -> int:
+    def _apply_request_limit(path: str = '') -> int:
         """将数据库中的上传限制同步到 Flask 请求体限制"""
         max_mb = _get_max_upload_mb()
+        body_mb = max_mb
+        if path.endswith('/upload/batch'):
+            # 批量上传的请求体包含多个文件，单独按批量上限放行
+            try:
+                from tg_imagebed.database import get_system_setting_int
+                body_mb = max(max_mb, get_system_setting_int('batch_upload_max_total_mb', 500, minimum=1, maximum=102400))
+            except Exception:
+                pass
         # 额外留 2MB 余量给表单字段和 multipart 边界
-        app.config['MAX_CONTENT_LENGTH'] = (max_mb + 2) * 1024 * 1024
+        app.config['MAX_CONTENT_LENGTH'] = (body_mb + 2) * 1024 * 1024
         return max_mb
 
     # 应用 ProxyFix 中间件
@@ -196,7 +214,7 @@ def create_app() -> Flask:
         不然管理员在后台把 max_file_size_mb 调大以后，当前进程还是抱着启动时
         的旧值不撒手，上传直接 413，纯属自己给自己下绊子。
         """
-        _apply_request_limit()
+        _apply_request_limit(request.path)
 
     @app.errorhandler(RequestEntityTooLarge)
     def handle_request_entity_too_large(error):
@@ -217,7 +235,7 @@ def create_app() -> Flask:
     # 注册蓝图 - 必须先导入路由模块以触发路由注册
     from tg_imagebed.api import upload_bp, images_bp, admin_bp, auth_bp, gallery_site_bp
     # 导入路由模块，触发 @bp.route 装饰器执行
-    from tg_imagebed.api import upload, images, admin, auth, settings, galleries, tg_auth, gallery_site
+    from tg_imagebed.api import upload, upload_sessions, images, admin, auth, settings, galleries, tg_auth, gallery_site
 
     app.register_blueprint(upload_bp)
     app.register_blueprint(admin_bp)
@@ -274,6 +292,33 @@ def main():
     # 启动 CDN 监控（由 start_cdn_monitor 内部判断是否启用）
     start_cdn_monitor()
 
+    # 启动过期续传会话回收
+    start_upload_session_gc()
+
+    # 启动写回推送（会先恢复重启前未完成的 pending 文件）
+    start_writeback_worker()
+
+    # 启动镜像补偿（恢复未完成的副本复制、清理孤儿副本）
+    start_mirror_worker()
+
+    # 启动冷热分层调度（未开启时每轮直接跳过）
+    start_tiering_worker()
+
+    # 启动存储迁移调度（续跑重启前未完成的迁移任务）
+    start_migration_worker()
+
+    # 启动存储后端健康探测（熔断后端冷却结束后做半开探测）
+    start_storage_health_prober()
+
+    # 启动存储完整性巡检调度（续跑未完成的巡检，按周期自动创建）
+    start_scrub_worker()
+
+    # 启动删除队列 GC（清理已删除图片的存储对象、TG 消息与 CDN 缓存）
+    start_deletion_gc()
+
+    # 启动统计对账（定期修正触发器维护的统计计数偏差）
+    start_stats_reconciler()
+
     logger.info("启动Telegram云图床服务...")
 
     # 检查前端静态文件
@@ -323,6 +368,18 @@ def main():
         shutdown_event.set()
     finally:
         stop_cdn_monitor()
+        stop_upload_session_gc()
+        stop_image_meta_workers()
+        stop_writeback_worker()
+        stop_mirror_worker()
+        stop_tiering_worker()
+        stop_migration_worker()
+        stop_storage_health_prober()
+        stop_scrub_worker()
+        stop_deletion_gc()
+        stop_stats_reconciler()
+        # 最后停止单写线程，提交其它线程退出前入队的写操作
+        stop_db_writer()
         release_lock()
         logger.info("服务已停止")
 
@@ -0,0 +1,49 @@
+"""存储相关测试共用的内存后端与路由器"""
+from tg_imagebed.storage.base import StorageBackend, PutResult, DownloadResult
+
+
+class MemoryBackend(StorageBackend):
+    """对象存在字典里的后端；corrupt=True 时写入内容被篡改，ranges 记录每次读取的 Range"""
+
+    def __init__(self, name, corrupt=False):
+        self.name = name
+        self.objects = {}
+        self.corrupt = corrupt
+        self.ranges = []
+
+    def put_bytes(self, *, file_content, filename, **kwargs):
+        key = f"{self.name}/new-{filename}"
+        self.objects[key] = file_content[::-1] if self.corrupt else file_content
+        return PutResult(file_id=key, file_path=key, file_size=len(file_content),
+                         storage_backend=self.name, storage_key=key)
+
+    def download(self, *, file_info, range_header):
+        self.ranges.append(range_header)
+        data = self.objects.get(file_info.get('storage_key'))
+        if data is None:
+            return DownloadResult(status_code=404, content_type='text/plain', headers={}, body=[b''])
+        if range_header:
+            return DownloadResult(status_code=206, content_type='image/png', headers={}, body=[data[:1]])
+        return DownloadResult(status_code=200, content_type='image/png', headers={}, body=[data])
+
+    def delete(self, *, storage_key):
+        return self.objects.pop(storage_key, None) is not None
+
+
+class Router:
+    def __init__(self, *backends, active=None):
+        self.backends = {b.name: b for b in backends}
+        self.active = active
+
+    def list_backends(self):
+        return {name: {} for name in self.backends}
+
+    def get_backend(self, name):
+        return self.backends[name]
+
+    def get_active_backend_name(self):
+        return self.active
+
+    def download_with_failover(self, file_info, range_header):
+        backend = self.backends[file_info['storage_backend']]
+        return backend, backend.download(file_info=file_info, range_header=range_header)
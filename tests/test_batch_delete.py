@@ -0,0 +1,136 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from tg_imagebed.services import deletion_service
+from tg_imagebed.storage.backends import s3 as s3_module
+from tg_imagebed.storage.backends.local import LocalBackend
+from tg_imagebed.storage.backends.rclone import RcloneBackend
+from tg_imagebed.telegram_api import TelegramBotClient, TelegramRequestError
+
+from storage_fakes import MemoryBackend
+
+
+class _FakeS3Client:
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [item['Key'] for item in Delete['Objects']]
+        self.calls.append(keys)
+        return {'Errors': [{'Key': key, 'Code': 'AccessDenied'} for key in keys if key in self.failing]}
+
+
+class _GroupedBackend(MemoryBackend):
+    """记录 delete_many 调用；keep_first=True 时只删除每批第一个对象"""
+
+    def __init__(self, name, keep_first=False):
+        super().__init__(name)
+        self.calls = []
+        self.keep_first = keep_first
+
+    def delete_many(self, *, storage_keys):
+        self.calls.append(list(storage_keys))
+        deleted = storage_keys[:1] if self.keep_first else storage_keys
+        for key in deleted:
+            self.objects.pop(key, None)
+        return deleted
+
+
+class BatchDeleteTests(unittest.TestCase):
+    def test_s3_uses_delete_objects_in_batches(self):
+        backend = s3_module.S3Backend.__new__(s3_module.S3Backend)
+        backend.name, backend._bucket = 's3', 'bucket'
+        backend._client = _FakeS3Client(failing={'k5'})
+        keys = [f"k{i}" for i in range(2500)]
+        with mock.patch.object(s3_module, 'HAS_BOTO3', True):
+            deleted = backend.delete_many(storage_keys=keys + ['k1'])
+        self.assertEqual([len(c) for c in backend._client.calls], [1000, 1000, 500])
+        self.assertEqual(len(deleted), 2499)
+        self.assertNotIn('k5', deleted)
+
+    def test_local_deletes_in_thread_pool(self):
+        with tempfile.TemporaryDirectory() as root:
+            backend = LocalBackend(name='local', root_dir=root)
+            for i in range(5):
+                with open(os.path.join(root, f"{i}.png"), 'wb') as fh:
+                    fh.write(b'x')
+            deleted = backend.delete_many(storage_keys=[f"{i}.png" for i in range(5)] + ['missing.png'])
+            self.assertEqual(sorted(deleted), [f"{i}.png" for i in range(5)])
+            self.assertEqual(os.listdir(root), [])
+
+    def test_rclone_runs_single_delete_with_files_from(self):
+        backend = RcloneBackend(name='rc', remote='drive', base_path='images')
+        listed = []
+
+        def fake_run(*, args, timeout_seconds):
+            listed.append(open(args[args.index('--files-from') + 1]).read().split())
+            return subprocess.CompletedProcess(args, 0, b'', b'')
+
+        with mock.patch.object(backend, '_run_capture', side_effect=fake_run) as run:
+            deleted = backend.delete_many(storage_keys=['a.png', 'b/c.png', 'a.png'])
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(run.call_args.kwargs['args'][-4:-2], ['delete', 'drive:images'])
+        self.assertEqual(listed, [['a.png', 'b/c.png']])
+        self.assertEqual(deleted, ['a.png', 'b/c.png'])
+
+    def test_telegram_delete_messages_batches_of_100(self):
+        client = TelegramBotClient()
+        with mock.patch.object(client, 'call', return_value={'ok': True}) as call:
+            deleted = client.delete_messages(-100, list(range(1, 251)), bot_token='t')
+        self.assertEqual(len(deleted), 250)
+        self.assertEqual([c.args[0] for c in call.call_args_list], ['deleteMessages'] * 3)
+
+    def test_deletion_gc_groups_by_backend(self):
+        backends = {'s3': _GroupedBackend('s3'), 'local': _GroupedBackend('local', keep_first=True)}
+        backends['local'].objects.update(b=b'x', d=b'x')
+        router = mock.Mock()
+        router.get_backend.side_effect = backends.__getitem__
+        items = [
+            {'id': 1, 'storage_backend': 's3', 'storage_key': 'a'},
+            {'id': 2, 'storage_backend': 'local', 'storage_key': 'b'},
+            {'id': 3, 'storage_backend': 's3', 'storage_key': 'c'},
+            {'id': 4, 'storage_backend': 'local', 'storage_key': 'd'},
+        ]
+        with mock.patch.object(deletion_service, 'get_storage_router', return_value=router):
+            done, errors = deletion_service._gc_storage(items)
+        self.assertEqual((done, set(errors)), ({1, 2, 3}, {4}))
+        self.assertEqual(backends['s3'].calls, [['a', 'c']])
+
+    def test_delete_messages_separates_request_failures(self):
+        client = TelegramBotClient()
+        responses = {
+            'deleteMessages': {'ok': False, 'error_code': 400, 'description': 'Bad Request: message can\'t be deleted'},
+            1: {'ok': True, 'result': True},
+            2: {'ok': False, 'error_code': 400, 'description': 'Bad Request: message to delete not found'},
+            3: {'ok': False, 'error_code': 0, 'description': 'Connection reset'},
+        }
+        with mock.patch.object(client, 'call', side_effect=lambda method, params, **kw: responses[
+                method if method == 'deleteMessages' else params['message_id']]):
+            with self.assertRaises(TelegramRequestError) as ctx:
+                client.delete_messages(-100, [1, 2, 3], bot_token='t')
+        self.assertEqual((ctx.exception.deleted, ctx.exception.failed_ids), ([1], [3]))
+
+    def _gc_telegram(self, payload):
+        client = TelegramBotClient()
+        items = [{'id': 1, 'storage_backend': 'telegram', 'group_chat_id': -100, 'group_message_id': 5},
+                 {'id': 2, 'storage_backend': 'telegram', 'group_chat_id': -100, 'group_message_id': 6}]
+        with mock.patch('tg_imagebed.bot_control.get_effective_bot_token', return_value=('t', 'env')), \
+                mock.patch('tg_imagebed.telegram_api.get_telegram_client', return_value=client), \
+                mock.patch.object(client, 'call', return_value=payload):
+            return deletion_service._gc_telegram(items)
+
+    def test_gc_retries_rate_limited_deletes(self):
+        done, errors = self._gc_telegram({'ok': False, 'error_code': 429, 'parameters': {'retry_after': 5}})
+        self.assertEqual((done, set(errors)), (set(), {1, 2}))
+
+    def test_gc_treats_missing_messages_as_done(self):
+        done, errors = self._gc_telegram({'ok': False, 'error_code': 400, 'description': 'message to delete not found'})
+        self.assertEqual((done, errors), ({1, 2}, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from tg_imagebed.api import register_blueprints, upload as upload_api
+from tg_imagebed.database import connection
+
+_PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+
+def _fake_batch(items, **kwargs):
+    """文件名含 fail 的项模拟后端推送失败"""
+    for index, (content, filename, _content_type) in enumerate(items):
+        if 'fail' in filename:
+            yield index, None, '上传失败'
+        else:
+            yield index, {'encrypted_id': f'id{index}', 'file_size': len(content)}, None
+
+
+class BatchUploadTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for patcher in (
+            mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'batch.db')),
+            mock.patch.object(upload_api, 'iter_upload_batch', side_effect=_fake_batch),
+            mock.patch.object(upload_api, 'is_guest_upload_allowed', return_value=True),
+            mock.patch.object(upload_api, 'get_image_domain', return_value='http://img'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(connection.close_thread_connections)
+        connection.init_database(quiet=True)
+        app = Flask(__name__)
+        register_blueprints(app)
+        self.client = app.test_client()
+
+    def _post(self, *files, query=''):
+        data = {'files': [(io.BytesIO(content), name, 'image/png') for name, content in files]}
+        return self.client.post('/api/upload/batch' + query, data=data, content_type='multipart/form-data')
+
+    def test_all_succeeded(self):
+        resp = self._post(('a.png', _PNG), ('b.png', _PNG))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['data']['succeeded'], 2)
+
+    def test_mixed_results_return_multi_status(self):
+        resp = self._post(('a.png', _PNG), ('fail.png', _PNG), ('bad.png', b'not an image at all'))
+        self.assertEqual(resp.status_code, 207)
+        body = resp.get_json()
+        self.assertTrue(body['success'])
+        self.assertEqual([r['success'] for r in body['data']['results']], [True, False, False])
+        self.assertEqual(body['data']['results'][0]['url'], 'http://img/image/id0')
+
+    def test_backend_failure_for_every_file(self):
+        resp = self._post(('fail1.png', _PNG), ('fail2.png', _PNG))
+        self.assertEqual(resp.status_code, 500)
+        self.assertFalse(resp.get_json()['success'])
+
+    def test_every_file_rejected_by_validation(self):
+        resp = self._post(('bad.png', b'not an image at all'))
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.get_json()['data']['failed'], 1)
+
+    def test_stream_mode_reports_each_file_then_summary(self):
+        resp = self._post(('a.png', _PNG), ('fail.png', _PNG), query='?stream=1')
+        self.assertEqual(resp.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+        self.assertEqual(sorted(line['index'] for line in lines[:-1]), [0, 1])
+        self.assertEqual(lines[-1], {'done': True, 'total': 2, 'succeeded': 1, 'failed': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
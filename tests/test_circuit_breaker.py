@@ -0,0 +1,92 @@
+import unittest
+from unittest import mock
+
+from tg_imagebed.storage.base import StorageBackend, DownloadResult
+from tg_imagebed.storage.latency import BackendLatencyTracker, CIRCUIT_OPEN, CIRCUIT_HALF_OPEN, CIRCUIT_CLOSED
+from tg_imagebed.storage.router import StorageRouter
+
+
+class _CountingBackend(StorageBackend):
+    def __init__(self, name, status=502):
+        self.name = name
+        self.status = status
+        self.calls = 0
+
+    def put_bytes(self, **kwargs):
+        return None
+
+    def download(self, *, file_info, range_header):
+        self.calls += 1
+        return DownloadResult(status_code=self.status, content_type='image/png', headers={}, body=[b''])
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('tg_imagebed.storage.latency.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tracker = BackendLatencyTracker(failure_threshold=3, open_seconds=30, latency_slo=1.0)
+
+    def _trip(self, name='tg'):
+        for _ in range(3):
+            self.tracker.record(name, 0.01, False)
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        self.tracker.record('tg', 0.01, False)
+        self.tracker.record('tg', 0.01, False)
+        self.assertEqual(self.tracker.state('tg'), CIRCUIT_CLOSED)
+        self.tracker.record('tg', 0.01, False)
+        self.assertEqual(self.tracker.state('tg'), CIRCUIT_OPEN)
+        allowed, retry_after = self.tracker.allow_request('tg')
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 30)
+
+    def test_half_open_allows_single_probe(self):
+        self._trip()
+        self.now += 31
+        self.assertEqual(self.tracker.allow_request('tg'), (True, 0.0))
+        self.assertEqual(self.tracker.state('tg'), CIRCUIT_HALF_OPEN)
+        self.assertFalse(self.tracker.allow_request('tg')[0])
+        self.tracker.record('tg', 0.01, True)
+        self.assertEqual(self.tracker.state('tg'), CIRCUIT_CLOSED)
+
+    def test_failed_probe_doubles_cooldown(self):
+        self._trip()
+        self.now += 31
+        self.tracker.allow_request('tg')
+        self.tracker.record('tg', 0.01, False)
+        self.assertEqual(self.tracker.state('tg'), CIRCUIT_OPEN)
+        self.assertAlmostEqual(self.tracker.allow_request('tg')[1], 60)
+
+    def test_slo_breach_counts_as_failure(self):
+        for _ in range(3):
+            self.tracker.record('tg', 2.0, True)
+        self.assertEqual(self.tracker.state('tg'), CIRCUIT_OPEN)
+        self.tracker.record('s3', 2.0, True, check_slo=False)
+        self.assertEqual(self.tracker.snapshot()['s3']['error_rate'], 0.0)
+
+    def test_router_returns_503_with_retry_after(self):
+        self._trip()
+        backend = _CountingBackend('tg')
+        with mock.patch('tg_imagebed.storage.router.get_latency_tracker', return_value=self.tracker):
+            dl = StorageRouter._timed_download(backend, {}, None)
+        self.assertEqual(dl.status_code, 503)
+        self.assertEqual(dl.headers['Retry-After'], '30')
+        self.assertEqual(backend.calls, 0)
+
+    def test_upload_avoids_open_circuit(self):
+        self._trip('s3')
+        router = StorageRouter({'active': 'tg', 'backends': {
+            'tg': {'driver': 'local', 'root_dir': '/tmp'},
+            's3': {'driver': 'local', 'root_dir': '/tmp'},
+        }})
+        with mock.patch('tg_imagebed.storage.router.get_latency_tracker', return_value=self.tracker), \
+                mock.patch('tg_imagebed.database.get_system_setting', return_value=None), \
+                mock.patch.object(router, 'get_effective_upload_policy', return_value={'guest': 's3'}):
+            self.assertEqual(router.resolve_upload_backend(scene='guest'), 'tg')
+            self.assertEqual(router.resolve_upload_backend(scene='admin', requested_backend='s3', is_admin=True), 's3')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from tg_imagebed.database import connection
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'pool.db'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(connection.close_thread_connections)
+        with connection.get_connection() as conn:
+            conn.execute('CREATE TABLE t (v INTEGER)')
+
+    def _count(self):
+        with connection.get_read_connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM t').fetchone()[0]
+
+    def test_reuses_connection_and_sets_pragmas_once(self):
+        with connection.get_connection() as first:
+            pass
+        with connection.get_connection() as second:
+            self.assertIs(first, second)
+            self.assertEqual(second.execute('PRAGMA synchronous').fetchone()[0], 1)
+            self.assertEqual(second.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+    def test_nested_contexts_get_separate_connections(self):
+        with connection.get_connection() as outer:
+            outer.execute('INSERT INTO t VALUES (1)')
+            with connection.get_connection() as inner:
+                self.assertIsNot(outer, inner)
+                self.assertEqual(inner.execute('SELECT COUNT(*) FROM t').fetchone()[0], 0)
+        self.assertEqual(self._count(), 1)
+
+    def test_exception_rolls_back_before_reuse(self):
+        with self.assertRaises(RuntimeError):
+            with connection.get_connection() as conn:
+                conn.execute('INSERT INTO t VALUES (1)')
+                conn.row_factory = None
+                raise RuntimeError('boom')
+        with connection.get_connection() as again:
+            self.assertIs(again, conn)
+            self.assertFalse(again.in_transaction)
+            self.assertIs(again.row_factory, sqlite3.Row)
+        self.assertEqual(self._count(), 0)
+
+    def test_read_connection_rejects_writes(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            with connection.get_read_connection() as conn:
+                conn.execute('INSERT INTO t VALUES (1)')
+
+    def test_threads_do_not_share_connections(self):
+        with connection.get_connection() as main_conn:
+            pass
+        seen = []
+
+        def worker():
+            with connection.get_connection() as conn:
+                seen.append(conn)
+            connection.close_thread_connections()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.assertIsNot(seen[0], main_conn)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from tg_imagebed.database import connection, writer
+from tg_imagebed.database import run_write, submit_write, enqueue_write, stop_db_writer, update_access_count
+
+
+def _insert(cursor, value):
+    cursor.execute('INSERT INTO t VALUES (?)', (value,))
+    return value
+
+
+class DbWriterTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'writer.db'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(connection.close_thread_connections)
+        self.addCleanup(stop_db_writer)
+        with connection.get_connection() as conn:
+            conn.execute('CREATE TABLE t (v INTEGER UNIQUE)')
+
+    def _values(self):
+        with connection.get_read_connection() as conn:
+            return sorted(row[0] for row in conn.execute('SELECT v FROM t'))
+
+    def _block_writer(self):
+        """让写线程阻塞在一个操作里，以便后续操作在队列中堆积成同一批"""
+        started, release = threading.Event(), threading.Event()
+
+        def _wait(cursor):
+            started.set()
+            release.wait(5)
+
+        run_write(lambda cursor: None)
+        first = submit_write(_wait)
+        self.assertTrue(started.wait(5))
+        return first, release
+
+    def test_run_write_returns_result_after_commit(self):
+        self.assertEqual(run_write(_insert, 1), 1)
+        self.assertEqual(self._values(), [1])
+
+    def test_queued_writes_share_one_transaction(self):
+        first, release = self._block_writer()
+        with mock.patch.object(writer, '_apply_batch', wraps=writer._apply_batch) as apply_batch:
+            futures = [submit_write(_insert, i) for i in range(20)]
+            release.set()
+            first.result(5)
+            self.assertEqual([f.result(5) for f in futures], list(range(20)))
+        self.assertEqual(apply_batch.call_count, 1)
+        self.assertEqual(len(apply_batch.call_args[0][1]), 20)
+
+    def test_failed_operation_only_rolls_back_itself(self):
+        first, release = self._block_writer()
+
+        def _insert_then_fail(cursor):
+            cursor.execute('INSERT INTO t VALUES (99)')
+            raise RuntimeError('boom')
+
+        ok_before = submit_write(_insert, 1)
+        failed = submit_write(_insert_then_fail)
+        duplicate = submit_write(_insert, 1)
+        ok_after = submit_write(_insert, 2)
+        release.set()
+        first.result(5)
+        self.assertEqual(ok_before.result(5), 1)
+        self.assertEqual(ok_after.result(5), 2)
+        with self.assertRaises(RuntimeError):
+            failed.result(5)
+        with self.assertRaises(sqlite3.IntegrityError):
+            duplicate.result(5)
+        self.assertEqual(self._values(), [1, 2])
+
+    def test_nested_submit_runs_in_current_transaction(self):
+        def _outer(cursor):
+            _insert(cursor, 1)
+            return run_write(_insert, 2)
+
+        self.assertEqual(run_write(_outer), 2)
+        self.assertEqual(self._values(), [1, 2])
+
+    def test_connection_failure_fails_batch_and_recovers(self):
+        with mock.patch.object(writer, '_open_writer_connection', side_effect=sqlite3.OperationalError('unable to open')):
+            with self.assertRaises(sqlite3.OperationalError):
+                run_write(_insert, 1)
+        self.assertEqual(run_write(_insert, 2), 2)
+        self.assertEqual(self._values(), [2])
+
+    def test_run_write_times_out(self):
+        first, release = self._block_writer()
+        self.addCleanup(release.set)
+        with mock.patch.object(writer, '_RUN_WRITE_TIMEOUT_SECONDS', 0.1):
+            with self.assertRaises(TimeoutError):
+                run_write(_insert, 1)
+        release.set()
+        first.result(5)
+        self.assertEqual(run_write(_insert, 2), 2)
+        self.assertEqual(self._values(), [1, 2])
+
+    def test_stop_drains_queued_writes(self):
+        first, release = self._block_writer()
+        for i in range(5):
+            enqueue_write(_insert, i)
+        stopper = threading.Thread(target=stop_db_writer)
+        stopper.start()
+        release.set()
+        stopper.join(5)
+        first.result(5)
+        self.assertEqual(self._values(), list(range(5)))
+
+    def test_access_count_is_written_asynchronously(self):
+        connection.init_database(quiet=True)
+        with connection.get_connection() as conn:
+            conn.execute("INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time) "
+                         "VALUES ('e1', 'f', 'p', 0)")
+        for _ in range(3):
+            update_access_count('e1', 'cdn_pull')
+        run_write(lambda cursor: None)
+        with connection.get_read_connection() as conn:
+            row = conn.execute("SELECT access_count, cdn_hit_count FROM file_storage "
+                               "WHERE encrypted_id = 'e1'").fetchone()
+        self.assertEqual(tuple(row), (3, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tg_imagebed.database import connection, list_due_deletions, swap_file_storage_location
+from tg_imagebed.services import deletion_service
+from tg_imagebed.storage.base import StorageBackend, DownloadResult
+
+
+class _Backend(StorageBackend):
+    def __init__(self, name, fail=()):
+        self.name = name
+        self.objects = {'a', 'b'}
+        self.fail = set(fail)
+
+    def put_bytes(self, **kwargs):
+        raise NotImplementedError
+
+    def download(self, *, file_info, range_header):
+        status = 200 if file_info['storage_key'] in self.objects else 404
+        return DownloadResult(status_code=status, content_type='image/png', headers={}, body=[b''])
+
+    def delete(self, *, storage_key):
+        if storage_key in self.fail:
+            return False
+        self.objects.discard(storage_key)
+        return True
+
+
+def _item(item_id, key, **extra):
+    item = {
+        'id': item_id, 'encrypted_id': f"e{item_id}", 'storage_backend': 'local', 'storage_key': key,
+        'group_chat_id': None, 'group_message_id': None, 'storage_meta': None,
+        'storage_done': 0, 'telegram_done': 1, 'cdn_done': 1, 'attempts': 0, 'next_attempt_at': 0,
+    }
+    item.update(extra)
+    return item
+
+
+class DeletionQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.backend = _Backend('local', fail={'b'})
+        router = mock.Mock()
+        router.get_backend.return_value = self.backend
+        patches = [
+            mock.patch.object(deletion_service, 'get_storage_router', return_value=router),
+            mock.patch.object(deletion_service, 'get_system_setting_int', side_effect=lambda k, d, **kw: d),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _run(self, items):
+        with mock.patch.object(deletion_service, 'list_due_deletions', return_value=items), \
+                mock.patch.object(deletion_service, 'update_deletion_progress') as update:
+            stats = deletion_service.run_deletion_gc()
+        return stats, {u['id']: u for u in update.call_args.args[0]}
+
+    def test_failed_delete_is_retried_with_backoff(self):
+        stats, updates = self._run([_item(1, 'a'), _item(2, 'b', attempts=2)])
+        self.assertEqual((stats['done'], stats['retry']), (1, 1))
+        self.assertEqual(updates[1]['status'], 'done')
+        self.assertEqual((updates[2]['status'], updates[2]['attempts'], updates[2]['storage_done']),
+                         ('pending', 3, 0))
+        self.assertGreaterEqual(updates[2]['next_attempt_at'] - updates[1]['next_attempt_at'], 120)
+
+    def test_missing_object_counts_as_deleted(self):
+        self.backend.objects.discard('b')
+        _, updates = self._run([_item(2, 'b')])
+        self.assertEqual(updates[2]['status'], 'done')
+
+    def test_gives_up_after_max_attempts(self):
+        stats, updates = self._run([_item(2, 'b', attempts=7)])
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(updates[2]['status'], 'failed')
+        self.assertIn('local', updates[2]['last_error'])
+
+    def test_only_unfinished_steps_are_redone(self):
+        item = _item(3, 'a', storage_done=1, telegram_done=0, cdn_done=0)
+        with mock.patch.object(deletion_service, '_gc_storage') as storage, \
+                mock.patch.object(deletion_service, '_gc_telegram', return_value=({3}, {})), \
+                mock.patch.object(deletion_service, '_gc_cdn', return_value=(set(), {3: 'CDN 缓存清除失败'})):
+            _, updates = self._run([item])
+        storage.assert_not_called()
+        self.assertEqual((updates[3]['telegram_done'], updates[3]['cdn_done']), (1, 0))
+        self.assertEqual(updates[3]['last_error'], 'CDN 缓存清除失败')
+
+
+class SwapTombstoneTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'swap.db'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(connection.close_thread_connections)
+        connection.init_database(quiet=True)
+        with connection.get_connection() as conn:
+            conn.execute("INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time, storage_backend, "
+                         "storage_key, group_chat_id, group_message_id) "
+                         "VALUES ('e1', 'old', '', 0, 'telegram', 'old', -100, 5)")
+        self.old = {'encrypted_id': 'e1', 'storage_backend': 'telegram', 'storage_key': 'old',
+                    'group_chat_id': -100, 'group_message_id': 5, 'storage_meta': None}
+
+    def test_old_location_is_queued_with_swap(self):
+        fields = {'storage_backend': 's3', 'storage_key': 'new', 'group_message_id': None, 'group_chat_id': None}
+        self.assertTrue(swap_file_storage_location('e1', 'telegram', 'old', fields, tombstone=self.old))
+        [item] = list_due_deletions()
+        self.assertEqual((item['storage_backend'], item['storage_key'], item['group_message_id']),
+                         ('telegram', 'old', 5))
+        self.assertEqual((item['telegram_done'], item['cdn_done']), (0, 1))
+
+    def test_lost_race_queues_nothing(self):
+        self.assertFalse(swap_file_storage_location('e1', 'telegram', 'other', {'storage_key': 'new'},
+                                                    tombstone=self.old))
+        self.assertEqual(list_due_deletions(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import sqlite3
+import unittest
+
+from tg_imagebed.database import connection
+
+
+class GalleryCounterTests(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.cursor = self.conn.cursor()
+        connection._init_core_tables(self.cursor)
+        connection._init_gallery_tables(self.cursor)
+        for eid in ('a', 'b', 'c'):
+            self.cursor.execute(
+                'INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time) VALUES (?, ?, ?, 0)',
+                (eid, eid, eid))
+        self.cursor.execute("INSERT INTO galleries (id, name) VALUES (1, 'g')")
+        self._add('a', '2024-01-01')
+        connection._init_gallery_counters(self.cursor)
+        self.addCleanup(self.conn.close)
+
+    def _add(self, eid, added_at):
+        self.cursor.execute('INSERT INTO gallery_images (gallery_id, encrypted_id, added_at) VALUES (1, ?, ?)',
+                            (eid, added_at))
+
+    def _gallery(self):
+        self.cursor.execute('SELECT image_count, resolved_cover FROM galleries WHERE id = 1')
+        return self.cursor.fetchone()
+
+    def test_backfill_and_insert_keep_earliest_cover(self):
+        self.assertEqual(self._gallery(), (1, 'a'))
+        self._add('b', '2023-01-01')
+        self._add('c', '2025-01-01')
+        self.assertEqual(self._gallery(), (3, 'b'))
+
+    def test_removing_cover_picks_next_image(self):
+        self._add('b', '2025-01-01')
+        self.cursor.execute("DELETE FROM gallery_images WHERE encrypted_id = 'a'")
+        self.assertEqual(self._gallery(), (1, 'b'))
+        self.cursor.execute("DELETE FROM file_storage WHERE encrypted_id = 'b'")
+        self.assertEqual(self._gallery(), (0, None))
+
+    def test_file_delete_without_cascade_moves_cover(self):
+        self.conn.commit()
+        self.conn.execute('PRAGMA foreign_keys = OFF')
+        self._add('b', '2025-01-01')
+        self.cursor.execute("DELETE FROM file_storage WHERE encrypted_id = 'a'")
+        self.assertEqual(self._gallery(), (2, 'b'))
+        connection._rebuild_gallery_counters(self.cursor)
+        self.assertEqual(self._gallery(), (2, 'b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import io
+import os
+import struct
+import tempfile
+import unittest
+
+from PIL import Image
+
+from tg_imagebed.services.image_meta_service import (
+    _BASE83,
+    _blurhash_encode,
+    compute_blurhash,
+    parse_image_header,
+    strip_image_metadata,
+)
+
+
+def _encode(img: Image.Image, fmt: str, **kwargs) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, fmt, **kwargs)
+    return buf.getvalue()
+
+
+def _jpeg(width: int, height: int, orientation: int = None, gps: bool = False) -> bytes:
+    """构造只含段结构的最小 JPEG（SOF0 + 可选 EXIF）"""
+    segments = b''
+    if orientation is not None:
+        entries = [(0x0112, 3, 1, struct.pack('>HH', orientation, 0))]
+        if gps:
+            entries.append((0x8825, 4, 1, struct.pack('>I', 0)))
+        ifd = struct.pack('>H', len(entries))
+        for tag, field_type, count, value in entries:
+            ifd += struct.pack('>HHI', tag, field_type, count) + value
+        tiff = b'MM\x00*' + struct.pack('>I', 8) + ifd + struct.pack('>I', 0)
+        payload = b'Exif\x00\x00' + tiff
+        segments += b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+    sof = b'\x08' + struct.pack('>HH', height, width) + b'\x03' + b'\x00' * 9
+    segments += b'\xff\xc0' + struct.pack('>H', len(sof) + 2) + sof
+    return b'\xff\xd8' + segments + b'\xff\xda\x00\x02' + b'\x00' * 4 + b'\xff\xd9'
+
+
+class ImageHeaderParseTests(unittest.TestCase):
+    def test_png_and_gif_dimensions(self):
+        png = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR' + struct.pack('>II', 640, 480) + b'\x08\x02\x00\x00\x00'
+        self.assertEqual(parse_image_header(png)['width'], 640)
+        self.assertEqual(parse_image_header(png)['height'], 480)
+
+        gif = b'GIF89a' + struct.pack('<HH', 32, 16) + b'\x00' * 8
+        meta = parse_image_header(gif)
+        self.assertEqual((meta['width'], meta['height']), (32, 16))
+
+    def test_jpeg_orientation_swaps_display_size(self):
+        meta = parse_image_header(_jpeg(400, 300, orientation=6))
+        self.assertEqual(meta['orientation'], 6)
+        self.assertEqual((meta['width'], meta['height']), (300, 400))
+
+    def test_unknown_format_returns_none(self):
+        meta = parse_image_header(b'not an image at all')
+        self.assertIsNone(meta['width'])
+        self.assertIsNone(meta['height'])
+
+
+class StripMetadataTests(unittest.TestCase):
+    def test_strip_keeps_orientation_only(self):
+        original = _jpeg(400, 300, orientation=6, gps=True)
+        stripped = strip_image_metadata(original)
+
+        self.assertNotEqual(original, stripped)
+        self.assertNotIn(struct.pack('>H', 0x8825), stripped)
+        meta = parse_image_header(stripped)
+        self.assertEqual(meta['orientation'], 6)
+        self.assertEqual((meta['width'], meta['height']), (300, 400))
+
+    def test_strip_without_exif_returns_same_bytes(self):
+        original = _jpeg(10, 10)
+        self.assertIs(strip_image_metadata(original), original)
+
+
+class BlurHashTests(unittest.TestCase):
+    def test_solid_color_hash(self):
+        pixels = [(255, 0, 0)] * 16
+        result = _blurhash_encode(pixels, 4, 4)
+        # 4x3 分量 = 1 位尺寸 + 1 位最大值 + 4 位 DC + 11*2 位 AC
+        self.assertEqual(len(result), 28)
+        self.assertTrue(result.startswith('L'))
+
+    def test_compute_from_real_images(self):
+        solid = compute_blurhash(_encode(Image.new('RGB', (120, 80), (255, 0, 0)), 'PNG'))
+        self.assertEqual(len(solid), 28)
+        # 第 3-6 位为平均色（DC 分量）
+        dc = 0
+        for char in solid[2:6]:
+            dc = dc * 83 + _BASE83.index(char)
+        self.assertEqual((dc >> 16, (dc >> 8) & 0xff, dc & 0xff), (255, 0, 0))
+
+        gradient = Image.linear_gradient('L').convert('RGB')
+        left_to_right = compute_blurhash(_encode(gradient, 'JPEG', quality=90))
+        self.assertEqual(len(left_to_right), 28)
+        self.assertNotEqual(left_to_right, compute_blurhash(_encode(gradient.rotate(180), 'JPEG', quality=90)))
+
+    def test_compute_from_file_path(self):
+        data = _encode(Image.new('RGB', (64, 64), (0, 128, 255)), 'PNG')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'a.png')
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.assertEqual(compute_blurhash(path), compute_blurhash(data))
+
+    def test_undecodable_data_returns_none(self):
+        self.assertIsNone(compute_blurhash(b'\x89PNG\r\n\x1a\n' + b'\x00' * 32))
+
+
+if __name__ == '__main__':
+    unittest.main()
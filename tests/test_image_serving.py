@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from tg_imagebed.api import register_blueprints, images as images_api
+from tg_imagebed.storage.backends.telegram import TelegramBackend
+from tg_imagebed.storage.base import DownloadResult
+from tg_imagebed.storage.latency import BackendLatencyTracker
+from tg_imagebed.storage.router import StorageRouter
+
+_META = {'bot_id': 1, 'photo_sizes': {'s': {'file_id': 'thumb', 'file_size': 321, 'width': 90, 'height': 60}}}
+_SETTINGS = {'cdn_redirect_enabled': '1'}
+
+
+class ImageServingTests(unittest.TestCase):
+    def setUp(self):
+        self.file_info = {'encrypted_id': 'abc', 'storage_backend': 'telegram', 'storage_key': 'orig',
+                          'file_size': 99999, 'upload_time': 0, 'cdn_cached': 1, 'storage_meta': _META}
+        self.backend = mock.Mock(spec=TelegramBackend)
+        self.backend.name = 'telegram'
+        self.backend.download.return_value = DownloadResult(status_code=200, content_type='image/jpeg',
+                                                            headers={}, body=[b'x'])
+        self.router = mock.Mock(spec=StorageRouter)
+        self.router.get_backend_for_record.return_value = self.backend
+        self.router._timed_download.side_effect = StorageRouter._timed_download
+        self.tracker = BackendLatencyTracker()
+        for patcher in (
+            mock.patch.object(images_api, 'get_file_info', return_value=self.file_info),
+            mock.patch.object(images_api, 'update_access_count'),
+            mock.patch.object(images_api, 'get_storage_router', return_value=self.router),
+            mock.patch.object(images_api, 'get_system_setting', side_effect=_SETTINGS.get),
+            mock.patch.object(images_api, 'get_system_setting_int', side_effect=lambda key, default, **kw: default),
+            mock.patch.object(images_api, '_get_domain_mode', return_value=('cdn.example', True, True)),
+            mock.patch('tg_imagebed.storage.router.get_latency_tracker', return_value=self.tracker),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        app = Flask(__name__)
+        register_blueprints(app)
+        self.client = app.test_client()
+
+    def test_cdn_redirect_keeps_size_parameter(self):
+        resp = self.client.get('/image/abc?size=s')
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(resp.headers['Location'], 'https://cdn.example/image/abc?size=s')
+
+    def test_variant_read_uses_variant_size(self):
+        resp = self.client.get('/image/abc?size=s', headers={'CF-Connecting-IP': '1.2.3.4'})
+        self.assertEqual(resp.status_code, 200)
+        record = self.backend.download.call_args.kwargs['file_info']
+        self.assertEqual((record['storage_key'], record['file_size']), ('thumb', 321))
+        self.router.download_with_failover.assert_not_called()
+
+    def test_variant_read_respects_open_circuit(self):
+        with mock.patch.object(self.tracker, 'allow_request', return_value=(False, 7.2)):
+            resp = self.client.get('/image/abc?size=s', headers={'CF-Connecting-IP': '1.2.3.4'})
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.headers['Retry-After'], '8')
+        self.backend.download.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
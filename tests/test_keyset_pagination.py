@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from tg_imagebed.database import connection
+from tg_imagebed.database.pagination import decode_cursor, encode_cursor, keyset_condition, next_cursor
+
+
+class CursorCodecTests(unittest.TestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor('2024-01-02 03:04:05', 'abc')
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), ('2024-01-02 03:04:05', 'abc'))
+
+    def test_rejects_malformed(self):
+        for bad in ('not-base64!', encode_cursor('only-one'), encode_cursor(None, 'x')):
+            with self.assertRaises(ValueError):
+                decode_cursor(bad)
+
+    def test_condition_direction(self):
+        self.assertEqual(keyset_condition(('a', 'b'), None), ('', []))
+        sql, params = keyset_condition(('a', 'b'), encode_cursor(1, 'x'), descending=False)
+        self.assertEqual((sql, params), ('a >= ? AND (a, b) > (?, ?)', [1, 1, 'x']))
+
+
+class KeysetQueryTests(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.row_factory = sqlite3.Row
+        self.cursor = self.conn.cursor()
+        connection._init_core_tables(self.cursor)
+        connection._migrate_file_storage_columns(self.cursor)
+        # 相同 created_at 的并列行由 encrypted_id 决胜
+        for i in range(7):
+            self.cursor.execute(
+                'INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time, created_at) '
+                'VALUES (?, ?, ?, 0, ?)',
+                (f'id{i}', 'f', 'p', f'2024-01-0{1 + i // 3} 00:00:00'))
+        self.addCleanup(self.conn.close)
+
+    def _page(self, limit, cursor=None):
+        keyset, params = keyset_condition(('created_at', 'encrypted_id'), cursor)
+        self.cursor.execute(
+            f"SELECT encrypted_id, created_at FROM file_storage {'WHERE ' + keyset if keyset else ''} "
+            'ORDER BY created_at DESC, encrypted_id DESC LIMIT ?', (*params, limit))
+        rows = [dict(r) for r in self.cursor.fetchall()]
+        return rows, next_cursor(rows, limit, ('created_at', 'encrypted_id'))
+
+    def test_walks_all_rows_once_in_order(self):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = self._page(3, cursor)
+            seen.extend(r['encrypted_id'] for r in rows)
+            if not cursor:
+                break
+        self.assertEqual(seen, ['id6', 'id5', 'id4', 'id3', 'id2', 'id1', 'id0'])
+
+    def test_uses_composite_index(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(connection.close_thread_connections)
+        with mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'test.db')):
+            connection.init_database(quiet=True)
+            with connection.get_connection() as conn:
+                plan = ' '.join(row[3] for row in conn.execute(
+                    'EXPLAIN QUERY PLAN SELECT encrypted_id FROM file_storage '
+                    'WHERE (created_at, encrypted_id) < (?, ?) '
+                    'ORDER BY created_at DESC, encrypted_id DESC LIMIT 3',
+                    ('2024-01-02 00:00:00', 'id4')))
+        self.assertIn('idx_file_storage_created_eid', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_nullable_sort_key_walks_null_rows(self):
+        self.cursor.execute("UPDATE file_storage SET file_size = 10 WHERE encrypted_id IN ('id1', 'id4')")
+        sort_key = 'COALESCE(file_size, 0)'
+        seen, cursor = [], None
+        while True:
+            keyset, params = keyset_condition((sort_key, 'encrypted_id'), cursor)
+            self.cursor.execute(
+                f"SELECT encrypted_id, {sort_key} AS sort_key FROM file_storage "
+                f"{'WHERE ' + keyset if keyset else ''} ORDER BY {sort_key} DESC, encrypted_id DESC LIMIT 2",
+                params)
+            rows = [dict(r) for r in self.cursor.fetchall()]
+            seen.extend(r['encrypted_id'] for r in rows)
+            cursor = next_cursor(rows, 2, ('sort_key', 'encrypted_id'))
+            if not cursor:
+                break
+        self.assertEqual(seen, ['id4', 'id1', 'id6', 'id5', 'id3', 'id2', 'id0'])
+
+    def test_expression_index_is_searched(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(connection.close_thread_connections)
+        keyset, params = keyset_condition(('COALESCE(access_count, 0)', 'encrypted_id'), encode_cursor(3, 'x'))
+        with mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'test.db')):
+            connection.init_database(quiet=True)
+            with connection.get_connection() as conn:
+                plan = ' '.join(row[3] for row in conn.execute(
+                    f'EXPLAIN QUERY PLAN SELECT encrypted_id FROM file_storage WHERE {keyset} '
+                    'ORDER BY COALESCE(access_count, 0) DESC, encrypted_id DESC LIMIT 3', params))
+        self.assertIn('SEARCH', plan)
+        self.assertIn('idx_file_storage_access_key', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
+
+from tg_imagebed.storage.backends.telegram import TelegramBackend
+from tg_imagebed.telegram_api import TelegramBotClient
+
+
+class _FakeLocalBotApi(BaseHTTPRequestHandler):
+    """模拟 telegram-bot-api --local：getFile 返回数据目录中的绝对路径，不提供 /file 下载"""
+
+    data_dir = ''
+    requests_seen = []
+
+    def do_POST(self):
+        method = self.path.rsplit('/', 1)[-1]
+        length = int(self.headers.get('Content-Length') or 0)
+        params = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        self.requests_seen.append(method)
+        if method == 'getFile':
+            payload = {'ok': True, 'result': {
+                'file_id': params['file_id'],
+                'file_path': os.path.join(self.data_dir, 'documents', params['file_id']),
+            }}
+        else:
+            payload = {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.send_response(404)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalBotApiTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.data_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(cls.data_dir, 'documents'))
+        _FakeLocalBotApi.data_dir = cls.data_dir
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeLocalBotApi)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.data_dir, ignore_errors=True)
+
+    def setUp(self):
+        _FakeLocalBotApi.requests_seen.clear()
+        self.client = TelegramBotClient(f"http://127.0.0.1:{self.server.server_port}", local_mode=True)
+        self.client._session.trust_env = False
+        with mock.patch('tg_imagebed.storage.backends.telegram.get_telegram_client', return_value=self.client):
+            self.backend = TelegramBackend(name='local-test', bot_token='1:a', chat_id=-1,
+                                           api_id='1', api_hash='h')
+
+    def _write(self, file_id, data):
+        path = os.path.join(self.data_dir, 'documents', file_id)
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        return path
+
+    def test_download_reads_from_disk_without_size_cap(self):
+        data = os.urandom(64 * 1024)
+        path = self._write('big', data)
+        file_info = {'storage_key': 'big', 'file_size': 30 * 1024 * 1024, 'mime_type': 'image/png'}
+
+        dl = self.backend.download(file_info=file_info, range_header=None)
+        self.assertEqual(dl.status_code, 200)
+        self.assertEqual(b''.join(dl.body), data)
+        self.assertEqual(dl.updated_fields, {'file_path': path})
+        self.assertEqual(_FakeLocalBotApi.requests_seen, ['getFile'])
+        # 服务器的数据文件不能被当作临时文件删除
+        self.assertTrue(os.path.exists(path))
+
+    def test_range_request(self):
+        self._write('ranged', b'0123456789')
+        dl = self.backend.download(file_info={'storage_key': 'ranged'}, range_header='bytes=2-5')
+        self.assertEqual(dl.status_code, 206)
+        self.assertEqual(b''.join(dl.body), b'2345')
+
+    def test_unreadable_local_path(self):
+        dl = self.backend.download(file_info={'storage_key': 'missing'}, range_header=None)
+        self.assertEqual(dl.status_code, 502)
+
+    def test_remote_mode_keeps_http_paths(self):
+        self.assertFalse(TelegramBotClient().is_local_path('/var/lib/telegram-bot-api/x'))
+        self.assertFalse(self.client.is_local_path('photos/file_1.jpg'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from tg_imagebed.database import (
+    connection, create_replica_tasks, complete_replica, get_file_replicas, list_due_deletions,
+)
+from tg_imagebed.services import mirror_service
+from tg_imagebed.storage.base import StorageBackend, DownloadResult
+from tg_imagebed.storage.latency import BackendLatencyTracker
+from tg_imagebed.storage.router import StorageRouter
+
+
+class _FakeBackend(StorageBackend):
+    def __init__(self, name, status=200, delay=0.0):
+        self.name = name
+        self.status = status
+        self.delay = delay
+
+    def put_bytes(self, **kwargs):
+        return None
+
+    def download(self, *, file_info, range_header):
+        time.sleep(self.delay)
+        return DownloadResult(status_code=self.status, content_type='image/png', headers={}, body=[self.name.encode()])
+
+
+class MirrorFailoverTests(unittest.TestCase):
+    def _download(self, *backends, budget=0.05):
+        router = StorageRouter({})
+        candidates = [(b, {'storage_backend': b.name}) for b in backends]
+        tracker = BackendLatencyTracker()
+        with mock.patch.object(router, '_read_candidates', return_value=candidates), \
+                mock.patch.object(router, '_get_read_latency_budget', return_value=budget), \
+                mock.patch('tg_imagebed.storage.router.get_latency_tracker', return_value=tracker):
+            backend, dl = router.download_with_failover({}, None)
+        return backend.name, dl.status_code
+
+    def test_primary_error_fails_over_to_replica(self):
+        self.assertEqual(self._download(_FakeBackend('tg', status=502), _FakeBackend('s3')), ('s3', 200))
+
+    def test_slow_primary_races_replica(self):
+        self.assertEqual(self._download(_FakeBackend('tg', delay=0.5), _FakeBackend('s3')), ('s3', 200))
+
+    def test_fast_primary_wins(self):
+        self.assertEqual(self._download(_FakeBackend('tg'), _FakeBackend('s3', delay=0.5)), ('tg', 200))
+
+    def test_all_fail_returns_primary_result(self):
+        result = self._download(_FakeBackend('tg', status=404), _FakeBackend('s3', status=502))
+        self.assertEqual(result, ('tg', 404))
+
+    def test_tracker_ranks_healthy_fastest_first(self):
+        tracker = BackendLatencyTracker()
+        tracker.record('a', 0.5, True)
+        tracker.record('b', 0.1, True)
+        for _ in range(3):
+            tracker.record('c', 0.01, False)
+        self.assertEqual(tracker.rank(['a', 'b', 'c', 'd']), ['b', 'a', 'd', 'c'])
+
+
+class OrphanReplicaCleanupTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'mirror.db'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(connection.close_thread_connections)
+        connection.init_database(quiet=True)
+        with connection.get_connection() as conn:
+            conn.execute("INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time) "
+                         "VALUES ('e1', 'f', 'p', 0)")
+        create_replica_tasks('e1', ['tg-mirror'])
+        complete_replica('e1', 'tg-mirror', file_id='m', file_path='', storage_key='m',
+                         storage_meta={'chat_id': -100, 'message_id': 7})
+        with connection.get_connection() as conn:
+            conn.execute("DELETE FROM file_storage WHERE encrypted_id = 'e1'")
+
+    def test_orphaned_telegram_replica_is_queued_for_gc(self):
+        router = mock.Mock()
+        router.list_backends.return_value = {'tg-mirror': {}}
+        with mock.patch.object(mirror_service, 'get_storage_router', return_value=router), \
+                mock.patch.object(mirror_service, 'wake_deletion_gc') as wake:
+            self.assertEqual(mirror_service.cleanup_orphan_replicas(), 1)
+        wake.assert_called_once()
+        router.get_backend.assert_not_called()
+        self.assertEqual(get_file_replicas('e1', 'orphaned'), [])
+        queued = [item for item in list_due_deletions() if item['storage_backend'] == 'tg-mirror']
+        self.assertEqual(len(queued), 1)
+        self.assertEqual(json.loads(queued[0]['storage_meta'])['message_id'], 7)
+        self.assertEqual(queued[0]['cdn_done'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+file_storage 热点查询执行计划回归测试
+
+在种子数据库上调用真实的数据访问函数，通过 trace 回调捕获其实际执行的 SELECT，
+逐条 EXPLAIN QUERY PLAN；出现无索引全表扫描或临时 B 树排序即失败。
+"""
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from tg_imagebed.database import connection
+from tg_imagebed.database import (
+    get_recent_uploads, get_user_uploads, get_token_uploads, get_upload_count_today,
+    get_uncached_files, list_pending_writebacks, get_file_info,
+    create_gallery, add_images_to_gallery, get_gallery_images,
+    create_or_update_share_all_link, get_share_all_galleries, get_share_all_gallery_images,
+    admin_get_token_uploads, admin_get_token_overview, next_cursor, list_tiering_candidates,
+)
+from tg_imagebed.database.admin_galleries import admin_get_gallery_images
+
+_real_connect = sqlite3.connect
+
+# admin_module.admin_images 生成的语句形态（筛选 + 排序 + 键集游标）
+_ADMIN_LIST_QUERIES = [
+    "SELECT fs.encrypted_id FROM file_storage fs "
+    "ORDER BY fs.created_at DESC, fs.encrypted_id DESC LIMIT 20",
+    "SELECT fs.encrypted_id FROM file_storage fs WHERE (fs.created_at, fs.encrypted_id) < ('2024-01-01', 'x') "
+    "ORDER BY fs.created_at DESC, fs.encrypted_id DESC LIMIT 20",
+    "SELECT fs.encrypted_id FROM file_storage fs WHERE fs.source = 'web_upload' "
+    "ORDER BY fs.created_at DESC, fs.encrypted_id DESC LIMIT 20",
+    "SELECT fs.encrypted_id FROM file_storage fs WHERE fs.is_group_upload = 1 "
+    "ORDER BY fs.created_at DESC, fs.encrypted_id DESC LIMIT 20",
+    "SELECT fs.encrypted_id FROM file_storage fs WHERE fs.created_at >= '2024-01-01' AND fs.created_at < '2024-01-08' "
+    "ORDER BY fs.created_at DESC, fs.encrypted_id DESC LIMIT 20",
+    "SELECT fs.encrypted_id FROM file_storage fs "
+    "ORDER BY COALESCE(fs.file_size, 0) ASC, fs.encrypted_id ASC LIMIT 20",
+]
+for _column in ('file_size', 'access_count', 'cdn_hit_count', 'direct_hit_count'):
+    _ADMIN_LIST_QUERIES.append(
+        f"SELECT fs.encrypted_id, COALESCE(fs.{_column}, 0) AS sort_key FROM file_storage fs "
+        f"WHERE COALESCE(fs.{_column}, 0) <= 5 AND (COALESCE(fs.{_column}, 0), fs.encrypted_id) < (5, 'x') "
+        f"ORDER BY COALESCE(fs.{_column}, 0) DESC, fs.encrypted_id DESC LIMIT 20"
+    )
+
+
+class HotQueryPlanTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls._tmp.name, 'plans.db')
+        cls._patcher = mock.patch.object(connection, 'DATABASE_PATH', cls.db_path)
+        cls._patcher.start()
+        connection.init_database(quiet=True)
+        cls._seed()
+
+    @classmethod
+    def tearDownClass(cls):
+        connection.close_thread_connections()
+        cls._patcher.stop()
+        cls._tmp.cleanup()
+
+    @classmethod
+    def _seed(cls):
+        now = datetime.now()
+        with connection.get_connection() as conn:
+            conn.execute("INSERT INTO auth_tokens (token) VALUES ('tok')")
+            for i in range(200):
+                created = now - timedelta(hours=i)
+                conn.execute(
+                    'INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time, created_at, '
+                    'tg_user_id, username, source, auth_token, file_size, cdn_url, cdn_cached, '
+                    'is_group_upload, storage_backend) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (f'e{i:04d}', 'f', 'p', int(created.timestamp()), created.isoformat(),
+                     i % 5 or None, f'user{i % 7}', ('web_upload', 'token', 'group')[i % 3],
+                     'tok' if i % 4 == 0 else None, i * 100, 'https://cdn/x' if i % 2 else None,
+                     i % 3 == 0, i % 3 == 2, 'pending' if i % 50 == 0 else 'telegram'))
+            cls.token_rowid = conn.execute("SELECT rowid FROM auth_tokens WHERE token = 'tok'").fetchone()[0]
+        cls.gallery_id = create_gallery('tok', 'g')['id']
+        add_images_to_gallery(cls.gallery_id, 'tok', [f'e{i:04d}' for i in range(0, 200, 4)])
+        cls.share_token = create_or_update_share_all_link(True)['share_token']
+
+    def _traced(self, fn, *args, **kwargs):
+        statements = []
+
+        def connect(*a, **kw):
+            conn = _real_connect(*a, **kw)
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        # 线程内缓存的连接不经过 connect，先清空以便新建带 trace 的连接
+        connection.close_thread_connections()
+        with mock.patch.object(connection.sqlite3, 'connect', side_effect=connect):
+            result = fn(*args, **kwargs)
+        connection.close_thread_connections()
+        selects = [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+        self.assertTrue(selects, f'{fn.__name__} 未执行任何查询')
+        return result, selects
+
+    def _assert_indexed(self, sql):
+        conn = _real_connect(self.db_path)
+        try:
+            plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+        finally:
+            conn.close()
+        for detail in plan:
+            full_scan = detail.startswith('SCAN ') and ' USING ' not in detail and 'CONSTANT ROW' not in detail
+            self.assertFalse(full_scan, f'全表扫描: {detail}\n{sql}')
+            self.assertNotIn('TEMP B-TREE', detail, f'临时排序: {detail}\n{sql}')
+
+    def _check(self, fn, *args, **kwargs):
+        result, selects = self._traced(fn, *args, **kwargs)
+        for sql in selects:
+            with self.subTest(fn=fn.__name__, sql=' '.join(sql.split())[:120]):
+                self._assert_indexed(sql)
+        return result
+
+    def test_upload_listings(self):
+        rows = self._check(get_recent_uploads, 10)
+        self._check(get_recent_uploads, 10, cursor=next_cursor(rows, 10, ('created_at', 'encrypted_id')))
+        self._check(get_user_uploads, tg_user_id=3, limit=10)
+        self._check(get_user_uploads, 'user2', limit=10)
+        rows = self._check(get_token_uploads, 'tok', 10)
+        self._check(get_token_uploads, 'tok', 10, cursor=next_cursor(rows, 10, ('created_at', 'encrypted_id')))
+        self._check(admin_get_token_uploads, self.token_rowid)
+        self._check(admin_get_token_overview, self.token_rowid)
+
+    def test_daily_quota_counts(self):
+        self.assertGreater(self._check(get_upload_count_today, source='web_upload'), 0)
+        self.assertGreater(self._check(get_upload_count_today, auth_token='tok'), 0)
+
+    def test_background_scans(self):
+        self.assertTrue(self._check(get_uncached_files, int(time.time()) - 86400 * 30))
+        self.assertEqual(len(self._check(list_pending_writebacks)), 4)
+        self._check(get_file_info, 'e0001')
+        self._check(list_tiering_candidates, 'hot', 5, 1024 * 1024)
+
+    def test_gallery_listings(self):
+        page = self._check(get_gallery_images, self.gallery_id, 'tok', 1, 10)
+        self._check(get_gallery_images, self.gallery_id, 'tok', 1, 10, cursor=page['next_cursor'])
+        self._check(admin_get_gallery_images, self.gallery_id, 1, 10)
+        self._check(get_share_all_galleries, self.share_token)
+        self._check(get_share_all_gallery_images, self.share_token, self.gallery_id, 1, 10)
+
+    def test_admin_image_list(self):
+        for sql in _ADMIN_LIST_QUERIES:
+            with self.subTest(sql=sql):
+                self._assert_indexed(sql)
+
+
+if __name__ == '__main__':
+    unittest.main()
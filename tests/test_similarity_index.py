@@ -0,0 +1,122 @@
+import io
+import random
+import unittest
+from unittest import mock
+
+from PIL import Image, ImageDraw
+
+from tg_imagebed.services import similarity_service
+from tg_imagebed.services.image_meta_service import compute_dhash
+from tg_imagebed.services.similarity_service import PerceptualHashIndex, hamming_distance
+
+
+def _jpeg(img: Image.Image, quality: int = 90) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', quality=quality)
+    return buf.getvalue()
+
+
+def _distance(a: str, b: str) -> int:
+    return hamming_distance(int(a, 16), int(b, 16))
+
+
+class PerceptualHashIndexTests(unittest.TestCase):
+    def test_search_matches_linear_scan(self):
+        rng = random.Random(42)
+        index = PerceptualHashIndex()
+        hashes = {}
+        base = rng.getrandbits(64)
+        for i in range(300):
+            value = rng.getrandbits(64)
+            if i % 3 == 0:
+                # 构造一批与 base 距离较近的哈希
+                value = base
+                for bit in rng.sample(range(64), rng.randint(0, 9)):
+                    value ^= 1 << bit
+            hashes[f'img{i}'] = value
+            index.add(f'img{i}', format(value, '016x'))
+
+        for radius in (0, 3, 6, 9):
+            expected = sorted(
+                (eid, hamming_distance(base, v)) for eid, v in hashes.items()
+                if hamming_distance(base, v) <= radius
+            )
+            got = sorted(index.search(format(base, '016x'), radius))
+            self.assertEqual(got, expected)
+
+    def test_discard_and_exclude(self):
+        index = PerceptualHashIndex()
+        index.add('a', '00000000000000ff')
+        index.add('b', '00000000000000fe')
+        self.assertEqual(index.search('00000000000000ff', 2, exclude='a'), [('b', 1)])
+
+        index.discard('b')
+        self.assertEqual(index.search('00000000000000ff', 2, exclude='a'), [])
+        self.assertEqual(len(index), 1)
+
+
+class DHashTests(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.image = Image.new('RGB', (256, 192), (255, 255, 255))
+        draw = ImageDraw.Draw(self.image)
+        for _ in range(12):
+            x, y = rng.randrange(220), rng.randrange(160)
+            draw.ellipse([x, y, x + rng.randrange(20, 90), y + rng.randrange(20, 90)],
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+
+    def test_reencoded_and_resized_copies_stay_close(self):
+        original = compute_dhash(_jpeg(self.image))
+        self.assertRegex(original, r'^[0-9a-f]{16}$')
+        self.assertLessEqual(_distance(original, compute_dhash(_jpeg(self.image, quality=40))), 4)
+        self.assertLessEqual(_distance(original, compute_dhash(_jpeg(self.image.resize((128, 96))))), 4)
+
+    def test_different_images_are_far_apart(self):
+        original = compute_dhash(_jpeg(self.image))
+        mirrored = compute_dhash(_jpeg(self.image.transpose(Image.FLIP_LEFT_RIGHT)))
+        self.assertGreater(_distance(original, mirrored), 16)
+
+    def test_undecodable_data_returns_none(self):
+        self.assertIsNone(compute_dhash(b'not an image'))
+
+
+class DuplicateGroupJobTests(unittest.TestCase):
+    def setUp(self):
+        self.index = PerceptualHashIndex()
+        for eid, phash in (('a', '00000000000000ff'), ('b', '00000000000000fe'),
+                           ('c', 'ffffffff00000000'), ('d', 'ffffffff00000001'), ('e', '0f0f0f0f0f0f0f0f')):
+            self.index.add(eid, phash)
+        for patcher in (
+            mock.patch.object(similarity_service, 'get_phash_index', return_value=self.index),
+            mock.patch.object(similarity_service, '_filter_existing',
+                              side_effect=lambda matches: [{'encrypted_id': m, 'created_at': m} for m, _ in matches]),
+            mock.patch.dict(similarity_service._groups_cache, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _wait_for_job(self):
+        thread = similarity_service._groups_thread
+        if thread:
+            thread.join(5)
+
+    def test_groups_are_computed_in_background_and_cached(self):
+        first = similarity_service.find_duplicate_groups(2)
+        self.assertEqual((first['groups'], first['computed_at']), ([], None))
+        self.assertTrue(first['running'])
+        self._wait_for_job()
+
+        second = similarity_service.find_duplicate_groups(2)
+        self.assertFalse(second['running'])
+        self.assertIsNotNone(second['computed_at'])
+        self.assertEqual(sorted([r['encrypted_id'] for r in g] for g in second['groups']),
+                         [['a', 'b'], ['c', 'd']])
+
+    def test_distance_is_capped(self):
+        similarity_service.find_duplicate_groups(32)
+        self._wait_for_job()
+        self.assertEqual(list(similarity_service._groups_cache), [similarity_service._MAX_GROUP_DISTANCE])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import date
+from unittest import mock
+
+from tg_imagebed.database import connection, get_site_stats, reconcile_site_stats
+
+
+class SiteStatsTriggerTests(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.cursor = self.conn.cursor()
+        connection._init_core_tables(self.cursor)
+        connection._migrate_file_storage_columns(self.cursor)
+        self._insert('old', cdn_url='https://cdn/old', group=1)
+        connection._init_site_stats_tables(self.cursor)
+        self.addCleanup(self.conn.close)
+
+    def _insert(self, eid, *, cdn_url=None, group=0, size=10, when=None):
+        self.cursor.execute(
+            'INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time, file_size, '
+            'cdn_url, is_group_upload) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (eid, eid, eid, int(when or time.time()), size, cdn_url, group))
+
+    def _stats(self):
+        self.cursor.execute('SELECT name, value FROM site_stats')
+        return dict(self.cursor.fetchall())
+
+    def _today(self):
+        self.cursor.execute('SELECT uploads, total_bytes FROM daily_upload_stats WHERE day = ?',
+                            (date.today().isoformat(),))
+        return self.cursor.fetchone()
+
+    def test_backfill_and_insert(self):
+        self._insert('a')
+        self._insert('b', when=time.time() - 3 * 86400)
+        stats = self._stats()
+        self.assertEqual((stats['group_uploads'], stats['cdn_pending'], stats['cdn_uncached']), (1, 1, 3))
+        self.assertEqual(self._today(), (2, 20))
+
+    def test_cdn_and_access_updates(self):
+        self.cursor.execute("UPDATE file_storage SET cdn_cached = 1 WHERE encrypted_id = 'old'")
+        self.cursor.execute("UPDATE file_storage SET access_count = access_count + 1, "
+                            "cdn_hit_count = cdn_hit_count + 1 WHERE encrypted_id = 'old'")
+        stats = self._stats()
+        self.assertEqual((stats['cdn_cached'], stats['cdn_pending'], stats['cdn_uncached']), (1, 0, 0))
+        self.assertEqual((stats['access_total'], stats['cdn_hits'], stats['direct_hits']), (1, 1, 0))
+
+    def test_delete_and_rebuild_agree(self):
+        self._insert('a', group=1)
+        self.cursor.execute("UPDATE file_storage SET access_count = 5 WHERE encrypted_id = 'a'")
+        self.cursor.execute("DELETE FROM file_storage WHERE encrypted_id = 'old'")
+        live, today = self._stats(), self._today()
+        connection._rebuild_site_stats(self.cursor)
+        self.assertEqual(self._stats(), live)
+        self.assertEqual(self._today(), today)
+        self.assertEqual(live['group_uploads'], 1)
+
+    def test_updates_touch_only_changed_stat_rows(self):
+        before = self.conn.total_changes
+        self.cursor.execute("UPDATE file_storage SET access_count = access_count + 1, "
+                            "direct_hit_count = direct_hit_count + 1 WHERE encrypted_id = 'old'")
+        # file_storage 一行 + access_total + direct_hits
+        self.assertEqual(self.conn.total_changes - before, 3)
+        before = self.conn.total_changes
+        self.cursor.execute("UPDATE file_storage SET cdn_cached = cdn_cached, access_count = access_count "
+                            "WHERE encrypted_id = 'old'")
+        self.assertEqual(self.conn.total_changes - before, 1)
+
+    def test_legacy_update_trigger_is_replaced(self):
+        self.cursor.execute('''
+            CREATE TRIGGER trg_site_stats_update AFTER UPDATE OF access_count ON file_storage
+            BEGIN UPDATE site_stats SET value = value + 1; END
+        ''')
+        connection._init_site_stats_tables(self.cursor)
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_site_stats%'")
+        names = {row[0] for row in self.cursor.fetchall()}
+        self.assertNotIn('trg_site_stats_update', names)
+        self.assertIn('trg_site_stats_access_update', names)
+
+
+class ReconcileSiteStatsTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'stats.db'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(connection.close_thread_connections)
+        connection.init_database(quiet=True)
+        with connection.get_connection() as conn:
+            conn.execute("INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time, file_size, "
+                         "access_count) VALUES ('a', 'a', 'a', ?, 10, 3)", (int(time.time()),))
+
+    def test_corrects_drift_only(self):
+        self.assertEqual(reconcile_site_stats(), {})
+        with connection.get_connection() as conn:
+            conn.execute("UPDATE site_stats SET value = 100 WHERE name = 'access_total'")
+            conn.execute("UPDATE storage_usage_counters SET file_count = 0 WHERE scope = 'all'")
+        drift = reconcile_site_stats()
+        self.assertEqual(drift, {'site_stats:access_total': -97, 'storage_usage_counters:all::file_count': 1})
+        self.assertEqual(get_site_stats()['access_total'], 3)
+        self.assertEqual(reconcile_site_stats(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
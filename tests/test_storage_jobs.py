@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from tg_imagebed.database import connection, list_due_deletions
+from tg_imagebed.services import storage_jobs
+from tg_imagebed.services.storage_jobs import ByteRateLimiter, JobRunner, telegram_message_fields
+from tg_imagebed.storage.base import PutResult
+
+
+class ByteRateLimiterTests(unittest.TestCase):
+    def test_paces_bytes(self):
+        limiter = ByteRateLimiter(1000)
+        start = time.monotonic()
+        limiter.acquire(100)
+        limiter.acquire(100)
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_stop_event_interrupts_wait(self):
+        stop = threading.Event()
+        limiter = ByteRateLimiter(10, stop)
+        limiter.acquire(10)
+        stop.set()
+        start = time.monotonic()
+        limiter.acquire(100)
+        self.assertLess(time.monotonic() - start, 1)
+
+
+class JobRunnerTests(unittest.TestCase):
+    def setUp(self):
+        self.jobs = {1: 'paused', 2: 'pending', 3: 'running'}
+        self.ran = []
+        self.done = threading.Event()
+        self.runner = JobRunner(name='test-jobs', label='测试任务', list_jobs=self._list, set_status=self._set,
+                                run_job=self._run, poll_interval=0.05)
+        self.addCleanup(self.runner.stop)
+
+    def _list(self, statuses, limit):
+        return [{'id': i, 'status': s} for i, s in self.jobs.items() if s in statuses]
+
+    def _set(self, job_id, status, from_statuses=None, error=None):
+        if from_statuses and self.jobs.get(job_id) not in from_statuses:
+            return False
+        self.jobs[job_id] = status
+        return True
+
+    def _run(self, job_id):
+        self.ran.append(job_id)
+        self.jobs[job_id] = 'completed'
+        if job_id == 1:
+            self.done.set()
+
+    def test_runs_interrupted_jobs_first_then_resumed_ones(self):
+        self.runner.start()
+        deadline = time.monotonic() + 2
+        while len(self.ran) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.ran, [3, 2])
+        self.assertTrue(self.runner.resume(1))
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual(self.ran, [3, 2, 1])
+
+    def test_state_transitions_are_conditional(self):
+        self.assertFalse(self.runner.resume(2))
+        self.assertTrue(self.runner.pause(2))
+        self.assertTrue(self.runner.cancel(2))
+        self.assertFalse(self.runner.pause(2))
+
+    def test_failed_job_is_marked_failed(self):
+        self.jobs = {1: 'pending'}
+        self.runner._run_job = mock.Mock(side_effect=RuntimeError('boom'))
+        self.runner.start()
+        deadline = time.monotonic() + 2
+        while self.jobs[1] != 'failed' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.jobs[1], 'failed')
+
+
+class SwapHelpersTests(unittest.TestCase):
+    def test_telegram_message_fields_follow_new_location(self):
+        target = mock.Mock(_chat_id=-100)
+        self.assertEqual(telegram_message_fields({'message_id': 7}, target, drop_old=False),
+                         {'group_message_id': 7, 'group_chat_id': -100})
+        self.assertEqual(telegram_message_fields({}, target, drop_old=True),
+                         {'group_message_id': None, 'group_chat_id': None})
+        self.assertEqual(telegram_message_fields({}, target, drop_old=False), {})
+
+    def test_discarded_objects_are_queued_for_gc(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'jobs.db')), \
+                mock.patch.object(storage_jobs, 'wake_deletion_gc') as wake:
+            self.addCleanup(connection.close_thread_connections)
+            connection.init_database(quiet=True)
+            storage_jobs.discard_objects('e1', [PutResult(
+                file_id='f', file_path='', file_size=1, storage_backend='telegram', storage_key='f',
+                storage_meta={'message_id': 9, 'chat_id': -100})])
+            [item] = list_due_deletions()
+        wake.assert_called_once()
+        self.assertEqual((item['storage_backend'], item['storage_key']), ('telegram', 'f'))
+        self.assertEqual(json.loads(item['storage_meta'])['message_id'], 9)
+        self.assertEqual((item['telegram_done'], item['cdn_done']), (0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import hashlib
+import unittest
+from unittest import mock
+
+from tg_imagebed.services import migration_service
+from tg_imagebed.services.storage_jobs import ByteRateLimiter
+
+from storage_fakes import MemoryBackend, Router
+
+
+class StorageMigrationTests(unittest.TestCase):
+    def setUp(self):
+        self.src = MemoryBackend('src')
+        self.src.objects['src/a.png'] = b'payload'
+        self.row = {
+            'encrypted_id': 'a', 'storage_backend': 'src', 'storage_key': 'src/a.png',
+            'original_filename': 'a.png', 'file_hash': hashlib.sha256(b'payload').hexdigest(),
+        }
+        self.migration = {'source_backend': 'src', 'target_backend': 'dst',
+                          'options': {'verify': True, 'delete_source': True}}
+
+    def _run(self, dst, swapped=True, replicas=()):
+        limiter = ByteRateLimiter(0)
+        with mock.patch.object(migration_service, 'get_storage_router', return_value=Router(self.src, dst)), \
+                mock.patch.object(migration_service, 'get_file_replicas', return_value=list(replicas)), \
+                mock.patch.object(migration_service, 'delete_replica', return_value=1) as self.delete_replica, \
+                mock.patch.object(migration_service, 'swap_file_storage_location', return_value=swapped) as swap, \
+                mock.patch.object(migration_service, 'wake_deletion_gc') as self.wake, \
+                mock.patch.object(migration_service, 'discard_objects') as self.discard:
+            return migration_service._migrate_row(self.migration, self.row, limiter), swap
+
+    def test_copies_verifies_and_swaps(self):
+        dst = MemoryBackend('dst')
+        (outcome, size, _), swap = self._run(dst)
+        self.assertEqual((outcome, size), ('migrated', 7))
+        self.assertEqual(swap.call_args.args[:3], ('a', 'src', 'src/a.png'))
+        self.assertEqual(swap.call_args.args[3]['storage_backend'], 'dst')
+        self.assertEqual(dst.objects, {'dst/new-a.png': b'payload'})
+        # 源对象登记到删除队列（与切换同一事务），由删除 GC 清理
+        self.assertIs(swap.call_args.kwargs['tombstone'], self.row)
+        self.assertIn('src/a.png', self.src.objects)
+
+    def test_keep_source_does_not_queue_deletion(self):
+        self.migration['options']['delete_source'] = False
+        (outcome, _, _), swap = self._run(MemoryBackend('dst'))
+        self.assertEqual(outcome, 'migrated')
+        self.assertIsNone(swap.call_args.kwargs['tombstone'])
+
+    def test_source_hash_mismatch_fails(self):
+        self.row['file_hash'] = 'deadbeef'
+        dst = MemoryBackend('dst')
+        (outcome, _, _), swap = self._run(dst)
+        self.assertEqual(outcome, 'failed')
+        swap.assert_not_called()
+        self.assertEqual(dst.objects, {})
+
+    def test_corrupt_copy_is_discarded(self):
+        dst = MemoryBackend('dst', corrupt=True)
+        (outcome, _, _), swap = self._run(dst)
+        self.assertEqual(outcome, 'failed')
+        swap.assert_not_called()
+        self._assert_discarded(dst)
+
+    def test_concurrent_change_rolls_back(self):
+        dst = MemoryBackend('dst')
+        (outcome, _, _), _ = self._run(dst, swapped=False)
+        self.assertEqual(outcome, 'skipped')
+        self._assert_discarded(dst)
+        self.assertIn('src/a.png', self.src.objects)
+
+    def test_duplicate_target_replica_is_queued_for_gc(self):
+        self.migration['options']['delete_source'] = False
+        dst = MemoryBackend('dst')
+        dst.objects['dst/old-a.png'] = b'payload'
+        (outcome, _, _), _ = self._run(dst, replicas=[{'storage_backend': 'dst', 'storage_key': 'dst/old-a.png'}])
+        self.assertEqual(outcome, 'migrated')
+        self.delete_replica.assert_called_once_with('a', 'dst', queue_cleanup=True)
+        self.wake.assert_called_once()
+        self.assertIn('dst/old-a.png', dst.objects)
+
+    def _assert_discarded(self, dst):
+        """作废的新对象登记到删除队列，而不是直接调用 delete()（Telegram 没有实现）"""
+        encrypted_id, [put_result] = self.discard.call_args.args
+        self.assertEqual((encrypted_id, put_result.storage_key), ('a', 'dst/new-a.png'))
+        self.assertIn(put_result.storage_key, dst.objects)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import hashlib
+import unittest
+from unittest import mock
+
+from tg_imagebed.services import scrub_service
+from tg_imagebed.services.storage_jobs import ByteRateLimiter
+
+from storage_fakes import MemoryBackend, Router
+
+
+class StorageScrubTests(unittest.TestCase):
+    def setUp(self):
+        self.tg = MemoryBackend('tg')
+        self.s3 = MemoryBackend('s3')
+        self.row = {
+            'encrypted_id': 'a', 'storage_backend': 'tg', 'storage_key': 'tg/a', 'file_size': 7,
+            'original_filename': 'a.png', 'file_hash': hashlib.sha256(b'payload').hexdigest(),
+        }
+        self.replica = {'storage_backend': 's3', 'storage_key': 's3/a', 'role': 'mirror'}
+        self.s3.objects['s3/a'] = b'payload'
+        patches = [
+            mock.patch.object(scrub_service, 'get_storage_router', return_value=Router(self.tg, self.s3)),
+            mock.patch.object(scrub_service, 'get_file_replicas', return_value=[self.replica]),
+            mock.patch.object(scrub_service, 'record_scrub_issue'),
+            mock.patch.object(scrub_service, 'clear_scrub_issue'),
+        ]
+        self.mocks = [p.start() for p in patches]
+        for p in patches:
+            self.addCleanup(p.stop)
+        self.limiter = ByteRateLimiter()
+
+    def test_exists_mode_reads_only_first_byte(self):
+        self.tg.objects['tg/a'] = b'payload'
+        self.assertEqual(scrub_service.check_object(self.tg, self.row, False, self.limiter), ('ok', '', 0))
+        self.assertEqual(self.tg.ranges, ['bytes=0-0'])
+
+    def test_detects_missing_and_corrupt(self):
+        self.assertEqual(scrub_service.check_object(self.tg, self.row, False, self.limiter)[0], 'missing')
+        self.tg.objects['tg/a'] = b'paylOad'
+        status, _, size = scrub_service.check_object(self.tg, self.row, True, self.limiter)
+        self.assertEqual((status, size), ('corrupt', 7))
+
+    def test_scrub_row_reports_broken_primary_and_clears_healthy_replica(self):
+        outcome, _, results = scrub_service._scrub_row(self.row, True, True, run_id=1)
+        self.assertEqual(outcome, 'broken')
+        self.assertEqual([r['status'] for r in results], ['missing', 'ok'])
+        record, clear = self.mocks[2], self.mocks[3]
+        self.assertEqual(record.call_args.args, ('a', 'tg'))
+        self.assertEqual(record.call_args.kwargs['status'], 'missing')
+        clear.assert_called_once_with('a', 's3')
+
+    def _repair(self, swapped=True):
+        self.row['group_message_id'] = 5
+        with mock.patch.object(scrub_service, 'get_file_info', return_value=self.row), \
+                mock.patch.object(scrub_service, 'swap_file_storage_location', return_value=swapped) as swap, \
+                mock.patch.object(scrub_service, 'wake_deletion_gc'), \
+                mock.patch.object(scrub_service, 'discard_objects') as discard:
+            ok, _ = scrub_service.repair_file('a')
+        return ok, swap, discard
+
+    def test_repair_primary_from_mirror(self):
+        ok, swap, discard = self._repair()
+        self.assertTrue(ok)
+        self.assertEqual(swap.call_args.args[:3], ('a', 'tg', 'tg/a'))
+        fields = swap.call_args.args[3]
+        self.assertEqual(self.tg.objects[fields['storage_key']], b'payload')
+        # 旧对象与旧 TG 消息随切换登记删除，记录不再指向旧消息
+        self.assertIs(swap.call_args.kwargs['tombstone'], self.row)
+        self.assertIsNone(fields['group_message_id'])
+        discard.assert_not_called()
+        self.assertEqual(self.mocks[2].call_args.kwargs['status'], 'repaired')
+
+    def test_repair_lost_race_discards_new_object(self):
+        ok, _, discard = self._repair(swapped=False)
+        self.assertFalse(ok)
+        self.assertEqual(discard.call_args.args[1][0].storage_key, 'tg/new-a.png')
+
+    def test_repair_refuses_corrupt_source(self):
+        self.s3.objects['s3/a'] = b'garbage'
+        with mock.patch.object(scrub_service, 'get_file_info', return_value=self.row), \
+                mock.patch.object(scrub_service, 'swap_file_storage_location') as swap:
+            ok, _ = scrub_service.repair_file('a')
+        self.assertFalse(ok)
+        swap.assert_not_called()
+
+    def test_repair_replica_queues_broken_object(self):
+        with mock.patch.object(scrub_service, 'get_file_info', return_value=self.row), \
+                mock.patch.object(scrub_service, 'delete_replica', return_value=1) as delete, \
+                mock.patch.object(scrub_service, 'wake_deletion_gc') as wake, \
+                mock.patch.object(scrub_service, 'schedule_mirror', return_value=['s3']):
+            ok, _ = scrub_service.repair_file('a', 's3')
+        self.assertTrue(ok)
+        delete.assert_called_once_with('a', 's3', queue_cleanup=True)
+        wake.assert_called_once()
+        self.assertIn('s3/a', self.s3.objects)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+import json
+import time
+import unittest
+from unittest import mock
+
+from tg_imagebed.storage.backends.telegram import (
+    BotTokenPool, TelegramBackend, photo_size_variants, select_photo_variant,
+)
+from tg_imagebed.storage.router import _parse_chat_ids
+from tg_imagebed.telegram_api import TelegramBotClient, TokenBucket
+
+
+class _FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+
+    def json(self):
+        return self._payload
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_reservations_queue_in_order(self):
+        bucket = TokenBucket(rate=10.0, capacity=2)
+        waits = [bucket.reserve() for _ in range(4)]
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1, places=2)
+        self.assertAlmostEqual(waits[3], 0.2, places=2)
+
+    def test_block_for_delays_next_reservation(self):
+        bucket = TokenBucket(rate=100.0, capacity=10)
+        bucket.block_for(5)
+        self.assertGreater(bucket.reserve(), 4.9)
+
+
+class TelegramBotClientTests(unittest.TestCase):
+    def test_retry_after_is_honoured(self):
+        client = TelegramBotClient()
+        responses = [
+            _FakeResponse({'ok': False, 'error_code': 429, 'parameters': {'retry_after': 0.05}}, 429),
+            _FakeResponse({'ok': True, 'result': True}),
+        ]
+        with mock.patch.object(client._session, 'post', side_effect=responses) as post:
+            start = time.monotonic()
+            ok = client.delete_message(-100123, 42, bot_token='t')
+            elapsed = time.monotonic() - start
+
+        self.assertTrue(ok)
+        self.assertEqual(post.call_count, 2)
+        self.assertGreaterEqual(elapsed, 0.05)
+        metrics = client.get_metrics()['deleteMessage']
+        self.assertEqual((metrics['requests'], metrics['ok'], metrics['rate_limited'], metrics['retries']), (2, 1, 1, 1))
+
+    def test_long_local_queue_returns_429_without_request(self):
+        client = TelegramBotClient()
+        client._bucket(('bot', 't'), (30.0, 30)).block_for(120)
+        with mock.patch.object(client._session, 'post') as post:
+            payload = client.call('getMe', bot_token='t')
+        post.assert_not_called()
+        self.assertEqual(payload['error_code'], 429)
+
+    def test_get_file_does_not_use_global_bucket(self):
+        client = TelegramBotClient()
+        client._bucket(('bot', 't'), (30.0, 30)).block_for(120)
+        response = _FakeResponse({'ok': True, 'result': {'file_path': 'photos/a.jpg'}})
+        with mock.patch.object(client._session, 'post', return_value=response):
+            self.assertEqual(client.get_file_path('x', bot_token='t'), 'photos/a.jpg')
+
+    def test_max_wait_fails_fast(self):
+        client = TelegramBotClient()
+        client._bucket(('method', 't', 'getFile'), (20.0, 40)).block_for(2)
+        with mock.patch.object(client._session, 'post') as post:
+            start = time.monotonic()
+            payload = client.call('getFile', {'file_id': 'x'}, bot_token='t', max_wait=0.5)
+        self.assertLess(time.monotonic() - start, 0.5)
+        post.assert_not_called()
+        self.assertEqual(payload['error_code'], 429)
+
+    def test_unauthorized_token_is_marked_unhealthy(self):
+        client = TelegramBotClient()
+        response = _FakeResponse({'ok': False, 'error_code': 401, 'description': 'Unauthorized'}, 401)
+        with mock.patch.object(client._session, 'post', return_value=response):
+            client.call('getFile', {'file_id': 'x'}, bot_token='1:bad')
+        self.assertFalse(client.is_token_healthy('1:bad'))
+        self.assertIn('1', client.get_token_health())
+
+
+class ServeStaleFilePathTests(unittest.TestCase):
+    def test_download_uses_stored_path_when_get_file_is_queued(self):
+        client = TelegramBotClient()
+        with mock.patch('tg_imagebed.storage.backends.telegram.get_telegram_client', return_value=client):
+            backend = TelegramBackend(name='stale-test', bot_token='1:a', chat_id=-1)
+        client._bucket(('method', '1:a', 'getFile'), (20.0, 40)).block_for(60)
+        upstream = mock.Mock(status_code=200, headers={})
+        upstream.iter_content.return_value = [b'data']
+        file_info = {'storage_key': 'fid', 'file_path': 'photos/old.jpg', 'file_size': 4}
+        with mock.patch.object(client._session, 'post') as post, \
+                mock.patch.object(client, 'open_file', return_value=upstream) as open_file:
+            start = time.monotonic()
+            result = backend.download(file_info=file_info, range_header=None)
+        self.assertLess(time.monotonic() - start, 1)
+        post.assert_not_called()
+        self.assertEqual(open_file.call_args.args[0], 'photos/old.jpg')
+        self.assertEqual((result.status_code, b''.join(result.body)), (200, b'data'))
+
+
+class BotTokenPoolTests(unittest.TestCase):
+    def test_uploads_rotate_across_healthy_tokens(self):
+        client = TelegramBotClient()
+        pool = BotTokenPool(['1:a', '2:b', '3:c'], client)
+        self.assertEqual([pool.upload_token() for _ in range(6)], ['1:a', '2:b', '3:c'] * 2)
+        client.mark_token_unhealthy('2:b', 60)
+        self.assertNotIn('2:b', {pool.upload_token() for _ in range(6)})
+
+    def test_reads_go_to_uploading_bot_then_default(self):
+        pool = BotTokenPool(['1:a', '2:b'], TelegramBotClient())
+        self.assertEqual(pool.candidates('2'), ['2:b', '1:a'])
+        self.assertEqual(pool.candidates(None), ['1:a'])
+        # 已移出池的 Bot 上传的文件只能交给默认 Bot
+        self.assertEqual(pool.candidates('9'), ['1:a'])
+
+
+class _PerBotClient(TelegramBotClient):
+    """file_id 只对上传它的 Bot 有效的假 Bot API"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def call(self, method, params=None, *, bot_token, files=None, **kwargs):
+        bot_id = bot_token.split(':', 1)[0]
+        self.calls.append((method, bot_id))
+        if method == 'sendPhoto':
+            photo = {'file_id': f'photo@{bot_id}', 'width': 10, 'height': 10}
+            return {'ok': True, 'result': {'message_id': 1, 'photo': [photo]}}
+        if method == 'getFile':
+            if params['file_id'].endswith(f'@{bot_id}'):
+                return {'ok': True, 'result': {'file_path': f'photos/{bot_id}.jpg'}}
+            return {'ok': False, 'error_code': 400, 'description': 'Bad Request: invalid file_id'}
+        return {'ok': False}
+
+
+class MultiBotRoutingTests(unittest.TestCase):
+    def test_upload_records_bot_and_download_uses_it(self):
+        client = _PerBotClient()
+        with mock.patch('tg_imagebed.storage.backends.telegram.get_telegram_client', return_value=client):
+            backend = TelegramBackend(name='multi-bot-test', bot_token='1:a', chat_id=-1, bot_tokens=['2:b'])
+        results = [backend.put_bytes(file_content=b'x', filename='a.png', content_type='image/png', file_size=1,
+                                     caption='', source='test', username='u') for _ in range(2)]
+        self.assertEqual([r.storage_meta['bot_id'] for r in results], ['1', '2'])
+        self.assertEqual(results[1].file_path, 'photos/2.jpg')
+
+        client.calls.clear()
+        upstream = mock.Mock(status_code=200, headers={})
+        upstream.iter_content.return_value = [b'x']
+        file_info = {'storage_key': results[1].file_id, 'file_path': 'photos/stale.jpg', 'file_size': 1,
+                     'storage_meta': json.dumps(results[1].storage_meta)}
+        with mock.patch.object(client, 'open_file', return_value=upstream) as open_file:
+            dl = backend.download(file_info=file_info, range_header=None)
+        self.assertEqual(client.calls, [('getFile', '2')])
+        self.assertEqual(open_file.call_args.kwargs['bot_token'], '2:b')
+        self.assertEqual(dl.updated_fields, {'file_path': 'photos/2.jpg'})
+
+
+class ChatPlacementTests(unittest.TestCase):
+    def _backend(self, name, placement):
+        return TelegramBackend(name=name, bot_token='1:a', chat_id=-1, chat_ids=[-2, -3, -2], chat_placement=placement)
+
+    def test_round_robin_cycles_through_all_chats(self):
+        backend = self._backend('rr-test', 'round_robin')
+        self.assertEqual([backend._pick_chat(b'x') for _ in range(6)], [-1, -2, -3, -1, -2, -3])
+
+    def test_lru_picks_least_recently_used(self):
+        backend = self._backend('lru-test', 'lru')
+        picked = [backend._pick_chat(b'x') for _ in range(3)]
+        self.assertEqual(sorted(picked), [-3, -2, -1])
+        self.assertEqual(backend._pick_chat(b'x'), picked[0])
+
+    def test_hash_is_deterministic(self):
+        backend = self._backend('hash-test', 'hash')
+        self.assertEqual(backend._pick_chat(b'same'), backend._pick_chat(b'same'))
+        self.assertEqual(len({backend._pick_chat(bytes([i])) for i in range(64)}), 3)
+
+    def test_chunked_upload_does_not_consume_a_pick(self):
+        backend = self._backend('rr-chunk-test', 'round_robin')
+        backend._chunk_threshold = 1
+        with mock.patch.object(backend, '_upload_chunked', return_value=None):
+            backend.put_bytes(file_content=b'xy', filename='a.bin', content_type='', file_size=2,
+                              caption='', source='test', username='u')
+        self.assertEqual(backend._pick_chat(b'x'), -1)
+
+    def test_invalid_extra_chat_ids_are_skipped(self):
+        self.assertEqual(_parse_chat_ids('tg', ['-2', ' ', '@channel', -3, 'abc']), [-2, -3])
+
+
+class PhotoSizeVariantTests(unittest.TestCase):
+    _SIZES = [
+        {'file_id': 'a', 'width': 90, 'height': 60, 'file_size': 1000},
+        {'file_id': 'b', 'width': 320, 'height': 213, 'file_size': 9000},
+        {'file_id': 'c', 'width': 800, 'height': 533, 'file_size': 50000},
+        {'file_id': 'd', 'width': 1280, 'height': 853, 'file_size': 120000},
+    ]
+
+    def test_variants_exclude_original(self):
+        variants = photo_size_variants(self._SIZES)
+        self.assertEqual(sorted(variants), ['m', 's', 'x'])
+        self.assertEqual(variants['m']['file_id'], 'b')
+
+    def test_select_falls_back_to_larger_label(self):
+        meta = {'photo_sizes': photo_size_variants(self._SIZES[1:])}
+        self.assertEqual(select_photo_variant(meta, 's')[0], 'm')
+        self.assertIsNone(select_photo_variant(meta, 'y'))
+        self.assertIsNone(select_photo_variant('{}', 'm'))
+        self.assertIsNone(select_photo_variant(meta, 'bogus'))
+
+
+if __name__ == '__main__':
+    unittest.main()
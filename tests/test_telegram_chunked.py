@@ -0,0 +1,135 @@
+import os
+import threading
+import unittest
+
+from tg_imagebed.storage.backends.telegram import TelegramBackend, chunk_part_messages
+
+
+class _FakeFileResponse:
+    def __init__(self, data, status_code):
+        self._data = data
+        self.status_code = status_code
+
+    def iter_content(self, chunk_size):
+        for pos in range(0, len(self._data), chunk_size):
+            yield self._data[pos:pos + chunk_size]
+
+    def close(self):
+        pass
+
+
+class _FakeBotClient:
+    """内存中的 Bot API：sendDocument 存字节，getFile/下载按 file_id 取回"""
+
+    def __init__(self):
+        self.files = {}
+        self.deleted = []
+        self.ignore_range = False
+        self.get_file_busy = False
+        self.get_file_waits = []
+        self._lock = threading.Lock()
+
+    def call(self, method, params=None, *, bot_token, files=None, **kwargs):
+        with self._lock:
+            if method == 'sendDocument':
+                file_id = f"doc{len(self.files)}"
+                self.files[file_id] = files['document'][1]
+                return {'ok': True, 'result': {'message_id': len(self.files), 'document': {'file_id': file_id}}}
+            if method == 'getFile':
+                self.get_file_waits.append(kwargs.get('max_wait'))
+                if self.get_file_busy:
+                    return {'ok': False, 'error_code': 429}
+                return {'ok': True, 'result': {'file_path': f"documents/{params['file_id']}"}}
+        return {'ok': False}
+
+    local_mode = False
+
+    def is_token_healthy(self, token):
+        return True
+
+    def is_local_path(self, file_path):
+        return False
+
+    def open_file(self, file_path, *, bot_token, headers=None, **kwargs):
+        data = self.files[file_path.split('/', 1)[1]]
+        range_header = (headers or {}).get('Range')
+        if range_header and not self.ignore_range:
+            start, end = (int(x) for x in range_header[len('bytes='):].split('-'))
+            return _FakeFileResponse(data[start:end + 1], 206)
+        return _FakeFileResponse(data, 200)
+
+    def delete_message(self, chat_id, message_id, **kwargs):
+        self.deleted.append((chat_id, message_id))
+        return True
+
+
+class ChunkedStorageTests(unittest.TestCase):
+    def setUp(self):
+        self.backend = TelegramBackend(
+            name='chunk-test', bot_token='1:a', chat_id=-1,
+            chunk_threshold_mb=1, chunk_size_mb=1, chunk_parallelism=3,
+        )
+        self.client = _FakeBotClient()
+        self.backend._client = self.client
+        self.backend._token_pool._client = self.client
+        self.data = os.urandom(2 * 1024 * 1024 + 12345)
+
+    def _put(self):
+        return self.backend.put_bytes(
+            file_content=self.data, filename='big.png', content_type='image/png',
+            file_size=len(self.data), caption='', source='test', username='u',
+        )
+
+    def _download(self, result, range_header=None):
+        file_info = {'storage_key': result.storage_key, 'storage_meta': result.storage_meta, 'mime_type': 'image/png'}
+        dl = self.backend.download(file_info=file_info, range_header=range_header)
+        return dl, b''.join(dl.body)
+
+    def test_round_trip_and_manifest(self):
+        result = self._put()
+        parts = result.storage_meta['chunked']['parts']
+        self.assertEqual([p['size'] for p in parts], [1024 * 1024, 1024 * 1024, 12345])
+        self.assertEqual(len(chunk_part_messages(result.storage_meta)), 2)
+
+        dl, body = self._download(result)
+        self.assertEqual(dl.status_code, 200)
+        self.assertEqual(body, self.data)
+
+    def test_range_spanning_parts(self):
+        result = self._put()
+        start, end = 1024 * 1024 - 10, 2 * 1024 * 1024 + 5
+        dl, body = self._download(result, f'bytes={start}-{end}')
+        self.assertEqual(dl.status_code, 206)
+        self.assertEqual(dl.headers['Content-Range'], f'bytes {start}-{end}/{len(self.data)}')
+        self.assertEqual(body, self.data[start:end + 1])
+
+    def test_server_ignoring_range_is_trimmed_while_streaming(self):
+        result = self._put()
+        self.client.ignore_range = True
+        start, end = 1024 * 1024 + 100, 2 * 1024 * 1024 + 200
+        dl, body = self._download(result, f'bytes={start}-{end}')
+        self.assertEqual(body, self.data[start:end + 1])
+
+    def test_only_first_part_uses_serving_get_file_wait(self):
+        result = self._put()
+        self._download(result)
+        self.assertEqual(sorted(self.client.get_file_waits, key=str), [0.5, None, None])
+
+    def test_busy_get_file_fails_before_headers(self):
+        result = self._put()
+        self.client.get_file_busy = True
+        dl, _ = self._download(result)
+        self.assertEqual(dl.status_code, 503)
+        self.assertIn('Retry-After', dl.headers)
+
+    def test_chunk_size_is_capped_below_get_file_limit(self):
+        backend = TelegramBackend(name='chunk-cap-test', bot_token='1:a', chat_id=-1, chunk_size_mb=49)
+        self.assertEqual(backend._chunk_size, 19 * 1024 * 1024)
+
+    def test_small_files_are_not_chunked(self):
+        self.backend._chunk_threshold = len(self.data)
+        self.assertFalse(self.backend._should_chunk(len(self.data)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from tg_imagebed.database import (
+    connection, add_hot_replica, get_file_replicas, list_due_deletions, list_tiering_candidates,
+)
+from tg_imagebed.services import tiering_service
+from tg_imagebed.services.tiering_service import hotness, plan_tiering
+from tg_imagebed.storage.latency import BackendLatencyTracker
+from tg_imagebed.storage.router import StorageRouter
+
+
+def _item(eid, size, count, age_hours, now):
+    return {'encrypted_id': eid, 'file_size': size, 'access_count': count,
+            'last_accessed_ts': int(now - age_hours * 3600)}
+
+
+class TieringPlanTests(unittest.TestCase):
+    def test_hotness_decays_with_age(self):
+        now = time.time()
+        self.assertAlmostEqual(hotness(100, int(now), now), 100, delta=0.1)
+        self.assertAlmostEqual(hotness(100, int(now - 24 * 3600), now), 50, delta=0.1)
+
+    def test_budget_evicts_coldest(self):
+        now = time.time()
+        hot = [_item('old', 60, 10, 72, now)]
+        candidates = [_item('new', 60, 50, 0, now)]
+        promote, evict = plan_tiering(hot, candidates, budget_bytes=100, now=now)
+        self.assertEqual([i['encrypted_id'] for i in promote], ['new'])
+        self.assertEqual([i['encrypted_id'] for i in evict], ['old'])
+
+    def test_retain_bonus_avoids_thrashing(self):
+        now = time.time()
+        hot = [_item('kept', 60, 10, 0, now)]
+        candidates = [_item('close', 60, 11, 0, now)]
+        promote, evict = plan_tiering(hot, candidates, budget_bytes=100, now=now)
+        self.assertEqual((promote, evict), ([], []))
+
+
+class HotReplicaReadOrderTests(unittest.TestCase):
+    def test_hot_replica_served_before_primary(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        router = StorageRouter({'backends': {
+            name: {'driver': 'local', 'root_dir': f"{root.name}/{name}"} for name in ('telegram', 'mirror', 'hot')
+        }})
+        replicas = [
+            {'storage_backend': 'mirror', 'role': 'mirror', 'storage_key': 'k'},
+            {'storage_backend': 'hot', 'role': 'hot', 'storage_key': 'k'},
+        ]
+        with mock.patch('tg_imagebed.database.get_file_replicas', return_value=replicas), \
+                mock.patch('tg_imagebed.storage.router.get_latency_tracker', return_value=BackendLatencyTracker()):
+            order = [b.name for b, _ in router._read_candidates({'encrypted_id': 'x', 'storage_backend': 'telegram'})]
+        self.assertEqual(order, ['hot', 'telegram', 'mirror'])
+
+
+class HotTierDatabaseTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'tiering.db'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(connection.close_thread_connections)
+        connection.init_database(quiet=True)
+        with connection.get_connection() as conn:
+            for eid, count, age in (('busy-old', 100, '-3 days'), ('recent', 6, '-1 hours'),
+                                    ('stale', 50, '-30 days'), ('rare', 1, '-1 hours')):
+                conn.execute("INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time, file_size, "
+                             "access_count, last_accessed) VALUES (?, 'f', 'p', 0, 10, ?, datetime('now', ?))",
+                             (eid, count, age))
+
+    def test_candidates_follow_recent_activity(self):
+        rows = list_tiering_candidates('hot', min_access=5, max_size=100)
+        self.assertEqual([r['encrypted_id'] for r in rows], ['recent', 'busy-old'])
+        self.assertEqual([r['encrypted_id'] for r in list_tiering_candidates('hot', 5, 100, limit=1)], ['recent'])
+
+    def test_evicted_telegram_object_is_queued_for_gc(self):
+        self.assertTrue(add_hot_replica('recent', 'tg-hot', file_id='h', file_path='', storage_key='h',
+                                        storage_meta={'chat_id': -100, 'message_id': 11}))
+        router = mock.Mock()
+        router.list_backends.return_value = {'tg-hot': {}}
+        with mock.patch.object(tiering_service, 'get_storage_router', return_value=router):
+            self.assertTrue(tiering_service._evict({'encrypted_id': 'recent', 'storage_backend': 'tg-hot'}))
+        router.get_backend.assert_not_called()
+        self.assertEqual(get_file_replicas('recent'), [])
+        [item] = list_due_deletions()
+        self.assertEqual((item['storage_backend'], item['storage_key']), ('tg-hot', 'h'))
+        self.assertEqual(json.loads(item['storage_meta'])['message_id'], 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from tg_imagebed.database import connection
+from tg_imagebed.services import upload_session_service as sessions
+from tg_imagebed.services.upload_session_service import UploadSessionError
+
+_CONTENT = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 4
+
+
+class UploadSessionTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.uploaded = []
+        for patcher in (
+            mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'sessions.db')),
+            mock.patch.object(sessions, 'UPLOAD_SPOOL_DIR', os.path.join(tmp.name, 'spool')),
+            mock.patch.object(sessions, 'process_upload', side_effect=self._fake_process_upload),
+            mock.patch.dict(sessions._session_locks, clear=True),
+            mock.patch.dict(sessions._hash_states, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(connection.close_thread_connections)
+        connection.init_database(quiet=True)
+
+    def _fake_process_upload(self, *, file_content, file_path, file_hash, **kwargs):
+        self.assertIsNone(file_content)
+        with open(file_path, 'rb') as f:
+            self.uploaded.append((f.read(), file_hash))
+        return {'encrypted_id': 'enc', 'file_size': os.path.getsize(file_path)}
+
+    def _start(self, size=len(_CONTENT)):
+        return sessions.start_session(filename='a.png', content_type='image/png', total_size=size,
+                                      source='web_upload', upload_scene='guest')['upload_id']
+
+    def _append(self, upload_id, offset, data):
+        return sessions.append_chunk(upload_id, offset, io.BytesIO(data))
+
+    def test_chunks_append_and_finalize_streams_spooled_file(self):
+        upload_id = self._start()
+        self.assertEqual(self._append(upload_id, 0, _CONTENT[:500]), 500)
+        self.assertEqual(self._append(upload_id, 500, _CONTENT[500:]), len(_CONTENT))
+        self.assertEqual(sessions.get_session_status(upload_id)['offset'], len(_CONTENT))
+
+        result = sessions.finalize_session(upload_id, validator=lambda name, header: None)
+        self.assertEqual(result['encrypted_id'], 'enc')
+        self.assertEqual(self.uploaded, [(_CONTENT, hashlib.sha256(_CONTENT).hexdigest())])
+        self.assertFalse(os.path.exists(sessions._spool_path(upload_id)))
+        self.assertNotIn(upload_id, sessions._session_locks)
+        with self.assertRaises(UploadSessionError) as ctx:
+            sessions.get_session_status(upload_id)
+        self.assertEqual(ctx.exception.status, 404)
+
+    def test_out_of_order_and_duplicate_chunks_are_rejected(self):
+        upload_id = self._start()
+        self._append(upload_id, 0, _CONTENT[:100])
+        for offset in (0, 200):
+            with self.assertRaises(UploadSessionError) as ctx:
+                self._append(upload_id, offset, _CONTENT[offset:offset + 100])
+            self.assertEqual((ctx.exception.status, ctx.exception.offset), (409, 100))
+        with self.assertRaises(UploadSessionError) as ctx:
+            self._append(upload_id, 100, _CONTENT[100:] + b'extra')
+        self.assertEqual(ctx.exception.status, 400)
+        # 失败的分片不改变已接收偏移和落盘内容
+        self.assertEqual(sessions.get_session_status(upload_id)['offset'], 100)
+        self.assertEqual(os.path.getsize(sessions._spool_path(upload_id)), 100)
+
+    def test_finalize_requires_complete_file_and_valid_header(self):
+        upload_id = self._start()
+        self._append(upload_id, 0, _CONTENT[:10])
+        with self.assertRaises(UploadSessionError) as ctx:
+            sessions.finalize_session(upload_id)
+        self.assertEqual(ctx.exception.status, 409)
+
+        self._append(upload_id, 10, _CONTENT[10:])
+        headers = []
+        with self.assertRaises(UploadSessionError) as ctx:
+            sessions.finalize_session(upload_id, validator=lambda name, header: headers.append(header) or 'bad')
+        self.assertEqual(ctx.exception.status, 400)
+        self.assertEqual(headers, [_CONTENT[:64]])
+        self.assertEqual(self.uploaded, [])
+
+    def test_unknown_upload_ids_do_not_create_locks(self):
+        for upload_id in ('0' * 32, 'f' * 32, 'not-hex'):
+            with self.assertRaises(UploadSessionError):
+                self._append(upload_id, 0, b'x')
+            with self.assertRaises(UploadSessionError):
+                sessions.finalize_session(upload_id)
+        self.assertEqual(sessions._session_locks, {})
+
+    def test_expired_sessions_are_removed_with_their_locks(self):
+        upload_id = self._start()
+        self._append(upload_id, 0, _CONTENT[:100])
+        self.assertIn(upload_id, sessions._session_locks)
+        with connection.get_connection() as conn:
+            conn.execute('UPDATE upload_sessions SET updated_at = 0 WHERE upload_id = ?', (upload_id,))
+
+        self.assertEqual(sessions.cleanup_stale_sessions(), 1)
+        self.assertNotIn(upload_id, sessions._session_locks)
+        self.assertFalse(os.path.exists(sessions._spool_path(upload_id)))
+        with self.assertRaises(UploadSessionError) as ctx:
+            self._append(upload_id, 100, _CONTENT[100:200])
+        self.assertEqual(ctx.exception.status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import sqlite3
+import unittest
+
+from tg_imagebed.database import connection
+
+
+class UsageCounterTests(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.cursor = self.conn.cursor()
+        connection._init_core_tables(self.cursor)
+        connection._migrate_file_storage_columns(self.cursor)
+        self._insert('old', 'telegram', None, None, 5)
+        connection._init_usage_counter_tables(self.cursor)
+        self.addCleanup(self.conn.close)
+
+    def _insert(self, eid, backend, token, user, size):
+        self.cursor.execute(
+            'INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time, storage_backend, '
+            'auth_token, tg_user_id, file_size) VALUES (?, ?, ?, 0, ?, ?, ?, ?)',
+            (eid, eid, eid, backend, token, user, size))
+
+    def _counters(self):
+        self.cursor.execute('SELECT scope, scope_key, file_count, total_bytes FROM storage_usage_counters')
+        return {(scope, key): (count, size) for scope, key, count, size in self.cursor.fetchall()}
+
+    def test_backfill_and_insert(self):
+        self._insert('a', 's3', 'tok', 42, 100)
+        self._insert('b', '', 'tok', None, 50)
+        counters = self._counters()
+        self.assertEqual(counters[('all', '')], (3, 155))
+        self.assertEqual(counters[('backend', 'telegram')], (2, 55))
+        self.assertEqual(counters[('backend', 's3')], (1, 100))
+        self.assertEqual(counters[('token', 'tok')], (2, 150))
+        self.assertEqual(counters[('tg_user', '42')], (1, 100))
+
+    def test_update_and_delete_move_counts(self):
+        self._insert('a', 's3', 'tok', 42, 100)
+        self.cursor.execute("UPDATE file_storage SET storage_backend = 'local', auth_token = NULL WHERE encrypted_id = 'a'")
+        counters = self._counters()
+        self.assertEqual(counters[('backend', 's3')], (0, 0))
+        self.assertEqual(counters[('backend', 'local')], (1, 100))
+        self.assertEqual(counters[('token', 'tok')], (0, 0))
+        self.cursor.execute("DELETE FROM file_storage WHERE encrypted_id = 'a'")
+        counters = self._counters()
+        self.assertEqual(counters[('all', '')], (1, 5))
+        self.assertEqual(counters[('tg_user', '42')], (0, 0))
+
+    def test_rebuild_matches_triggers(self):
+        self._insert('a', 's3', 'tok', 42, 100)
+        self.cursor.execute("UPDATE file_storage SET file_size = 7 WHERE encrypted_id = 'a'")
+        live = {k: v for k, v in self._counters().items() if v[0]}
+        connection._rebuild_usage_counters(self.cursor)
+        self.assertEqual(self._counters(), live)
+
+
+if __name__ == '__main__':
+    unittest.main()
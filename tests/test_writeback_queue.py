@@ -0,0 +1,157 @@
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from tg_imagebed.database import connection, get_file_info, list_due_deletions
+from tg_imagebed.services import storage_jobs, writeback_service as writeback
+from tg_imagebed.storage.backends.local import LocalBackend
+from tg_imagebed.storage.base import PutResult
+
+from storage_fakes import Router
+
+_CONTENT = b'\x89PNG\r\n\x1a\n' + b'\x01' * 64
+
+
+class WritebackQueueTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.staging = LocalBackend(name='pending', root_dir=os.path.join(tmp.name, 'staging'))
+        self.target = mock.Mock()
+        self.target.name = 'dst'
+        self.target.put_bytes.side_effect = lambda *, file_content, filename, **kw: PutResult(
+            file_id=filename, file_path=filename, file_size=len(file_content),
+            storage_backend='dst', storage_key=f'dst/{filename}')
+        for patcher in (
+            mock.patch.object(connection, 'DATABASE_PATH', os.path.join(tmp.name, 'writeback.db')),
+            mock.patch.object(writeback, 'get_storage_router', return_value=Router(self.staging, self.target, active='dst')),
+            mock.patch.object(writeback, '_ready_queue', queue.Queue()),
+            mock.patch.object(writeback, '_delayed', []),
+            mock.patch.object(writeback, '_queued_ids', set()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(connection.close_thread_connections)
+        connection.init_database(quiet=True)
+
+    def _stage(self, encrypted_id, upload_time=0, meta=None):
+        put = self.staging.put_bytes(file_content=_CONTENT, filename=f'{encrypted_id}.png', content_type='image/png',
+                                     file_size=len(_CONTENT), caption='', source='web_upload', username='u')
+        with connection.get_connection() as conn:
+            conn.execute(
+                "INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time, original_filename, "
+                "storage_backend, storage_key, storage_meta) VALUES (?, ?, ?, ?, ?, 'pending', ?, ?)",
+                (encrypted_id, put.file_id, put.file_path, upload_time, f'{encrypted_id}.png',
+                 put.storage_key, json.dumps(meta or {'writeback_target': 'dst'})))
+        return put.storage_key
+
+    def _meta(self, encrypted_id):
+        return json.loads(get_file_info(encrypted_id)['storage_meta'] or '{}')
+
+    def test_enqueue_dedupes_and_delays_future_items(self):
+        writeback.enqueue_writeback('a')
+        writeback.enqueue_writeback('a')
+        writeback.enqueue_writeback('b', time.time() + 60)
+        self.assertEqual(writeback._ready_queue.qsize(), 1)
+        self.assertEqual([item[2] for item in writeback._delayed], ['b'])
+
+    def test_delay_scheduler_releases_items_when_due(self):
+        writeback.enqueue_writeback('late', time.time() + 0.2)
+        writeback.enqueue_writeback('soon', time.time() + 0.05)
+        stop = threading.Event()
+        with mock.patch.object(writeback, '_stop_event', stop):
+            thread = threading.Thread(target=writeback._delay_scheduler, daemon=True)
+            thread.start()
+            try:
+                self.assertEqual(writeback._ready_queue.get(timeout=2), 'soon')
+                self.assertEqual(writeback._ready_queue.get(timeout=2), 'late')
+            finally:
+                stop.set()
+                with writeback._delayed_cond:
+                    writeback._delayed_cond.notify_all()
+                thread.join(2)
+        self.assertFalse(thread.is_alive())
+
+    def test_success_swaps_record_and_removes_staged_file(self):
+        staged_key = self._stage('a')
+        self.assertIsNone(writeback._process_writeback('a'))
+        info = get_file_info('a')
+        self.assertEqual((info['storage_backend'], info['storage_key']), ('dst', 'dst/a.png'))
+        self.assertEqual(self.target.put_bytes.call_args.kwargs['file_content'], _CONTENT)
+        self.assertEqual(self.staging.download(file_info={'storage_key': staged_key}, range_header=None).status_code,
+                         404)
+
+    def test_record_deleted_mid_push_queues_remote_object(self):
+        staged_key = self._stage('a')
+        push = self.target.put_bytes.side_effect
+
+        def put_then_delete(**kwargs):
+            with connection.get_connection() as conn:
+                conn.execute("DELETE FROM file_storage WHERE encrypted_id = 'a'")
+            return push(**kwargs)
+
+        self.target.put_bytes.side_effect = put_then_delete
+        with mock.patch.object(storage_jobs, 'wake_deletion_gc') as wake:
+            self.assertIsNone(writeback._process_writeback('a'))
+        wake.assert_called_once()
+        self.target.delete.assert_not_called()
+        queued = [item for item in list_due_deletions() if item['storage_backend'] == 'dst']
+        self.assertEqual([item['storage_key'] for item in queued], ['dst/a.png'])
+        self.assertEqual(self.staging.download(file_info={'storage_key': staged_key}, range_header=None).status_code,
+                         404)
+
+    def test_failures_back_off_then_give_up(self):
+        self._stage('a')
+        self.target.put_bytes.side_effect = None
+        self.target.put_bytes.return_value = None
+        with mock.patch.object(writeback, 'get_system_setting_int', return_value=2):
+            before = time.time()
+            retry_at = writeback._process_writeback('a')
+            self.assertGreaterEqual(retry_at, before + writeback._RETRY_BASE_SECONDS)
+            meta = self._meta('a')
+            self.assertEqual(meta['writeback_attempts'], 1)
+            self.assertGreaterEqual(meta['writeback_next_at'], int(before) + writeback._RETRY_BASE_SECONDS)
+
+            self.assertIsNone(writeback._process_writeback('a'))
+        meta = self._meta('a')
+        self.assertEqual(meta['writeback_attempts'], 2)
+        self.assertTrue(meta['writeback_failed'])
+        self.assertEqual(get_file_info('a')['storage_backend'], 'pending')
+
+    def test_rescan_pages_through_every_pending_record(self):
+        future = int(time.time()) + 600
+        with connection.get_connection() as conn:
+            conn.executemany(
+                "INSERT INTO file_storage (encrypted_id, file_id, file_path, upload_time, storage_backend, "
+                "storage_key, storage_meta) VALUES (?, 'f', 'p', ?, 'pending', 'k', ?)",
+                [(f'p{i}', i // 3, json.dumps({'writeback_next_at': future} if i % 50 == 0 else {}))
+                 for i in range(25)]
+                + [('failed', 0, json.dumps({'writeback_failed': True}))])
+        with mock.patch.object(writeback, '_RESCAN_PAGE_SIZE', 4):
+            self.assertEqual(writeback.rescan_pending_writebacks(), 25)
+        self.assertEqual(writeback._queued_ids, {f'p{i}' for i in range(25)})
+        self.assertEqual(sorted(item[2] for item in writeback._delayed), ['p0'])
+        self.assertEqual(writeback._ready_queue.qsize(), 24)
+
+    def test_restart_pushes_staged_records(self):
+        self._stage('a')
+        self._stage('b', upload_time=1)
+        writeback.start_writeback_worker()
+        try:
+            deadline = time.time() + 5
+            while time.time() < deadline and any(
+                    get_file_info(eid)['storage_backend'] == 'pending' for eid in ('a', 'b')):
+                time.sleep(0.05)
+        finally:
+            writeback.stop_writeback_worker()
+        self.assertEqual([get_file_info(eid)['storage_backend'] for eid in ('a', 'b')], ['dst', 'dst'])
+        self.assertFalse(any(t.is_alive() for t in threading.enumerate() if t.name.startswith('writeback-')))
+
+
+if __name__ == '__main__':
+    unittest.main()
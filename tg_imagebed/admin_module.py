@@ -13,7 +13,6 @@ import time
 import json
 import re
 import threading
-import requests
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import session, request, jsonify, render_template, make_response, redirect, url_for
@@ -542,6 +541,19 @@ def _get_config_status_from_db() -> dict:
         'cdnMonitor': cdn_monitor_display
     }
 
+def _get_backend_usage() -> list:
+    """各存储后端的文件数与占用空间（读取触发器维护的用量计数）"""
+    try:
+        from .database import list_usage
+        return [
+            {'backend': item['key'], 'files': item['file_count'],
+             'bytes': item['total_bytes'], 'size': format_size(item['total_bytes'])}
+            for item in list_usage('backend')
+        ]
+    except Exception as e:
+        logger.debug(f"读取后端用量失败: {e}")
+        return []
+
 def init_admin_config():
     """初始化管理员配置表（在主数据库中）"""
     with get_connection() as conn:
@@ -740,18 +752,7 @@ def init_database_admin_update(DATABASE_PATH):
                 ON file_storage(original_filename)
             ''')
 
-            # 添加额外的索引以优化管理查询
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_created_at ON file_storage(created_at DESC)
-            ''')
-
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_file_size ON file_storage(file_size)
-            ''')
-
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_group_upload ON file_storage(is_group_upload)
-            ''')
+            # created_at / file_size 排序与群组筛选由 connection._create_indexes 中的复合/部分索引覆盖
 
         logger.info("管理功能数据库索引创建完成")
     except Exception as e:
@@ -929,30 +930,15 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
             total_files = get_all_files_count()
             total_size = get_total_size()
 
-            # 获取今日上传数
-            with get_connection() as conn:
-                cursor = conn.cursor()
-
-                try:
-                    # 修复日期查询 - 使用时间戳范围查询
-                    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                    today_end = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
-                    today_start_ts = int(today_start.timestamp())
-                    today_end_ts = int(today_end.timestamp())
-
-                    cursor.execute('''
-                        SELECT COUNT(*) FROM file_storage
-                        WHERE upload_time >= ? AND upload_time <= ?
-                    ''', (today_start_ts, today_end_ts))
-                    today_uploads = cursor.fetchone()[0]
-
-                    # 获取 CDN 缓存数量
-                    cursor.execute('SELECT COUNT(*) FROM file_storage WHERE cdn_cached = 1')
-                    cdn_cached = cursor.fetchone()[0]
-                except Exception as e:
-                    logger.error(f"查询统计数据失败: {e}")
-                    today_uploads = 0
-                    cdn_cached = 0
+            # 今日上传数与 CDN 缓存数来自触发器维护的物化统计
+            try:
+                from .database import get_site_stats, get_uploads_on
+                today_uploads = get_uploads_on()['uploads']
+                cdn_cached = get_site_stats().get('cdn_cached', 0)
+            except Exception as e:
+                logger.error(f"查询统计数据失败: {e}")
+                today_uploads = 0
+                cdn_cached = 0
 
             response_data = {
                 'success': True,
@@ -963,6 +949,9 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                         'todayUploads': today_uploads,
                         'cdnCached': cdn_cached
                     },
+                    'usage': {
+                        'backends': _get_backend_usage(),
+                    },
                     'config': _get_config_status_from_db()
                 }
             }
@@ -987,6 +976,7 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
         try:
             page = request.args.get('page', 1, type=int)
             limit = request.args.get('limit', 20, type=int)
+            page_cursor = request.args.get('cursor', '').strip() or None
             search = request.args.get('search', '').strip()
             filter_type = request.args.get('filter', 'all').strip().lower()
             sort_by = request.args.get('sort_by', 'created_at').strip().lower()
@@ -1008,12 +998,14 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                 filter_type = 'all'
 
             # 验证排序参数
+            # 可为 NULL 的排序列用 COALESCE 归一（与表达式索引一致），
+            # 否则行值比较会跳过 NULL 行、游标在 NULL 处提前结束
             sort_by_map = {
                 'created_at': 'fs.created_at',
-                'file_size': 'fs.file_size',
-                'access_count': 'fs.access_count',
-                'cdn_hit_count': 'fs.cdn_hit_count',
-                'direct_hit_count': 'fs.direct_hit_count',
+                'file_size': 'COALESCE(fs.file_size, 0)',
+                'access_count': 'COALESCE(fs.access_count, 0)',
+                'cdn_hit_count': 'COALESCE(fs.cdn_hit_count, 0)',
+                'direct_hit_count': 'COALESCE(fs.direct_hit_count, 0)',
             }
             if sort_by not in sort_by_map:
                 sort_by = 'created_at'
@@ -1025,14 +1017,15 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                 source = ''
 
             def _parse_query_date(value: str, day_end: bool = False):
+                # 返回日期前缀字符串；day_end 时返回次日，作为半开区间上界
                 raw = str(value or '').strip()
                 if not raw:
                     return None
                 try:
                     dt = datetime.strptime(raw, '%Y-%m-%d')
                     if day_end:
-                        dt = dt + timedelta(days=1) - timedelta(seconds=1)
-                    return dt.strftime('%Y-%m-%d %H:%M:%S')
+                        dt = dt + timedelta(days=1)
+                    return dt.strftime('%Y-%m-%d')
                 except Exception:
                     logger.debug(f"无效日期参数: {raw}")
                     return None
@@ -1058,8 +1051,8 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                 cursor.execute("PRAGMA table_info(file_storage)")
                 columns = [column[1] for column in cursor.fetchall()]
 
-                # 构建查询
-                offset = (page - 1) * limit
+                # 构建查询（传入游标时按键集分页，忽略 page）
+                offset = 0 if page_cursor else (page - 1) * limit
 
                 # 构建SELECT语句，只选择存在的列
                 select_columns = [
@@ -1076,6 +1069,18 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                     select_columns.append('fs.cdn_hit_count')
                 if 'direct_hit_count' in columns:
                     select_columns.append('fs.direct_hit_count')
+                for optional_col in ('width', 'height', 'phash'):
+                    if optional_col in columns:
+                        select_columns.append(f'fs.{optional_col}')
+
+                sort_column = sort_by_map.get(sort_by, 'fs.created_at')
+                # 访问统计列在旧库可能不存在，兜底回退到总访问量排序
+                if sort_by == 'cdn_hit_count' and 'cdn_hit_count' not in columns:
+                    sort_column = sort_by_map['access_count']
+                if sort_by == 'direct_hit_count' and 'direct_hit_count' not in columns:
+                    sort_column = sort_by_map['access_count']
+                # 排序键随行返回，用于生成下一页游标
+                select_columns.append(f'{sort_column} AS sort_key')
 
                 query = f'''
                     SELECT {', '.join(select_columns)}
@@ -1128,12 +1133,12 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                         where_clauses.append('fs.source = ?')
                         where_params.append(source)
 
-                # 时间范围筛选（新增）
+                # 时间范围筛选（新增）：直接比较 created_at 字符串，可走 created_at 索引
                 if date_from_dt:
-                    where_clauses.append('datetime(fs.created_at) >= datetime(?)')
+                    where_clauses.append('fs.created_at >= ?')
                     where_params.append(date_from_dt)
                 if date_to_dt:
-                    where_clauses.append('datetime(fs.created_at) <= datetime(?)')
+                    where_clauses.append('fs.created_at < ?')
                     where_params.append(date_to_dt)
 
                 # 文件大小筛选（新增，字节）
@@ -1152,35 +1157,53 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                     where_clauses.append('COALESCE(fs.access_count, 0) <= ?')
                     where_params.append(int(access_max))
 
-                # 拼接 WHERE 子句
+                # 获取总数（与查询条件一致）：无筛选时直接读存储用量计数；
+                # 有筛选时最多数到 admin_images_count_cap 条，超出则返回近似总数
+                total_approximate = False
                 if where_clauses:
-                    query += ' WHERE ' + ' AND '.join(where_clauses)
-
-                # 获取总数（与查询条件一致）
-                count_query = 'SELECT COUNT(*) FROM file_storage fs'
-                if where_clauses:
-                    count_query += ' WHERE ' + ' AND '.join(where_clauses)
-                cursor.execute(count_query, where_params)
-
-                total_count = cursor.fetchone()[0]
+                    from .database import get_system_setting_int
+                    count_cap = get_system_setting_int('admin_images_count_cap', 10000, minimum=100)
+                    cursor.execute(
+                        'SELECT COUNT(*) FROM (SELECT 1 FROM file_storage fs WHERE '
+                        + ' AND '.join(where_clauses) + ' LIMIT ?)',
+                        [*where_params, count_cap + 1],
+                    )
+                    total_count = cursor.fetchone()[0]
+                    if total_count > count_cap:
+                        total_count = count_cap
+                        total_approximate = True
+                else:
+                    from .database import get_usage_totals
+                    total_count = get_usage_totals()['file_count']
 
                 # 获取当前页数据
-                sort_column = sort_by_map.get(sort_by, 'fs.created_at')
-                # 访问统计列在旧库可能不存在，兜底回退到总访问量排序
-                if sort_by == 'cdn_hit_count' and 'cdn_hit_count' not in columns:
-                    sort_column = 'fs.access_count'
-                if sort_by == 'direct_hit_count' and 'direct_hit_count' not in columns:
-                    sort_column = 'fs.access_count'
+                # 键集分页：(排序列, encrypted_id) 行值比较，encrypted_id 作为并列值的决胜列
+                from .database import keyset_condition, next_cursor
+                try:
+                    keyset, keyset_params = keyset_condition(
+                        (sort_column, 'fs.encrypted_id'), page_cursor, descending=sort_order == 'desc'
+                    )
+                except ValueError as e:
+                    return jsonify({'success': False, 'error': str(e)}), 400
+                if keyset:
+                    where_clauses.append(keyset)
+
+                # 拼接 WHERE 子句
+                if where_clauses:
+                    query += ' WHERE ' + ' AND '.join(where_clauses)
 
-                query += f' ORDER BY {sort_column} {sort_order.upper()} LIMIT ? OFFSET ?'
+                query += f' ORDER BY {sort_column} {sort_order.upper()}, fs.encrypted_id {sort_order.upper()} LIMIT ? OFFSET ?'
                 params = list(where_params)
+                params.extend(keyset_params)
                 params.extend([limit, offset])
 
                 cursor.execute(query, params)
+                rows = [dict(row) for row in cursor.fetchall()]
+                next_page_cursor = next_cursor(rows, limit, ('sort_key', 'encrypted_id'))
                 images = []
 
-                for row in cursor.fetchall():
-                    image_data = dict(row)
+                for image_data in rows:
+                    image_data.pop('sort_key', None)
 
                     # 如果没有 is_group_upload 列，默认为 0
                     if 'is_group_upload' not in image_data:
@@ -1291,8 +1314,10 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                     'images': images,
                     'totalPages': total_pages,
                     'total': total_count,
+                    'totalApproximate': total_approximate,
                     'page': page,
-                    'limit': limit
+                    'limit': limit,
+                    'nextCursor': next_page_cursor
                 }
             }
 
@@ -1330,6 +1355,7 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
         deleted_size = 0
         tg_deleted_count = 0
         storage_deleted_count = 0
+        queued_count = 0
 
         def _chunked(seq, size=900):
             for i in range(0, len(seq), size):
@@ -1372,85 +1398,14 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                 except Exception:
                     pass
 
-                # 当 delete_storage=True 且 tg_sync_delete_enabled=True 时，删除存储后端文件和TG消息
-                if delete_storage and tg_sync_delete_enabled:
-                    # 删除存储后端文件（静默忽略失败）
-                    try:
-                        from .storage.router import get_storage_router
-                        router = get_storage_router()
-                        for row in files_to_delete:
-                            encrypted_id = row[0]
-                            storage_backend_name = row[4] if len(row) > 4 else None
-                            storage_key = row[6] if len(row) > 6 else None
-                            if storage_key and storage_backend_name:
-                                try:
-                                    backend = router.get_backend(storage_backend_name.strip())
-                                    backend.delete(storage_key=storage_key)
-                                    storage_deleted_count += 1
-                                except Exception as e:
-                                    logger.debug(f"删除存储文件失败: {encrypted_id}, {e}")
-                    except Exception as e:
-                        logger.debug(f"存储后端删除跳过: {e}")
-
-                # 同步删除TG群组消息（静默忽略失败）
+                # 当 delete_storage=True 且 tg_sync_delete_enabled=True 时，在同一事务内登记删除队列，
+                # 存储后端文件、TG消息与 CDN 缓存由后台 GC 批量清理
                 if delete_storage and tg_sync_delete_enabled:
-                    try:
-                        from .bot_control import get_effective_bot_token
-                        bot_token, _ = get_effective_bot_token()
-                        if bot_token:
-                            # 获取存储路由器（用于 fallback 获取 chat_id）
-                            try:
-                                from .storage.router import get_storage_router
-                                _router = get_storage_router()
-                            except Exception:
-                                _router = None
-
-                            seen = set()
-                            for row in files_to_delete:
-                                chat_id, message_id = row[2], row[3]
-                                storage_backend_name = row[4] if len(row) > 4 else None
-                                storage_meta_raw = row[5] if len(row) > 5 else None
-
-                                # 兼容历史数据：从 storage_meta 中提取 message_id，从后端配置获取 chat_id
-                                if message_id is None or chat_id is None:
-                                    try:
-                                        import json as _json
-                                        meta = _json.loads(storage_meta_raw) if isinstance(storage_meta_raw, str) and storage_meta_raw else {}
-                                        if message_id is None:
-                                            message_id = meta.get('message_id')
-                                        if chat_id is None and storage_backend_name and _router:
-                                            try:
-                                                be = _router.get_backend(storage_backend_name.strip())
-                                                if hasattr(be, '_chat_id'):
-                                                    chat_id = be._chat_id
-                                            except Exception:
-                                                pass
-                                    except Exception:
-                                        pass
-
-                                if chat_id is None or message_id is None:
-                                    continue
-                                key = (chat_id, message_id)
-                                if key in seen:
-                                    continue
-                                seen.add(key)
-                                try:
-                                    url = f"https://api.telegram.org/bot{bot_token}/deleteMessage"
-                                    resp = requests.post(url, data={
-                                        'chat_id': chat_id,
-                                        'message_id': message_id
-                                    }, timeout=5)
-                                    if resp.ok:
-                                        try:
-                                            payload = resp.json()
-                                            if payload.get('ok') is True:
-                                                tg_deleted_count += 1
-                                        except Exception:
-                                            pass
-                                except Exception:
-                                    pass
-                    except Exception as e:
-                        logger.debug(f"TG消息删除跳过: {e}")
+                    from .database import enqueue_file_deletions
+                    columns = ('encrypted_id', 'file_size', 'group_chat_id', 'group_message_id',
+                               'storage_backend', 'storage_meta', 'storage_key')
+                    queued_count = enqueue_file_deletions(
+                        cursor, [dict(zip(columns, row)) for row in files_to_delete])
 
                 # 删除数据库记录（分块处理）
                 for chunk in _chunked(ids):
@@ -1461,7 +1416,11 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                     ''', chunk)
                     deleted_count += cursor.rowcount
 
-            logger.info(f"管理员删除了 {deleted_count} 张图片，TG消息同步删除 {tg_deleted_count} 条，存储文件删除 {storage_deleted_count} 个")
+            if queued_count:
+                from .services.deletion_service import wake_deletion_gc
+                wake_deletion_gc()
+
+            logger.info(f"管理员删除了 {deleted_count} 张图片，{queued_count} 个存储文件/TG消息进入删除队列")
 
             return jsonify({
                 'success': True,
@@ -1469,6 +1428,7 @@ def register_admin_routes(app, DATABASE_PATH, get_all_files_count, get_total_siz
                     'deleted': deleted_count,
                     'tg_deleted': tg_deleted_count,
                     'storage_deleted': storage_deleted_count,
+                    'queued': queued_count,
                     'message': f'成功删除 {deleted_count} 张图片'
                 }
             })
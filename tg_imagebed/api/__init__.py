@@ -5,6 +5,7 @@ API 路由层模块 - Flask Blueprint 组织
 
 包含：
 - upload: 上传相关路由
+- upload_sessions: 分片续传路由
 - images: 图片访问和查询路由
 - admin: 管理员路由
 - auth: Token 认证路由
@@ -24,7 +25,7 @@ gallery_site_bp = Blueprint('gallery_site', __name__)
 def register_blueprints(app):
     """注册所有蓝图到 Flask 应用"""
     # 导入路由模块以注册路由
-    from . import upload, images, admin, auth, settings, galleries, tg_auth, admin_domains, gallery_site
+    from . import upload, upload_sessions, images, admin, auth, settings, galleries, tg_auth, admin_domains, gallery_site
 
     app.register_blueprint(upload_bp)
     app.register_blueprint(admin_bp)
@@ -8,9 +8,13 @@
 - admin_setup: 初始化设置（/api/setup/*）
 - admin_cdn: CDN 管理（/api/admin/cdn/*）
 - admin_storage: 存储配置（/api/admin/storage/*, /api/admin/upload）
+- admin_migrations: 存储后端迁移任务（/api/admin/storage/migrations/*）
+- admin_scrub: 存储完整性巡检（/api/admin/storage/scrub/*）
+- admin_deletions: 文件删除队列（/api/admin/storage/deletions/*）
 - admin_tokens: Token 管理（/api/admin/tokens/*）
 - admin_telegram: Telegram Bot 配置（/api/admin/telegram/*）
 - admin_galleries: 画集管理（/api/admin/galleries/*）
+- admin_images: 近似重复检索（/api/admin/images/duplicates, /api/admin/images/<id>/similar）
 - admin_update: 系统热更新（/api/admin/update/*）
 
 本文件保留：管理员账号设置 + 公告管理
@@ -27,9 +31,13 @@ from .. import admin_module
 from . import admin_setup      # noqa: F401
 from . import admin_cdn        # noqa: F401
 from . import admin_storage    # noqa: F401
+from . import admin_migrations  # noqa: F401
+from . import admin_scrub      # noqa: F401
+from . import admin_deletions  # noqa: F401
 from . import admin_tokens     # noqa: F401
 from . import admin_telegram   # noqa: F401
 from . import admin_galleries  # noqa: F401
+from . import admin_images     # noqa: F401
 from . import admin_domains    # noqa: F401
 from . import admin_dashboard  # noqa: F401
 from . import admin_update     # noqa: F401
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+管理员路由 - 文件删除队列（/api/admin/storage/deletions/*）
+"""
+from flask import request
+
+from . import admin_bp
+from .admin_helpers import _admin_json, _admin_options
+from ..config import logger
+from ..database import get_deletion_queue_stats, list_deletion_queue, retry_failed_deletions
+from ..services.deletion_service import wake_deletion_gc
+from .. import admin_module
+
+_STATUSES = ('pending', 'done', 'failed')
+
+
+@admin_bp.route('/api/admin/storage/deletions', methods=['GET', 'OPTIONS'])
+@admin_module.login_required
+def storage_deletion_queue():
+    """删除队列统计与分页列表（?status=pending|done|failed）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, OPTIONS')
+    status = (request.args.get('status') or '').strip() or None
+    if status and status not in _STATUSES:
+        return _admin_json({'success': False, 'error': f"不支持的状态: {status}"}, 400)
+    page = max(1, request.args.get('page', 1, type=int) or 1)
+    limit = max(1, min(200, request.args.get('limit', 50, type=int) or 50))
+    try:
+        return _admin_json({'success': True, 'data': {
+            'stats': get_deletion_queue_stats(),
+            'items': list_deletion_queue(status, limit=limit, offset=(page - 1) * limit),
+            'page': page,
+            'limit': limit,
+        }})
+    except Exception as e:
+        logger.error(f"获取删除队列失败: {e}")
+        return _admin_json({'success': False, 'error': '获取删除队列失败'}, 500)
+
+
+@admin_bp.route('/api/admin/storage/deletions/retry', methods=['POST', 'OPTIONS'])
+@admin_module.login_required
+def storage_deletion_retry():
+    """重试失败的删除项（{"ids": [...]}，不传则重试全部失败项）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('POST, OPTIONS')
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+        return _admin_json({'success': False, 'error': 'ids 必须是整数数组'}, 400)
+    try:
+        count = retry_failed_deletions(ids or None)
+    except Exception as e:
+        logger.error(f"重试删除队列失败: {e}")
+        return _admin_json({'success': False, 'error': '重试失败'}, 500)
+    if count:
+        wake_deletion_gc()
+    return _admin_json({'success': True, 'data': {'retried': count}})
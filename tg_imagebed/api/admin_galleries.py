@@ -136,7 +136,12 @@ def admin_gallery_images(gallery_id: int):
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 50, type=int)
         limit = max(1, min(200, limit))
-        result = admin_get_gallery_images(gallery_id, page, limit)
+        try:
+            result = admin_get_gallery_images(
+                gallery_id, page, limit, cursor=request.args.get('cursor', '').strip() or None
+            )
+        except ValueError as e:
+            return _admin_json({'success': False, 'error': str(e)}, 400)
         base_url = get_image_domain(request)
         cdn_domain = _get_cdn_domain()
         cdn_enabled = str(get_system_setting('cdn_enabled') or '0') == '1'
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+管理员路由 - 图片近似重复检索（/api/admin/images/duplicates, /api/admin/images/<id>/similar）
+"""
+from flask import request
+
+from . import admin_bp
+from .admin_helpers import _admin_json, _admin_options
+from ..config import logger
+from ..database import get_file_info, get_system_setting_int
+from ..services.image_meta_service import HAS_PIL
+from ..services.similarity_service import find_similar_images, find_duplicate_groups
+from .. import admin_module
+
+
+def _get_max_distance() -> int:
+    default = get_system_setting_int('phash_max_distance', 6, minimum=0, maximum=32)
+    distance = request.args.get('distance', default, type=int)
+    return max(0, min(32, distance if distance is not None else default))
+
+
+@admin_bp.route('/api/admin/images/<encrypted_id>/similar', methods=['GET', 'OPTIONS'])
+@admin_module.login_required
+def admin_similar_images(encrypted_id):
+    """查找与指定图片近似的图片"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, OPTIONS')
+
+    file_info = get_file_info(encrypted_id)
+    if not file_info:
+        return _admin_json({'success': False, 'error': '图片不存在'}, 404)
+    if not file_info.get('phash'):
+        return _admin_json({
+            'success': True,
+            'data': {'items': [], 'indexed': False, 'pillow_available': HAS_PIL},
+        })
+
+    limit = max(1, min(100, request.args.get('limit', 20, type=int) or 20))
+    try:
+        items = find_similar_images(file_info['phash'], _get_max_distance(), limit=limit, exclude=encrypted_id)
+    except Exception as e:
+        logger.error(f"近似图片检索失败: {e}")
+        return _admin_json({'success': False, 'error': '检索失败'}, 500)
+    return _admin_json({'success': True, 'data': {'items': items, 'indexed': True}})
+
+
+@admin_bp.route('/api/admin/images/duplicates', methods=['GET', 'OPTIONS'])
+@admin_module.login_required
+def admin_duplicate_images():
+    """列出近似重复图片分组（?refresh=1 强制后台重算）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, OPTIONS')
+
+    limit = max(1, min(200, request.args.get('limit', 50, type=int) or 50))
+    refresh = request.args.get('refresh', '').strip().lower() in ('1', 'true', 'yes')
+    try:
+        data = find_duplicate_groups(_get_max_distance(), limit=limit, refresh=refresh)
+    except Exception as e:
+        logger.error(f"近似重复分组失败: {e}")
+        return _admin_json({'success': False, 'error': '检索失败'}, 500)
+    # 分组由后台任务计算：尚无结果时返回 202，客户端稍后重试
+    status = 202 if data['computed_at'] is None else 200
+    return _admin_json({
+        'success': True,
+        'data': {
+            'groups': data['groups'],
+            'total': len(data['groups']),
+            'computed_at': data['computed_at'],
+            'running': data['running'],
+            'pillow_available': HAS_PIL,
+        },
+    }, status)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+管理员路由 - 存储后端迁移任务（/api/admin/storage/migrations/*）
+"""
+from flask import request
+
+from . import admin_bp
+from .admin_helpers import _admin_json, _admin_options
+from ..config import logger
+from ..database import get_storage_migration, list_storage_migrations, list_migration_failures
+from ..services.migration_service import (
+    create_migration, pause_migration, resume_migration, cancel_migration,
+)
+from .. import admin_module
+
+
+def _with_progress(migration: dict) -> dict:
+    """附加进度百分比与平均吞吐"""
+    done = migration['migrated_count'] + migration['skipped_count'] + migration['failed_count']
+    total = migration['total_count']
+    migration['progress'] = round(min(100.0, done * 100.0 / total), 1) if total else 100.0
+    elapsed = (migration.get('finished_at') or migration['updated_at']) - (migration.get('started_at') or migration['updated_at'])
+    migration['bytes_per_second'] = int(migration['migrated_bytes'] / elapsed) if elapsed > 0 else 0
+    return migration
+
+
+@admin_bp.route('/api/admin/storage/migrations', methods=['GET', 'POST', 'OPTIONS'])
+@admin_module.login_required
+def storage_migrations():
+    """列出/创建存储迁移任务"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, POST, OPTIONS')
+
+    if request.method == 'GET':
+        try:
+            items = [_with_progress(m) for m in list_storage_migrations(limit=50)]
+            return _admin_json({'success': True, 'data': {'items': items}})
+        except Exception as e:
+            logger.error(f"获取迁移任务失败: {e}")
+            return _admin_json({'success': False, 'error': '获取迁移任务失败'}, 500)
+
+    data = request.get_json(silent=True) or {}
+    try:
+        migration_id = create_migration(
+            data.get('source_backend'),
+            data.get('target_backend'),
+            filters=data.get('filters') if isinstance(data.get('filters'), dict) else {},
+            options=data.get('options') if isinstance(data.get('options'), dict) else {},
+        )
+    except (TypeError, ValueError) as e:
+        return _admin_json({'success': False, 'error': str(e)}, 400)
+    except Exception as e:
+        logger.error(f"创建迁移任务失败: {e}")
+        return _admin_json({'success': False, 'error': '创建迁移任务失败'}, 500)
+    return _admin_json({'success': True, 'data': _with_progress(get_storage_migration(migration_id))}, 201)
+
+
+@admin_bp.route('/api/admin/storage/migrations/<int:migration_id>', methods=['GET', 'OPTIONS'])
+@admin_module.login_required
+def storage_migration_detail(migration_id: int):
+    """迁移任务详情（含最近的失败文件）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, OPTIONS')
+    migration = get_storage_migration(migration_id)
+    if not migration:
+        return _admin_json({'success': False, 'error': '迁移任务不存在'}, 404)
+    migration = _with_progress(migration)
+    migration['failures'] = list_migration_failures(migration_id, limit=100)
+    return _admin_json({'success': True, 'data': migration})
+
+
+_ACTIONS = {
+    'pause': pause_migration,
+    'resume': resume_migration,
+    'cancel': cancel_migration,
+}
+
+
+@admin_bp.route('/api/admin/storage/migrations/<int:migration_id>/<action>', methods=['POST', 'OPTIONS'])
+@admin_module.login_required
+def storage_migration_action(migration_id: int, action: str):
+    """暂停/恢复/取消迁移任务（在当前批次结束后生效）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('POST, OPTIONS')
+    handler = _ACTIONS.get(action)
+    if not handler:
+        return _admin_json({'success': False, 'error': f"不支持的操作: {action}"}, 400)
+    if not get_storage_migration(migration_id):
+        return _admin_json({'success': False, 'error': '迁移任务不存在'}, 404)
+    if not handler(migration_id):
+        return _admin_json({'success': False, 'error': '当前状态不允许该操作'}, 409)
+    return _admin_json({'success': True, 'data': _with_progress(get_storage_migration(migration_id))})
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+管理员路由 - 存储完整性巡检（/api/admin/storage/scrub/*）
+"""
+from flask import request
+
+from . import admin_bp
+from .admin_helpers import _admin_json, _admin_options
+from ..config import logger
+from ..database import (
+    get_scrub_run, list_scrub_runs, list_scrub_issues, get_scrub_issue_counts, SCRUB_ISSUE_STATUSES,
+)
+from ..services.scrub_service import (
+    create_scrub, pause_scrub, resume_scrub, cancel_scrub, verify_file, repair_file,
+)
+from .. import admin_module
+
+
+def _with_progress(run: dict) -> dict:
+    """附加进度百分比"""
+    total = run['total_count']
+    run['progress'] = round(min(100.0, run['checked_count'] * 100.0 / total), 1) if total else 100.0
+    return run
+
+
+@admin_bp.route('/api/admin/storage/scrub', methods=['GET', 'POST', 'OPTIONS'])
+@admin_module.login_required
+def storage_scrub_runs():
+    """列出巡检任务与问题统计；POST 创建巡检任务"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, POST, OPTIONS')
+
+    if request.method == 'GET':
+        try:
+            return _admin_json({'success': True, 'data': {
+                'items': [_with_progress(run) for run in list_scrub_runs(limit=20)],
+                'issues': get_scrub_issue_counts(),
+            }})
+        except Exception as e:
+            logger.error(f"获取巡检任务失败: {e}")
+            return _admin_json({'success': False, 'error': '获取巡检任务失败'}, 500)
+
+    data = request.get_json(silent=True) or {}
+    try:
+        run_id = create_scrub(
+            data.get('mode') or 'exists',
+            options=data.get('options') if isinstance(data.get('options'), dict) else {},
+        )
+    except (TypeError, ValueError) as e:
+        return _admin_json({'success': False, 'error': str(e)}, 400)
+    except Exception as e:
+        logger.error(f"创建巡检任务失败: {e}")
+        return _admin_json({'success': False, 'error': '创建巡检任务失败'}, 500)
+    return _admin_json({'success': True, 'data': _with_progress(get_scrub_run(run_id))}, 201)
+
+
+_ACTIONS = {
+    'pause': pause_scrub,
+    'resume': resume_scrub,
+    'cancel': cancel_scrub,
+}
+
+
+@admin_bp.route('/api/admin/storage/scrub/<int:run_id>/<action>', methods=['POST', 'OPTIONS'])
+@admin_module.login_required
+def storage_scrub_action(run_id: int, action: str):
+    """暂停/恢复/取消巡检任务（在当前批次结束后生效）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('POST, OPTIONS')
+    handler = _ACTIONS.get(action)
+    if not handler:
+        return _admin_json({'success': False, 'error': f"不支持的操作: {action}"}, 400)
+    if not get_scrub_run(run_id):
+        return _admin_json({'success': False, 'error': '巡检任务不存在'}, 404)
+    if not handler(run_id):
+        return _admin_json({'success': False, 'error': '当前状态不允许该操作'}, 409)
+    return _admin_json({'success': True, 'data': _with_progress(get_scrub_run(run_id))})
+
+
+@admin_bp.route('/api/admin/storage/scrub/issues', methods=['GET', 'OPTIONS'])
+@admin_module.login_required
+def storage_scrub_issues():
+    """分页列出损坏/缺失对象（?status=missing|corrupt|error|repaired&backend=）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, OPTIONS')
+    status = (request.args.get('status') or '').strip() or None
+    if status and status not in SCRUB_ISSUE_STATUSES:
+        return _admin_json({'success': False, 'error': f"不支持的状态: {status}"}, 400)
+    backend = (request.args.get('backend') or '').strip() or None
+    page = max(1, request.args.get('page', 1, type=int) or 1)
+    limit = max(1, min(200, request.args.get('limit', 50, type=int) or 50))
+    try:
+        items, total = list_scrub_issues(status, backend, limit=limit, offset=(page - 1) * limit)
+    except Exception as e:
+        logger.error(f"获取巡检问题失败: {e}")
+        return _admin_json({'success': False, 'error': '获取巡检问题失败'}, 500)
+    return _admin_json({'success': True, 'data': {'items': items, 'total': total, 'page': page, 'limit': limit}})
+
+
+@admin_bp.route('/api/admin/storage/scrub/issues/<encrypted_id>/verify', methods=['POST', 'OPTIONS'])
+@admin_module.login_required
+def storage_scrub_verify(encrypted_id: str):
+    """立即复查单个文件（默认完整校验 SHA-256，{"hash": false} 只检查存在性）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('POST, OPTIONS')
+    data = request.get_json(silent=True) or {}
+    results = verify_file(encrypted_id, verify_hash=data.get('hash', True) is not False)
+    if results is None:
+        return _admin_json({'success': False, 'error': '文件不存在'}, 404)
+    healthy = all(item['status'] == 'ok' for item in results)
+    return _admin_json({'success': True, 'data': {'healthy': healthy, 'results': results}})
+
+
+@admin_bp.route('/api/admin/storage/scrub/issues/<encrypted_id>/repair', methods=['POST', 'OPTIONS'])
+@admin_module.login_required
+def storage_scrub_repair(encrypted_id: str):
+    """从健康副本修复（{"backend": 名称} 指定要修复的副本，默认主副本）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('POST, OPTIONS')
+    data = request.get_json(silent=True) or {}
+    try:
+        ok, message = repair_file(encrypted_id, (data.get('backend') or '').strip() or None)
+    except Exception as e:
+        logger.error(f"巡检修复异常: {encrypted_id} - {e}")
+        return _admin_json({'success': False, 'error': '修复失败'}, 500)
+    if not ok:
+        return _admin_json({'success': False, 'error': message}, 409)
+    return _admin_json({'success': True, 'data': {'message': message}})
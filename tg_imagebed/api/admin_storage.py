@@ -5,6 +5,7 @@
 """
 import re
 import json
+import time
 
 from flask import request, jsonify, Response, session
 
@@ -12,13 +13,20 @@ from . import admin_bp
 from .admin_helpers import _admin_json, _admin_options
 from ..config import logger
 from ..utils import add_cache_headers, format_size, get_image_domain
-from ..database import get_system_setting, update_system_setting
+from ..database import (
+    get_system_setting, update_system_setting, get_replica_stats,
+    USAGE_SCOPES, get_usage_totals, list_usage, reconcile_site_stats,
+)
 from ..services.file_service import process_upload
 from ..storage.router import get_storage_router, reload_storage_router, _load_storage_config
+from ..storage.latency import get_latency_tracker
+from ..storage.backends.telegram import CHAT_PLACEMENT_POLICIES
+from ..telegram_api import get_telegram_client
+from ..services.tiering_service import get_tiering_status, trigger_tiering_cycle
 from .. import admin_module
 
 # 敏感字段列表（需要掩码）
-_SENSITIVE_FIELDS = {'bot_token', 'api_hash', 'secret_key', 'access_key'}
+_SENSITIVE_FIELDS = {'bot_token', 'bot_tokens', 'api_hash', 'secret_key', 'access_key'}
 _MASKED_VALUE = '__MASKED__'
 # 允许的驱动类型
 _ALLOWED_DRIVERS = {'telegram', 'local', 's3', 'rclone'}
@@ -31,6 +39,19 @@ def _validate_backend_config(driver: str, cfg: dict) -> None:
     if driver != 'telegram':
         return
 
+    bot_tokens = cfg.get('bot_tokens')
+    if bot_tokens not in (None, '', _MASKED_VALUE):
+        if not isinstance(bot_tokens, list) or not all(isinstance(t, str) for t in bot_tokens):
+            raise ValueError('bot_tokens 必须为字符串数组')
+
+    chat_ids = cfg.get('chat_ids')
+    if chat_ids not in (None, ''):
+        if not isinstance(chat_ids, list) or not all(re.fullmatch(r'-?\d+', str(c).strip()) for c in chat_ids):
+            raise ValueError('chat_ids 必须为数字 ID 数组')
+    placement = str(cfg.get('chat_placement') or '').strip()
+    if placement and placement not in CHAT_PLACEMENT_POLICIES:
+        raise ValueError(f"chat_placement 仅支持: {', '.join(CHAT_PLACEMENT_POLICIES)}")
+
     api_id = str(cfg.get('api_id') or '').strip()
     api_hash = str(cfg.get('api_hash') or '').strip()
     if api_id or api_hash:
@@ -136,13 +157,17 @@ def check_storage_health():
         backends = router.list_backends()
         health_status = {}
 
+        tracker = get_latency_tracker()
         for name in backends.keys():
+            start = time.monotonic()
             try:
                 backend = router.get_backend(name)
                 health_status[name] = backend.healthcheck()
             except Exception as e:
                 logger.warning(f"后端 {name} 健康检查失败: {e}")
                 health_status[name] = False
+            # 手动检查结果同样计入熔断统计
+            tracker.record(name, time.monotonic() - start, bool(health_status[name]), check_slo=False)
 
         return _admin_json({'success': True, 'data': health_status})
 
@@ -202,6 +227,141 @@ def storage_upload_policy():
         return _admin_json({'success': False, 'error': '存储策略操作失败'}, 500)
 
 
+@admin_bp.route('/api/admin/storage/mirror', methods=['GET', 'PUT', 'OPTIONS'])
+@admin_module.login_required
+def storage_mirror_policy():
+    """获取/更新镜像策略（附带副本统计与各后端读延迟）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, PUT, OPTIONS')
+
+    try:
+        router = get_storage_router()
+        backends = router.list_backends()
+
+        if request.method == 'GET':
+            return _admin_json({
+                'success': True,
+                'data': {
+                    'policy': router.get_mirror_policy(),
+                    'available_backends': list(backends.keys()),
+                    'replicas': get_replica_stats(),
+                    'latency': get_latency_tracker().snapshot(),
+                }
+            })
+
+        # PUT 请求：更新策略
+        data = request.get_json(silent=True) or {}
+        policy = data.get('policy') if isinstance(data.get('policy'), dict) else data
+        if not isinstance(policy, dict):
+            return _admin_json({'success': False, 'error': 'policy 必须为 JSON 对象'}, 400)
+
+        normalized = {}
+        for primary, targets in policy.items():
+            primary = str(primary or '').strip()
+            if primary not in backends:
+                return _admin_json({'success': False, 'error': f"后端 {primary} 未配置"}, 400)
+            if not isinstance(targets, list):
+                return _admin_json({'success': False, 'error': '副本列表必须为数组'}, 400)
+            names = []
+            for name in targets:
+                name = str(name or '').strip()
+                if not name or name == primary or name in names:
+                    continue
+                if name not in backends:
+                    return _admin_json({'success': False, 'error': f"后端 {name} 未配置"}, 400)
+                names.append(name)
+            if names:
+                normalized[primary] = names
+
+        update_system_setting('storage_mirror_policy_json', json.dumps(normalized, ensure_ascii=False))
+        return _admin_json({'success': True, 'data': {'policy': normalized}})
+
+    except Exception as e:
+        logger.error(f"镜像策略操作失败: {e}")
+        return _admin_json({'success': False, 'error': '镜像策略操作失败'}, 500)
+
+
+@admin_bp.route('/api/admin/storage/tiering', methods=['GET', 'POST', 'OPTIONS'])
+@admin_module.login_required
+def storage_tiering():
+    """冷热分层状态（热层占用、最近一轮调度）；POST 立即触发一轮调度"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, POST, OPTIONS')
+    try:
+        if request.method == 'POST':
+            trigger_tiering_cycle()
+        return _admin_json({'success': True, 'data': get_tiering_status()})
+    except Exception as e:
+        logger.error(f"获取冷热分层状态失败: {e}")
+        return _admin_json({'success': False, 'error': '获取冷热分层状态失败'}, 500)
+
+
+@admin_bp.route('/api/admin/storage/circuits', methods=['GET', 'OPTIONS'])
+@admin_module.login_required
+def storage_circuits():
+    """各后端熔断状态（closed/open/half_open）、窗口错误率、P95 与平滑延迟"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, OPTIONS')
+    tracker = get_latency_tracker()
+    return _admin_json({
+        'success': True,
+        'data': {
+            'backends': tracker.snapshot(),
+            'failure_threshold': tracker.failure_threshold,
+            'open_seconds': tracker.open_seconds,
+            'latency_slo_ms': int(tracker.latency_slo * 1000),
+        },
+    })
+
+
+@admin_bp.route('/api/admin/storage/usage', methods=['GET', 'POST', 'OPTIONS'])
+@admin_module.login_required
+def storage_usage():
+    """
+    存储用量（触发器维护的计数，不扫描 file_storage）
+
+    GET ?scope=backend|token|tg_user&limit=：全站合计 + 指定维度排行
+    POST：按 file_storage 全量重建用量计数与站点统计（对账），返回修正量
+    """
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, POST, OPTIONS')
+    if request.method == 'POST':
+        try:
+            drift = reconcile_site_stats()
+        except Exception as e:
+            logger.error(f"统计对账失败: {e}")
+            return _admin_json({'success': False, 'error': '统计对账失败'}, 500)
+        logger.info(f"手动统计对账完成，修正 {len(drift)} 项")
+        return _admin_json({'success': True, 'data': {'totals': get_usage_totals(), 'drift': drift}})
+
+    scope = (request.args.get('scope') or 'backend').strip()
+    if scope not in USAGE_SCOPES or scope == 'all':
+        return _admin_json({'success': False, 'error': f"不支持的用量维度: {scope}"}, 400)
+    limit = max(1, min(500, request.args.get('limit', 100, type=int) or 100))
+    try:
+        items = list_usage(scope, limit=limit)
+        totals = get_usage_totals()
+    except Exception as e:
+        logger.error(f"获取存储用量失败: {e}")
+        return _admin_json({'success': False, 'error': '获取存储用量失败'}, 500)
+    for item in items:
+        item['size'] = format_size(item['total_bytes'])
+    return _admin_json({'success': True, 'data': {'scope': scope, 'totals': totals, 'items': items}})
+
+
+@admin_bp.route('/api/admin/storage/telegram-metrics', methods=['GET', 'OPTIONS'])
+@admin_module.login_required
+def storage_telegram_metrics():
+    """Bot API 请求统计（按方法：请求数、失败、限流、排队等待与平均耗时）"""
+    if request.method == 'OPTIONS':
+        return _admin_options('GET, OPTIONS')
+    client = get_telegram_client()
+    return _admin_json({
+        'success': True,
+        'data': {'methods': client.get_metrics(), 'unhealthy_bots': client.get_token_health()},
+    })
+
+
 @admin_bp.route('/api/admin/upload', methods=['POST', 'OPTIONS'])
 @admin_module.login_required
 def admin_upload():
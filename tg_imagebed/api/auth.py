@@ -4,7 +4,6 @@
 认证路由模块 - Token 认证 API
 """
 import time
-import requests as http_requests
 from datetime import datetime
 from flask import request, jsonify
 
@@ -16,13 +15,14 @@ from ..database import (
     verify_auth_token, verify_auth_token_access, get_token_info, update_token_usage,
     update_token_description, is_token_generation_allowed, is_token_upload_allowed,
     get_system_setting_int, get_upload_count_today,
-    create_auth_token, get_token_uploads,
+    create_auth_token, get_token_uploads, next_cursor,
     get_system_setting, verify_tg_session, get_user_token_count, bind_token_to_user, unbind_token_from_user,
-    count_tokens_by_ip,
+    count_tokens_by_ip, enqueue_file_deletions,
 )
 from ..database.connection import get_connection
+from ..services.deletion_service import wake_deletion_gc
 from ..services.file_service import process_upload
-from .upload import validate_image_magic, is_extension_allowed, validate_upload_file
+from .upload import validate_image_magic, is_extension_allowed, validate_upload_file, run_batch_upload
 
 
 def _extract_bearer_token() -> str:
@@ -263,21 +263,64 @@ def upload_with_token():
 
         logger.info(f"游客上传完成: {file.filename} -> {result['encrypted_id']}, 剩余: {remaining}次")
 
-        return add_cache_headers(jsonify({
-            'success': True,
-            'data': {
-                'url': permanent_url,
-                'filename': file.filename,
-                'size': format_size(result['file_size']),
-                'upload_time': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'remaining_uploads': remaining
-            }
-        }), 'no-cache')
+        data = {
+            'url': permanent_url,
+            'filename': file.filename,
+            'size': format_size(result['file_size']),
+            'upload_time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'remaining_uploads': remaining
+        }
+        if result.get('similar_images'):
+            data['similar_images'] = result['similar_images']
+
+        return add_cache_headers(jsonify({'success': True, 'data': data}), 'no-cache')
 
     except Exception as e:
         logger.error(f"Token上传错误: {e}")
         return add_cache_headers(jsonify({'success': False, 'error': '上传失败，请稍后重试'}), 'no-cache'), 500
 
+@auth_bp.route('/api/auth/upload/batch', methods=['POST'])
+def upload_batch_with_token():
+    """使用 Token 批量上传图片（multipart 字段 files，可重复）"""
+    if not is_token_upload_allowed():
+        return add_cache_headers(jsonify({
+            'success': False,
+            'error': 'Token 上传已关闭，仅管理员可上传'
+        }), 'no-cache'), 403
+
+    token = _extract_bearer_token()
+    if not token:
+        return add_cache_headers(jsonify({'success': False, 'error': '未提供Token'}), 'no-cache'), 401
+
+    verification = verify_auth_token(token)
+    if not verification['valid']:
+        return add_cache_headers(jsonify({'success': False, 'error': f"Token无效: {verification['reason']}"}), 'no-cache'), 401
+    issue = get_bound_token_session_issue(verification.get('token_data'))
+    if issue:
+        return add_cache_headers(jsonify({'success': False, 'error': issue['reason']}), 'no-cache'), issue['status']
+
+    # 配额只检查一次：取 Token 剩余次数与每日剩余次数的较小值
+    quota = max(0, verification.get('remaining_uploads', 0))
+    daily_limit = get_system_setting_int('daily_upload_limit', 0, minimum=0, maximum=1000000)
+    if daily_limit > 0:
+        quota = min(quota, daily_limit - get_upload_count_today(auth_token=token))
+        if quota <= 0:
+            return add_cache_headers(jsonify({'success': False, 'error': f'已达到每日上传限制({daily_limit}张)'}), 'no-cache'), 429
+
+    try:
+        # 整批结束后一次性累加使用次数
+        return run_batch_upload(
+            quota=quota,
+            username='guest_user',
+            source='guest_token',
+            scene='token',
+            auth_token=token,
+            on_finished=lambda succeeded: update_token_usage(token, succeeded),
+        )
+    except Exception as e:
+        logger.error(f"Token批量上传错误: {e}")
+        return add_cache_headers(jsonify({'success': False, 'error': '上传失败，请稍后重试'}), 'no-cache'), 500
+
 @auth_bp.route('/api/auth/uploads', methods=['GET'])
 def get_token_uploads_api():
     """获取 Token 上传的图片列表"""
@@ -299,8 +342,14 @@ def get_token_uploads_api():
 
         limit = request.args.get('limit', 50, type=int)
         page = request.args.get('page', 1, type=int)
+        cursor = request.args.get('cursor', '').strip() or None
 
-        uploads = get_token_uploads(token, limit, page)
+        try:
+            uploads = get_token_uploads(token, limit, page, cursor=cursor)
+        except ValueError as e:
+            return add_cache_headers(jsonify({'success': False, 'error': str(e)}), 'no-cache'), 400
+        # 游标基于原始 created_at，须在格式化前生成
+        next_page = next_cursor(uploads, limit, ('created_at', 'encrypted_id'))
 
         base_url = get_image_domain(request)
         for upload in uploads:
@@ -324,7 +373,8 @@ def get_token_uploads_api():
                 'can_upload': verification.get('can_upload', False),
                 'page': page,
                 'limit': limit,
-                'has_more': len(uploads) == limit
+                'has_more': len(uploads) == limit,
+                'next_cursor': next_page
             }
         }), 'no-cache')
 
@@ -462,78 +512,61 @@ def unbind_token_from_tg():
     return add_cache_headers(jsonify({'success': True, 'message': '解绑成功'}), 'no-cache')
 
 
-def _delete_tg_message(file_row: dict) -> bool:
+def _delete_file_records(encrypted_ids: list, token: str, *, delete_storage: bool = True) -> dict:
     """
-    同步删除 Telegram 频道中的消息（单一职责：仅处理 TG 消息删除）
-    返回是否成功删除
+    批量删除属于该 Token 的图片记录（访问立即 404）。
+    - delete_storage=True: 同一事务内登记删除队列，存储文件 + TG消息 + CDN 缓存由后台 GC 清理
+    - delete_storage=False: 仅删除数据库记录（保留存储文件）
+    返回 { 'deleted': int, 'failed': int, 'queued': int }
     """
-    chat_id = file_row.get('group_chat_id')
-    message_id = file_row.get('group_message_id')
-    storage_backend = (file_row.get('storage_backend') or 'telegram').strip()
-
-    # 兼容历史数据：从 storage_meta 中提取 message_id，从后端配置获取 chat_id
-    if not message_id or not chat_id:
-        try:
-            import json as _json
-            meta_raw = file_row.get('storage_meta') or '{}'
-            meta = _json.loads(meta_raw) if isinstance(meta_raw, str) else (meta_raw or {})
-            if not message_id:
-                message_id = meta.get('message_id')
-            if not chat_id and storage_backend:
-                from ..storage.router import get_storage_router as _get_router
-                be = _get_router().get_backend(storage_backend)
-                if hasattr(be, '_chat_id'):
-                    chat_id = be._chat_id
-        except Exception:
-            pass
-
-    if not (chat_id and message_id):
-        return False
-
+    result = {'deleted': 0, 'failed': 0, 'queued': 0}
     try:
-        from ..bot_control import get_effective_bot_token
-        bot_token, _ = get_effective_bot_token()
-        if not bot_token:
-            return False
-        resp = http_requests.post(
-            f"https://api.telegram.org/bot{bot_token}/deleteMessage",
-            data={'chat_id': chat_id, 'message_id': message_id},
-            timeout=5,
-        )
-        return resp.ok and resp.json().get('ok', False)
-    except Exception:
-        return False
-
-
-def _delete_storage_file(file_row: dict) -> None:
-    """
-    删除存储后端文件（单一职责：仅处理存储文件删除）
-    失败时仅记录日志，不抛出异常
-    """
-    storage_backend = (file_row.get('storage_backend') or 'telegram').strip()
-    storage_key = file_row.get('storage_key') or ''
-    encrypted_id = file_row.get('encrypted_id', '')
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join('?' * len(encrypted_ids))
+            cursor.execute(
+                "SELECT encrypted_id, file_size, storage_backend, storage_key, "
+                "group_chat_id, group_message_id, storage_meta "
+                f"FROM file_storage WHERE auth_token = ? AND encrypted_id IN ({placeholders})",
+                (token, *encrypted_ids),
+            )
+            file_rows = [dict(row) for row in cursor.fetchall()]
+            owned = [row['encrypted_id'] for row in file_rows]
 
-    if not storage_key:
-        return
+            if delete_storage and file_rows:
+                tg_sync_enabled = str(get_system_setting('tg_sync_delete_enabled') or '1') == '1'
+                result['queued'] = enqueue_file_deletions(cursor, file_rows, sync_telegram=tg_sync_enabled)
 
-    try:
-        from ..storage.router import get_storage_router
-        router = get_storage_router()
-        backend = router.get_backend(storage_backend)
-        backend.delete(storage_key=storage_key)
+            if owned:
+                placeholders = ','.join('?' * len(owned))
+                cursor.execute(
+                    f"DELETE FROM file_storage WHERE auth_token = ? AND encrypted_id IN ({placeholders})",
+                    (token, *owned),
+                )
+                result['deleted'] = cursor.rowcount
+                # 递减 token 的 upload_count（不低于 0）
+                cursor.execute(
+                    "UPDATE auth_tokens SET upload_count = MAX(0, upload_count - ?) WHERE token = ?",
+                    (result['deleted'], token),
+                )
     except Exception as e:
-        logger.debug(f"用户删除-存储文件删除失败: {encrypted_id}, {e}")
+        logger.error(f"用户批量删除图片失败: {e}")
+        result['deleted'] = 0
+        result['queued'] = 0
+    if result['queued']:
+        wake_deletion_gc()
+    result['failed'] = len(encrypted_ids) - result['deleted']
+    return result
 
 
 def _delete_file_record(encrypted_id: str, token: str, *, delete_storage: bool = True) -> dict:
     """
     删除单个图片记录，可选同时删除存储后端文件。
-    - delete_storage=True: 删除存储文件 + TG消息 + 数据库记录（完全删除）
+    - delete_storage=True: 删除数据库记录并登记删除队列，存储文件 + TG消息 + CDN 缓存由后台 GC 清理
     - delete_storage=False: 仅删除数据库记录（保留存储文件）
-    返回 { 'deleted': bool, 'tg_deleted': bool, 'error': str|None }
+    返回 { 'deleted': bool, 'queued': bool, 'error': str|None }
     """
-    result = {'deleted': False, 'tg_deleted': False, 'error': None}
+    result = {'deleted': False, 'queued': False, 'error': None}
 
     try:
         with get_connection() as conn:
@@ -554,15 +587,11 @@ def _delete_file_record(encrypted_id: str, token: str, *, delete_storage: bool =
             file_row = dict(row)
 
             if delete_storage:
-                # 1. 删除存储后端文件
-                _delete_storage_file(file_row)
-
-                # 2. TG 消息同步删除
+                # 登记删除队列（与删除记录同一事务）
                 tg_sync_enabled = str(get_system_setting('tg_sync_delete_enabled') or '1') == '1'
-                if tg_sync_enabled:
-                    result['tg_deleted'] = _delete_tg_message(file_row)
+                result['queued'] = enqueue_file_deletions(cursor, [file_row], sync_telegram=tg_sync_enabled) > 0
 
-            # 3. 删除数据库记录
+            # 删除数据库记录
             cursor.execute(
                 "DELETE FROM file_storage WHERE encrypted_id = ? AND auth_token = ?",
                 (encrypted_id, token),
@@ -578,7 +607,10 @@ def _delete_file_record(encrypted_id: str, token: str, *, delete_storage: bool =
     except Exception as e:
         logger.error(f"用户删除图片失败: {encrypted_id}, {e}")
         result['error'] = '删除失败'
+        result['queued'] = False
 
+    if result['queued']:
+        wake_deletion_gc()
     return result
 
 
@@ -606,7 +638,9 @@ def user_delete_image(encrypted_id):
         'success': True,
         'data': {
             'deleted': 1 if result['deleted'] else 0,
-            'tg_deleted': 1 if result['tg_deleted'] else 0,
+            # TG 消息改由后台 GC 删除，保留字段兼容旧客户端
+            'tg_deleted': 0,
+            'queued': 1 if result['queued'] else 0,
         }
     }), 'no-cache')
 
@@ -643,27 +677,18 @@ def user_batch_delete_images():
     # 是否同时删除存储文件（默认 true）
     delete_storage = bool(data.get('delete_storage', True))
 
-    deleted = 0
-    failed = 0
-    tg_deleted = 0
-
-    for eid in ids:
-        result = _delete_file_record(eid, token, delete_storage=delete_storage)
-        if result['deleted']:
-            deleted += 1
-            if result['tg_deleted']:
-                tg_deleted += 1
-        else:
-            failed += 1
+    result = _delete_file_records(ids, token, delete_storage=delete_storage)
+    deleted, failed, queued = result['deleted'], result['failed'], result['queued']
 
     token_masked = f"{token[:8]}…{token[-4:]}" if len(token) > 12 else token
-    logger.info(f"用户批量删除图片: token={token_masked}, 删除={deleted}, 失败={failed}, TG同步={tg_deleted}")
+    logger.info(f"用户批量删除图片: token={token_masked}, 删除={deleted}, 失败={failed}, 进入删除队列={queued}")
 
     return add_cache_headers(jsonify({
         'success': True,
         'data': {
             'deleted': deleted,
             'failed': failed,
-            'tg_deleted': tg_deleted,
+            'tg_deleted': 0,
+            'queued': queued,
         }
     }), 'no-cache')
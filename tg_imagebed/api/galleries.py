@@ -44,6 +44,11 @@ def _json_response(data, status=200, cache='no-cache'):
     return add_cache_headers(jsonify(data), cache), status
 
 
+def _page_cursor() -> Optional[str]:
+    """读取键集分页游标参数（传入时数据层忽略 page）"""
+    return request.args.get('cursor', '').strip() or None
+
+
 def _sanitize_gallery_payload(gallery: Optional[Dict[str, Any]]):
     """脱敏画集字段，避免返回密码哈希"""
     if not gallery:
@@ -172,7 +177,10 @@ def gallery_images(gallery_id: int):
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 50, type=int)
         limit = max(1, min(100, limit))
-        result = get_gallery_images(gallery_id, token, page, limit)
+        try:
+            result = get_gallery_images(gallery_id, token, page, limit, cursor=_page_cursor())
+        except ValueError as e:
+            return _json_response({'success': False, 'error': str(e)}, 400)
         base_url = get_image_domain(request)
         for item in result['items']:
             item['image_url'] = f"{base_url}/image/{item['encrypted_id']}"
@@ -402,7 +410,11 @@ def shared_gallery_api(share_token: str):
     limit = request.args.get('limit', 50, type=int)
     limit = max(1, min(100, limit))
 
-    images_result = get_gallery_images(gallery['id'], None, page, limit)
+    cursor = _page_cursor()
+    try:
+        images_result = get_gallery_images(gallery['id'], None, page, limit, cursor=cursor)
+    except ValueError as e:
+        return _json_response({'success': False, 'error': str(e)}, 400)
     base_url = get_image_domain(request)
     for item in images_result['items']:
         item['image_url'] = f"{base_url}/image/{item['encrypted_id']}"
@@ -429,7 +441,8 @@ def shared_gallery_api(share_token: str):
             'total': images_result['total'],
             'page': page,
             'limit': limit,
-            'has_more': page * limit < images_result['total']
+            'has_more': images_result['next_cursor'] is not None if cursor else page * limit < images_result['total'],
+            'next_cursor': images_result['next_cursor']
         }
     })
 
@@ -524,7 +537,10 @@ def shared_all_galleries_api(share_token: str):
     limit = request.args.get('limit', 50, type=int)
     limit = max(1, min(100, limit))
 
-    result = get_share_all_galleries(share_token, page, limit)
+    try:
+        result = get_share_all_galleries(share_token, page, limit, cursor=_page_cursor())
+    except ValueError as e:
+        return _json_response({'success': False, 'error': str(e)}, 400)
     if not result:
         logger.warning(f"全部分享链接无效: token={share_token[:8]}...")
         return _json_response({'success': False, 'error': '分享链接无效或已过期'}, 404)
@@ -616,7 +632,11 @@ def shared_all_gallery_detail_api(share_all_token: str, gallery_id: int):
     limit = request.args.get('limit', 50, type=int)
     limit = max(1, min(100, limit))
 
-    images_result = get_share_all_gallery_images(share_all_token, gallery['id'], page, limit)
+    cursor = _page_cursor()
+    try:
+        images_result = get_share_all_gallery_images(share_all_token, gallery['id'], page, limit, cursor=cursor)
+    except ValueError as e:
+        return _json_response({'success': False, 'error': str(e)}, 400)
     if not images_result:
         return _json_response({'success': False, 'error': '分享链接无效或画集不可见'}, 404)
 
@@ -647,7 +667,8 @@ def shared_all_gallery_detail_api(share_all_token: str, gallery_id: int):
             'total': images_result['total'],
             'page': page,
             'limit': limit,
-            'has_more': page * limit < images_result['total']
+            'has_more': images_result['next_cursor'] is not None if cursor else page * limit < images_result['total'],
+            'next_cursor': images_result['next_cursor']
         }
     })
 
@@ -14,7 +14,7 @@ from . import gallery_site_bp
 from ..config import logger
 from ..utils import add_cache_headers, get_image_domain, get_domain
 from ..database import (
-    get_system_setting, get_system_setting_int,
+    get_system_setting, get_system_setting_int, get_usage_totals,
     update_system_setting,
     is_gallery_domain,
     get_gallery_home_config,
@@ -60,14 +60,8 @@ def _build_cover_urls(items):
 _GALLERY_LIST_SQL = '''
     SELECT g.id, g.name, g.description, g.card_subtitle, g.editor_pick_weight,
         g.created_at, g.updated_at,
-        (SELECT COUNT(*) FROM gallery_images gi WHERE gi.gallery_id = g.id) AS image_count,
-        COALESCE(g.cover_image, (
-            SELECT fs.encrypted_id
-            FROM gallery_images gi2
-            JOIN file_storage fs ON gi2.encrypted_id = fs.encrypted_id
-            WHERE gi2.gallery_id = g.id
-            ORDER BY gi2.added_at ASC LIMIT 1
-        )) AS cover_image
+        g.image_count,
+        COALESCE(g.cover_image, g.resolved_cover) AS cover_image
     FROM galleries g
     WHERE g.share_enabled = 1 AND g.access_mode = 'public'
     ORDER BY g.updated_at DESC
@@ -180,7 +174,7 @@ def gallery_site_detail(gallery_id):
                     g.created_at, g.updated_at,
                     g.layout_mode, g.theme_color, g.show_image_info,
                     g.allow_download, g.sort_order, g.nsfw_warning, g.custom_header_text,
-                    (SELECT COUNT(*) FROM gallery_images gi WHERE gi.gallery_id = g.id) AS image_count
+                    g.image_count
                 FROM galleries g
                 WHERE g.id = ? AND g.share_enabled = 1 AND g.access_mode = 'public'
             ''', (gallery_id,))
@@ -274,20 +268,12 @@ def gallery_site_stats():
         with get_connection() as conn:
             cursor = conn.cursor()
 
-            # 公开画集数
+            # 公开画集数与其中的总图片数（image_count 由触发器维护）
             cursor.execute('''
-                SELECT COUNT(*) FROM galleries
+                SELECT COUNT(*), COALESCE(SUM(image_count), 0) FROM galleries
                 WHERE share_enabled = 1 AND access_mode = 'public'
             ''')
-            gallery_count = cursor.fetchone()[0]
-
-            # 公开画集中的总图片数
-            cursor.execute('''
-                SELECT COUNT(*) FROM gallery_images gi
-                JOIN galleries g ON gi.gallery_id = g.id
-                WHERE g.share_enabled = 1 AND g.access_mode = 'public'
-            ''')
-            image_count = cursor.fetchone()[0]
+            gallery_count, image_count = cursor.fetchone()
 
         response = jsonify({
             'success': True,
@@ -775,14 +761,8 @@ def gallery_admin_list():
                     g.share_enabled, g.access_mode, g.editor_pick_weight,
                     COALESCE(g.homepage_expose_enabled, 1) AS homepage_expose_enabled,
                     g.created_at, g.updated_at,
-                    (SELECT COUNT(*) FROM gallery_images gi WHERE gi.gallery_id = g.id) AS image_count,
-                    COALESCE(g.cover_image, (
-                        SELECT fs.encrypted_id
-                        FROM gallery_images gi2
-                        JOIN file_storage fs ON gi2.encrypted_id = fs.encrypted_id
-                        WHERE gi2.gallery_id = g.id
-                        ORDER BY gi2.added_at ASC LIMIT 1
-                    )) AS cover_image
+                    g.image_count,
+                    COALESCE(g.cover_image, g.resolved_cover) AS cover_image
                 FROM galleries g
                 ORDER BY g.updated_at DESC
                 LIMIT ? OFFSET ?
@@ -1281,8 +1261,11 @@ def gallery_admin_images_list():
 
             where_sql = (' WHERE ' + ' AND '.join(where_clauses)) if where_clauses else ''
 
-            cursor.execute(f'SELECT COUNT(*) FROM file_storage{where_sql}', where_params)
-            total = cursor.fetchone()[0]
+            if where_clauses:
+                cursor.execute(f'SELECT COUNT(*) FROM file_storage{where_sql}', where_params)
+                total = cursor.fetchone()[0]
+            else:
+                total = get_usage_totals()['file_count']
 
             cursor.execute(
                 f'SELECT encrypted_id, original_filename, file_size, mime_type, cdn_cached '
@@ -16,7 +16,7 @@ from ..config import (
 )
 from ..database import (
     get_file_info, update_access_count, update_cdn_cache_status,
-    get_stats, get_recent_uploads, update_file_path_in_db,
+    get_stats, get_recent_uploads, update_file_path_in_db, next_cursor,
     get_system_setting, get_system_setting_int
 )
 from ..utils import (
@@ -24,6 +24,7 @@ from ..utils import (
 )
 from ..services.cdn_service import cloudflare_cdn, get_monitor_queue_size
 from ..storage.router import get_storage_router
+from ..storage.backends.telegram import TelegramBackend, select_photo_variant, upload_bot_id
 
 
 def _get_domain_mode():
@@ -123,6 +124,9 @@ def serve_image(encrypted_id):
 
         if file_info.get('cdn_cached'):
             cdn_url = f"https://{cdn_domain}/image/{encrypted_id}"
+            # 保留查询参数（如 ?size=s），否则缩略图请求会被重定向到原图
+            if request.query_string:
+                cdn_url = f"{cdn_url}?{request.query_string.decode('utf-8', 'replace')}"
             request_url = request.url
             if cdn_url not in request_url:
                 logger.info(f"图片已缓存，重定向到CDN: {encrypted_id} -> {cdn_url}")
@@ -141,8 +145,14 @@ def serve_image(encrypted_id):
     # 更新访问计数
     update_access_count(encrypted_id, access_type)
 
+    # 缩略图档位（?size=s|m|x|y|w）：Telegram 预生成的 PhotoSize，无需服务端缩放
+    size_label = (request.args.get('size') or '').strip().lower()
+    variant = select_photo_variant(file_info.get('storage_meta'), size_label) if size_label else None
+
     # 生成 ETag
     etag = file_info.get('etag') or f'W/"{encrypted_id}-{file_info.get("file_size", 0)}"'
+    if variant:
+        etag = f'W/"{encrypted_id}-{variant[0]}-{variant[1].get("file_size", 0)}"'
 
     # 检查条件请求
     if_none_match = request.headers.get('If-None-Match')
@@ -160,13 +170,24 @@ def serve_image(encrypted_id):
     # 从存储后端下载图片
     try:
         router = get_storage_router()
-        backend = router.get_backend_for_record(file_info)
         range_header = request.headers.get('Range')
 
-        dl = backend.download(file_info=file_info, range_header=range_header)
+        backend = router.get_backend_for_record(file_info) if variant else None
+        if variant and isinstance(backend, TelegramBackend):
+            # 变体直接按 file_id 读取（file_path 由上传 Bot 的 getFile 现取），不走镜像切换，但仍受熔断保护
+            backend_record = dict(file_info, storage_key=variant[1]['file_id'], file_path='',
+                                  file_size=int(variant[1].get('file_size') or 0),
+                                  storage_meta={'bot_id': upload_bot_id(file_info.get('storage_meta'))})
+            dl = router._timed_download(backend, backend_record, range_header)
+            served_by_primary = False
+        else:
+            variant = None
+            # 配置了镜像的文件会在主后端出错/超时时切换到最快的副本
+            backend, dl = router.download_with_failover(file_info, range_header)
+            served_by_primary = backend.name == (file_info.get('storage_backend') or 'telegram')
 
         # 如果后端返回了更新的字段（如 Telegram 的 file_path 刷新）
-        if dl.updated_fields and dl.updated_fields.get('file_path'):
+        if served_by_primary and dl.updated_fields and dl.updated_fields.get('file_path'):
             update_file_path_in_db(encrypted_id, dl.updated_fields['file_path'])
             file_info['file_path'] = dl.updated_fields['file_path']
 
@@ -176,6 +197,10 @@ def serve_image(encrypted_id):
             body = b'Image not found' if status == 404 else b'Error loading image'
             response = Response(body, status=status, mimetype='text/plain')
             response.headers['Access-Control-Allow-Origin'] = '*'
+            # 后端熔断时透传建议的重试时间
+            retry_after = (dl.headers or {}).get('Retry-After')
+            if status == 503 and retry_after:
+                response.headers['Retry-After'] = retry_after
             return add_cache_headers(response, 'no-cache')
 
         logger.info(f"从后端获取图片: {encrypted_id} (backend={backend.name}, 访问类型: {access_type})")
@@ -191,10 +216,12 @@ def serve_image(encrypted_id):
         resp_headers['ETag'] = etag
         resp_headers['X-Access-Type'] = access_type
         resp_headers['X-Storage-Backend'] = backend.name
+        if variant:
+            resp_headers['X-Image-Size'] = f"{variant[0]} {variant[1].get('width', 0)}x{variant[1].get('height', 0)}"
         resp_headers['Access-Control-Allow-Origin'] = '*'
         resp_headers['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
         resp_headers['Access-Control-Allow-Headers'] = 'Range, Cache-Control'
-        resp_headers['Access-Control-Expose-Headers'] = 'Content-Length, Content-Range, Accept-Ranges, ETag, X-Storage-Backend'
+        resp_headers['Access-Control-Expose-Headers'] = 'Content-Length, Content-Range, Accept-Ranges, ETag, X-Storage-Backend, X-Image-Size'
 
         resp = Response(
             dl.body,
@@ -259,9 +286,12 @@ def get_recent_api():
     """获取最近上传的文件"""
     limit = request.args.get('limit', 12, type=int)
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '').strip() or None
 
     try:
-        recent_files = get_recent_uploads(limit, page)
+        recent_files = get_recent_uploads(limit, page, cursor=cursor)
+        # 游标基于原始 created_at，须在格式化前生成
+        next_page = next_cursor(recent_files, limit, ('created_at', 'encrypted_id'))
         base_url = get_image_domain(request)
         cdn_domain, _, cdn_mode = _get_domain_mode()
 
@@ -284,12 +314,17 @@ def get_recent_api():
             'files': recent_files,
             'page': page,
             'limit': limit,
-            'has_more': len(recent_files) == limit
+            'has_more': len(recent_files) == limit,
+            'next_cursor': next_page
         })
 
         response.headers['Access-Control-Allow-Origin'] = '*'
         return add_cache_headers(response, 'no-cache')
 
+    except ValueError as e:
+        response = jsonify({'success': False, 'error': str(e), 'files': [], 'has_more': False})
+        response.headers['Access-Control-Allow-Origin'] = '*'
+        return add_cache_headers(response, 'no-cache'), 400
     except Exception as e:
         logger.error(f"Failed to get recent files: {e}")
         response = jsonify({
@@ -101,6 +101,9 @@ def _format_settings_for_response(settings: dict) -> dict:
         # 网络代理
         'proxy_url_set': bool(settings.get('proxy_url', '')),
         'proxy_env_set': bool(PROXY_URL),
+        # 自建 Bot API 服务
+        'bot_api_base_url': settings.get('bot_api_base_url', ''),
+        'bot_api_local_mode': settings.get('bot_api_local_mode', '0') == '1',
         # 允许的文件后缀
         'allowed_extensions': settings.get('allowed_extensions', 'jpg,jpeg,png,gif,webp,bmp,avif,tiff,tif,ico'),
         # TG 认证
@@ -440,6 +443,17 @@ def admin_system_settings():
                     # 空值清除代理
                     settings_to_update['proxy_url'] = ''
 
+            # 自建 Bot API 服务
+            if 'bot_api_base_url' in data:
+                api_base_val = str(data.get('bot_api_base_url') or '').strip().rstrip('/')
+                if api_base_val and not api_base_val.startswith(('http://', 'https://')):
+                    errors.append('Bot API 地址必须以 http:// 或 https:// 开头')
+                else:
+                    settings_to_update['bot_api_base_url'] = api_base_val
+
+            if 'bot_api_local_mode' in data:
+                settings_to_update['bot_api_local_mode'] = '1' if data['bot_api_local_mode'] else '0'
+
             # TG 认证配置
             for tg_bool_key in ('tg_auth_enabled', 'tg_auth_required_for_token', 'tg_bind_token_enabled'):
                 if tg_bool_key in data:
@@ -723,6 +737,8 @@ def admin_system_settings():
                     'bot_settoken_ttl_seconds',
                     'bot_template_strict_mode',
                     'proxy_url',
+                    'bot_api_base_url',
+                    'bot_api_local_mode',
                 }
                 if restart_sensitive_keys.intersection(settings_to_update.keys()):
                     try:
@@ -3,13 +3,16 @@
 """
 上传路由模块 - 处理文件上传 API
 """
+import json
 import time
-from flask import request, jsonify
+from typing import Optional, Callable, Dict, Any, List
+
+from flask import request, jsonify, Response, stream_with_context
 
 from . import upload_bp
 from ..config import logger
 from ..utils import add_cache_headers, format_size, get_image_domain
-from ..services.file_service import process_upload
+from ..services.file_service import process_upload, iter_upload_batch
 from ..database import is_guest_upload_allowed, get_system_setting_int, get_upload_count_today
 
 # 图片魔数签名
@@ -55,21 +58,21 @@ def is_extension_allowed(filename: str) -> bool:
     return ext in get_allowed_extensions()
 
 
-def validate_upload_file(file) -> tuple:
+def check_upload_file(file) -> tuple:
     """
     公共文件上传校验（扩展名、Content-Type、大小、魔数）
-    返回 (error_response, file_content) — error_response 为 None 表示校验通过
+    返回 (error_message, file_content) — error_message 为 None 表示校验通过
     """
     content_type = (file.content_type or '').strip().lower()
 
     # 检查文件扩展名是否在允许列表中（SVG 等危险格式由白名单统一控制）
     if not is_extension_allowed(file.filename):
         ext = file.filename.rsplit('.', 1)[-1].lower() if '.' in (file.filename or '') else ''
-        return (add_cache_headers(jsonify({'success': False, 'error': f'不支持的文件格式: .{ext}'}), 'no-cache'), 400), None
+        return f'不支持的文件格式: .{ext}', None
 
     # 初步检查 Content-Type
     if content_type and not content_type.startswith('image/'):
-        return (add_cache_headers(jsonify({'success': False, 'error': '只允许上传图片文件'}), 'no-cache'), 400), None
+        return '只允许上传图片文件', None
 
     # 检查文件大小（使用动态配置）
     file.seek(0, 2)
@@ -80,18 +83,168 @@ def validate_upload_file(file) -> tuple:
     max_size_bytes = max_size_mb * 1024 * 1024
 
     if file_size > max_size_bytes:
-        return (add_cache_headers(jsonify({'success': False, 'error': f'文件大小超过 {max_size_mb}MB 限制'}), 'no-cache'), 400), None
+        return f'文件大小超过 {max_size_mb}MB 限制', None
 
     file_content = file.read()
 
     # 魔数校验：验证文件实际类型
     detected_mime = validate_image_magic(file_content)
     if not detected_mime:
-        return (add_cache_headers(jsonify({'success': False, 'error': '无效的图片文件格式'}), 'no-cache'), 400), None
+        return '无效的图片文件格式', None
 
     return None, file_content
 
 
+def validate_upload_file(file) -> tuple:
+    """
+    公共文件上传校验（扩展名、Content-Type、大小、魔数）
+    返回 (error_response, file_content) — error_response 为 None 表示校验通过
+    """
+    error, file_content = check_upload_file(file)
+    if error:
+        return (add_cache_headers(jsonify({'success': False, 'error': error}), 'no-cache'), 400), None
+    return None, file_content
+
+
+# ===================== 批量上传 =====================
+
+def _wants_ndjson() -> bool:
+    """客户端是否要求以 NDJSON 流式返回批量结果"""
+    if request.args.get('stream', '').strip().lower() in ('1', 'true', 'yes'):
+        return True
+    return 'application/x-ndjson' in (request.headers.get('Accept') or '')
+
+
+def run_batch_upload(
+    *,
+    quota: Optional[int],
+    username: str,
+    source: str,
+    scene: str,
+    auth_token: Optional[str] = None,
+    on_finished: Optional[Callable[[int], None]] = None,
+):
+    """
+    批量上传的公共流程：逐个校验 → 按剩余配额截断 → 并发推送后端 → 汇总结果
+
+    Args:
+        quota: 本批最多可成功上传的数量，None 表示不限制
+        on_finished: 整批结束后以成功数量回调（用于一次性更新 Token 配额）
+
+    返回 JSON（默认）或 NDJSON 流（?stream=1 或 Accept: application/x-ndjson）。
+    JSON 模式的状态码见 _batch_status；流式模式响应头先于结果发出，固定为 200，
+    以末行 done 汇总判断成败。
+    """
+    files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f and f.filename]
+    if not files:
+        return add_cache_headers(jsonify({'success': False, 'error': '未提供文件'}), 'no-cache'), 400
+
+    max_files = get_system_setting_int('batch_upload_max_files', 50, minimum=1, maximum=1000)
+    if len(files) > max_files:
+        return add_cache_headers(jsonify({
+            'success': False,
+            'error': f'单次最多上传 {max_files} 个文件'
+        }), 'no-cache'), 400
+
+    # 先在请求线程内完成校验，失败项直接记入结果，不占用配额
+    results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+    items = []
+    item_indexes = []
+    for index, file in enumerate(files):
+        error, file_content = check_upload_file(file)
+        if not error and quota is not None and len(items) >= quota:
+            error = '超出剩余上传额度'
+        if error:
+            results[index] = {'index': index, 'filename': file.filename, 'success': False, 'error': error}
+            continue
+        item_indexes.append(index)
+        items.append((file_content, file.filename, file.content_type))
+
+    base_url = get_image_domain(request, scene=scene)
+    concurrency = get_system_setting_int('batch_upload_concurrency', 4, minimum=1, maximum=32)
+
+    def _generate():
+        """按完成顺序产出每个文件的结果，最后调用 on_finished"""
+        for index in range(len(files)):
+            if results[index] is not None:
+                yield results[index]
+        succeeded = 0
+        try:
+            for item_index, result, error in iter_upload_batch(
+                items,
+                username=username,
+                source=source,
+                auth_token=auth_token,
+                upload_scene=scene,
+                max_workers=concurrency,
+            ):
+                index = item_indexes[item_index]
+                filename = files[index].filename
+                if result:
+                    succeeded += 1
+                    entry = {
+                        'index': index,
+                        'filename': filename,
+                        'success': True,
+                        'url': f"{base_url}/image/{result['encrypted_id']}",
+                        'size': format_size(result['file_size']),
+                    }
+                    if result.get('similar_images'):
+                        entry['similar_images'] = result['similar_images']
+                else:
+                    entry = {'index': index, 'filename': filename, 'success': False, 'error': error}
+                results[index] = entry
+                yield entry
+        finally:
+            if on_finished:
+                on_finished(succeeded)
+            logger.info(f"批量上传完成: {source}, 成功 {succeeded}/{len(files)}")
+
+    if _wants_ndjson():
+        def _stream():
+            succeeded = 0
+            for entry in _generate():
+                succeeded += 1 if entry.get('success') else 0
+                yield json.dumps(entry, ensure_ascii=False) + '\n'
+            yield json.dumps({
+                'done': True,
+                'total': len(files),
+                'succeeded': succeeded,
+                'failed': len(files) - succeeded,
+            }, ensure_ascii=False) + '\n'
+
+        response = Response(stream_with_context(_stream()), mimetype='application/x-ndjson')
+        return add_cache_headers(response, 'no-cache')
+
+    entries = list(_generate())
+    succeeded = sum(1 for entry in entries if entry.get('success'))
+    response = add_cache_headers(jsonify({
+        'success': succeeded > 0,
+        'data': {
+            'total': len(files),
+            'succeeded': succeeded,
+            'failed': len(files) - succeeded,
+            'results': results,
+            'upload_time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+    }), 'no-cache')
+    return response, _batch_status(succeeded, len(files), attempted=len(items))
+
+
+def _batch_status(succeeded: int, total: int, attempted: int) -> int:
+    """
+    批量上传的 HTTP 状态码
+
+    全部成功 200；部分成功 207；全部失败时，若没有文件通过校验（格式/大小/额度）
+    返回 400，否则说明是后端推送失败，返回 500。
+    """
+    if succeeded == total:
+        return 200
+    if succeeded > 0:
+        return 207
+    return 500 if attempted else 400
+
+
 @upload_bp.route('/api/upload', methods=['POST'])
 @upload_bp.route('/upload', methods=['POST'])
 def upload_file():
@@ -142,16 +295,46 @@ def upload_file():
 
         logger.info(f"Web上传完成: {file.filename} -> {result['encrypted_id']}")
 
-        return add_cache_headers(jsonify({
-            'success': True,
-            'data': {
-                'url': permanent_url,
-                'filename': file.filename,
-                'size': format_size(result['file_size']),
-                'upload_time': time.strftime('%Y-%m-%d %H:%M:%S')
-            }
-        }), 'no-cache')
+        data = {
+            'url': permanent_url,
+            'filename': file.filename,
+            'size': format_size(result['file_size']),
+            'upload_time': time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        if result.get('similar_images'):
+            data['similar_images'] = result['similar_images']
+
+        return add_cache_headers(jsonify({'success': True, 'data': data}), 'no-cache')
 
     except Exception as e:
         logger.error(f"Upload error: {e}")
         return add_cache_headers(jsonify({'error': '上传失败，请稍后重试'}), 'no-cache'), 500
+
+
+@upload_bp.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    """批量匿名上传（multipart 字段 files，可重复）"""
+    if not is_guest_upload_allowed():
+        return add_cache_headers(jsonify({
+            'success': False,
+            'error': '匿名上传已关闭，请使用 Token 上传或联系管理员'
+        }), 'no-cache'), 403
+
+    # 每日上传限制只检查一次，剩余额度作为本批上限
+    quota = None
+    daily_limit = get_system_setting_int('daily_upload_limit', 0, minimum=0, maximum=1000000)
+    if daily_limit > 0:
+        quota = daily_limit - get_upload_count_today(source='web_upload')
+        if quota <= 0:
+            return add_cache_headers(jsonify({'success': False, 'error': f'已达到每日上传限制({daily_limit}张)'}), 'no-cache'), 429
+
+    try:
+        return run_batch_upload(
+            quota=quota,
+            username='web_user',
+            source='web_upload',
+            scene='guest',
+        )
+    except Exception as e:
+        logger.error(f"批量上传错误: {e}")
+        return add_cache_headers(jsonify({'success': False, 'error': '上传失败，请稍后重试'}), 'no-cache'), 500
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片续传路由模块
+
+    POST   /api/upload/sessions                    创建会话 {filename, size, content_type}
+    GET    /api/upload/sessions/<id>               查询当前偏移（HEAD 同样可用）
+    PUT    /api/upload/sessions/<id>               写入分片（Upload-Offset 头或 ?offset=）
+    POST   /api/upload/sessions/<id>/complete      完成上传
+    DELETE /api/upload/sessions/<id>               取消上传
+
+携带 Authorization: Bearer <token> 时按 Token 上传处理，否则按匿名上传处理。
+"""
+import time
+from typing import Optional
+
+from flask import request, jsonify
+
+from . import upload_bp
+from .auth_helpers import extract_bearer_token, get_bound_token_session_issue
+from .upload import validate_image_magic, is_extension_allowed
+from ..config import logger
+from ..utils import add_cache_headers, format_size, get_image_domain, get_client_ip
+from ..database import (
+    is_guest_upload_allowed, is_token_upload_allowed, verify_auth_token,
+    get_system_setting_int, get_upload_count_today, update_token_usage,
+)
+from ..services.upload_session_service import (
+    UploadSessionError, start_session, get_session_status,
+    append_chunk, finalize_session, abort_session,
+)
+
+
+def _error(message: str, status: int, offset: Optional[int] = None):
+    payload = {'success': False, 'error': message}
+    if offset is not None:
+        payload['offset'] = offset
+    response = jsonify(payload)
+    if offset is not None:
+        response.headers['Upload-Offset'] = str(offset)
+    return add_cache_headers(response, 'no-cache'), status
+
+
+def _check_uploader():
+    """
+    校验上传权限与每日限额
+
+    Returns:
+        (error_response, auth_token) — error_response 为 None 表示允许上传
+    """
+    token = extract_bearer_token()
+    if token:
+        if not is_token_upload_allowed():
+            return _error('Token 上传已关闭，仅管理员可上传', 403), None
+        verification = verify_auth_token(token)
+        if not verification['valid']:
+            return _error(f"Token无效: {verification['reason']}", 401), None
+        issue = get_bound_token_session_issue(verification.get('token_data'))
+        if issue:
+            return _error(issue['reason'], issue['status']), None
+    elif not is_guest_upload_allowed():
+        return _error('匿名上传已关闭，请使用 Token 上传或联系管理员', 403), None
+
+    daily_limit = get_system_setting_int('daily_upload_limit', 0, minimum=0, maximum=1000000)
+    if daily_limit > 0:
+        if token:
+            uploaded_today = get_upload_count_today(auth_token=token)
+        else:
+            uploaded_today = get_upload_count_today(source='web_upload')
+        if uploaded_today >= daily_limit:
+            return _error(f'已达到每日上传限制({daily_limit}张)', 429), None
+
+    return None, token or None
+
+
+def _validate_content(filename: str, header: bytes) -> Optional[str]:
+    """合并后的文件校验（扩展名 + 文件头魔数）"""
+    if not is_extension_allowed(filename):
+        return '不支持的文件格式'
+    if not validate_image_magic(header):
+        return '无效的图片文件格式'
+    return None
+
+
+@upload_bp.route('/api/upload/sessions', methods=['POST'])
+def create_upload_session_api():
+    """创建分片续传会话"""
+    err, token = _check_uploader()
+    if err:
+        return err
+
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get('filename') or '').strip()
+    content_type = str(data.get('content_type') or '').strip().lower()
+    try:
+        total_size = int(data.get('size') or 0)
+    except (TypeError, ValueError):
+        total_size = 0
+
+    if not filename:
+        return _error('缺少文件名', 400)
+    if not is_extension_allowed(filename):
+        ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        return _error(f'不支持的文件格式: .{ext}', 400)
+    if content_type and not content_type.startswith('image/'):
+        return _error('只允许上传图片文件', 400)
+    if total_size <= 0:
+        return _error('文件大小无效', 400)
+
+    max_size_mb = get_system_setting_int('max_file_size_mb', 100, minimum=1, maximum=1024)
+    if total_size > max_size_mb * 1024 * 1024:
+        return _error(f'文件大小超过 {max_size_mb}MB 限制', 400)
+
+    try:
+        session = start_session(
+            filename=filename,
+            content_type=content_type or None,
+            total_size=total_size,
+            source='guest_token' if token else 'web_upload',
+            upload_scene='token' if token else 'guest',
+            auth_token=token,
+            client_ip=get_client_ip(request),
+        )
+    except Exception as e:
+        logger.error(f"创建续传会话失败: {e}")
+        return _error('创建上传会话失败，请稍后重试', 500)
+
+    return add_cache_headers(jsonify({'success': True, 'data': session}), 'no-cache'), 201
+
+
+@upload_bp.route('/api/upload/sessions/<upload_id>', methods=['GET', 'HEAD'])
+def get_upload_session_api(upload_id):
+    """查询续传会话当前偏移"""
+    try:
+        status = get_session_status(upload_id, extract_bearer_token() or None)
+    except UploadSessionError as e:
+        return _error(str(e), e.status)
+
+    response = jsonify({'success': True, 'data': status})
+    response.headers['Upload-Offset'] = str(status['offset'])
+    response.headers['Upload-Length'] = str(status['total_size'])
+    return add_cache_headers(response, 'no-cache')
+
+
+@upload_bp.route('/api/upload/sessions/<upload_id>', methods=['PUT', 'PATCH'])
+def put_upload_chunk_api(upload_id):
+    """按偏移量写入一个分片（请求体为原始字节）"""
+    raw_offset = request.headers.get('Upload-Offset', request.args.get('offset', ''))
+    try:
+        offset = int(raw_offset)
+    except (TypeError, ValueError):
+        return _error('缺少或无效的 Upload-Offset', 400)
+    if offset < 0:
+        return _error('缺少或无效的 Upload-Offset', 400)
+
+    try:
+        new_offset = append_chunk(upload_id, offset, request.stream, extract_bearer_token() or None)
+    except UploadSessionError as e:
+        return _error(str(e), e.status, e.offset)
+    except Exception as e:
+        logger.error(f"写入分片失败: {upload_id} - {e}")
+        return _error('写入分片失败，请查询偏移后重试', 500)
+
+    response = jsonify({'success': True, 'data': {'upload_id': upload_id, 'offset': new_offset}})
+    response.headers['Upload-Offset'] = str(new_offset)
+    return add_cache_headers(response, 'no-cache')
+
+
+@upload_bp.route('/api/upload/sessions/<upload_id>/complete', methods=['POST'])
+def complete_upload_session_api(upload_id):
+    """完成续传并写入存储后端"""
+    err, token = _check_uploader()
+    if err:
+        return err
+
+    try:
+        result = finalize_session(upload_id, token, validator=_validate_content)
+    except UploadSessionError as e:
+        return _error(str(e), e.status, e.offset)
+    except Exception as e:
+        logger.error(f"完成续传失败: {upload_id} - {e}")
+        return _error('上传失败，请稍后重试', 500)
+
+    if token:
+        update_token_usage(token)
+
+    session = result['session']
+    base_url = get_image_domain(request, scene=session['upload_scene'])
+    logger.info(f"续传上传完成: {session['filename']} -> {result['encrypted_id']}")
+
+    return add_cache_headers(jsonify({
+        'success': True,
+        'data': {
+            'url': f"{base_url}/image/{result['encrypted_id']}",
+            'filename': session['filename'],
+            'size': format_size(result['file_size']),
+            'upload_time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+    }), 'no-cache')
+
+
+@upload_bp.route('/api/upload/sessions/<upload_id>', methods=['DELETE'])
+def abort_upload_session_api(upload_id):
+    """取消续传会话"""
+    try:
+        abort_session(upload_id, extract_bearer_token() or None)
+    except UploadSessionError as e:
+        return _error(str(e), e.status)
+    return add_cache_headers(jsonify({'success': True}), 'no-cache')
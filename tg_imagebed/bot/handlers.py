@@ -16,12 +16,11 @@ from telegram import Update
 
 from ..config import logger
 from ..utils import format_size
-from .media_batch import _MediaBatch, _media_group_batches, _flush_media_group, _MAX_BATCH_ITEMS
+from .media_batch import (
+    _MediaBatch, _media_group_batches, _flush_media_group, _fetch_telegram_file, _MAX_BATCH_ITEMS,
+)
 from .state import _inc_bot_stats, _inc_template_error
 
-# 文件下载超时（秒）
-_DOWNLOAD_TIMEOUT = 60
-
 
 async def start(update: Update, context):
     """处理 /start 命令"""
@@ -230,6 +229,7 @@ def _build_reply_text(result: dict, permanent_url: str, filename: str, get_syste
 async def handle_photo(update: Update, context):
     """处理图片上传（私聊/群组/频道）"""
     from ..services.file_service import process_upload, record_existing_telegram_file
+    from ..storage.backends.telegram import photo_size_variants
     from ..utils import get_domain, get_image_domain, get_mime_type as _get_mime_type
     from ..database import get_system_setting, has_bound_tokens
     from ..database import get_active_user_tokens, get_default_upload_token
@@ -333,6 +333,7 @@ async def handle_photo(update: Update, context):
                 "username": username,
                 "tg_user_id": tg_user_id,
                 "auth_token": upload_auth_token,
+                "photo_sizes": photo_size_variants(message.photo) if message.photo else None,
             })
             batch.updated_at = time.monotonic()
             if batch.first_message_id is None or message.message_id < batch.first_message_id:
@@ -352,15 +353,14 @@ async def handle_photo(update: Update, context):
             )
             return
 
-        file_info = await asyncio.wait_for(context.bot.get_file(tg_file.file_id), timeout=_DOWNLOAD_TIMEOUT)
-        file_bytes = await asyncio.wait_for(file_info.download_as_bytearray(), timeout=_DOWNLOAD_TIMEOUT)
+        tg_file_path, file_bytes = await _fetch_telegram_file(context.bot, tg_file.file_id)
 
         if is_group:
             result = record_existing_telegram_file(
                 file_id=tg_file.file_id,
                 file_unique_id=file_unique_id,
-                file_path=getattr(file_info, 'file_path', '') or '',
-                file_content=bytes(file_bytes),
+                file_path=tg_file_path,
+                file_content=file_bytes,
                 filename=filename,
                 content_type=content_type,
                 username=username,
@@ -370,10 +370,11 @@ async def handle_photo(update: Update, context):
                 is_group_upload=True,
                 group_message_id=message.message_id,
                 group_chat_id=chat.id,
+                photo_sizes=photo_size_variants(message.photo) if message.photo else None,
             )
         else:
             result = process_upload(
-                file_content=bytes(file_bytes),
+                file_content=file_bytes,
                 filename=filename,
                 content_type=content_type,
                 username=username,
@@ -5,6 +5,7 @@
 
 处理群组/频道中的批量图片上传，使用 debounce 机制合并汇总消息。
 """
+import asyncio
 import time
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Tuple
@@ -20,6 +21,24 @@ _STALE_BATCH_TIMEOUT = 300
 _DOWNLOAD_TIMEOUT = 60
 
 
+async def _fetch_telegram_file(bot, file_id: str) -> Tuple[str, bytes]:
+    """
+    获取 Telegram 文件的 (file_path, 内容)
+
+    自建 local Bot API 的 getFile 返回本地绝对路径，直接读盘（不经网络、不受 20MB 限制）。
+    """
+    from ..telegram_api import get_telegram_client
+
+    file_info = await asyncio.wait_for(bot.get_file(file_id), timeout=_DOWNLOAD_TIMEOUT)
+    file_path = getattr(file_info, "file_path", "") or ""
+    if get_telegram_client().is_local_path(file_path):
+        with open(file_path, "rb") as fh:
+            data = await asyncio.to_thread(fh.read)
+        return file_path, data
+    file_bytes = await asyncio.wait_for(file_info.download_as_bytearray(), timeout=_DOWNLOAD_TIMEOUT)
+    return file_path, bytes(file_bytes)
+
+
 @dataclass
 class _MediaBatch:
     """群组/频道批量图片上传的累加器"""
@@ -87,7 +106,6 @@ async def _flush_media_group(
     debounce_seconds: float = 1.5,
 ) -> None:
     """延迟处理批量图片并发送汇总消息"""
-    import asyncio
     from ..services.file_service import record_existing_telegram_file
     from ..utils import get_image_domain
     from .state import _inc_bot_stats
@@ -134,14 +152,13 @@ async def _flush_media_group(
                 failure_count += 1
                 continue
 
-            file_info = await asyncio.wait_for(bot.get_file(file_id), timeout=_DOWNLOAD_TIMEOUT)
-            file_bytes = await asyncio.wait_for(file_info.download_as_bytearray(), timeout=_DOWNLOAD_TIMEOUT)
+            file_path, file_bytes = await _fetch_telegram_file(bot, file_id)
 
             result = record_existing_telegram_file(
                 file_id=file_id,
                 file_unique_id=item.get("file_unique_id"),
-                file_path=getattr(file_info, "file_path", "") or "",
-                file_content=bytes(file_bytes),
+                file_path=file_path,
+                file_content=file_bytes,
                 filename=item.get("filename", ""),
                 content_type=item.get("content_type", "image/jpeg"),
                 username=item.get("username", ""),
@@ -151,6 +168,7 @@ async def _flush_media_group(
                 is_group_upload=True,
                 group_message_id=item.get("message_id"),
                 group_chat_id=batch.chat_id,
+                photo_sizes=item.get("photo_sizes"),
             )
 
             if not result:
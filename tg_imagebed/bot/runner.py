@@ -9,7 +9,7 @@ import asyncio
 import threading
 import time
 
-from ..config import get_proxy_url, logger
+from ..config import get_bot_api_settings, get_proxy_url, logger
 from ..bot_control import (
     get_effective_bot_token,
     is_bot_token_configured,
@@ -185,6 +185,11 @@ def run_telegram_bot():
                 if proxy_url:
                     logger.info(f"Telegram Bot 使用代理: {proxy_url}")
                     builder = builder.proxy(proxy_url).get_updates_proxy(proxy_url)
+                api_base_url, api_local_mode = get_bot_api_settings()
+                if api_base_url:
+                    logger.info(f"Telegram Bot 使用自建 Bot API: {api_base_url} (local={'on' if api_local_mode else 'off'})")
+                    builder = builder.base_url(f"{api_base_url}/bot").base_file_url(f"{api_base_url}/file/bot")
+                    builder = builder.local_mode(api_local_mode)
 
                 telegram_app = builder.build()
 
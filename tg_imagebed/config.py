@@ -12,6 +12,7 @@ import time
 import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
+from typing import Tuple
 
 
 def _normalize_proxy_url(proxy: str) -> str:
@@ -66,6 +67,30 @@ def get_proxy_url() -> str:
         pass
     return PROXY_URL
 
+
+# ===================== Bot API 服务地址（自建 telegram-bot-api） =====================
+TELEGRAM_API_BASE_URL = os.environ.get('TELEGRAM_API_BASE_URL', '').strip().rstrip('/')
+TELEGRAM_API_LOCAL_MODE = os.environ.get('TELEGRAM_API_LOCAL_MODE', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def get_bot_api_settings() -> Tuple[str, bool]:
+    """
+    获取 Bot API 服务地址与 local 模式（优先数据库设置，回退环境变量）
+
+    Returns:
+        (base_url, local_mode)；base_url 为空表示使用官方 api.telegram.org
+    """
+    base_url, local_mode = TELEGRAM_API_BASE_URL, TELEGRAM_API_LOCAL_MODE
+    try:
+        from .database import get_system_setting
+        db_base = (get_system_setting('bot_api_base_url') or '').strip().rstrip('/')
+        if db_base:
+            base_url = db_base
+            local_mode = str(get_system_setting('bot_api_local_mode') or '0') == '1'
+    except Exception:
+        pass
+    return base_url, bool(base_url) and local_mode
+
 # ===================== SECRET_KEY — 持久化到文件 =====================
 _secret_key_file = os.path.join(DATA_DIR, '.secret_key')
 try:
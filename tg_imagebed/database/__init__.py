@@ -8,11 +8,13 @@
 """
 
 # 连接管理 + 初始化
-from .connection import get_connection, db_retry, init_database
+from .connection import get_connection, get_read_connection, close_thread_connections, db_retry, init_database
 
 # 文件 CRUD + 统计
 from .files import (
-    get_file_info, save_file_info, update_file_path_in_db,
+    get_file_info, save_file_info, update_file_path_in_db, update_image_meta,
+    list_pending_writebacks, update_pending_storage_meta, complete_pending_writeback,
+    swap_file_storage_location,
     update_cdn_cache_status, update_access_count, delete_files_by_ids,
     get_all_files_count, get_total_size, get_stats,
     get_recent_uploads, get_uncached_files, get_cdn_dashboard_stats,
@@ -85,6 +87,55 @@ from .tg_auth import (
     consume_web_verify_code, get_web_verify_status,
 )
 
+# 分片续传会话
+from .uploads import (
+    create_upload_session, get_upload_session, update_upload_session_offset,
+    delete_upload_session, list_stale_upload_sessions,
+)
+
+# 文件副本（镜像）
+from .replicas import (
+    create_replica_tasks, complete_replica, fail_replica, get_file_replicas,
+    list_replica_tasks, delete_replica, get_replica_stats,
+    add_hot_replica, list_hot_replicas, list_tiering_candidates,
+)
+
+# 存储后端迁移
+from .storage_migrations import (
+    MIGRATION_ACTIVE_STATUSES,
+    create_storage_migration, get_storage_migration, list_storage_migrations,
+    set_storage_migration_status, list_migration_batch, checkpoint_storage_migration,
+    record_migration_failure, list_migration_failures,
+)
+
+# 存储完整性巡检
+from .storage_scrub import (
+    SCRUB_ISSUE_STATUSES,
+    create_scrub_run, get_scrub_run, list_scrub_runs, set_scrub_run_status,
+    list_scrub_batch, checkpoint_scrub_run,
+    record_scrub_issue, clear_scrub_issue, list_scrub_issues, get_scrub_issue_counts,
+)
+
+# 存储用量计数
+from .usage import (
+    USAGE_SCOPES, get_usage_totals, get_token_usage, get_tg_user_usage, list_usage, rebuild_usage_counters,
+)
+
+# 站点统计物化表
+from .site_stats import get_site_stats, get_uploads_on, list_daily_uploads, reconcile_site_stats
+
+# 单写线程
+from .writer import submit_write, run_write, enqueue_write, start_db_writer, stop_db_writer, pending_writes
+
+# 键集（游标）分页
+from .pagination import encode_cursor, decode_cursor, keyset_condition, next_cursor
+
+# 文件删除队列
+from .deletions import (
+    enqueue_file_deletions, queue_object_cleanup, list_due_deletions, update_deletion_progress,
+    get_deletion_queue_stats, list_deletion_queue, retry_failed_deletions, purge_finished_deletions,
+)
+
 # 域名管理
 from .domains import (
     get_all_domains, get_domains_by_type, get_active_image_domains,
@@ -95,11 +146,13 @@ from .domains import (
 
 __all__ = [
     # 连接管理
-    'get_connection', 'db_retry',
+    'get_connection', 'get_read_connection', 'close_thread_connections', 'db_retry',
     # 初始化
     'init_database',
     # 文件操作
-    'get_file_info', 'save_file_info', 'update_file_path_in_db',
+    'get_file_info', 'save_file_info', 'update_file_path_in_db', 'update_image_meta',
+    'list_pending_writebacks', 'update_pending_storage_meta', 'complete_pending_writeback',
+    'swap_file_storage_location',
     'update_cdn_cache_status', 'update_access_count', 'delete_files_by_ids',
     # 统计（admin_module.py 兼容）
     'get_all_files_count', 'get_total_size', 'get_stats',
@@ -156,6 +209,35 @@ __all__ = [
     'get_active_user_tokens', 'get_default_upload_token', 'set_default_upload_token',
     'cleanup_expired_codes', 'cleanup_expired_sessions',
     'consume_web_verify_code', 'get_web_verify_status',
+    # 分片续传会话
+    'create_upload_session', 'get_upload_session', 'update_upload_session_offset',
+    'delete_upload_session', 'list_stale_upload_sessions',
+    # 文件副本（镜像）
+    'create_replica_tasks', 'complete_replica', 'fail_replica', 'get_file_replicas',
+    'list_replica_tasks', 'delete_replica', 'get_replica_stats',
+    'add_hot_replica', 'list_hot_replicas', 'list_tiering_candidates',
+    # 存储后端迁移
+    'MIGRATION_ACTIVE_STATUSES',
+    'create_storage_migration', 'get_storage_migration', 'list_storage_migrations',
+    'set_storage_migration_status', 'list_migration_batch', 'checkpoint_storage_migration',
+    'record_migration_failure', 'list_migration_failures',
+    # 存储完整性巡检
+    'SCRUB_ISSUE_STATUSES',
+    'create_scrub_run', 'get_scrub_run', 'list_scrub_runs', 'set_scrub_run_status',
+    'list_scrub_batch', 'checkpoint_scrub_run',
+    'record_scrub_issue', 'clear_scrub_issue', 'list_scrub_issues', 'get_scrub_issue_counts',
+    # 存储用量计数
+    'USAGE_SCOPES', 'get_usage_totals', 'get_token_usage', 'get_tg_user_usage', 'list_usage',
+    'rebuild_usage_counters',
+    # 站点统计物化表
+    'get_site_stats', 'get_uploads_on', 'list_daily_uploads', 'reconcile_site_stats',
+    # 单写线程
+    'submit_write', 'run_write', 'enqueue_write', 'start_db_writer', 'stop_db_writer', 'pending_writes',
+    # 键集（游标）分页
+    'encode_cursor', 'decode_cursor', 'keyset_condition', 'next_cursor',
+    # 文件删除队列
+    'enqueue_file_deletions', 'queue_object_cleanup', 'list_due_deletions', 'update_deletion_progress',
+    'get_deletion_queue_stats', 'list_deletion_queue', 'retry_failed_deletions', 'purge_finished_deletions',
     # 域名管理
     'get_all_domains', 'get_domains_by_type', 'get_active_image_domains',
     'get_default_domain', 'add_domain', 'update_domain', 'delete_domain',
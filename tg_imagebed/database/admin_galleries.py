@@ -7,6 +7,8 @@ from typing import Optional, Dict, Any, List
 from ..config import logger
 from .connection import get_connection
 from .tokens import _parse_datetime
+from .galleries import _list_gallery_images
+from .pagination import decode_cursor
 
 
 # ===================== 管理员画集操作 =====================
@@ -88,12 +90,7 @@ def admin_list_galleries(page: int = 1, limit: int = 50, search: Optional[str] =
             query_params = params + [limit, offset]
             cur.execute(f'''
                 SELECT g.*,
-                    (SELECT COUNT(*) FROM gallery_images gi WHERE gi.gallery_id = g.id) AS image_count,
-                    COALESCE(g.cover_image, (
-                        SELECT fs.encrypted_id FROM gallery_images gi2
-                        JOIN file_storage fs ON gi2.encrypted_id = fs.encrypted_id
-                        WHERE gi2.gallery_id = g.id ORDER BY gi2.added_at ASC LIMIT 1
-                    )) AS resolved_cover_image
+                    COALESCE(g.cover_image, g.resolved_cover) AS resolved_cover_image
                 FROM galleries g
                 WHERE {where_sql}
                 ORDER BY {order_sql}
@@ -290,33 +287,23 @@ def admin_remove_images_from_gallery(gallery_id: int, encrypted_ids: List[str])
         logger.error(f"Admin 从画集移除图片失败: {e}")
         return 0
 
-def admin_get_gallery_images(gallery_id: int, page: int = 1, limit: int = 50) -> Dict[str, Any]:
-    """管理员获取画集图片"""
+def admin_get_gallery_images(gallery_id: int, page: int = 1, limit: int = 50,
+                             cursor: Optional[str] = None) -> Dict[str, Any]:
+    """管理员获取画集图片（cursor 格式错误时抛出 ValueError）"""
     page = max(1, int(page or 1))
     limit = max(1, min(200, int(limit or 50)))
+    if cursor:
+        decode_cursor(cursor)
     try:
         with get_connection() as conn:
             cur = conn.cursor()
             cur.execute('SELECT 1 FROM galleries WHERE id = ?', (gallery_id,))
             if not cur.fetchone():
-                return {'items': [], 'total': 0, 'page': page, 'limit': limit}
-            offset = (page - 1) * limit
-            cur.execute('SELECT COUNT(*) FROM gallery_images WHERE gallery_id = ?', (gallery_id,))
-            total = cur.fetchone()[0]
-            cur.execute('''
-                SELECT fs.encrypted_id, fs.original_filename, fs.file_size, fs.created_at,
-                       fs.cdn_cached, fs.cdn_url, fs.mime_type, gi.added_at
-                FROM gallery_images gi
-                JOIN file_storage fs ON gi.encrypted_id = fs.encrypted_id
-                WHERE gi.gallery_id = ?
-                ORDER BY gi.added_at DESC
-                LIMIT ? OFFSET ?
-            ''', (gallery_id, limit, offset))
-            items = [dict(r) for r in cur.fetchall()]
-            return {'items': items, 'total': total, 'page': page, 'limit': limit}
+                return {'items': [], 'total': 0, 'page': page, 'limit': limit, 'next_cursor': None}
+            return _list_gallery_images(cur, gallery_id, page, limit, cursor)
     except Exception as e:
         logger.error(f"Admin 获取画集图片失败: {e}")
-        return {'items': [], 'total': 0, 'page': page, 'limit': limit}
+        return {'items': [], 'total': 0, 'page': page, 'limit': limit, 'next_cursor': None}
 
 
 def admin_update_gallery_share(gallery_id: int, enabled: bool, expires_at: Optional[str] = None) -> Optional[Dict[str, Any]]:
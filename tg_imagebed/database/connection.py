@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """数据库连接管理 + 初始化"""
+import os
 import sqlite3
+import threading
 import time
 import random
 import json
@@ -14,22 +16,82 @@ from ..config import DATABASE_PATH, logger
 
 
 # ===================== 数据库连接管理 =====================
-@contextmanager
-def get_connection():
-    """获取数据库连接的上下文管理器"""
-    conn = sqlite3.connect(DATABASE_PATH)
+# 连接按线程复用：每个线程按 (数据库路径, 是否只读) 维护空闲连接栈，PRAGMA 只在建连时执行一次。
+# 同一线程内嵌套 get_connection() 会取到另一条连接，保持“每个上下文独立连接、独立事务”的语义。
+_POOL_MAX_IDLE_PER_THREAD = 4
+
+_CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA foreign_keys = ON',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA synchronous = NORMAL',     # WAL 下仅在检查点时 fsync
+    'PRAGMA cache_size = -8000',       # 每连接 8MB 页缓存
+    'PRAGMA mmap_size = 268435456',    # 256MB 内存映射读取
+    'PRAGMA temp_store = MEMORY',
+)
+
+_local = threading.local()
+
+
+def _open_connection(path: str, readonly: bool) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
     conn.row_factory = sqlite3.Row
-    conn.execute('PRAGMA foreign_keys = ON')
-    conn.execute('PRAGMA busy_timeout = 5000')
-    conn.execute('PRAGMA journal_mode=WAL')
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    if readonly:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+def _idle_connections(path: str, readonly: bool) -> list:
+    """当前线程的空闲连接栈；fork 后的子进程不复用父进程的连接"""
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        _local.pid = pid
+        _local.pools = {}
+    return _local.pools.setdefault((path, readonly), [])
+
+
+@contextmanager
+def _pooled_connection(readonly: bool):
+    idle = _idle_connections(DATABASE_PATH, readonly)
+    conn = idle.pop() if idle else _open_connection(DATABASE_PATH, readonly)
+    reusable = False
     try:
         yield conn
         conn.commit()
-    except Exception:
-        conn.rollback()
+        reusable = True
+    except BaseException:
+        try:
+            conn.rollback()
+            reusable = True
+        except sqlite3.Error:
+            pass
         raise
     finally:
-        conn.close()
+        if reusable and not conn.in_transaction and len(idle) < _POOL_MAX_IDLE_PER_THREAD:
+            conn.row_factory = sqlite3.Row
+            idle.append(conn)
+        else:
+            conn.close()
+
+
+def get_connection():
+    """获取数据库连接的上下文管理器（线程内复用，正常退出提交、异常回滚）"""
+    return _pooled_connection(False)
+
+
+def get_read_connection():
+    """获取只读连接的上下文管理器（PRAGMA query_only，与写连接分开缓存，供纯读取路径使用）"""
+    return _pooled_connection(True)
+
+
+def close_thread_connections() -> None:
+    """关闭当前线程缓存的全部空闲连接（线程退出前或切换数据库文件后调用）"""
+    pools = getattr(_local, 'pools', None) or {}
+    for idle in pools.values():
+        while idle:
+            idle.pop().close()
 
 
 def db_retry(max_attempts: int = 3, base_delay: float = 0.1, max_delay: float = 2.0):
@@ -169,6 +231,11 @@ def _migrate_file_storage_columns(cursor) -> None:
         ('storage_backend', 'TEXT'),
         ('storage_key', 'TEXT'),
         ('storage_meta', 'TEXT'),
+        ('width', 'INTEGER'),
+        ('height', 'INTEGER'),
+        ('orientation', 'INTEGER'),
+        ('blurhash', 'TEXT'),
+        ('phash', 'TEXT'),
     ]
 
     storage_columns_added = False
@@ -670,17 +737,521 @@ def _init_custom_domains_table(cursor, quiet: bool = False) -> None:
         logger.debug(f"域名标准化迁移失败（可忽略）: {e}")
 
 
+def _init_upload_tables(cursor) -> None:
+    """创建分片续传会话表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            upload_id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            content_type TEXT,
+            total_size INTEGER NOT NULL,
+            received_size INTEGER NOT NULL DEFAULT 0,
+            source TEXT NOT NULL DEFAULT 'web_upload',
+            upload_scene TEXT NOT NULL DEFAULT 'guest',
+            auth_token TEXT,
+            client_ip TEXT,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+
+
+def _init_replica_tables(cursor) -> None:
+    """创建文件副本表（镜像策略）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS file_replicas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            encrypted_id TEXT NOT NULL,
+            storage_backend TEXT NOT NULL,
+            storage_key TEXT,
+            file_id TEXT,
+            file_path TEXT,
+            storage_meta TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            role TEXT NOT NULL DEFAULT 'mirror',
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL,
+            UNIQUE(encrypted_id, storage_backend)
+        )
+    ''')
+    # role: mirror 为镜像策略的持久副本，hot 为冷热分层晋升的热层副本（可被淘汰）
+    cursor.execute("PRAGMA table_info(file_replicas)")
+    if 'role' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE file_replicas ADD COLUMN role TEXT NOT NULL DEFAULT 'mirror'")
+    # 主记录删除时把副本标记为孤儿，由后台清理远端对象
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_file_replicas_orphan
+        AFTER DELETE ON file_storage
+        BEGIN
+            UPDATE file_replicas
+            SET status = 'orphaned', updated_at = CAST(strftime('%s', 'now') AS INTEGER)
+            WHERE encrypted_id = OLD.encrypted_id;
+        END
+    ''')
+
+
+def _init_storage_migration_tables(cursor) -> None:
+    """创建存储后端迁移任务表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS storage_migrations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_backend TEXT NOT NULL,
+            target_backend TEXT NOT NULL,
+            filters TEXT,
+            options TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            checkpoint_key TEXT NOT NULL DEFAULT '',
+            total_count INTEGER NOT NULL DEFAULT 0,
+            migrated_count INTEGER NOT NULL DEFAULT 0,
+            skipped_count INTEGER NOT NULL DEFAULT 0,
+            failed_count INTEGER NOT NULL DEFAULT 0,
+            migrated_bytes INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL,
+            started_at INTEGER,
+            finished_at INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS storage_migration_failures (
+            migration_id INTEGER NOT NULL,
+            encrypted_id TEXT NOT NULL,
+            error TEXT,
+            created_at INTEGER NOT NULL,
+            PRIMARY KEY (migration_id, encrypted_id)
+        )
+    ''')
+
+
+def _init_storage_scrub_tables(cursor) -> None:
+    """创建存储完整性巡检任务表与问题报告表"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS storage_scrub_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mode TEXT NOT NULL DEFAULT 'exists',
+            options TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            checkpoint_key TEXT NOT NULL DEFAULT '',
+            total_count INTEGER NOT NULL DEFAULT 0,
+            checked_count INTEGER NOT NULL DEFAULT 0,
+            ok_count INTEGER NOT NULL DEFAULT 0,
+            broken_count INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            scanned_bytes INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL,
+            started_at INTEGER,
+            finished_at INTEGER
+        )
+    ''')
+    # 每个 (文件, 后端) 一行；status: missing / corrupt / error / repaired
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS storage_scrub_issues (
+            encrypted_id TEXT NOT NULL,
+            storage_backend TEXT NOT NULL,
+            storage_key TEXT,
+            role TEXT NOT NULL DEFAULT 'primary',
+            status TEXT NOT NULL,
+            detail TEXT,
+            run_id INTEGER,
+            first_seen_at INTEGER NOT NULL,
+            checked_at INTEGER NOT NULL,
+            PRIMARY KEY (encrypted_id, storage_backend)
+        )
+    ''')
+    # 主记录删除后报告随之失效
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_storage_scrub_issues_cleanup
+        AFTER DELETE ON file_storage
+        BEGIN
+            DELETE FROM storage_scrub_issues WHERE encrypted_id = OLD.encrypted_id;
+        END
+    ''')
+
+
+# 画集默认封面：最早加入且文件仍存在的图片
+_GALLERY_FIRST_IMAGE_SQL = '''
+    SELECT gi.encrypted_id
+    FROM gallery_images gi
+    JOIN file_storage fs ON fs.encrypted_id = gi.encrypted_id
+    WHERE gi.gallery_id = {gallery_id}
+    ORDER BY gi.added_at ASC
+    LIMIT 1
+'''
+
+
+def _init_gallery_counters(cursor) -> None:
+    """
+    画集反范式字段：galleries.image_count / galleries.resolved_cover
+
+    由 gallery_images 与 file_storage 上的触发器维护，列表查询不再逐行执行相关子查询；
+    首次添加列时按现有数据回填。
+    """
+    cursor.execute("PRAGMA table_info(galleries)")
+    columns = {column[1] for column in cursor.fetchall()}
+    added = False
+    for col_name, col_type in (('image_count', 'INTEGER NOT NULL DEFAULT 0'), ('resolved_cover', 'TEXT')):
+        if col_name not in columns:
+            logger.info(f"添加 {col_name} 列到 galleries")
+            cursor.execute(f'ALTER TABLE galleries ADD COLUMN {col_name} {col_type}')
+            added = True
+
+    first_new = _GALLERY_FIRST_IMAGE_SQL.format(gallery_id='NEW.gallery_id')
+    first_old = _GALLERY_FIRST_IMAGE_SQL.format(gallery_id='OLD.gallery_id')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_gallery_images_insert
+        AFTER INSERT ON gallery_images
+        BEGIN
+            UPDATE galleries
+            SET image_count = image_count + 1,
+                resolved_cover = ({first_new})
+            WHERE id = NEW.gallery_id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_gallery_images_delete
+        AFTER DELETE ON gallery_images
+        BEGIN
+            UPDATE galleries
+            SET image_count = MAX(0, image_count - 1),
+                resolved_cover = CASE WHEN resolved_cover = OLD.encrypted_id
+                                      THEN ({first_old}) ELSE resolved_cover END
+            WHERE id = OLD.gallery_id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_gallery_images_update
+        AFTER UPDATE OF gallery_id, encrypted_id, added_at ON gallery_images
+        BEGIN
+            UPDATE galleries SET image_count = MAX(0, image_count - 1) WHERE id = OLD.gallery_id;
+            UPDATE galleries SET image_count = image_count + 1 WHERE id = NEW.gallery_id;
+            UPDATE galleries SET resolved_cover = ({first_old}) WHERE id = OLD.gallery_id;
+            UPDATE galleries SET resolved_cover = ({first_new}) WHERE id = NEW.gallery_id;
+        END
+    ''')
+    # 外键关闭或历史数据未级联时，文件删除后封面仍需换成下一张
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_gallery_cover_file_delete
+        AFTER DELETE ON file_storage
+        BEGIN
+            UPDATE galleries
+            SET resolved_cover = ({_GALLERY_FIRST_IMAGE_SQL.format(gallery_id='galleries.id')})
+            WHERE resolved_cover = OLD.encrypted_id;
+        END
+    ''')
+    if added:
+        _rebuild_gallery_counters(cursor)
+        logger.info("已回填画集图片数与封面")
+
+
+def _rebuild_gallery_counters(cursor) -> None:
+    """按 gallery_images 全量重算画集图片数与默认封面"""
+    cursor.execute(f'''
+        UPDATE galleries SET
+            image_count = (SELECT COUNT(*) FROM gallery_images gi WHERE gi.gallery_id = galleries.id),
+            resolved_cover = ({_GALLERY_FIRST_IMAGE_SQL.format(gallery_id='galleries.id')})
+    ''')
+
+
+# 用量计数维度：(scope, scope_key 表达式, 条件)；{row} 替换为 NEW / OLD
+_USAGE_SCOPES = (
+    ("'all'", "''", '1'),
+    ("'backend'", "COALESCE(NULLIF({row}.storage_backend, ''), 'telegram')", '1'),
+    ("'token'", '{row}.auth_token', "COALESCE({row}.auth_token, '') != ''"),
+    ("'tg_user'", 'CAST({row}.tg_user_id AS TEXT)', '{row}.tg_user_id IS NOT NULL'),
+)
+
+
+def _usage_trigger_body(row: str, sign: str) -> str:
+    """生成对 storage_usage_counters 加/减一条文件的触发器语句"""
+    statements = []
+    for scope, key, cond in _USAGE_SCOPES:
+        statements.append(f'''
+            INSERT INTO storage_usage_counters (scope, scope_key, file_count, total_bytes)
+            SELECT {scope}, {key.format(row=row)}, {sign}1, {sign}COALESCE({row}.file_size, 0)
+            WHERE {cond.format(row=row)}
+            ON CONFLICT(scope, scope_key) DO UPDATE SET
+                file_count = file_count + excluded.file_count,
+                total_bytes = total_bytes + excluded.total_bytes;''')
+    return ''.join(statements)
+
+
+def _usage_sums_sql(scope: str, key: str, cond: str) -> str:
+    """某个用量维度按 scope_key 分组的 (scope, scope_key, file_count, total_bytes) 查询"""
+    expr = key.format(row='file_storage')
+    return f'''
+        SELECT {scope}, {expr}, COUNT(*), COALESCE(SUM(file_size), 0)
+        FROM file_storage
+        WHERE {cond.format(row='file_storage')}
+        GROUP BY {expr}
+    '''
+
+
+def _rebuild_usage_counters(cursor) -> None:
+    """按 file_storage 全量重建用量计数"""
+    cursor.execute('DELETE FROM storage_usage_counters')
+    for scope, key, cond in _USAGE_SCOPES:
+        cursor.execute(
+            'INSERT INTO storage_usage_counters (scope, scope_key, file_count, total_bytes) '
+            + _usage_sums_sql(scope, key, cond)
+        )
+
+
+def _init_usage_counter_tables(cursor) -> None:
+    """
+    创建存储用量计数表（按全站 / 后端 / Token / TG 用户统计文件数与字节数）
+
+    由 file_storage 上的触发器增量维护，统计接口无需 SUM 全表扫描；首次创建时按现有数据回填。
+    """
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'storage_usage_counters'"
+    )
+    exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS storage_usage_counters (
+            scope TEXT NOT NULL,
+            scope_key TEXT NOT NULL,
+            file_count INTEGER NOT NULL DEFAULT 0,
+            total_bytes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, scope_key)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_usage_counters_insert
+        AFTER INSERT ON file_storage
+        BEGIN{_usage_trigger_body('NEW', '+')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_usage_counters_delete
+        AFTER DELETE ON file_storage
+        BEGIN{_usage_trigger_body('OLD', '-')}
+        END
+    ''')
+    # 迁移/分层切换后端、解绑 Token 等更新：先减旧值再加新值
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_usage_counters_update
+        AFTER UPDATE OF storage_backend, auth_token, tg_user_id, file_size ON file_storage
+        WHEN OLD.storage_backend IS NOT NEW.storage_backend
+            OR OLD.auth_token IS NOT NEW.auth_token
+            OR OLD.tg_user_id IS NOT NEW.tg_user_id
+            OR OLD.file_size IS NOT NEW.file_size
+        BEGIN{_usage_trigger_body('OLD', '-')}{_usage_trigger_body('NEW', '+')}
+        END
+    ''')
+    if not exists:
+        _rebuild_usage_counters(cursor)
+        logger.info("已按现有文件回填存储用量计数")
+
+
+def _init_deletion_queue_table(cursor) -> None:
+    """创建文件删除队列（记录删除后由后台 GC 清理存储对象、TG 消息与 CDN 缓存）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS file_deletion_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            encrypted_id TEXT NOT NULL,
+            storage_backend TEXT,
+            storage_key TEXT,
+            group_chat_id INTEGER,
+            group_message_id INTEGER,
+            storage_meta TEXT,
+            sync_telegram INTEGER NOT NULL DEFAULT 1,
+            storage_done INTEGER NOT NULL DEFAULT 0,
+            telegram_done INTEGER NOT NULL DEFAULT 0,
+            cdn_done INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL
+        )
+    ''')
+
+
+# 站点统计项：名称 → 单条记录的贡献值表达式（{row} 替换为 NEW / OLD / file_storage）
+_SITE_STAT_EXPRS = {
+    'cdn_cached': 'COALESCE({row}.cdn_cached = 1, 0)',
+    'cdn_uncached': 'COALESCE({row}.cdn_cached, 0) = 0',
+    'cdn_pending': 'COALESCE({row}.cdn_cached = 0 AND {row}.cdn_url IS NOT NULL, 0)',
+    'group_uploads': 'COALESCE({row}.is_group_upload = 1, 0)',
+    'access_total': 'COALESCE({row}.access_count, 0)',
+    'cdn_hits': 'COALESCE({row}.cdn_hit_count, 0)',
+    'direct_hits': 'COALESCE({row}.direct_hit_count, 0)',
+}
+# 更新触发器：触发器名 → (依赖列, 受影响的统计项)。
+# 访问计数与 CDN/群组状态分开，每次访问只改动实际变化的计数行
+_SITE_STAT_UPDATE_TRIGGERS = {
+    'trg_site_stats_cdn_update': (('cdn_cached', 'cdn_url'), ('cdn_cached', 'cdn_uncached', 'cdn_pending')),
+    'trg_site_stats_group_update': (('is_group_upload',), ('group_uploads',)),
+    'trg_site_stats_access_update': (('access_count',), ('access_total',)),
+    'trg_site_stats_cdn_hit_update': (('cdn_hit_count',), ('cdn_hits',)),
+    'trg_site_stats_direct_hit_update': (('direct_hit_count',), ('direct_hits',)),
+}
+# 上传日桶（本地时区，与 datetime.now() 的“今日”一致）
+_DAILY_BUCKET_EXPR = "date({row}.upload_time, 'unixepoch', 'localtime')"
+
+
+def _site_stats_delta(parts, names=None) -> str:
+    """生成 UPDATE site_stats 的 CASE 表达式；parts 为 [(row, sign)]，names 限定统计项"""
+    cases = ''.join(
+        f"\n                WHEN '{name}' THEN "
+        + ' '.join(f"{sign} ({_SITE_STAT_EXPRS[name].format(row=row)})" for row, sign in parts)
+        for name in (names or _SITE_STAT_EXPRS)
+    )
+    return f"CASE name{cases}\n                ELSE 0 END"
+
+
+def _daily_upload_upsert(row: str, sign: str) -> str:
+    return f'''
+            INSERT INTO daily_upload_stats (day, uploads, total_bytes)
+            VALUES ({_DAILY_BUCKET_EXPR.format(row=row)}, {sign}1, {sign}COALESCE({row}.file_size, 0))
+            ON CONFLICT(day) DO UPDATE SET
+                uploads = uploads + excluded.uploads,
+                total_bytes = total_bytes + excluded.total_bytes;'''
+
+
+def _site_stats_sums(cursor) -> dict:
+    """按 file_storage 全量计算各站点统计项"""
+    columns = ', '.join(
+        f"COALESCE(SUM({expr.format(row='file_storage')}), 0)" for expr in _SITE_STAT_EXPRS.values()
+    )
+    cursor.execute(f'SELECT {columns} FROM file_storage')
+    return dict(zip(_SITE_STAT_EXPRS, [int(v or 0) for v in cursor.fetchone()]))
+
+
+def _daily_upload_sums_sql() -> str:
+    """按上传日分组的 (day, uploads, total_bytes) 查询"""
+    bucket = _DAILY_BUCKET_EXPR.format(row='file_storage')
+    return f'''
+        SELECT {bucket}, COUNT(*), COALESCE(SUM(file_size), 0)
+        FROM file_storage
+        GROUP BY {bucket}
+    '''
+
+
+def _rebuild_site_stats(cursor) -> None:
+    """按 file_storage 全量重建站点统计与上传日桶"""
+    cursor.executemany(
+        'INSERT OR REPLACE INTO site_stats (name, value) VALUES (?, ?)',
+        list(_site_stats_sums(cursor).items()),
+    )
+    cursor.execute('DELETE FROM daily_upload_stats')
+    cursor.execute(f'INSERT INTO daily_upload_stats (day, uploads, total_bytes) {_daily_upload_sums_sql()}')
+
+
+def _init_site_stats_tables(cursor) -> None:
+    """
+    创建站点统计物化表：site_stats（CDN 缓存数、群组上传数、访问总数等）
+    与 daily_upload_stats（按本地日期的上传数/字节数）
+
+    由 file_storage 上的触发器增量维护，/api/stats、/api/admin/stats 与 CDN 仪表盘
+    只做主键查找；首次创建时按现有数据回填，偏差由定期对账修正。
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'site_stats'")
+    exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS site_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_upload_stats (
+            day TEXT PRIMARY KEY,
+            uploads INTEGER NOT NULL DEFAULT 0,
+            total_bytes INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    cursor.executemany(
+        'INSERT OR IGNORE INTO site_stats (name, value) VALUES (?, 0)',
+        [(name,) for name in _SITE_STAT_EXPRS],
+    )
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_site_stats_insert
+        AFTER INSERT ON file_storage
+        BEGIN
+            UPDATE site_stats SET value = value + {_site_stats_delta([('NEW', '+')])};{_daily_upload_upsert('NEW', '+')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_site_stats_delete
+        AFTER DELETE ON file_storage
+        BEGIN
+            UPDATE site_stats SET value = value + {_site_stats_delta([('OLD', '-')])};{_daily_upload_upsert('OLD', '-')}
+        END
+    ''')
+    # 访问计数、CDN 缓存状态等更新：只在相关列实际变化时，按新旧值之差调整对应统计项
+    # （旧版本的单一触发器会在每次访问时改写全部统计行）
+    cursor.execute('DROP TRIGGER IF EXISTS trg_site_stats_update')
+    for trigger, (columns, names) in _SITE_STAT_UPDATE_TRIGGERS.items():
+        changed = ' OR '.join(f'OLD.{col} IS NOT NEW.{col}' for col in columns)
+        placeholders = ', '.join(f"'{name}'" for name in names)
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {trigger}
+            AFTER UPDATE OF {', '.join(columns)} ON file_storage
+            WHEN {changed}
+            BEGIN
+                UPDATE site_stats SET value = value + {_site_stats_delta([('NEW', '+'), ('OLD', '-')], names)}
+                WHERE name IN ({placeholders});
+            END
+        ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_daily_upload_stats_update
+        AFTER UPDATE OF upload_time, file_size ON file_storage
+        WHEN OLD.upload_time IS NOT NEW.upload_time OR OLD.file_size IS NOT NEW.file_size
+        BEGIN{_daily_upload_upsert('OLD', '-')}{_daily_upload_upsert('NEW', '+')}
+        END
+    ''')
+    if not exists:
+        _rebuild_site_stats(cursor)
+        logger.info("已按现有文件回填站点统计")
+
+
+# 已被复合/部分索引取代的旧索引（新索引覆盖其全部用途）
+_SUPERSEDED_INDEXES = (
+    'idx_file_storage_created',
+    'idx_file_storage_tg_user',
+    'idx_auth_token',
+    'idx_gallery_images_gallery',
+    'idx_file_size',
+    'idx_created_at',
+    'idx_cdn_cached',
+    'idx_group_upload',
+    'idx_storage_backend',
+    'idx_file_storage_size_eid',
+)
+
+
 def _create_indexes(cursor) -> None:
     """创建所有数据库索引"""
     indexes = [
-        ('idx_file_storage_created', 'file_storage(created_at)'),
+        # 键集分页：排序键 + encrypted_id 决胜列
+        ('idx_file_storage_created_eid', 'file_storage(created_at, encrypted_id)'),
+        ('idx_file_storage_tg_user_created', 'file_storage(tg_user_id, created_at, encrypted_id)'),
+        ('idx_file_storage_token_created', 'file_storage(auth_token, created_at, encrypted_id)'),
+        # 管理后台按大小/访问量排序：与查询一致的 COALESCE 表达式，NULL 行按 0 参与键集分页
+        ('idx_file_storage_size_key', 'file_storage(COALESCE(file_size, 0), encrypted_id)'),
+        ('idx_file_storage_access_key', 'file_storage(COALESCE(access_count, 0), encrypted_id)'),
+        ('idx_file_storage_cdn_hits_key', 'file_storage(COALESCE(cdn_hit_count, 0), encrypted_id)'),
+        ('idx_file_storage_direct_hits_key', 'file_storage(COALESCE(direct_hit_count, 0), encrypted_id)'),
+        ('idx_gallery_images_gallery_added', 'gallery_images(gallery_id, added_at, encrypted_id)'),
+        ('idx_galleries_share_all_updated', 'galleries(hide_from_share_all, updated_at, id)'),
+        # file_storage 热点查询（tests/test_query_plans.py 校验执行计划）
+        ('idx_file_storage_username_created', 'file_storage(username, created_at, encrypted_id)'),
+        ('idx_file_storage_source_created', 'file_storage(source, created_at, encrypted_id)'),
+        ('idx_file_storage_group_created',
+         'file_storage(created_at, encrypted_id) WHERE is_group_upload = 1'),
+        ('idx_file_storage_uncached',
+         'file_storage(upload_time) WHERE cdn_cached = 0 AND cdn_url IS NOT NULL'),
+        ('idx_file_storage_backend_uploaded', 'file_storage(storage_backend, upload_time)'),
+        # 冷热分层候选：按最近访问时间倒序取热点文件
+        ('idx_file_storage_last_accessed', 'file_storage(last_accessed)'),
         ('idx_original_filename', 'file_storage(original_filename)'),
-        ('idx_file_size', 'file_storage(file_size)'),
-        ('idx_cdn_cached', 'file_storage(cdn_cached)'),
-        ('idx_group_upload', 'file_storage(is_group_upload)'),
-        ('idx_file_storage_tg_user', 'file_storage(tg_user_id)'),
-        ('idx_auth_token', 'file_storage(auth_token)'),
-        ('idx_storage_backend', 'file_storage(storage_backend)'),
         ('idx_storage_key', 'file_storage(storage_backend, storage_key)'),
         ('idx_auth_tokens_expires', 'auth_tokens(expires_at)'),
         ('idx_auth_tokens_active', 'auth_tokens(is_active)'),
@@ -691,7 +1262,8 @@ def _create_indexes(cursor) -> None:
         ('idx_galleries_hide_share_all', 'galleries(hide_from_share_all)'),
         ('idx_galleries_homepage_expose', 'galleries(homepage_expose_enabled)'),
         ('idx_galleries_editor_pick', 'galleries(editor_pick_weight DESC, updated_at DESC)'),
-        ('idx_gallery_images_gallery', 'gallery_images(gallery_id, added_at DESC)'),
+        ('idx_galleries_resolved_cover', 'galleries(resolved_cover)'),
+        ('idx_galleries_public_updated', 'galleries(share_enabled, access_mode, updated_at DESC)'),
         ('idx_share_all_token', 'share_all_links(share_token)'),
         ('idx_gallery_token_access_gallery', 'gallery_token_access(gallery_id)'),
         ('idx_gallery_token_access_token', 'gallery_token_access(token)'),
@@ -716,10 +1288,19 @@ def _create_indexes(cursor) -> None:
         ('idx_custom_domains_active', 'custom_domains(is_active)'),
         ('idx_custom_domains_default', 'custom_domains(is_default)'),
         ('idx_custom_domains_sort', 'custom_domains(sort_order)'),
+        ('idx_upload_sessions_updated', 'upload_sessions(updated_at)'),
+        ('idx_file_replicas_status', 'file_replicas(status, updated_at)'),
+        ('idx_file_replicas_role', 'file_replicas(role, storage_backend)'),
+        ('idx_storage_migrations_status', 'storage_migrations(status)'),
+        ('idx_storage_scrub_runs_status', 'storage_scrub_runs(status)'),
+        ('idx_storage_scrub_issues_status', 'storage_scrub_issues(status, checked_at DESC)'),
+        ('idx_file_deletion_queue_status', 'file_deletion_queue(status, next_attempt_at)'),
     ]
 
     for idx_name, idx_def in indexes:
         cursor.execute(f'CREATE INDEX IF NOT EXISTS {idx_name} ON {idx_def}')
+    for idx_name in _SUPERSEDED_INDEXES:
+        cursor.execute(f'DROP INDEX IF EXISTS {idx_name}')
 
 
 # ===================== 数据库初始化入口 =====================
@@ -737,6 +1318,14 @@ def init_database(quiet: bool = False) -> None:
             _migrate_galleries_table(cursor, conn)
             _init_gallery_home_tables(cursor)
             _init_custom_domains_table(cursor, quiet=quiet)
+            _init_upload_tables(cursor)
+            _init_replica_tables(cursor)
+            _init_storage_migration_tables(cursor)
+            _init_storage_scrub_tables(cursor)
+            _init_deletion_queue_table(cursor)
+            _init_usage_counter_tables(cursor)
+            _init_site_stats_tables(cursor)
+            _init_gallery_counters(cursor)
             _create_indexes(cursor)
 
         if not quiet:
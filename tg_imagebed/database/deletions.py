@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件删除队列数据访问层
+
+删除图片时只在数据库事务内删除 file_storage 记录（访问立即 404），
+并把存储位置写入 file_deletion_queue 作为墓碑；存储对象、Telegram 消息与 CDN 缓存
+由后台 GC 在事务之外批量清理。三个清理步骤分别记录完成标记，重试时只重做未完成的部分。
+
+状态：pending → done / failed（超过最大重试次数）
+"""
+import time
+from typing import Optional, Dict, Any, List, Iterable
+
+from .connection import get_connection, db_retry
+
+
+def enqueue_file_deletions(cursor, rows: Iterable[Dict[str, Any]], *, sync_telegram: bool = True,
+                           purge_cdn: bool = True) -> int:
+    """
+    在调用方的事务内登记待清理的文件（与删除 file_storage 记录同一事务）
+
+    Args:
+        cursor: 调用方事务的 cursor
+        rows: 含 encrypted_id / storage_backend / storage_key / group_chat_id /
+              group_message_id / storage_meta 的文件记录
+        sync_telegram: 是否同步删除 Telegram 消息
+        purge_cdn: 是否清除 CDN 缓存（迁移后清理旧位置时内容不变，无需清除）
+
+    Returns:
+        登记数量
+    """
+    now = int(time.time())
+    params = [
+        (
+            row.get('encrypted_id'),
+            row.get('storage_backend'),
+            row.get('storage_key'),
+            row.get('group_chat_id'),
+            row.get('group_message_id'),
+            row.get('storage_meta') if isinstance(row.get('storage_meta'), (str, type(None))) else None,
+            1 if sync_telegram else 0,
+            0 if sync_telegram else 1,
+            0 if purge_cdn else 1,
+            now, now,
+        )
+        for row in rows if row.get('encrypted_id')
+    ]
+    if params:
+        cursor.executemany('''
+            INSERT INTO file_deletion_queue (
+                encrypted_id, storage_backend, storage_key, group_chat_id, group_message_id,
+                storage_meta, sync_telegram, telegram_done, cdn_done, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', params)
+    return len(params)
+
+
+@db_retry(max_attempts=3, base_delay=0.1, max_delay=2.0)
+def queue_object_cleanup(rows: Iterable[Dict[str, Any]], *, sync_telegram: bool = True) -> int:
+    """
+    登记不再被任何记录引用的存储对象（迁移/修复中作废的对象），由后台 GC 清理
+
+    与 enqueue_file_deletions 相同，但自行开启事务，且不清除 CDN 缓存（文件仍然存在）。
+    """
+    with get_connection() as conn:
+        return enqueue_file_deletions(conn.cursor(), rows, sync_telegram=sync_telegram, purge_cdn=False)
+
+
+def list_due_deletions(limit: int = 200, now: Optional[int] = None) -> List[Dict[str, Any]]:
+    """取出已到重试时间的待清理项（先入先出）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM file_deletion_queue
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY id
+            LIMIT ?
+        ''', (int(now if now is not None else time.time()), int(limit)))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+@db_retry()
+def update_deletion_progress(updates: List[Dict[str, Any]]) -> None:
+    """
+    批量回写清理进度
+
+    Args:
+        updates: [{'id', 'storage_done', 'telegram_done', 'cdn_done', 'status',
+                   'attempts', 'next_attempt_at', 'last_error'}]
+    """
+    if not updates:
+        return
+    now = int(time.time())
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE file_deletion_queue
+            SET storage_done = ?, telegram_done = ?, cdn_done = ?, status = ?,
+                attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ?
+            WHERE id = ?
+        ''', [
+            (int(u['storage_done']), int(u['telegram_done']), int(u['cdn_done']), u['status'],
+             int(u['attempts']), int(u['next_attempt_at']), (u.get('last_error') or '')[:500] or None,
+             now, int(u['id']))
+            for u in updates
+        ])
+
+
+def get_deletion_queue_stats() -> Dict[str, Any]:
+    """各状态数量、最早待清理项的排队时长"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT status, COUNT(*) AS n FROM file_deletion_queue GROUP BY status')
+        counts = {row['status']: row['n'] for row in cursor.fetchall()}
+        cursor.execute("SELECT MIN(created_at) FROM file_deletion_queue WHERE status = 'pending'")
+        oldest = cursor.fetchone()[0]
+    return {
+        'pending': counts.get('pending', 0),
+        'done': counts.get('done', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_pending_seconds': int(time.time()) - int(oldest) if oldest else 0,
+    }
+
+
+def list_deletion_queue(status: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+    """列出队列项（新项在前）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        sql = ('SELECT id, encrypted_id, storage_backend, storage_key, status, attempts, storage_done, '
+               'telegram_done, cdn_done, next_attempt_at, last_error, created_at, updated_at '
+               'FROM file_deletion_queue')
+        params: list = []
+        if status:
+            sql += ' WHERE status = ?'
+            params.append(status)
+        sql += ' ORDER BY id DESC LIMIT ? OFFSET ?'
+        cursor.execute(sql, (*params, int(limit), int(offset)))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+@db_retry()
+def retry_failed_deletions(ids: Optional[List[int]] = None) -> int:
+    """把失败项重新放回队列（不指定 ID 时全部重试），返回数量"""
+    now = int(time.time())
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if ids:
+            placeholders = ','.join('?' * len(ids))
+            cursor.execute(f'''
+                UPDATE file_deletion_queue
+                SET status = 'pending', attempts = 0, next_attempt_at = 0, updated_at = ?
+                WHERE status = 'failed' AND id IN ({placeholders})
+            ''', (now, *[int(i) for i in ids]))
+        else:
+            cursor.execute('''
+                UPDATE file_deletion_queue
+                SET status = 'pending', attempts = 0, next_attempt_at = 0, updated_at = ?
+                WHERE status = 'failed'
+            ''', (now,))
+        return cursor.rowcount
+
+
+@db_retry()
+def purge_finished_deletions(older_than_seconds: int) -> int:
+    """删除已完成且超过保留期的队列项"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM file_deletion_queue WHERE status = 'done' AND updated_at < ?",
+            (int(time.time()) - int(older_than_seconds),),
+        )
+        return cursor.rowcount
@@ -7,49 +7,51 @@ from datetime import datetime
 from typing import Optional, Dict, Any, List
 
 from ..config import logger
-from .connection import get_connection, db_retry
+from .connection import get_connection, get_read_connection, db_retry
+from .writer import run_write, enqueue_write
+from .usage import get_usage_totals, get_tg_user_usage
+from .site_stats import get_site_stats, get_uploads_on
+from .pagination import keyset_condition
+from .deletions import enqueue_file_deletions
 
 
 # ===================== 文件存储操作 =====================
 def get_file_info(encrypted_id: str) -> Optional[Dict[str, Any]]:
     """获取文件信息"""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM file_storage WHERE encrypted_id = ?', (encrypted_id,))
         row = cursor.fetchone()
         return dict(row) if row else None
 
 
-@db_retry(max_attempts=3, base_delay=0.1, max_delay=2.0)
 def save_file_info(encrypted_id: str, file_info: Dict[str, Any]) -> None:
-    """保存文件信息到数据库（带重试）"""
+    """保存文件信息到数据库（经单写线程提交）"""
     from .settings import get_system_setting
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        # 生成 ETag
-        etag = f'W/"{encrypted_id}-{file_info.get("file_size", 0)}"'
-
-        # 生成 CDN URL（仅在 CDN Mode：域名已配置 + cdn_enabled=1）
-        cdn_url = None
-        cdn_enabled = str(get_system_setting('cdn_enabled') or '0') == '1'
-        cdn_domain = str(get_system_setting('cloudflare_cdn_domain') or '').strip()
-        if cdn_enabled and cdn_domain:
-            cdn_url = f"https://{cdn_domain}/image/{encrypted_id}"
-
-        # 处理存储字段（类型防御：确保是字符串）
-        storage_backend = str(file_info.get('storage_backend') or 'telegram').strip() or 'telegram'
-        storage_key = str(file_info.get('storage_key') or file_info.get('file_id') or '').strip()
-        storage_meta = file_info.get('storage_meta')
-        if isinstance(storage_meta, str):
-            storage_meta_json = storage_meta
-        else:
-            try:
-                storage_meta_json = json.dumps(storage_meta or {}, ensure_ascii=False, separators=(",", ":"))
-            except Exception:
-                storage_meta_json = "{}"
+    # 生成 ETag
+    etag = f'W/"{encrypted_id}-{file_info.get("file_size", 0)}"'
+
+    # 生成 CDN URL（仅在 CDN Mode：域名已配置 + cdn_enabled=1）
+    cdn_url = None
+    cdn_enabled = str(get_system_setting('cdn_enabled') or '0') == '1'
+    cdn_domain = str(get_system_setting('cloudflare_cdn_domain') or '').strip()
+    if cdn_enabled and cdn_domain:
+        cdn_url = f"https://{cdn_domain}/image/{encrypted_id}"
+
+    # 处理存储字段（类型防御：确保是字符串）
+    storage_backend = str(file_info.get('storage_backend') or 'telegram').strip() or 'telegram'
+    storage_key = str(file_info.get('storage_key') or file_info.get('file_id') or '').strip()
+    storage_meta = file_info.get('storage_meta')
+    if isinstance(storage_meta, str):
+        storage_meta_json = storage_meta
+    else:
+        try:
+            storage_meta_json = json.dumps(storage_meta or {}, ensure_ascii=False, separators=(",", ":"))
+        except Exception:
+            storage_meta_json = "{}"
 
+    def _write(cursor) -> None:
         cursor.execute('''
             INSERT INTO file_storage (
                 encrypted_id, file_id, file_path, upload_time,
@@ -85,13 +87,13 @@ def save_file_info(encrypted_id: str, file_info: Dict[str, Any]) -> None:
             datetime.now().isoformat()
         ))
 
-        logger.info(f"文件信息已保存: {encrypted_id}")
+    run_write(_write)
+    logger.info(f"文件信息已保存: {encrypted_id}")
 
 
 def update_file_path_in_db(encrypted_id: str, new_file_path: str) -> None:
     """更新数据库中的文件路径"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
+    def _write(cursor) -> None:
         cursor.execute('''
             UPDATE file_storage
             SET file_path = ?, last_file_path_update = CURRENT_TIMESTAMP
@@ -99,11 +101,120 @@ def update_file_path_in_db(encrypted_id: str, new_file_path: str) -> None:
         ''', (new_file_path, encrypted_id))
         logger.debug(f"更新file_path: {encrypted_id} -> {new_file_path}")
 
+    run_write(_write)
+
+
+def update_image_meta(
+    encrypted_id: str,
+    width: Optional[int],
+    height: Optional[int],
+    orientation: Optional[int] = None,
+    blurhash: Optional[str] = None,
+    phash: Optional[str] = None,
+) -> None:
+    """回写上传后解析出的图片元数据（经单写线程提交）"""
+    def _write(cursor) -> None:
+        cursor.execute('''
+            UPDATE file_storage
+            SET width = ?, height = ?, orientation = ?, blurhash = ?, phash = ?
+            WHERE encrypted_id = ?
+        ''', (width, height, orientation, blurhash, phash, encrypted_id))
+
+    run_write(_write)
+
+
+def list_pending_writebacks(limit: int = 500, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    列出仍停留在写回暂存区的文件（重启后重建写回队列用）
+
+    按 (upload_time, rowid) 升序键集分页：以 next_cursor(rows, limit, ('upload_time', 'rowid'))
+    生成的游标继续读取下一页。
+    """
+    condition, params = keyset_condition(('upload_time', 'rowid'), cursor, descending=False)
+    with get_read_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'''
+            SELECT rowid, encrypted_id, upload_time, storage_meta FROM file_storage
+            WHERE storage_backend = 'pending' {'AND ' + condition if condition else ''}
+            ORDER BY upload_time, rowid
+            LIMIT ?
+        ''', (*params, limit))
+        return [dict(row) for row in cur.fetchall()]
+
+
 @db_retry(max_attempts=3, base_delay=0.1, max_delay=2.0)
-def update_cdn_cache_status(encrypted_id: str, cached: bool) -> None:
-    """更新CDN缓存状态（带重试）"""
+def update_pending_storage_meta(encrypted_id: str, storage_meta: Dict[str, Any]) -> None:
+    """更新暂存文件的写回状态（重试次数、下次重试时间等）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE file_storage SET storage_meta = ?
+            WHERE encrypted_id = ? AND storage_backend = 'pending'
+        ''', (json.dumps(storage_meta, ensure_ascii=False, separators=(",", ":")), encrypted_id))
+
+
+@db_retry(max_attempts=3, base_delay=0.1, max_delay=2.0)
+def complete_pending_writeback(encrypted_id: str, fields: Dict[str, Any]) -> bool:
+    """
+    写回完成后把记录切换到目标后端
+
+    仅当记录仍处于 pending 状态时更新；返回 False 表示记录已被删除或已切换。
+    """
+    allowed = (
+        'file_id', 'file_path', 'storage_backend', 'storage_key', 'storage_meta',
+        'group_message_id', 'group_chat_id',
+    )
+    updates = {k: v for k, v in fields.items() if k in allowed}
+    if isinstance(updates.get('storage_meta'), dict):
+        updates['storage_meta'] = json.dumps(updates['storage_meta'], ensure_ascii=False, separators=(",", ":"))
+    assignments = ', '.join(f'{k} = ?' for k in updates)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE file_storage SET {assignments}, last_file_path_update = CURRENT_TIMESTAMP "
+            "WHERE encrypted_id = ? AND storage_backend = 'pending'",
+            (*updates.values(), encrypted_id)
+        )
+        return cursor.rowcount > 0
+
+
+def swap_file_storage_location(encrypted_id: str, expected_backend: str, expected_key: str,
+                               fields: Dict[str, Any], *,
+                               tombstone: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    把记录切换到新的存储位置（后端迁移使用）
+
+    以原 storage_backend/storage_key 作为比较条件原子更新；返回 False 表示
+    记录已被删除或已被其它流程改动，调用方应清理新写入的对象。
+    给出 tombstone（原位置的文件记录）时在同一事务内登记删除队列，
+    由后台 GC 删除旧对象与旧 TG 消息（不清除 CDN 缓存）。
+    """
+    allowed = (
+        'file_id', 'file_path', 'storage_backend', 'storage_key', 'storage_meta',
+        'group_message_id', 'group_chat_id', 'file_hash',
+    )
+    updates = {k: v for k, v in fields.items() if k in allowed}
+    if isinstance(updates.get('storage_meta'), dict):
+        updates['storage_meta'] = json.dumps(updates['storage_meta'], ensure_ascii=False, separators=(",", ":"))
+    assignments = ', '.join(f'{k} = ?' for k in updates)
     with get_connection() as conn:
         cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE file_storage SET {assignments}, last_file_path_update = CURRENT_TIMESTAMP "
+            "WHERE encrypted_id = ? AND COALESCE(NULLIF(storage_backend, ''), 'telegram') = ? "
+            "AND COALESCE(storage_key, '') = ?",
+            (*updates.values(), encrypted_id, expected_backend, expected_key or '')
+        )
+        if cursor.rowcount <= 0:
+            return False
+        if tombstone:
+            enqueue_file_deletions(cursor, [tombstone], purge_cdn=False)
+        return True
+
+
+def update_cdn_cache_status(encrypted_id: str, cached: bool) -> None:
+    """更新CDN缓存状态（经单写线程提交）"""
+    def _write(cursor) -> None:
         cursor.execute('''
             UPDATE file_storage
             SET cdn_cached = ?, cdn_cache_time = CURRENT_TIMESTAMP
@@ -111,16 +222,17 @@ def update_cdn_cache_status(encrypted_id: str, cached: bool) -> None:
         ''', (1 if cached else 0, encrypted_id))
         logger.info(f"更新CDN缓存状态: {encrypted_id} -> {'已缓存' if cached else '未缓存'}")
 
+    run_write(_write)
+
 
 def update_access_count(encrypted_id: str, access_type: str = 'direct_access') -> None:
-    """更新访问计数
+    """更新访问计数（异步写入，不阻塞图片响应；失败只记录日志）
 
     Args:
         encrypted_id: 加密的文件ID
         access_type: 访问类型 ('cdn_pull' 或 'direct_access')
     """
-    with get_connection() as conn:
-        cursor = conn.cursor()
+    def _write(cursor) -> None:
         cdn_inc = 1 if access_type == 'cdn_pull' else 0
         direct_inc = 1 if access_type == 'direct_access' else 0
         try:
@@ -144,6 +256,8 @@ def update_access_count(encrypted_id: str, access_type: str = 'direct_access') -
             else:
                 raise
 
+    enqueue_write(_write)
+
 
 def delete_files_by_ids(encrypted_ids: List[str]) -> tuple:
     """批量删除文件记录"""
@@ -170,85 +284,55 @@ def delete_files_by_ids(encrypted_ids: List[str]) -> tuple:
 
 # ===================== 统计查询（admin_module.py 兼容） =====================
 def get_all_files_count() -> int:
-    """获取所有文件数量（admin_module.py 兼容接口）"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM file_storage')
-        return cursor.fetchone()[0]
+    """获取所有文件数量（admin_module.py 兼容接口，读取触发器维护的用量计数）"""
+    return get_usage_totals()['file_count']
 
 
 def get_total_size() -> int:
-    """获取所有文件总大小（admin_module.py 兼容接口）"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT COALESCE(SUM(file_size), 0) FROM file_storage')
-        return cursor.fetchone()[0]
+    """获取所有文件总大小（admin_module.py 兼容接口，读取触发器维护的用量计数）"""
+    return get_usage_totals()['total_bytes']
 
 
 def get_stats() -> Dict[str, Any]:
-    """获取完整统计信息"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        # 获取总文件数和大小
-        cursor.execute('SELECT COUNT(*), COALESCE(SUM(file_size), 0) FROM file_storage')
-        total_files, total_size = cursor.fetchone()
-
-        # 获取今日上传数
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_timestamp = int(today_start.timestamp())
-        cursor.execute(
-            'SELECT COUNT(*) FROM file_storage WHERE upload_time >= ?',
-            (today_timestamp,)
-        )
-        today_uploads = cursor.fetchone()[0]
-
-        # 获取CDN缓存的文件数
-        cursor.execute('SELECT COUNT(*) FROM file_storage WHERE cdn_cached = 1')
-        cached_files = cursor.fetchone()[0]
-
-        # 获取待缓存数
-        cursor.execute(
-            'SELECT COUNT(*) FROM file_storage WHERE cdn_cached = 0 AND cdn_url IS NOT NULL'
-        )
-        pending_cache = cursor.fetchone()[0]
-
-        # 获取群组上传数
-        cursor.execute('SELECT COUNT(*) FROM file_storage WHERE is_group_upload = 1')
-        group_uploads = cursor.fetchone()[0]
-
-        return {
-            'total_files': total_files,
-            'total_size': total_size,
-            'today_uploads': today_uploads,
-            'group_uploads': group_uploads,
-            'cdn_stats': {
-                'cached_files': cached_files,
-                'pending_cache': pending_cache,
-                'monitor_queue_size': 0  # 由 cdn_service 更新
-            }
+    """获取完整统计信息（读取触发器维护的物化统计，不扫描 file_storage）"""
+    usage = get_usage_totals()
+    site = get_site_stats()
+
+    return {
+        'total_files': usage['file_count'],
+        'total_size': usage['total_bytes'],
+        'today_uploads': get_uploads_on()['uploads'],
+        'group_uploads': site.get('group_uploads', 0),
+        'cdn_stats': {
+            'cached_files': site.get('cdn_cached', 0),
+            'pending_cache': site.get('cdn_pending', 0),
+            'monitor_queue_size': 0  # 由 cdn_service 更新
         }
+    }
 
 
-def get_recent_uploads(limit: int = 10, page: int = 1) -> List[Dict[str, Any]]:
-    """获取最近上传的文件"""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        offset = (page - 1) * limit
+def get_recent_uploads(limit: int = 10, page: int = 1, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """获取最近上传的文件；传入 cursor 时按键集分页（忽略 page）"""
+    keyset, params = keyset_condition(('created_at', 'encrypted_id'), cursor)
+    with get_read_connection() as conn:
+        db_cursor = conn.cursor()
+        offset = 0 if cursor else (page - 1) * limit
 
-        cursor.execute('''
+        db_cursor.execute(f'''
             SELECT encrypted_id, original_filename, file_size,
-                   created_at, username, cdn_cached, is_group_upload
+                   created_at, username, cdn_cached, is_group_upload,
+                   width, height, blurhash
             FROM file_storage
-            ORDER BY created_at DESC
+            {'WHERE ' + keyset if keyset else ''}
+            ORDER BY created_at DESC, encrypted_id DESC
             LIMIT ? OFFSET ?
-        ''', (limit, offset))
+        ''', (*params, limit, offset))
 
-        return [dict(row) for row in cursor.fetchall()]
+        return [dict(row) for row in db_cursor.fetchall()]
 
 def get_uncached_files(since_timestamp: int, limit: int = 100) -> List[Dict[str, Any]]:
     """获取未缓存的文件（用于恢复CDN监控任务）"""
-    with get_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT encrypted_id, upload_time FROM file_storage
@@ -266,7 +350,8 @@ def get_user_uploads(
     *,
     tg_user_id: Optional[int] = None,
     limit: int = 10,
-    page: int = 1
+    page: int = 1,
+    cursor: Optional[str] = None
 ) -> tuple:
     """获取指定用户的上传记录（分页）
 
@@ -275,50 +360,53 @@ def get_user_uploads(
         tg_user_id: TG 用户 ID（优先使用）
         limit: 每页数量
         page: 页码（从1开始）
+        cursor: 键集分页游标（传入时忽略 page）
 
     Returns:
         (files_list, total_count) 元组
     """
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        offset = (page - 1) * limit
+    keyset, params = keyset_condition(('created_at', 'encrypted_id'), cursor)
+    keyset = f'AND {keyset}' if keyset else ''
+    offset = 0 if cursor else (page - 1) * limit
+    files: List[Dict[str, Any]] = []
+    total = 0
 
-        files: List[Dict[str, Any]] = []
-        total = 0
+    # 按 TG 用户计数直接读取存储用量计数表
+    if tg_user_id is not None:
+        total = get_tg_user_usage(tg_user_id)['file_count']
 
-        if tg_user_id is not None:
-            cursor.execute(
-                'SELECT COUNT(*) FROM file_storage WHERE tg_user_id = ?',
-                (tg_user_id,)
-            )
-            total = int(cursor.fetchone()[0] or 0)
-            if total > 0:
-                cursor.execute('''
-                    SELECT encrypted_id, original_filename, file_size,
-                           created_at, username, mime_type, tg_user_id
-                    FROM file_storage
-                    WHERE tg_user_id = ?
-                    ORDER BY created_at DESC
-                    LIMIT ? OFFSET ?
-                ''', (tg_user_id, limit, offset))
-                files = [dict(row) for row in cursor.fetchall()]
+    with get_read_connection() as conn:
+        db_cursor = conn.cursor()
+
+        if total > 0:
+            db_cursor.execute(f'''
+                SELECT encrypted_id, original_filename, file_size,
+                       created_at, username, mime_type, tg_user_id,
+                       width, height, blurhash
+                FROM file_storage
+                WHERE tg_user_id = ? {keyset}
+                ORDER BY created_at DESC, encrypted_id DESC
+                LIMIT ? OFFSET ?
+            ''', (tg_user_id, *params, limit, offset))
+            files = [dict(row) for row in db_cursor.fetchall()]
 
         # 兼容历史记录（旧数据仅按 username 存储）
         if total == 0 and username:
-            cursor.execute(
+            db_cursor.execute(
                 'SELECT COUNT(*) FROM file_storage WHERE username = ?',
                 (username,)
             )
-            total = int(cursor.fetchone()[0] or 0)
-            cursor.execute('''
+            total = int(db_cursor.fetchone()[0] or 0)
+            db_cursor.execute(f'''
                 SELECT encrypted_id, original_filename, file_size,
-                       created_at, username, mime_type, tg_user_id
+                       created_at, username, mime_type, tg_user_id,
+                       width, height, blurhash
                 FROM file_storage
-                WHERE username = ?
-                ORDER BY created_at DESC
+                WHERE username = ? {keyset}
+                ORDER BY created_at DESC, encrypted_id DESC
                 LIMIT ? OFFSET ?
-            ''', (username, limit, offset))
-            files = [dict(row) for row in cursor.fetchall()]
+            ''', (username, *params, limit, offset))
+            files = [dict(row) for row in db_cursor.fetchall()]
 
         return files, total
 
@@ -328,62 +416,55 @@ def get_cdn_dashboard_stats(window_hours: Optional[int] = None) -> Dict[str, Any
     CDN 仪表盘统计
     注意：无法从源站精确推断 Cloudflare 边缘 HIT 率，边缘命中不会到达源站
     """
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        # 文件缓存统计
-        cursor.execute("SELECT COUNT(*) FROM file_storage")
-        total_files = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM file_storage WHERE cdn_cached = 1")
-        cached_files = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM file_storage WHERE cdn_cached = 0 OR cdn_cached IS NULL")
-        uncached_files = cursor.fetchone()[0]
-
-        # 访问统计（可选时间窗口）
-        where = ""
-        params: List[Any] = []
-        if window_hours is not None:
-            hours = int(window_hours)
-            where = "WHERE last_accessed IS NOT NULL AND last_accessed >= datetime('now', ?)"
-            params = [f"-{hours} hours"]
-
-        cursor.execute(
-            f"""
-            SELECT
-              COALESCE(SUM(access_count), 0),
-              COALESCE(SUM(cdn_hit_count), 0),
-              COALESCE(SUM(direct_hit_count), 0)
-            FROM file_storage
-            {where}
-            """,
-            params
-        )
-        row = cursor.fetchone()
+    # 文件缓存统计（物化统计）
+    total_files = get_usage_totals()['file_count']
+    site = get_site_stats()
+    cached_files = site.get('cdn_cached', 0)
+    uncached_files = site.get('cdn_uncached', 0)
+
+    if window_hours is None:
+        access_total = site.get('access_total', 0)
+        cdn_origin_requests = site.get('cdn_hits', 0)
+        direct_origin_requests = site.get('direct_hits', 0)
+    else:
+        # 时间窗口内的访问统计仍需按 last_accessed 聚合
+        with get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT
+                  COALESCE(SUM(access_count), 0),
+                  COALESCE(SUM(cdn_hit_count), 0),
+                  COALESCE(SUM(direct_hit_count), 0)
+                FROM file_storage
+                WHERE last_accessed IS NOT NULL AND last_accessed >= datetime('now', ?)
+                """,
+                [f"-{int(window_hours)} hours"]
+            )
+            row = cursor.fetchone()
         access_total = int(row[0] or 0)
         cdn_origin_requests = int(row[1] or 0)
         direct_origin_requests = int(row[2] or 0)
 
-        origin_total = cdn_origin_requests + direct_origin_requests
-        direct_share = (direct_origin_requests / origin_total) if origin_total else 0.0
-        cdn_origin_share = (cdn_origin_requests / origin_total) if origin_total else 0.0
-
-        return {
-            "files": {
-                "total": total_files,
-                "cached": cached_files,
-                "uncached": uncached_files,
-                "cache_rate": (cached_files / total_files) if total_files else 0.0,
-            },
-            "origin_requests": {
-                "window_hours": window_hours,
-                "total_access_count": access_total,
-                "origin_total": origin_total,
-                "cdn_origin_requests": cdn_origin_requests,
-                "direct_origin_requests": direct_origin_requests,
-                "cdn_origin_share": cdn_origin_share,
-                "direct_origin_share": direct_share,
-                "note": "Edge HITs do not reach origin; use Cloudflare analytics for real hit rate.",
-            },
-        }
+    origin_total = cdn_origin_requests + direct_origin_requests
+    direct_share = (direct_origin_requests / origin_total) if origin_total else 0.0
+    cdn_origin_share = (cdn_origin_requests / origin_total) if origin_total else 0.0
+
+    return {
+        "files": {
+            "total": total_files,
+            "cached": cached_files,
+            "uncached": uncached_files,
+            "cache_rate": (cached_files / total_files) if total_files else 0.0,
+        },
+        "origin_requests": {
+            "window_hours": window_hours,
+            "total_access_count": access_total,
+            "origin_total": origin_total,
+            "cdn_origin_requests": cdn_origin_requests,
+            "direct_origin_requests": direct_origin_requests,
+            "cdn_origin_share": cdn_origin_share,
+            "direct_origin_share": direct_share,
+            "note": "Edge HITs do not reach origin; use Cloudflare analytics for real hit rate.",
+        },
+    }
@@ -6,8 +6,9 @@ import secrets
 from typing import Optional, Dict, Any, List
 
 from ..config import logger
-from .connection import get_connection
+from .connection import get_connection, get_read_connection
 from .tokens import _parse_datetime
+from .pagination import decode_cursor, keyset_condition, next_cursor
 
 
 # ===================== 画集 CRUD =====================
@@ -76,12 +77,7 @@ def list_galleries(owner_token: str, page: int = 1, limit: int = 50) -> Dict[str
             # 注意：使用 resolved_cover_image 避免与 g.* 中的 cover_image 列名冲突
             cursor.execute('''
                 SELECT g.*,
-                    (SELECT COUNT(*) FROM gallery_images gi WHERE gi.gallery_id = g.id) AS image_count,
-                    COALESCE(g.cover_image, (
-                        SELECT fs.encrypted_id FROM gallery_images gi2
-                        JOIN file_storage fs ON gi2.encrypted_id = fs.encrypted_id
-                        WHERE gi2.gallery_id = g.id ORDER BY gi2.added_at ASC LIMIT 1
-                    )) AS resolved_cover_image
+                    COALESCE(g.cover_image, g.resolved_cover) AS resolved_cover_image
                 FROM galleries g
                 WHERE g.owner_token = ?
                 ORDER BY g.updated_at DESC
@@ -287,39 +283,54 @@ def remove_images_from_gallery(gallery_id: int, owner_token: str, encrypted_ids:
         return 0
 
 
-def get_gallery_images(gallery_id: int, owner_token: Optional[str] = None, page: int = 1, limit: int = 50) -> Dict[str, Any]:
-    """获取画集内的图片"""
+def _list_gallery_images(cursor, gallery_id: int, page: int, limit: int,
+                         after: Optional[str] = None) -> Dict[str, Any]:
+    """按加入时间倒序分页读取画集图片；after 为键集游标（传入时忽略 page），总数取自 galleries.image_count"""
+    keyset, params = keyset_condition(('gi.added_at', 'gi.encrypted_id'), after)
+    cursor.execute('SELECT image_count FROM galleries WHERE id = ?', (gallery_id,))
+    row = cursor.fetchone()
+    total = int(row[0]) if row else 0
+    offset = 0 if after else (page - 1) * limit
+    cursor.execute(f'''
+        SELECT fs.encrypted_id, fs.original_filename, fs.file_size, fs.created_at,
+               fs.cdn_cached, fs.cdn_url, fs.mime_type,
+               fs.width, fs.height, fs.blurhash, gi.added_at
+        FROM gallery_images gi
+        JOIN file_storage fs ON gi.encrypted_id = fs.encrypted_id
+        WHERE gi.gallery_id = ? {'AND ' + keyset if keyset else ''}
+        ORDER BY gi.added_at DESC, gi.encrypted_id DESC
+        LIMIT ? OFFSET ?
+    ''', (gallery_id, *params, limit, offset))
+    items = [dict(r) for r in cursor.fetchall()]
+    return {
+        'items': items, 'total': total, 'page': page, 'limit': limit,
+        'next_cursor': next_cursor(items, limit, ('added_at', 'encrypted_id')),
+    }
+
+
+def get_gallery_images(gallery_id: int, owner_token: Optional[str] = None, page: int = 1, limit: int = 50,
+                       cursor: Optional[str] = None) -> Dict[str, Any]:
+    """获取画集内的图片（cursor 格式错误时抛出 ValueError）"""
+    if cursor:
+        decode_cursor(cursor)
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
+        with get_read_connection() as conn:
+            db_cursor = conn.cursor()
             if owner_token:
-                cursor.execute('SELECT id FROM galleries WHERE id = ? AND owner_token = ?', (gallery_id, owner_token))
+                db_cursor.execute('SELECT id FROM galleries WHERE id = ? AND owner_token = ?', (gallery_id, owner_token))
             else:
-                cursor.execute('''
+                db_cursor.execute('''
                     SELECT id FROM galleries
                     WHERE id = ? AND share_enabled = 1
                     AND (share_expires_at IS NULL OR share_expires_at > CURRENT_TIMESTAMP)
                 ''', (gallery_id,))
-            row = cursor.fetchone()
+            row = db_cursor.fetchone()
             if not row:
-                return {'items': [], 'total': 0, 'page': page, 'limit': limit}
-            offset = (page - 1) * limit
-            cursor.execute('SELECT COUNT(*) FROM gallery_images WHERE gallery_id = ?', (gallery_id,))
-            total = cursor.fetchone()[0]
-            cursor.execute('''
-                SELECT fs.encrypted_id, fs.original_filename, fs.file_size, fs.created_at,
-                       fs.cdn_cached, fs.cdn_url, fs.mime_type, gi.added_at
-                FROM gallery_images gi
-                JOIN file_storage fs ON gi.encrypted_id = fs.encrypted_id
-                WHERE gi.gallery_id = ?
-                ORDER BY gi.added_at DESC
-                LIMIT ? OFFSET ?
-            ''', (gallery_id, limit, offset))
-            items = [dict(r) for r in cursor.fetchall()]
-            return {'items': items, 'total': total, 'page': page, 'limit': limit}
+                return {'items': [], 'total': 0, 'page': page, 'limit': limit, 'next_cursor': None}
+            return _list_gallery_images(db_cursor, gallery_id, page, limit, cursor)
     except Exception as e:
         logger.error(f"获取画集图片失败: {e}")
-        return {'items': [], 'total': 0, 'page': page, 'limit': limit}
+        return {'items': [], 'total': 0, 'page': page, 'limit': limit, 'next_cursor': None}
 
 # ===================== 分享 =====================
 def update_gallery_share(gallery_id: int, owner_token: str, enabled: bool, expires_at: Optional[str] = None) -> Optional[Dict[str, Any]]:
@@ -420,57 +431,55 @@ def create_or_update_share_all_link(enabled: bool = True, expires_at: Optional[s
         return None
 
 
-def get_share_all_galleries(share_token: str, page: int = 1, limit: int = 50) -> Optional[Dict[str, Any]]:
-    """通过全部分享链接获取画集列表（自动包含所有画集，排除隐藏和仅管理员可见的）"""
+def get_share_all_galleries(share_token: str, page: int = 1, limit: int = 50,
+                            cursor: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """通过全部分享链接获取画集列表（自动包含所有画集，排除隐藏和仅管理员可见的；cursor 格式错误时抛出 ValueError）"""
     page = max(1, int(page or 1))
     limit = max(1, min(100, int(limit or 50)))
+    keyset, params = keyset_condition(('g.updated_at', 'g.id'), cursor)
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
+        with get_read_connection() as conn:
+            db_cursor = conn.cursor()
             # 验证分享链接
-            cursor.execute('''
+            db_cursor.execute('''
                 SELECT * FROM share_all_links
                 WHERE share_token = ? AND enabled = 1
                 AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
             ''', (share_token,))
-            if not cursor.fetchone():
+            if not db_cursor.fetchone():
                 return None
 
-            offset = (page - 1) * limit
+            offset = 0 if cursor else (page - 1) * limit
             # 获取画集列表，所有画集都返回封面（优先手动设置，否则用第一张图）
-            cursor.execute('''
+            db_cursor.execute(f'''
                 SELECT g.id, g.name, g.description, g.share_token, g.access_mode,
                        g.created_at, g.updated_at,
-                       (SELECT COUNT(*) FROM gallery_images WHERE gallery_id = g.id) as image_count,
-                       COALESCE(g.cover_image, (
-                           SELECT fs.encrypted_id
-                           FROM gallery_images gi2
-                           JOIN file_storage fs ON gi2.encrypted_id = fs.encrypted_id
-                           WHERE gi2.gallery_id = g.id
-                           ORDER BY gi2.added_at ASC
-                           LIMIT 1
-                       )) AS cover_image
+                       g.image_count,
+                       COALESCE(g.cover_image, g.resolved_cover) AS cover_image
                 FROM galleries g
                 WHERE g.hide_from_share_all = 0
                 AND g.access_mode != 'admin_only'
-                ORDER BY g.updated_at DESC
+                {'AND ' + keyset if keyset else ''}
+                ORDER BY g.updated_at DESC, g.id DESC
                 LIMIT ? OFFSET ?
-            ''', (limit, offset))
-            items = [dict(row) for row in cursor.fetchall()]
+            ''', (*params, limit, offset))
+            items = [dict(row) for row in db_cursor.fetchall()]
 
             # 获取总数
-            cursor.execute('''
+            db_cursor.execute('''
                 SELECT COUNT(*) FROM galleries
                 WHERE hide_from_share_all = 0 AND access_mode != 'admin_only'
             ''')
-            total = cursor.fetchone()[0]
+            total = db_cursor.fetchone()[0]
 
+            next_page = next_cursor(items, limit, ('updated_at', 'id'))
             return {
                 'items': items,
                 'total': total,
                 'page': page,
                 'limit': limit,
-                'has_more': page * limit < total
+                'has_more': next_page is not None if cursor else page * limit < total,
+                'next_cursor': next_page,
             }
     except Exception as e:
         logger.error(f"获取全部分享画集列表失败: {e}")
@@ -490,7 +499,7 @@ def _validate_share_all_token(cursor, share_token: str) -> bool:
 def get_share_all_gallery(share_token: str, gallery_id: int) -> Optional[Dict[str, Any]]:
     """在全部分享上下文中获取单个画集信息（不含图片）"""
     try:
-        with get_connection() as conn:
+        with get_read_connection() as conn:
             cursor = conn.cursor()
             if not _validate_share_all_token(cursor, share_token):
                 return None
@@ -500,7 +509,7 @@ def get_share_all_gallery(share_token: str, gallery_id: int) -> Optional[Dict[st
                        g.hide_from_share_all, g.created_at, g.updated_at,
                        g.layout_mode, g.theme_color, g.show_image_info,
                        g.allow_download, g.sort_order, g.nsfw_warning, g.custom_header_text,
-                       (SELECT COUNT(*) FROM gallery_images WHERE gallery_id = g.id) AS image_count
+                       g.image_count
                 FROM galleries g
                 WHERE g.id = ?
                   AND g.hide_from_share_all = 0
@@ -518,43 +527,32 @@ def get_share_all_gallery_images(
     share_token: str,
     gallery_id: int,
     page: int = 1,
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None
 ) -> Optional[Dict[str, Any]]:
-    """在全部分享上下文中获取画集图片（不检查解锁 cookie，由 API 层处理）"""
+    """在全部分享上下文中获取画集图片（不检查解锁 cookie，由 API 层处理；cursor 格式错误时抛出 ValueError）"""
     page = max(1, int(page or 1))
     limit = max(1, min(200, int(limit or 50)))
+    if cursor:
+        decode_cursor(cursor)
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            if not _validate_share_all_token(cursor, share_token):
+        with get_read_connection() as conn:
+            db_cursor = conn.cursor()
+            if not _validate_share_all_token(db_cursor, share_token):
                 return None
 
             # 确保画集在 share-all 中可见
-            cursor.execute('''
+            db_cursor.execute('''
                 SELECT 1 FROM galleries
                 WHERE id = ?
                   AND hide_from_share_all = 0
                   AND access_mode != 'admin_only'
                 LIMIT 1
             ''', (gallery_id,))
-            if not cursor.fetchone():
+            if not db_cursor.fetchone():
                 return None
 
-            offset = (page - 1) * limit
-            cursor.execute('SELECT COUNT(*) FROM gallery_images WHERE gallery_id = ?', (gallery_id,))
-            total = cursor.fetchone()[0]
-
-            cursor.execute('''
-                SELECT fs.encrypted_id, fs.original_filename, fs.file_size, fs.created_at,
-                       fs.cdn_cached, fs.cdn_url, fs.mime_type, gi.added_at
-                FROM gallery_images gi
-                JOIN file_storage fs ON gi.encrypted_id = fs.encrypted_id
-                WHERE gi.gallery_id = ?
-                ORDER BY gi.added_at DESC
-                LIMIT ? OFFSET ?
-            ''', (gallery_id, limit, offset))
-            items = [dict(r) for r in cursor.fetchall()]
-            return {'items': items, 'total': total, 'page': page, 'limit': limit}
+            return _list_gallery_images(db_cursor, gallery_id, page, limit, cursor)
     except Exception as e:
         logger.error(f"Share-all 获取画集图片失败: {e}")
         return None
@@ -79,15 +79,8 @@ def _gallery_base_query(where_clause: str = '') -> str:
             g.editor_pick_weight,
             g.created_at,
             g.updated_at,
-            (SELECT COUNT(*) FROM gallery_images gi WHERE gi.gallery_id = g.id) AS image_count,
-            COALESCE(g.cover_image, (
-                SELECT fs.encrypted_id
-                FROM gallery_images gi2
-                JOIN file_storage fs ON gi2.encrypted_id = fs.encrypted_id
-                WHERE gi2.gallery_id = g.id
-                ORDER BY gi2.added_at ASC
-                LIMIT 1
-            )) AS cover_image
+            g.image_count,
+            COALESCE(g.cover_image, g.resolved_cover) AS cover_image
         FROM galleries g
         WHERE g.share_enabled = 1
           AND g.access_mode = 'public'
@@ -185,15 +178,8 @@ def list_gallery_home_sections(include_items: bool = False) -> List[Dict[str, An
                         g.access_mode,
                         COALESCE(g.homepage_expose_enabled, 1) AS homepage_expose_enabled,
                         g.updated_at,
-                        (SELECT COUNT(*) FROM gallery_images gi WHERE gi.gallery_id = g.id) AS image_count,
-                        COALESCE(g.cover_image, (
-                            SELECT fs.encrypted_id
-                            FROM gallery_images gi2
-                            JOIN file_storage fs ON gi2.encrypted_id = fs.encrypted_id
-                            WHERE gi2.gallery_id = g.id
-                            ORDER BY gi2.added_at ASC
-                            LIMIT 1
-                        )) AS cover_image
+                        g.image_count,
+                        COALESCE(g.cover_image, g.resolved_cover) AS cover_image
                     FROM gallery_home_section_items si
                     JOIN galleries g ON g.id = si.gallery_id
                     WHERE si.section_id = ?
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+键集（游标）分页工具
+
+游标为 urlsafe base64 编码的 JSON 数组，内容是上一页最后一行的排序键
+（如 [created_at, encrypted_id]），对调用方不透明。查询以行值比较
+`(排序列, 唯一列) < (?, ?)` 定位下一页，配合同序复合索引，深翻页代价与页码无关。
+排序列可为 NULL 时应以 COALESCE(列, 哨兵值) 作为排序列（并建同样的表达式索引），
+否则行值比较会跳过 NULL 行，游标在 NULL 处提前结束。
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def encode_cursor(*values: Any) -> str:
+    """把排序键编码为不透明游标"""
+    raw = json.dumps(list(values), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int = 2) -> Tuple[Any, ...]:
+    """
+    解码游标
+
+    Raises:
+        ValueError: 游标格式错误或键数量不符
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError('无效的分页游标')
+    if not isinstance(values, list) or len(values) != size or any(v is None for v in values):
+        raise ValueError('无效的分页游标')
+    return tuple(values)
+
+
+def keyset_condition(columns: Sequence[str], cursor: Optional[str], *,
+                     descending: bool = True) -> Tuple[str, List[Any]]:
+    """
+    生成游标定位条件
+
+    Args:
+        columns: 排序列（最后一列须唯一，作为并列值的决胜列）
+        cursor: 上一页返回的 next_cursor；为空时返回空条件
+        descending: 是否降序
+
+    Returns:
+        (SQL 片段, 参数)，片段不含前导 AND/WHERE
+    """
+    if not cursor:
+        return '', []
+    values = decode_cursor(cursor, len(columns))
+    op = '<' if descending else '>'
+    placeholders = ', '.join('?' for _ in columns)
+    # 首列单独再加一个范围条件：行值比较不能用于表达式索引（如 COALESCE(col, 0)）的范围查找
+    return (f"{columns[0]} {op}= ? AND ({', '.join(columns)}) {op} ({placeholders})",
+            [values[0], *values])
+
+
+def next_cursor(rows: Sequence[Dict[str, Any]], limit: int, keys: Sequence[str]) -> Optional[str]:
+    """本页取满时以最后一行的排序键生成下一页游标，否则返回 None"""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    if any(last.get(key) is None for key in keys):
+        return None
+    return encode_cursor(*(last[key] for key in keys))
+
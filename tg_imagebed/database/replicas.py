@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件副本（镜像）数据访问层
+
+状态流转：pending → ok / failed；主记录被删除时由触发器标记为 orphaned，
+由后台把远端对象登记到删除队列后删除记录。
+
+role 区分镜像策略的持久副本（mirror）与冷热分层的热层副本（hot），
+热层副本直接以 ok 状态登记，超出容量预算时由分层服务淘汰。
+"""
+import json
+import time
+from typing import Optional, Dict, Any, List
+
+from ..config import logger
+from .connection import get_connection, db_retry
+from .deletions import enqueue_file_deletions
+
+
+def _row_to_replica(row) -> Dict[str, Any]:
+    data = dict(row)
+    try:
+        data['storage_meta'] = json.loads(data.get('storage_meta') or '{}') or {}
+    except Exception:
+        data['storage_meta'] = {}
+    return data
+
+
+@db_retry()
+def create_replica_tasks(encrypted_id: str, backends: List[str]) -> int:
+    """为文件登记待复制的副本（已存在的副本忽略），返回新增数量"""
+    if not backends:
+        return 0
+    now = int(time.time())
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        created = 0
+        for name in backends:
+            cursor.execute('''
+                INSERT OR IGNORE INTO file_replicas (
+                    encrypted_id, storage_backend, status, attempts, created_at, updated_at
+                ) VALUES (?, ?, 'pending', 0, ?, ?)
+            ''', (encrypted_id, name, now, now))
+            created += cursor.rowcount
+            # 已有热层副本的后端直接转为持久镜像，不再参与淘汰
+            cursor.execute('''
+                UPDATE file_replicas SET role = 'mirror', updated_at = ?
+                WHERE encrypted_id = ? AND storage_backend = ? AND role = 'hot'
+            ''', (now, encrypted_id, name))
+        return created
+
+
+@db_retry()
+def complete_replica(encrypted_id: str, backend: str, *, file_id: str, file_path: str,
+                     storage_key: str, storage_meta: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    副本写入成功后登记（仅 pending 状态可完成）
+
+    Returns:
+        False 表示主记录已在复制期间被删除，调用方应清理刚写入的远端对象
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE file_replicas
+            SET status = 'ok', file_id = ?, file_path = ?, storage_key = ?, storage_meta = ?,
+                last_error = NULL, updated_at = ?
+            WHERE encrypted_id = ? AND storage_backend = ? AND status = 'pending'
+        ''', (file_id, file_path, storage_key,
+              json.dumps(storage_meta or {}, ensure_ascii=False, separators=(",", ":")),
+              int(time.time()), encrypted_id, backend))
+        return cursor.rowcount > 0
+
+
+@db_retry()
+def fail_replica(encrypted_id: str, backend: str, error: str, give_up: bool = False) -> None:
+    """记录一次复制失败；give_up 时标记为 failed 不再重试"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE file_replicas
+            SET attempts = attempts + 1, last_error = ?, updated_at = ?,
+                status = CASE WHEN ? THEN 'failed' ELSE status END
+            WHERE encrypted_id = ? AND storage_backend = ? AND status = 'pending'
+        ''', ((error or '')[:500], int(time.time()), 1 if give_up else 0, encrypted_id, backend))
+
+
+def get_file_replicas(encrypted_id: str, status: str = 'ok') -> List[Dict[str, Any]]:
+    """获取文件的副本列表"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM file_replicas
+                WHERE encrypted_id = ? AND status = ?
+                ORDER BY id
+            ''', (encrypted_id, status))
+            return [_row_to_replica(row) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"获取文件副本失败: {e}")
+        return []
+
+
+def list_replica_tasks(status: str, limit: int = 500) -> List[Dict[str, Any]]:
+    """按状态列出副本记录（后台复制/清理使用）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM file_replicas
+            WHERE status = ?
+            ORDER BY updated_at
+            LIMIT ?
+        ''', (status, int(limit)))
+        return [_row_to_replica(row) for row in cursor.fetchall()]
+
+
+def delete_replica(encrypted_id: str, backend: str, role: Optional[str] = None, *,
+                   queue_cleanup: bool = False) -> bool:
+    """
+    删除副本记录（指定 role 时仅删除该角色的副本）
+
+    Args:
+        queue_cleanup: 同一事务内把副本对象登记到删除队列，由删除 GC 清理
+                       （Telegram 副本没有 delete，需按 chat_id/message_id 删除消息）
+    """
+    where = 'encrypted_id = ? AND storage_backend = ?'
+    params: tuple = (encrypted_id, backend)
+    if role:
+        where += ' AND role = ?'
+        params += (role,)
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            if queue_cleanup:
+                cursor.execute(f'''
+                    SELECT encrypted_id, storage_backend, storage_key, storage_meta FROM file_replicas
+                    WHERE {where} AND storage_key IS NOT NULL AND storage_key != ''
+                ''', params)
+                enqueue_file_deletions(cursor, [dict(row) for row in cursor.fetchall()], purge_cdn=False)
+            cursor.execute(f'DELETE FROM file_replicas WHERE {where}', params)
+            return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"删除副本记录失败: {e}")
+        return False
+
+
+@db_retry()
+def add_hot_replica(encrypted_id: str, backend: str, *, file_id: str, file_path: str,
+                    storage_key: str, storage_meta: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    登记热层副本（直接为 ok 状态）
+
+    Returns:
+        False 表示主记录已被删除或该后端已有副本，调用方应清理刚写入的对象
+    """
+    now = int(time.time())
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR IGNORE INTO file_replicas (
+                encrypted_id, storage_backend, storage_key, file_id, file_path, storage_meta,
+                status, attempts, role, created_at, updated_at
+            )
+            SELECT ?, ?, ?, ?, ?, ?, 'ok', 0, 'hot', ?, ?
+            WHERE EXISTS (SELECT 1 FROM file_storage WHERE encrypted_id = ?)
+        ''', (encrypted_id, backend, storage_key, file_id, file_path,
+              json.dumps(storage_meta or {}, ensure_ascii=False, separators=(",", ":")),
+              now, now, encrypted_id))
+        return cursor.rowcount > 0
+
+
+def list_hot_replicas() -> List[Dict[str, Any]]:
+    """列出全部热层副本及对应文件的访问统计"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT r.encrypted_id, r.storage_backend, r.storage_key,
+                   COALESCE(f.file_size, 0) AS file_size,
+                   COALESCE(f.access_count, 0) AS access_count,
+                   CAST(strftime('%s', f.last_accessed) AS INTEGER) AS last_accessed_ts
+            FROM file_replicas r
+            JOIN file_storage f ON f.encrypted_id = r.encrypted_id
+            WHERE r.role = 'hot' AND r.status = 'ok'
+        ''')
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def list_tiering_candidates(hot_backend: str, min_access: int, max_size: int,
+                            within_days: int = 7, limit: int = 500) -> List[Dict[str, Any]]:
+    """
+    列出可晋升热层的文件：近期被访问、访问次数达标、尚无该后端副本
+
+    沿 last_accessed 索引从最近访问的文件倒序扫描，取满 limit 即停，
+    不再每轮全表按累计访问量排序；热度排序由 plan_tiering 在内存中完成。
+    主记录就在热层后端或仍在写回暂存区（pending）的文件不需要晋升。
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT f.encrypted_id, f.file_size, f.access_count,
+                   CAST(strftime('%s', f.last_accessed) AS INTEGER) AS last_accessed_ts
+            FROM file_storage f
+            WHERE f.last_accessed >= datetime('now', ?)
+              AND f.access_count >= ?
+              AND f.file_size BETWEEN 1 AND ?
+              AND COALESCE(NULLIF(f.storage_backend, ''), 'telegram') NOT IN (?, 'pending')
+              AND NOT EXISTS (
+                  SELECT 1 FROM file_replicas r
+                  WHERE r.encrypted_id = f.encrypted_id AND r.storage_backend = ?
+              )
+            ORDER BY f.last_accessed DESC
+            LIMIT ?
+        ''', (f'-{int(within_days)} days', int(min_access), int(max_size),
+              hot_backend, hot_backend, int(limit)))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def get_replica_stats() -> Dict[str, Dict[str, int]]:
+    """按后端、状态统计副本数量"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT storage_backend, status, COUNT(*) FROM file_replicas
+            GROUP BY storage_backend, status
+        ''')
+        stats: Dict[str, Dict[str, int]] = {}
+        for backend, status, count in cursor.fetchall():
+            stats.setdefault(backend, {})[status] = count
+        return stats
@@ -2,10 +2,11 @@
 # -*- coding: utf-8 -*-
 """系统设置 + 公告管理"""
 import json
+from datetime import date, timedelta
 from typing import Optional, Dict, Any, List
 
 from ..config import logger
-from .connection import get_connection
+from .connection import get_connection, get_read_connection
 
 
 # ===================== 公告管理 =====================
@@ -88,10 +89,48 @@ DEFAULT_SYSTEM_SETTINGS = {
     'daily_upload_limit': '0',  # 0=无限制
     'guest_token_max_upload_limit': '1000',
     'guest_token_max_expires_days': '365',
+    # 批量上传
+    'batch_upload_max_files': '50',          # 单次批量上传最多文件数
+    'batch_upload_max_total_mb': '500',      # 单次批量上传请求体上限（MB）
+    'batch_upload_concurrency': '4',         # 批量上传推送后端的并发数
+    # 分片续传
+    'upload_chunk_size_mb': '8',             # 建议分片大小（MB），单个分片不得超过 max_file_size_mb
+    'upload_session_ttl_hours': '24',        # 续传会话闲置多久后被回收
+    # 上传后处理
+    'image_strip_exif': '0',                 # 上传前剥离 EXIF/GPS（JPEG/PNG，保留方向）
+    'image_blurhash_enabled': '1',           # 计算 BlurHash 占位符（需安装 Pillow）
+    'image_meta_workers': '2',               # 元数据解析线程数
+    'phash_duplicate_warning': '0',          # 上传时提示近似重复图片（需安装 Pillow）
+    'phash_max_distance': '6',               # 近似判定的 dHash 汉明距离上限
     # 存储配置
     'storage_active_backend': 'telegram',
     'storage_config_json': '',
     'storage_upload_policy_json': '',
+    'storage_writeback_enabled': '0',        # 写回模式：先存本地暂存区立即返回，后台推送到目标后端
+    'storage_writeback_workers': '2',        # 写回推送线程数
+    'storage_writeback_max_attempts': '8',   # 写回最大重试次数（指数退避）
+    'storage_mirror_policy_json': '',        # 镜像策略：{"主后端": ["副本后端", ...]}
+    'storage_mirror_latency_budget_ms': '1500',  # 主后端读取超过该耗时即并发请求最快副本
+    'storage_tiering_enabled': '0',          # 冷热分层：按访问统计把热点文件复制到快速后端
+    'storage_tiering_hot_backend': '',       # 热层后端名称（local/S3 等），主副本仍留在原后端
+    'storage_tiering_budget_mb': '1024',     # 热层容量预算（MB），超出按热度淘汰
+    'storage_tiering_min_access': '5',       # 晋升热层所需的最少访问次数
+    'storage_tiering_interval_seconds': '300',  # 分层调度周期（秒）
+    'storage_tiering_max_move_mb': '256',    # 每轮最多晋升的数据量（MB），限制后台流量
+    'storage_circuit_failure_threshold': '3',  # 后端连续失败多少次后熔断（熔断期间读取直接返回 503）
+    'storage_circuit_open_seconds': '30',    # 熔断冷却时间（秒），半开探测失败时翻倍，最多 300 秒
+    'storage_read_latency_slo_ms': '10000',  # 读取延迟 SLO：超过视为一次失败
+    'storage_health_probe_interval_seconds': '10',  # 后台探测熔断后端的周期（秒）
+    'storage_upload_avoid_degraded': '1',    # 上传目标熔断中时改用激活后端或其它健康后端
+    'storage_scrub_interval_hours': '0',     # 完整性巡检周期（小时），0 表示只手动触发
+    'storage_scrub_verify_hash': '0',        # 周期巡检完整读取并校验 SHA-256（否则只检查对象是否存在）
+    'storage_scrub_workers': '4',            # 巡检并发数
+    'storage_scrub_bandwidth_mb': '20',      # 巡检全局读取带宽上限（MB/s），0 不限
+    'deletion_gc_interval_seconds': '30',    # 删除队列 GC 轮询周期（秒），删除后会立即唤醒
+    'deletion_gc_batch_size': '200',         # 每批清理的删除队列项数量
+    'deletion_gc_max_attempts': '8',         # 清理失败的最大重试次数，超过后标记为失败
+    'stats_reconcile_interval_hours': '24',  # 统计计数对账周期（小时），0 表示关闭
+    'admin_images_count_cap': '10000',       # 管理图片列表带筛选时精确计数的上限，超过后返回近似总数
     # CDN 配置（默认不开启）
     'cdn_enabled': '0',
     'cloudflare_cdn_domain': '',
@@ -127,6 +166,9 @@ DEFAULT_SYSTEM_SETTINGS = {
     'bot_template_strict_mode': '0',        # 回复模板严格模式
     # 网络代理
     'proxy_url': '',
+    # 自建 Bot API 服务（telegram-bot-api），留空使用官方 api.telegram.org
+    'bot_api_base_url': '',                 # 如 http://127.0.0.1:8081
+    'bot_api_local_mode': '0',              # 服务以 --local 运行：getFile 返回本地绝对路径，直接读盘且无 20MB 限制
     # 允许的文件后缀（逗号分隔）
     'allowed_extensions': 'jpg,jpeg,png,gif,webp,bmp,avif,tiff,tif,ico',
     # TG 认证配置
@@ -226,7 +268,7 @@ def init_system_settings() -> None:
 def get_system_setting(key: str) -> Optional[str]:
     """获取单个系统设置"""
     try:
-        with get_connection() as conn:
+        with get_read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT value FROM admin_config WHERE key = ?', (key,))
             row = cursor.fetchone()
@@ -241,7 +283,7 @@ def get_system_setting(key: str) -> Optional[str]:
 def get_all_system_settings() -> Dict[str, Any]:
     """获取所有系统设置"""
     try:
-        with get_connection() as conn:
+        with get_read_connection() as conn:
             cursor = conn.cursor()
             settings = dict(DEFAULT_SYSTEM_SETTINGS)  # 从默认值开始
 
@@ -329,10 +371,13 @@ def get_upload_count_today(*, source: Optional[str] = None, auth_token: Optional
         return 0
 
     try:
-        with get_connection() as conn:
+        with get_read_connection() as conn:
             cursor = conn.cursor()
-            conditions = ["date(created_at) = date('now', 'localtime')"]
-            params: List[Any] = []
+            # created_at 以本地时间 ISO 字符串存储，按日期前缀做半开区间比较，
+            # 与 date(created_at) = 今天 等价且可走 created_at 前缀索引
+            today = date.today()
+            conditions = ["created_at >= ?", "created_at < ?"]
+            params: List[Any] = [today.isoformat(), (today + timedelta(days=1)).isoformat()]
 
             if source:
                 conditions.append("source = ?")
@@ -361,6 +406,7 @@ def get_public_settings() -> Dict[str, Any]:
         'guest_token_generation_enabled': settings.get('guest_token_generation_enabled', '1') == '1',
         'max_file_size_mb': max(1, _safe_int(settings.get('max_file_size_mb', '100'), 100)),
         'daily_upload_limit': max(0, _safe_int(settings.get('daily_upload_limit', '0'), 0)),
+        'batch_upload_max_files': max(1, _safe_int(settings.get('batch_upload_max_files', '50'), 50)),
         'guest_token_max_upload_limit': max(1, _safe_int(settings.get('guest_token_max_upload_limit', '1000'), 1000)),
         'guest_token_max_expires_days': max(1, _safe_int(settings.get('guest_token_max_expires_days', '365'), 365)),
         'allowed_extensions': settings.get('allowed_extensions', 'jpg,jpeg,png,gif,webp,bmp,avif,tiff,tif,ico'),
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+站点统计物化表数据访问层
+
+site_stats / daily_upload_stats 由 file_storage 上的触发器增量维护
+（见 connection._init_site_stats_tables），读取均为主键查找；
+reconcile_site_stats() 全量重算并修正偏差（叠加修正量，不覆盖并发增量），由统计对账线程定期调用。
+"""
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from .connection import (
+    get_connection, get_read_connection, db_retry,
+    _site_stats_sums, _daily_upload_sums_sql, _usage_sums_sql, _USAGE_SCOPES, _GALLERY_FIRST_IMAGE_SQL,
+)
+
+
+def get_site_stats() -> Dict[str, int]:
+    """全部站点统计项（cdn_cached / cdn_uncached / cdn_pending / group_uploads / access_total / cdn_hits / direct_hits）"""
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT name, value FROM site_stats')
+        return {row[0]: int(row[1]) for row in cursor.fetchall()}
+
+
+def get_uploads_on(day: Optional[date] = None) -> Dict[str, int]:
+    """指定日期（默认今天，本地时区）的上传数与字节数"""
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT uploads, total_bytes FROM daily_upload_stats WHERE day = ?',
+            ((day or date.today()).isoformat(),),
+        )
+        row = cursor.fetchone()
+    return {
+        'uploads': int(row[0]) if row else 0,
+        'total_bytes': int(row[1]) if row else 0,
+    }
+
+
+def list_daily_uploads(days: int = 30) -> List[Dict[str, Any]]:
+    """最近 N 天的每日上传数与字节数（按日期升序，无上传的日期不返回）"""
+    since = (date.today() - timedelta(days=max(1, int(days)) - 1)).isoformat()
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT day, uploads, total_bytes FROM daily_upload_stats WHERE day >= ? AND uploads > 0 ORDER BY day',
+            (since,),
+        )
+        return [
+            {'day': row[0], 'uploads': int(row[1]), 'total_bytes': int(row[2])}
+            for row in cursor.fetchall()
+        ]
+
+
+# 物化计数表：(键列, 计数列, 行不存在时是否插入)
+_COUNTER_TABLES = {
+    'site_stats': (('name',), ('value',), True),
+    'daily_upload_stats': (('day',), ('uploads', 'total_bytes'), True),
+    'storage_usage_counters': (('scope', 'scope_key'), ('file_count', 'total_bytes'), True),
+    'galleries': (('id',), ('image_count',), False),
+}
+
+
+def _rows(cursor, sql: str, key_len: int) -> Dict[Tuple, Tuple[int, ...]]:
+    cursor.execute(sql)
+    return {tuple(row[:key_len]): tuple(int(v or 0) for v in row[key_len:]) for row in cursor.fetchall()}
+
+
+def _current_counters(cursor) -> Dict[str, Dict[Tuple, Tuple[int, ...]]]:
+    """物化计数的当前值：{表: {键: 计数}}"""
+    return {
+        table: _rows(cursor, f"SELECT {', '.join(keys + columns)} FROM {table}", len(keys))
+        for table, (keys, columns, _) in _COUNTER_TABLES.items()
+    }
+
+
+def _expected_counters(cursor) -> Dict[str, Dict[Tuple, Tuple[int, ...]]]:
+    """按源表全量重算的计数：{表: {键: 计数}}"""
+    usage: Dict[Tuple, Tuple[int, ...]] = {}
+    for scope, key, cond in _USAGE_SCOPES:
+        usage.update(_rows(cursor, _usage_sums_sql(scope, key, cond), 2))
+    return {
+        'site_stats': {(name,): (value,) for name, value in _site_stats_sums(cursor).items()},
+        'daily_upload_stats': _rows(cursor, _daily_upload_sums_sql(), 1),
+        'storage_usage_counters': usage,
+        'galleries': _rows(
+            cursor,
+            'SELECT id, (SELECT COUNT(*) FROM gallery_images gi WHERE gi.gallery_id = galleries.id) FROM galleries',
+            1,
+        ),
+    }
+
+
+def _apply_delta(cursor, table: str, key: Tuple, delta: Tuple[int, ...]) -> None:
+    """在计数上叠加修正量（而不是覆盖），保留读取快照之后触发器写入的增量"""
+    keys, columns, insert = _COUNTER_TABLES[table]
+    cursor.execute(
+        f"UPDATE {table} SET {', '.join(f'{col} = {col} + ?' for col in columns)} "
+        f"WHERE {' AND '.join(f'{col} = ?' for col in keys)}",
+        (*delta, *key),
+    )
+    if cursor.rowcount == 0 and insert:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(keys + columns)}) VALUES ({', '.join('?' * (len(keys) + len(columns)))})",
+            (*key, *delta),
+        )
+
+
+@db_retry()
+def reconcile_site_stats() -> Dict[str, int]:
+    """
+    全量重算站点统计、上传日桶、存储用量计数与画集图片数/封面，修正偏差
+
+    先在只读连接的同一快照内读取物化值并重算（全表聚合不占写锁），
+    再在短写事务中只对有偏差的行叠加修正量。
+
+    Returns:
+        {统计项: 修正量}，空字典表示无偏差
+    """
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        current = _current_counters(cursor)
+        expected = _expected_counters(cursor)
+        cursor.execute(
+            f"SELECT id FROM galleries WHERE resolved_cover IS NOT "
+            f"({_GALLERY_FIRST_IMAGE_SQL.format(gallery_id='galleries.id')})"
+        )
+        stale_covers = [row[0] for row in cursor.fetchall()]
+
+    deltas = []
+    for table, (_, columns, _) in _COUNTER_TABLES.items():
+        now, want = current[table], expected[table]
+        for key in set(now) | set(want):
+            zero = (0,) * len(columns)
+            delta = tuple(w - n for w, n in zip(want.get(key, zero), now.get(key, zero)))
+            if any(delta):
+                deltas.append((table, key, delta))
+    if not deltas and not stale_covers:
+        return {}
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for table, key, delta in deltas:
+            _apply_delta(cursor, table, key, delta)
+        cursor.executemany(
+            f"UPDATE galleries SET resolved_cover = ({_GALLERY_FIRST_IMAGE_SQL.format(gallery_id='galleries.id')}) "
+            f"WHERE id = ?",
+            [(gallery_id,) for gallery_id in stale_covers],
+        )
+
+    drift: Dict[str, int] = {}
+    for table, key, delta in deltas:
+        columns = _COUNTER_TABLES[table][1]
+        for column, value in zip(columns, delta):
+            if value:
+                name = ':'.join([table, *map(str, key)] + ([column] if len(columns) > 1 else []))
+                drift[name] = value
+    return drift
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储后端迁移任务数据访问层
+
+任务按 encrypted_id 做 keyset 扫描，checkpoint_key 记录已处理完的最后一个 ID，
+进度计数与断点在同一条 UPDATE 中推进，重启后从断点继续。
+
+状态：pending → running ⇄ paused → completed / cancelled / failed
+"""
+import json
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from ..config import logger
+from .connection import get_connection, db_retry
+
+MIGRATION_ACTIVE_STATUSES = ('pending', 'running', 'paused')
+
+
+def _row_to_migration(row) -> Dict[str, Any]:
+    data = dict(row)
+    for key in ('filters', 'options'):
+        try:
+            data[key] = json.loads(data.get(key) or '{}') or {}
+        except Exception:
+            data[key] = {}
+    return data
+
+
+def _filter_clause(source_backend: str, filters: Dict[str, Any]) -> Tuple[str, list]:
+    """源后端 + 上传时间/大小过滤条件"""
+    clauses = ["COALESCE(NULLIF(storage_backend, ''), 'telegram') = ?"]
+    params: list = [source_backend]
+    if filters.get('uploaded_after'):
+        clauses.append('upload_time >= ?')
+        params.append(int(filters['uploaded_after']))
+    if filters.get('uploaded_before'):
+        clauses.append('upload_time < ?')
+        params.append(int(filters['uploaded_before']))
+    if filters.get('min_size'):
+        clauses.append('COALESCE(file_size, 0) >= ?')
+        params.append(int(filters['min_size']))
+    if filters.get('max_size'):
+        clauses.append('COALESCE(file_size, 0) <= ?')
+        params.append(int(filters['max_size']))
+    return ' AND '.join(clauses), params
+
+
+@db_retry()
+def create_storage_migration(source_backend: str, target_backend: str,
+                             filters: Dict[str, Any], options: Dict[str, Any]) -> int:
+    """创建迁移任务（同时统计待迁移数量），返回任务 ID"""
+    now = int(time.time())
+    where, params = _filter_clause(source_backend, filters)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT COUNT(*) FROM file_storage WHERE {where}', params)
+        total = cursor.fetchone()[0]
+        cursor.execute('''
+            INSERT INTO storage_migrations (
+                source_backend, target_backend, filters, options, status,
+                total_count, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, 'pending', ?, ?, ?)
+        ''', (source_backend, target_backend,
+              json.dumps(filters, ensure_ascii=False), json.dumps(options, ensure_ascii=False),
+              total, now, now))
+        return cursor.lastrowid
+
+
+def get_storage_migration(migration_id: int) -> Optional[Dict[str, Any]]:
+    """获取迁移任务"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM storage_migrations WHERE id = ?', (int(migration_id),))
+        row = cursor.fetchone()
+        return _row_to_migration(row) if row else None
+
+
+def list_storage_migrations(statuses: Optional[Tuple[str, ...]] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """列出迁移任务（新任务在前）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if statuses:
+            placeholders = ','.join('?' * len(statuses))
+            cursor.execute(
+                f'SELECT * FROM storage_migrations WHERE status IN ({placeholders}) ORDER BY id DESC LIMIT ?',
+                (*statuses, int(limit)),
+            )
+        else:
+            cursor.execute('SELECT * FROM storage_migrations ORDER BY id DESC LIMIT ?', (int(limit),))
+        return [_row_to_migration(row) for row in cursor.fetchall()]
+
+
+@db_retry()
+def set_storage_migration_status(migration_id: int, status: str,
+                                 from_statuses: Optional[Tuple[str, ...]] = None,
+                                 error: Optional[str] = None) -> bool:
+    """
+    切换任务状态
+
+    Args:
+        from_statuses: 仅当当前状态在其中时才切换（用于暂停/恢复/取消的并发控制）
+    """
+    now = int(time.time())
+    sets = ['status = ?', 'updated_at = ?']
+    params: list = [status, now]
+    if status == 'running':
+        sets.append('started_at = COALESCE(started_at, ?)')
+        params.append(now)
+    if status in ('completed', 'cancelled', 'failed'):
+        sets.append('finished_at = ?')
+        params.append(now)
+    if error is not None:
+        sets.append('last_error = ?')
+        params.append(error[:500])
+    sql = f"UPDATE storage_migrations SET {', '.join(sets)} WHERE id = ?"
+    params.append(int(migration_id))
+    if from_statuses:
+        sql += f" AND status IN ({','.join('?' * len(from_statuses))})"
+        params.extend(from_statuses)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return cursor.rowcount > 0
+
+
+def list_migration_batch(migration: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+    """按 keyset 取下一批待迁移记录"""
+    where, params = _filter_clause(migration['source_backend'], migration.get('filters') or {})
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f'SELECT * FROM file_storage WHERE {where} AND encrypted_id > ? ORDER BY encrypted_id LIMIT ?',
+            (*params, migration.get('checkpoint_key') or '', int(limit)),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+@db_retry()
+def checkpoint_storage_migration(migration_id: int, checkpoint_key: str, *, migrated: int = 0,
+                                 skipped: int = 0, failed: int = 0, migrated_bytes: int = 0) -> None:
+    """推进断点并累加进度（同一事务）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE storage_migrations
+            SET checkpoint_key = ?, migrated_count = migrated_count + ?, skipped_count = skipped_count + ?,
+                failed_count = failed_count + ?, migrated_bytes = migrated_bytes + ?, updated_at = ?
+            WHERE id = ?
+        ''', (checkpoint_key, int(migrated), int(skipped), int(failed), int(migrated_bytes),
+              int(time.time()), int(migration_id)))
+
+
+def record_migration_failure(migration_id: int, encrypted_id: str, error: str) -> None:
+    """记录单个文件的迁移失败"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO storage_migration_failures (migration_id, encrypted_id, error, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', (int(migration_id), encrypted_id, (error or '')[:500], int(time.time())))
+    except Exception as e:
+        logger.error(f"记录迁移失败项出错: {e}")
+
+
+def list_migration_failures(migration_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+    """列出迁移失败的文件"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT encrypted_id, error, created_at FROM storage_migration_failures
+            WHERE migration_id = ?
+            ORDER BY created_at DESC
+            LIMIT ?
+        ''', (int(migration_id), int(limit)))
+        return [dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储完整性巡检数据访问层
+
+巡检任务按 encrypted_id 做 keyset 扫描 file_storage，checkpoint_key 记录已检查完的最后一个 ID；
+发现的问题按 (encrypted_id, storage_backend) 写入 storage_scrub_issues，
+复查通过时删除对应行，修复成功时标记为 repaired。
+
+状态：pending → running ⇄ paused → completed / cancelled / failed
+"""
+import json
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from ..config import logger
+from .connection import get_connection, db_retry
+
+SCRUB_ISSUE_STATUSES = ('missing', 'corrupt', 'error', 'repaired')
+
+
+def _row_to_run(row) -> Dict[str, Any]:
+    data = dict(row)
+    try:
+        data['options'] = json.loads(data.get('options') or '{}') or {}
+    except Exception:
+        data['options'] = {}
+    return data
+
+
+@db_retry()
+def create_scrub_run(mode: str, options: Dict[str, Any]) -> int:
+    """创建巡检任务（同时统计文件总数），返回任务 ID"""
+    now = int(time.time())
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM file_storage')
+        total = cursor.fetchone()[0]
+        cursor.execute('''
+            INSERT INTO storage_scrub_runs (mode, options, status, total_count, created_at, updated_at)
+            VALUES (?, ?, 'pending', ?, ?, ?)
+        ''', (mode, json.dumps(options, ensure_ascii=False), total, now, now))
+        return cursor.lastrowid
+
+
+def get_scrub_run(run_id: int) -> Optional[Dict[str, Any]]:
+    """获取巡检任务"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM storage_scrub_runs WHERE id = ?', (int(run_id),))
+        row = cursor.fetchone()
+        return _row_to_run(row) if row else None
+
+
+def list_scrub_runs(statuses: Optional[Tuple[str, ...]] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """列出巡检任务（新任务在前）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if statuses:
+            placeholders = ','.join('?' * len(statuses))
+            cursor.execute(
+                f'SELECT * FROM storage_scrub_runs WHERE status IN ({placeholders}) ORDER BY id DESC LIMIT ?',
+                (*statuses, int(limit)),
+            )
+        else:
+            cursor.execute('SELECT * FROM storage_scrub_runs ORDER BY id DESC LIMIT ?', (int(limit),))
+        return [_row_to_run(row) for row in cursor.fetchall()]
+
+
+@db_retry()
+def set_scrub_run_status(run_id: int, status: str,
+                         from_statuses: Optional[Tuple[str, ...]] = None,
+                         error: Optional[str] = None) -> bool:
+    """
+    切换巡检任务状态
+
+    Args:
+        from_statuses: 仅当当前状态在其中时才切换
+    """
+    now = int(time.time())
+    sets = ['status = ?', 'updated_at = ?']
+    params: list = [status, now]
+    if status == 'running':
+        sets.append('started_at = COALESCE(started_at, ?)')
+        params.append(now)
+    if status in ('completed', 'cancelled', 'failed'):
+        sets.append('finished_at = ?')
+        params.append(now)
+    if error is not None:
+        sets.append('last_error = ?')
+        params.append(error[:500])
+    sql = f"UPDATE storage_scrub_runs SET {', '.join(sets)} WHERE id = ?"
+    params.append(int(run_id))
+    if from_statuses:
+        sql += f" AND status IN ({','.join('?' * len(from_statuses))})"
+        params.extend(from_statuses)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return cursor.rowcount > 0
+
+
+def list_scrub_batch(after_key: str, limit: int) -> List[Dict[str, Any]]:
+    """按 keyset 取下一批待巡检的文件记录"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT * FROM file_storage WHERE encrypted_id > ? ORDER BY encrypted_id LIMIT ?',
+            (after_key or '', int(limit)),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+@db_retry()
+def checkpoint_scrub_run(run_id: int, checkpoint_key: str, *, checked: int = 0, ok: int = 0,
+                         broken: int = 0, errors: int = 0, scanned_bytes: int = 0) -> None:
+    """推进断点并累加进度（同一事务）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE storage_scrub_runs
+            SET checkpoint_key = ?, checked_count = checked_count + ?, ok_count = ok_count + ?,
+                broken_count = broken_count + ?, error_count = error_count + ?,
+                scanned_bytes = scanned_bytes + ?, updated_at = ?
+            WHERE id = ?
+        ''', (checkpoint_key, int(checked), int(ok), int(broken), int(errors), int(scanned_bytes),
+              int(time.time()), int(run_id)))
+
+
+def record_scrub_issue(encrypted_id: str, storage_backend: str, *, storage_key: str, role: str,
+                       status: str, detail: str = '', run_id: Optional[int] = None) -> None:
+    """登记（或刷新）一个问题对象，保留首次发现时间"""
+    now = int(time.time())
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO storage_scrub_issues (
+                    encrypted_id, storage_backend, storage_key, role, status, detail, run_id,
+                    first_seen_at, checked_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(encrypted_id, storage_backend) DO UPDATE SET
+                    storage_key = excluded.storage_key, role = excluded.role, status = excluded.status,
+                    detail = excluded.detail, run_id = COALESCE(excluded.run_id, run_id),
+                    checked_at = excluded.checked_at
+            ''', (encrypted_id, storage_backend, storage_key or '', role, status,
+                  (detail or '')[:500], run_id, now, now))
+    except Exception as e:
+        logger.error(f"记录巡检问题失败: {e}")
+
+
+def clear_scrub_issue(encrypted_id: str, storage_backend: Optional[str] = None) -> int:
+    """复查通过后删除问题记录（不指定后端时删除该文件的全部记录）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if storage_backend:
+            cursor.execute('DELETE FROM storage_scrub_issues WHERE encrypted_id = ? AND storage_backend = ?',
+                           (encrypted_id, storage_backend))
+        else:
+            cursor.execute('DELETE FROM storage_scrub_issues WHERE encrypted_id = ?', (encrypted_id,))
+        return cursor.rowcount
+
+
+def list_scrub_issues(status: Optional[str] = None, storage_backend: Optional[str] = None,
+                      limit: int = 100, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    分页列出问题对象（最近检查的在前）
+
+    Returns:
+        (当前页, 总数)
+    """
+    clauses, params = [], []
+    if status:
+        clauses.append('status = ?')
+        params.append(status)
+    if storage_backend:
+        clauses.append('storage_backend = ?')
+        params.append(storage_backend)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT COUNT(*) FROM storage_scrub_issues {where}', params)
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f'SELECT * FROM storage_scrub_issues {where} ORDER BY checked_at DESC, encrypted_id LIMIT ? OFFSET ?',
+            (*params, int(limit), int(offset)),
+        )
+        return [dict(row) for row in cursor.fetchall()], total
+
+
+def get_scrub_issue_counts() -> Dict[str, int]:
+    """按状态统计问题对象数量"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT status, COUNT(*) AS n FROM storage_scrub_issues GROUP BY status')
+        return {row['status']: row['n'] for row in cursor.fetchall()}
@@ -7,7 +7,10 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 
 from ..config import logger
-from .connection import get_connection
+from .connection import get_connection, get_read_connection
+from .usage import get_token_usage
+from .pagination import keyset_condition
+from .writer import run_write
 
 
 # ===================== 内部辅助 =====================
@@ -218,17 +221,25 @@ def update_token_description(token: str, description: Optional[str]) -> bool:
         return False
 
 
-def update_token_usage(token: str) -> None:
-    """更新 token 使用记录"""
+def update_token_usage(token: str, count: int = 1) -> None:
+    """
+    更新 token 使用记录
+
+    批量上传时传入本批成功数量，整批只占用一次事务。
+    """
+    if count <= 0:
+        return
+
+    def _write(cursor) -> None:
+        cursor.execute('''
+            UPDATE auth_tokens
+            SET upload_count = upload_count + ?,
+                last_used = CURRENT_TIMESTAMP
+            WHERE token = ?
+        ''', (int(count), token))
+
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE auth_tokens
-                SET upload_count = upload_count + 1,
-                    last_used = CURRENT_TIMESTAMP
-                WHERE token = ?
-            ''', (token,))
+        run_write(_write)
     except Exception as e:
         logger.error(f"更新token使用记录失败: {e}")
 
@@ -264,23 +275,25 @@ def count_tokens_by_ip(ip_address: str) -> int:
         return 0
 
 
-def get_token_uploads(token: str, limit: int = 50, page: int = 1) -> List[Dict[str, Any]]:
-    """获取 token 上传的所有图片"""
+def get_token_uploads(token: str, limit: int = 50, page: int = 1,
+                      cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """获取 token 上传的所有图片；传入 cursor 时按键集分页（忽略 page）"""
+    keyset, params = keyset_condition(('created_at', 'encrypted_id'), cursor)
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            offset = (page - 1) * limit
+        with get_read_connection() as conn:
+            db_cursor = conn.cursor()
+            offset = 0 if cursor else (page - 1) * limit
 
-            cursor.execute('''
+            db_cursor.execute(f'''
                 SELECT encrypted_id, original_filename, file_size, created_at,
-                       cdn_cached, cdn_url, mime_type
+                       cdn_cached, cdn_url, mime_type, width, height, blurhash
                 FROM file_storage
-                WHERE auth_token = ?
-                ORDER BY created_at DESC
+                WHERE auth_token = ? {'AND ' + keyset if keyset else ''}
+                ORDER BY created_at DESC, encrypted_id DESC
                 LIMIT ? OFFSET ?
-            ''', (token, limit, offset))
+            ''', (token, *params, limit, offset))
 
-            return [dict(row) for row in cursor.fetchall()]
+            return [dict(row) for row in db_cursor.fetchall()]
 
     except Exception as e:
         logger.error(f"获取token上传记录失败: {e}")
@@ -845,10 +858,10 @@ def admin_get_token_overview(token_id: int) -> Optional[Dict[str, Any]]:
             cursor = conn.cursor()
 
             cursor.execute(
-                "SELECT COUNT(1), MAX(created_at) FROM file_storage WHERE auth_token = ?",
+                "SELECT MAX(created_at) FROM file_storage WHERE auth_token = ?",
                 (token_str,),
             )
-            upload_row = cursor.fetchone() or (0, None)
+            last_upload_at = (cursor.fetchone() or (None,))[0]
 
             cursor.execute(
                 "SELECT COUNT(1), MAX(created_at) FROM galleries WHERE owner_token = ?",
@@ -862,11 +875,13 @@ def admin_get_token_overview(token_id: int) -> Optional[Dict[str, Any]]:
             )
             access_count = int((cursor.fetchone() or (0,))[0] or 0)
 
+        usage = get_token_usage(token_str)
         detail['summary'] = {
-            'upload_total': int(upload_row[0] or 0),
+            'upload_total': usage['file_count'],
+            'upload_bytes': usage['total_bytes'],
             'gallery_total': int(gallery_row[0] or 0),
             'access_total': access_count,
-            'last_upload_at': upload_row[1],
+            'last_upload_at': last_upload_at,
             'last_gallery_at': gallery_row[1],
         }
         return detail
@@ -898,17 +913,13 @@ def admin_get_token_uploads(
 
             token_str = token_row[0]
 
-            # 查总数
-            cursor.execute(
-                "SELECT COUNT(1) FROM file_storage WHERE auth_token = ?",
-                (token_str,)
-            )
-            total = cursor.fetchone()[0] or 0
+            # 查总数（存储用量计数）
+            total = get_token_usage(token_str)['file_count']
 
             # 查分页数据
             cursor.execute("""
                 SELECT encrypted_id, original_filename, file_size, created_at,
-                       cdn_cached, cdn_url, mime_type
+                       cdn_cached, cdn_url, mime_type, width, height, blurhash
                 FROM file_storage
                 WHERE auth_token = ?
                 ORDER BY created_at DESC
@@ -961,13 +972,7 @@ def admin_get_token_galleries(
             # 查分页数据（含图片数和封面）
             cursor.execute("""
                 SELECT g.*,
-                    (SELECT COUNT(*) FROM gallery_images gi WHERE gi.gallery_id = g.id) AS image_count,
-                    COALESCE(g.cover_image, (
-                        SELECT gi2.encrypted_id FROM gallery_images gi2
-                        WHERE gi2.gallery_id = g.id
-                        ORDER BY gi2.added_at ASC
-                        LIMIT 1
-                    )) AS resolved_cover_image
+                    COALESCE(g.cover_image, g.resolved_cover) AS resolved_cover_image
                 FROM galleries g
                 WHERE g.owner_token = ?
                 ORDER BY g.created_at DESC
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""分片续传会话数据访问层"""
+import time
+from typing import Optional, Dict, Any, List
+
+from ..config import logger
+from .connection import get_connection, db_retry
+
+
+@db_retry()
+def create_upload_session(
+    upload_id: str,
+    *,
+    filename: str,
+    content_type: Optional[str],
+    total_size: int,
+    source: str,
+    upload_scene: str,
+    auth_token: Optional[str] = None,
+    client_ip: Optional[str] = None,
+) -> None:
+    """创建分片续传会话"""
+    now = int(time.time())
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO upload_sessions (
+                upload_id, filename, content_type, total_size, received_size,
+                source, upload_scene, auth_token, client_ip, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?, ?, ?)
+        ''', (upload_id, filename, content_type, int(total_size), source, upload_scene,
+              auth_token, client_ip, now, now))
+
+
+def get_upload_session(upload_id: str) -> Optional[Dict[str, Any]]:
+    """获取分片续传会话"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM upload_sessions WHERE upload_id = ?', (upload_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+
+@db_retry()
+def update_upload_session_offset(upload_id: str, received_size: int) -> bool:
+    """更新会话已接收字节数（同时刷新活跃时间）"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE upload_sessions
+            SET received_size = ?, updated_at = ?
+            WHERE upload_id = ?
+        ''', (int(received_size), int(time.time()), upload_id))
+        return cursor.rowcount > 0
+
+
+def delete_upload_session(upload_id: str) -> bool:
+    """删除分片续传会话记录"""
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM upload_sessions WHERE upload_id = ?', (upload_id,))
+            return cursor.rowcount > 0
+    except Exception as e:
+        logger.error(f"删除上传会话失败: {e}")
+        return False
+
+
+def list_stale_upload_sessions(idle_before: int, limit: int = 200) -> List[str]:
+    """列出最后活跃时间早于 idle_before 的会话 ID"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT upload_id FROM upload_sessions
+            WHERE updated_at < ?
+            ORDER BY updated_at
+            LIMIT ?
+        ''', (int(idle_before), int(limit)))
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储用量计数数据访问层
+
+storage_usage_counters 由 file_storage 上的触发器增量维护（见 connection._init_usage_counter_tables），
+scope 取值：all（全站）/ backend（存储后端）/ token（上传 Token）/ tg_user（TG 用户）。
+读取均为主键查找，不扫描 file_storage。
+"""
+from typing import Optional, Dict, Any, List
+
+from .connection import get_connection, get_read_connection, db_retry, _rebuild_usage_counters
+
+USAGE_SCOPES = ('all', 'backend', 'token', 'tg_user')
+
+
+def _get_usage(scope: str, scope_key: str) -> Dict[str, int]:
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT file_count, total_bytes FROM storage_usage_counters WHERE scope = ? AND scope_key = ?',
+            (scope, scope_key),
+        )
+        row = cursor.fetchone()
+    return {
+        'file_count': int(row[0]) if row else 0,
+        'total_bytes': int(row[1]) if row else 0,
+    }
+
+
+def get_usage_totals() -> Dict[str, int]:
+    """全站文件数与总字节数"""
+    return _get_usage('all', '')
+
+
+def get_token_usage(token: str) -> Dict[str, int]:
+    """单个 Token 的文件数与总字节数"""
+    return _get_usage('token', token or '')
+
+
+def get_tg_user_usage(tg_user_id: int) -> Dict[str, int]:
+    """单个 TG 用户的文件数与总字节数"""
+    return _get_usage('tg_user', str(int(tg_user_id)))
+
+
+def list_usage(scope: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    列出某个维度的用量（按字节数降序）
+
+    Args:
+        scope: backend / token / tg_user
+        limit: 最多返回条数，None 表示全部
+    """
+    if scope not in USAGE_SCOPES:
+        raise ValueError(f"不支持的用量维度: {scope}")
+    with get_read_connection() as conn:
+        cursor = conn.cursor()
+        sql = ('SELECT scope_key, file_count, total_bytes FROM storage_usage_counters '
+               'WHERE scope = ? AND file_count > 0 ORDER BY total_bytes DESC')
+        params: list = [scope]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        cursor.execute(sql, params)
+        return [
+            {'key': row[0], 'file_count': int(row[1]), 'total_bytes': int(row[2])}
+            for row in cursor.fetchall()
+        ]
+
+
+@db_retry()
+def rebuild_usage_counters() -> Dict[str, int]:
+    """按 file_storage 全量重建计数（修复手工改库等导致的偏差），返回重建后的全站用量"""
+    with get_connection() as conn:
+        _rebuild_usage_counters(conn.cursor())
+    return get_usage_totals()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单写线程（group commit）
+
+经由 submit_write / run_write / enqueue_write 提交的写操作都在专属写线程上执行：
+写线程持有唯一的写连接，每轮从队列取出一批操作，以 BEGIN IMMEDIATE 开启一个事务，
+每个操作包在独立 SAVEPOINT 中（失败只回滚自身），整批一次 COMMIT 后再完成各自的
+Future。读路径仍使用各线程自己的连接，不经过写线程。
+
+写操作签名为 fn(cursor, *args, **kwargs)，只能使用传入的 cursor；
+在操作内部再用 get_connection() 写库会与写线程持有的写锁互相等待。
+"""
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, List, Optional
+
+from ..config import logger
+from . import connection
+
+# 单个事务最多合并的写操作数
+_MAX_BATCH = 256
+# BEGIN / COMMIT 遇到锁冲突（其它进程或未迁移的写路径）时的整批重试次数
+_BATCH_ATTEMPTS = 5
+# run_write 等待提交的上限（秒）：写线程卡住或异常退出时调用方不会无限阻塞
+_RUN_WRITE_TIMEOUT_SECONDS = 30
+
+_queue: 'queue.Queue[Optional[_WriteOp]]' = queue.Queue()
+_writer_thread: Optional[threading.Thread] = None
+_thread_lock = threading.Lock()
+# 写线程当前事务的 cursor（写操作内嵌套 run_write 时直接复用）
+_active_cursor: Optional[sqlite3.Cursor] = None
+
+
+class _WriteOp:
+    __slots__ = ('fn', 'args', 'kwargs', 'future', 'result', 'error')
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+def _open_writer_connection(path: str) -> sqlite3.Connection:
+    conn = connection._open_connection(path, readonly=False)
+    # 事务由写线程显式管理
+    conn.isolation_level = None
+    return conn
+
+
+def _is_lock_error(e: Exception) -> bool:
+    msg = str(e).lower()
+    return 'locked' in msg or 'busy' in msg
+
+
+def _apply_batch(conn: sqlite3.Connection, batch: List[_WriteOp]) -> None:
+    """在一个事务内执行整批写操作；BEGIN/COMMIT 失败时抛出，由调用方整批重试"""
+    global _active_cursor
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    _active_cursor = cursor
+    try:
+        for op in batch:
+            op.result, op.error = None, None
+            cursor.execute('SAVEPOINT write_op')
+            try:
+                op.result = op.fn(cursor, *op.args, **op.kwargs)
+            except Exception as e:
+                cursor.execute('ROLLBACK TO write_op')
+                op.error = e
+            cursor.execute('RELEASE write_op')
+        cursor.execute('COMMIT')
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        _active_cursor = None
+
+
+def _drain(first: '_WriteOp') -> List['_WriteOp']:
+    batch = [first]
+    while len(batch) < _MAX_BATCH:
+        try:
+            op = _queue.get_nowait()
+        except queue.Empty:
+            break
+        if op is None:
+            # 停止信号放回队尾，处理完本批后退出
+            _queue.put(None)
+            break
+        batch.append(op)
+    return batch
+
+
+def _writer_loop() -> None:
+    conn: Optional[sqlite3.Connection] = None
+    conn_path = None
+    stopping = False
+    try:
+        while True:
+            if stopping:
+                # 收到停止信号后继续处理已入队的操作，队列清空即退出
+                try:
+                    op = _queue.get_nowait()
+                except queue.Empty:
+                    return
+            else:
+                op = _queue.get()
+            if op is None:
+                stopping = True
+                continue
+            batch = _drain(op)
+
+            failure: Optional[BaseException] = None
+            # 数据库路径变化（测试或重新配置）时重建写连接；打开失败时整批失败，下一批重试
+            if conn is None or conn_path != connection.DATABASE_PATH:
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                try:
+                    conn = _open_writer_connection(connection.DATABASE_PATH)
+                    conn_path = connection.DATABASE_PATH
+                except Exception as e:
+                    failure = e
+
+            if failure is None:
+                for attempt in range(_BATCH_ATTEMPTS):
+                    try:
+                        _apply_batch(conn, batch)
+                        failure = None
+                        break
+                    except sqlite3.OperationalError as e:
+                        failure = e
+                        if not _is_lock_error(e):
+                            break
+                        time.sleep(min(0.05 * (2 ** attempt), 1.0))
+                    except Exception as e:
+                        failure = e
+                        break
+
+            if failure is not None:
+                logger.error(f"写队列事务提交失败（{len(batch)} 项）: {failure}")
+            for item in batch:
+                error = item.error or failure
+                if error is not None:
+                    item.future.set_exception(error)
+                else:
+                    item.future.set_result(item.result)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def start_db_writer() -> None:
+    """启动写线程（首次提交写操作时自动调用）"""
+    global _writer_thread
+    with _thread_lock:
+        if _writer_thread and _writer_thread.is_alive():
+            return
+        _writer_thread = threading.Thread(target=_writer_loop, name='db-writer', daemon=True)
+        _writer_thread.start()
+
+
+def stop_db_writer(timeout: float = 10) -> None:
+    """处理完已入队的写操作后停止写线程"""
+    global _writer_thread
+    with _thread_lock:
+        thread = _writer_thread
+        if not thread or not thread.is_alive():
+            _writer_thread = None
+            return
+        _queue.put(None)
+    thread.join(timeout=timeout)
+    with _thread_lock:
+        if _writer_thread is thread and not thread.is_alive():
+            _writer_thread = None
+
+
+def submit_write(fn: Callable[..., Any], *args, **kwargs) -> Future:
+    """提交写操作 fn(cursor, *args, **kwargs)，返回在所属事务提交后完成的 Future"""
+    if threading.current_thread() is _writer_thread and _active_cursor is not None:
+        # 写操作内部嵌套提交：直接在当前事务中执行，避免自我等待
+        future: Future = Future()
+        try:
+            future.set_result(fn(_active_cursor, *args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    op = _WriteOp(fn, args, kwargs)
+    start_db_writer()
+    _queue.put(op)
+    return op.future
+
+
+def run_write(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    提交写操作并等待提交完成，返回 fn 的返回值（异常原样抛出）
+
+    Raises:
+        TimeoutError: 超过 _RUN_WRITE_TIMEOUT_SECONDS 仍未提交（操作仍在队列中，之后可能提交）
+    """
+    future = submit_write(fn, *args, **kwargs)
+    try:
+        return future.result(timeout=_RUN_WRITE_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        raise TimeoutError(
+            f"等待写队列提交超时（{_RUN_WRITE_TIMEOUT_SECONDS}s，排队 {pending_writes()} 项）"
+        ) from None
+
+
+def _log_write_error(future: Future) -> None:
+    error = future.exception()
+    if error is not None:
+        logger.error(f"异步写操作失败: {error}")
+
+
+def enqueue_write(fn: Callable[..., Any], *args, **kwargs) -> None:
+    """提交写操作但不等待结果，失败只记录日志（适合访问计数等可丢失的统计写入）"""
+    submit_write(fn, *args, **kwargs).add_done_callback(_log_write_error)
+
+
+def pending_writes() -> int:
+    """当前排队中的写操作数（近似值）"""
+    return _queue.qsize()
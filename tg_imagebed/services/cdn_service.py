@@ -22,7 +22,9 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 from ..config import logger, get_proxy_url
-from ..database import update_cdn_cache_status, get_file_info, get_uncached_files, get_system_setting
+from ..database import (
+    update_cdn_cache_status, get_file_info, get_uncached_files, get_system_setting, close_thread_connections,
+)
 
 
 # CDN 配置缓存（减少数据库查询）
@@ -414,6 +416,7 @@ def _cdn_cache_monitor_worker():
             logger.error(f'CDN监控线程错误: {e}')
             _cdn_monitor_stop_event.wait(timeout=1)
 
+    close_thread_connections()
     logger.info('CDN缓存监控线程已停止')
 
 
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件删除服务模块
+
+各删除入口（管理员批量删除、用户删除、Token 级联删除、迁移/巡检作废的旧对象）共用删除队列：
+存储对象按后端分组后调用 StorageBackend.delete_many（S3 DeleteObjects、rclone --files-from、
+本地线程池），Telegram 消息按聊天分组后调用 deleteMessages（每次最多 100 条）。
+删除失败只记录日志，不影响数据库记录的删除。
+
+删除入口只在事务内删除数据库记录并写入 file_deletion_queue（访问立即 404），
+后台 GC 线程在事务之外批量清理存储对象、TG 消息与 CDN 缓存，失败按指数退避重试。
+"""
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ..config import logger
+from ..database import (
+    get_system_setting_int, list_due_deletions, update_deletion_progress, purge_finished_deletions,
+    close_thread_connections,
+)
+from ..storage.base import StorageBackend, close_download
+from ..storage.router import get_storage_router
+
+# 已完成队列项的保留时长（秒）
+_FINISHED_RETENTION_SECONDS = 7 * 86400
+# 重试退避上限（秒）
+_MAX_BACKOFF_SECONDS = 3600
+
+_worker_thread: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+_wake_event = threading.Event()
+
+
+def _parse_meta(raw: Any) -> Dict[str, Any]:
+    if isinstance(raw, dict):
+        return raw
+    try:
+        return json.loads(raw) if isinstance(raw, str) and raw else {}
+    except Exception:
+        return {}
+
+
+def resolve_telegram_message(row: Dict[str, Any], router=None) -> Optional[Tuple[Any, Any]]:
+    """
+    文件对应的 Telegram 消息 (chat_id, message_id)
+
+    兼容历史数据：从 storage_meta 中提取 message_id，从后端配置获取 chat_id
+    """
+    chat_id = row.get('group_chat_id')
+    message_id = row.get('group_message_id')
+    if not message_id or not chat_id:
+        meta = _parse_meta(row.get('storage_meta'))
+        message_id = message_id or meta.get('message_id')
+        chat_id = chat_id or meta.get('chat_id')
+        if not chat_id:
+            try:
+                backend = (router or get_storage_router()).get_backend(
+                    (row.get('storage_backend') or 'telegram').strip() or 'telegram')
+                chat_id = getattr(backend, '_chat_id', None)
+            except Exception:
+                pass
+    if not (chat_id and message_id):
+        return None
+    return chat_id, message_id
+
+
+def _object_gone(backend: StorageBackend, row: Dict[str, Any]) -> bool:
+    """删除未确认时探测对象是否已不存在（重试时对象可能已在上一轮删除）"""
+    try:
+        result = backend.download(file_info=row, range_header='bytes=0-0')
+    except Exception:
+        return False
+    close_download(result)
+    return result.status_code == 404
+
+
+def _gc_storage(items: List[Dict[str, Any]]) -> Tuple[Set[int], Dict[int, str]]:
+    """按后端分组批量删除存储对象，返回 (完成的队列项 ID, {ID: 错误})"""
+    done: Set[int] = set()
+    errors: Dict[int, str] = {}
+    grouped: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for item in items:
+        if item.get('storage_key'):
+            grouped[(item.get('storage_backend') or 'telegram').strip() or 'telegram'].append(item)
+        else:
+            done.add(item['id'])
+    if not grouped:
+        return done, errors
+
+    router = get_storage_router()
+    for name, group in grouped.items():
+        try:
+            backend = router.get_backend(name)
+        except Exception as e:
+            errors.update((item['id'], f"后端不可用: {e}") for item in group)
+            continue
+        # 未实现 delete 的后端（Telegram）由删除消息完成清理
+        if type(backend).delete is StorageBackend.delete:
+            done.update(item['id'] for item in group)
+            continue
+        try:
+            deleted = set(backend.delete_many(storage_keys=[item['storage_key'] for item in group]))
+        except Exception as e:
+            deleted = set()
+            logger.debug(f"GC 批量删除存储文件失败: backend={name}, {e}")
+        for item in group:
+            if item['storage_key'] in deleted or _object_gone(backend, item):
+                done.add(item['id'])
+            else:
+                errors[item['id']] = f"存储对象删除失败: {name}"
+    return done, errors
+
+
+def _gc_telegram(items: List[Dict[str, Any]]) -> Tuple[Set[int], Dict[int, str]]:
+    """按聊天分组批量删除 TG 消息（含分块消息），返回 (完成的队列项 ID, {ID: 错误})"""
+    from ..telegram_api import get_telegram_client, TelegramRequestError
+    from ..storage.backends.telegram import chunk_part_messages
+
+    try:
+        from ..bot_control import get_effective_bot_token
+        bot_token, _ = get_effective_bot_token()
+    except Exception:
+        bot_token = None
+    if not bot_token:
+        # 未配置 Bot 时无法删除消息，视为完成以免队列堆积
+        return {item['id'] for item in items}, {}
+
+    router = get_storage_router()
+    messages: Dict[int, List[Tuple[Any, Any]]] = {}
+    by_chat: Dict[Any, List[Any]] = defaultdict(list)
+    for item in items:
+        wanted = []
+        primary = resolve_telegram_message(item, router)
+        if primary:
+            wanted.append(primary)
+        wanted.extend(chunk_part_messages(item.get('storage_meta')))
+        messages[item['id']] = wanted
+        for chat_id, message_id in wanted:
+            by_chat[chat_id].append(message_id)
+
+    client = get_telegram_client()
+    failed: Set[Tuple[Any, Any]] = set()
+    for chat_id, message_ids in by_chat.items():
+        try:
+            client.delete_messages(chat_id, message_ids, bot_token=bot_token)
+        except TelegramRequestError as e:
+            failed.update((chat_id, m) for m in e.failed_ids)
+            logger.debug(f"GC 批量删除TG消息失败: chat={chat_id}, {e}")
+        except Exception as e:
+            failed.update((chat_id, m) for m in message_ids)
+            logger.debug(f"GC 批量删除TG消息失败: chat={chat_id}, {e}")
+
+    # 消息已删除/不存在时 Telegram 返回 400，视为完成；只有请求本身失败（网络、429、5xx）才重试
+    done: Set[int] = set()
+    errors: Dict[int, str] = {}
+    for item_id, wanted in messages.items():
+        if any(message in failed for message in wanted):
+            errors[item_id] = 'TG 消息删除失败'
+        else:
+            done.add(item_id)
+    return done, errors
+
+
+def _gc_cdn(items: List[Dict[str, Any]]) -> Tuple[Set[int], Dict[int, str]]:
+    """清除 CDN 上的图片缓存，未配置 Cloudflare 时直接视为完成"""
+    from .cdn_service import cloudflare_cdn
+
+    ids = {item['id'] for item in items}
+    try:
+        cloudflare_cdn._refresh_config()
+        domain = cloudflare_cdn.cdn_domain
+        configured = bool(domain and cloudflare_cdn.api_token and cloudflare_cdn.zone_id)
+    except Exception as e:
+        return set(), {item_id: f"CDN 配置读取失败: {e}" for item_id in ids}
+    if not configured:
+        return ids, {}
+    urls = [f"https://{domain}/image/{item['encrypted_id']}" for item in items]
+    if cloudflare_cdn.purge_cache(urls):
+        return ids, {}
+    return set(), {item_id: 'CDN 缓存清除失败' for item_id in ids}
+
+
+def run_deletion_gc(batch_size: int = 200) -> Dict[str, int]:
+    """
+    处理一批到期的删除队列项
+
+    三个步骤各自记录完成标记，失败项按 30s × 2^attempts（最多 1 小时）退避重试，
+    超过 deletion_gc_max_attempts 次后标记为 failed，由管理员手动重试。
+
+    Returns:
+        {'processed', 'done', 'retry', 'failed'}
+    """
+    items = list_due_deletions(limit=batch_size)
+    stats = {'processed': len(items), 'done': 0, 'retry': 0, 'failed': 0}
+    if not items:
+        return stats
+
+    errors: Dict[int, List[str]] = defaultdict(list)
+    phases = (
+        ('storage_done', _gc_storage),
+        ('telegram_done', _gc_telegram),
+        ('cdn_done', _gc_cdn),
+    )
+    for flag, handler in phases:
+        pending = [item for item in items if not item[flag]]
+        if not pending:
+            continue
+        try:
+            done, failed = handler(pending)
+        except Exception as e:
+            done, failed = set(), {item['id']: str(e) for item in pending}
+        for item in pending:
+            if item['id'] in done:
+                item[flag] = 1
+            else:
+                errors[item['id']].append(failed.get(item['id']) or f"{flag} 未完成")
+
+    max_attempts = get_system_setting_int('deletion_gc_max_attempts', 8, minimum=1, maximum=100)
+    now = int(time.time())
+    updates = []
+    for item in items:
+        if item['id'] not in errors:
+            status, attempts, next_at, error = 'done', item['attempts'], item['next_attempt_at'], None
+            stats['done'] += 1
+        else:
+            attempts = item['attempts'] + 1
+            error = '; '.join(errors[item['id']])
+            status = 'failed' if attempts >= max_attempts else 'pending'
+            next_at = now + min(_MAX_BACKOFF_SECONDS, 30 * 2 ** item['attempts'])
+            stats['failed' if status == 'failed' else 'retry'] += 1
+        updates.append({
+            'id': item['id'], 'storage_done': item['storage_done'], 'telegram_done': item['telegram_done'],
+            'cdn_done': item['cdn_done'], 'status': status, 'attempts': attempts,
+            'next_attempt_at': next_at, 'last_error': error,
+        })
+    update_deletion_progress(updates)
+    if stats['failed']:
+        logger.warning(f"删除队列: {stats['failed']} 项超过最大重试次数，已标记为失败")
+    return stats
+
+
+def wake_deletion_gc() -> None:
+    """删除入口登记队列后调用，让 GC 线程尽快处理新墓碑"""
+    _wake_event.set()
+
+
+def _gc_worker() -> None:
+    last_purge = 0.0
+    while not _stop_event.is_set():
+        _wake_event.clear()
+        batch_size = get_system_setting_int('deletion_gc_batch_size', 200, minimum=1, maximum=1000)
+        try:
+            # 一次唤醒内持续处理，直到没有整批到期项
+            while not _stop_event.is_set():
+                if run_deletion_gc(batch_size)['processed'] < batch_size:
+                    break
+            if time.time() - last_purge > 3600:
+                last_purge = time.time()
+                purge_finished_deletions(_FINISHED_RETENTION_SECONDS)
+        except Exception as e:
+            logger.error(f"删除队列 GC 失败: {e}")
+        interval = get_system_setting_int('deletion_gc_interval_seconds', 30, minimum=1, maximum=3600)
+        if _wake_event.wait(timeout=interval):
+            # 唤醒可能早于删除入口提交事务，稍等片刻再取队列
+            _stop_event.wait(timeout=1)
+    close_thread_connections()
+
+
+def start_deletion_gc() -> None:
+    """启动删除队列 GC 线程"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return
+    _stop_event.clear()
+    _worker_thread = threading.Thread(target=_gc_worker, name='deletion-gc', daemon=True)
+    _worker_thread.start()
+
+
+def stop_deletion_gc() -> None:
+    """停止删除队列 GC 线程"""
+    global _worker_thread
+    _stop_event.set()
+    _wake_event.set()
+    if _worker_thread and _worker_thread.is_alive():
+        _worker_thread.join(timeout=5)
+    _worker_thread = None
+
+
+__all__ = [
+    'resolve_telegram_message',
+    'run_deletion_gc',
+    'wake_deletion_gc',
+    'start_deletion_gc',
+    'stop_deletion_gc',
+]
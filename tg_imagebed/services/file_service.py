@@ -5,18 +5,29 @@
 
 提供文件上传到 Telegram、获取文件路径等功能。
 """
+import os
 import time
 import hashlib
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Dict, Any, List, Tuple, Iterator
 
-import requests
 
 from ..config import logger
-from ..database import save_file_info, get_file_info, update_file_path_in_db
+from ..database import (
+    save_file_info, get_file_info, update_file_path_in_db,
+    get_system_setting, get_system_setting_int,
+)
 from ..utils import sign_file_id, get_mime_type
 from .cdn_service import add_to_cdn_monitor
-from ..storage.router import get_storage_router
+from .image_meta_service import (
+    schedule_image_meta, strip_image_metadata, is_exif_strip_enabled, compute_dhash,
+)
+from ..storage.router import get_storage_router, PENDING_BACKEND_NAME
+from ..storage.latency import get_latency_tracker
+from .writeback_service import should_stage, enqueue_writeback
+from .mirror_service import schedule_mirror
 from ..bot_control import get_effective_bot_token
+from ..telegram_api import get_telegram_client
 
 
 def get_fresh_file_path(file_id: str) -> Optional[str]:
@@ -34,20 +45,12 @@ def get_fresh_file_path(file_id: str) -> Optional[str]:
         return None
 
     try:
-        response = requests.get(
-            f"https://api.telegram.org/bot{bot_token}/getFile",
-            params={'file_id': file_id},
-            timeout=10
-        )
-
-        if response.ok:
-            result = response.json()
-            if result.get('ok') and result.get('result'):
-                file_path = result['result'].get('file_path')
-                logger.debug(f"获取最新file_path成功: {file_id} -> {file_path}")
-                return file_path
+        file_path = get_telegram_client().get_file_path(file_id, bot_token=bot_token, timeout=10)
+        if file_path:
+            logger.debug(f"获取最新file_path成功: {file_id} -> {file_path}")
+            return file_path
 
-        logger.error(f"获取文件路径失败: {response.text}")
+        logger.error(f"获取文件路径失败: {file_id}")
         return None
 
     except Exception as e:
@@ -56,7 +59,7 @@ def get_fresh_file_path(file_id: str) -> Optional[str]:
 
 
 def process_upload(
-    file_content: bytes,
+    file_content: Optional[bytes],
     filename: str,
     content_type: str,
     username: str = 'web_user',
@@ -67,12 +70,15 @@ def process_upload(
     group_message_id: Optional[int] = None,
     upload_scene: Optional[str] = None,
     requested_backend: Optional[str] = None,
+    backend_name: Optional[str] = None,
+    file_hash: Optional[str] = None,
+    file_path: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
     """
     处理文件上传的完整流程
 
     Args:
-        file_content: 文件内容
+        file_content: 文件内容（给出 file_path 时传 None）
         filename: 文件名
         content_type: MIME 类型
         username: 用户名
@@ -83,11 +89,35 @@ def process_upload(
         group_message_id: 群组消息 ID
         upload_scene: 上传场景 (guest/token/group/admin)
         requested_backend: 管理员请求的特定后端
+        backend_name: 已解析好的后端名（批量上传时由调用方统一解析，跳过路由决策）
+        file_hash: 已计算好的 SHA256（分片续传时增量计算，避免重复哈希）
+        file_path: 本地文件路径（分片续传合并后的文件），经后端 put_file 流式上传，
+            不整体读入内存；调用方负责在返回后删除
 
     Returns:
         包含 encrypted_id, url 等信息的字典，失败返回 None
     """
-    file_size = len(file_content)
+    # 剥离元数据需要改写整个文件：文件来源且命中 JPEG/PNG 时退回内存处理
+    if file_path is not None and is_exif_strip_enabled():
+        with open(file_path, 'rb') as f:
+            head = f.read(8)
+        if head.startswith(b'\xff\xd8') or head == b'\x89PNG\r\n\x1a\n':
+            with open(file_path, 'rb') as f:
+                file_content = f.read()
+            file_path = None
+
+    if file_path is not None:
+        file_size = os.path.getsize(file_path)
+        if not file_hash:
+            file_hash = _hash_file(file_path)
+    else:
+        # 按设置剥离 EXIF/GPS（内容变化后预先计算的哈希不再可用）
+        if is_exif_strip_enabled():
+            stripped = strip_image_metadata(file_content)
+            if stripped is not file_content:
+                file_content = stripped
+                file_hash = None
+        file_size = len(file_content)
 
     # 规范化 content_type（防止 None 或空字符串导致后端出错）
     if not content_type:
@@ -104,28 +134,47 @@ def process_upload(
             scene = "guest"
 
     # 计算文件哈希（使用 SHA256，比 MD5 更安全）
-    file_hash = hashlib.sha256(file_content).hexdigest()
+    if not file_hash:
+        file_hash = hashlib.sha256(file_content).hexdigest()
 
     # 构建说明
     caption = f"{source} | 文件名: {filename} | 大小: {file_size} bytes | 时间: {time.strftime('%Y-%m-%d %H:%M:%S')}"
 
     # 通过存储路由器选择后端并上传
     router = get_storage_router()
-    backend_name = router.resolve_upload_backend(
-        scene=scene,
-        requested_backend=requested_backend,
-        is_admin=(scene == "admin"),
-    )
+    if not backend_name:
+        backend_name = router.resolve_upload_backend(
+            scene=scene,
+            requested_backend=requested_backend,
+            is_admin=(scene == "admin"),
+        )
     backend = router.get_backend(backend_name)
-    put_result = backend.put_bytes(
-        file_content=file_content,
-        filename=filename,
-        content_type=content_type,
-        file_size=file_size,
-        caption=caption,
-        source=source,
-        username=username,
-    )
+
+    # 写回模式：先落本地暂存区立即返回，后台再推送到目标后端
+    writeback_target = None
+    if should_stage(backend):
+        writeback_target = backend.name
+        backend = router.get_backend(PENDING_BACKEND_NAME)
+
+    # 上传结果计入熔断统计（耗时与文件大小相关，不参与延迟 SLO）
+    tracker = get_latency_tracker()
+    put_start = time.monotonic()
+    put_result = None
+    try:
+        put_kwargs = dict(
+            filename=filename,
+            content_type=content_type,
+            file_size=file_size,
+            caption=caption,
+            source=source,
+            username=username,
+        )
+        if file_path is not None:
+            put_result = backend.put_file(file_path=file_path, **put_kwargs)
+        else:
+            put_result = backend.put_bytes(file_content=file_content, **put_kwargs)
+    finally:
+        tracker.record(backend.name, time.monotonic() - put_start, bool(put_result), check_slo=False)
 
     if not put_result:
         return None
@@ -142,9 +191,10 @@ def process_upload(
     effective_message_id = group_message_id or meta.get('message_id')
     effective_chat_id = None
     if effective_message_id and not is_group_upload:
-        # Web 上传到 Telegram 后端时，从后端实例获取 chat_id
+        # Web 上传到 Telegram 后端时，优先取实际写入的频道（多频道分片），其次后端默认频道
         try:
-            if hasattr(backend, '_chat_id'):
+            effective_chat_id = meta.get('chat_id')
+            if not effective_chat_id and hasattr(backend, '_chat_id'):
                 effective_chat_id = backend._chat_id
         except Exception:
             pass
@@ -172,19 +222,120 @@ def process_upload(
         'storage_key': put_result.storage_key,
         'storage_meta': put_result.storage_meta,
     }
+    if writeback_target:
+        file_data['storage_meta'] = {**(put_result.storage_meta or {}), 'writeback_target': writeback_target}
     save_file_info(encrypted_id, file_data)
 
+    if writeback_target:
+        enqueue_writeback(encrypted_id)
+
+    # 镜像策略：副本异步复制（写回模式下以最终目标后端为主后端；文件来源时由复制任务从主后端读回）
+    schedule_mirror(encrypted_id, writeback_target or put_result.storage_backend, file_content)
+    image_source = file_path if file_path is not None else file_content
+
+    # 近似重复提醒：需要同步算出 dHash，后处理阶段直接复用
+    phash = None
+    similar_images = []
+    if get_system_setting('phash_duplicate_warning') == '1':
+        phash = compute_dhash(image_source)
+        if phash:
+            from .similarity_service import find_similar_images
+            max_distance = get_system_setting_int('phash_max_distance', 6, minimum=0, maximum=32)
+            similar_images = [
+                {'encrypted_id': item['encrypted_id'], 'filename': item['original_filename'], 'distance': item['distance']}
+                for item in find_similar_images(phash, max_distance, limit=5, exclude=encrypted_id)
+            ]
+
+    # 上传后处理：解析尺寸/方向/占位图（线程池异步执行）
+    schedule_image_meta(encrypted_id, image_source, phash)
+
     # 添加到 CDN 监控
     add_to_cdn_monitor(encrypted_id, file_data['upload_time'])
 
     logger.info(f"文件上传完成: {filename} -> {encrypted_id}")
 
-    return {
+    result = {
         'encrypted_id': encrypted_id,
         'file_size': put_result.file_size,
         'filename': filename,
         'mime_type': mime_type
     }
+    if similar_images:
+        result['similar_images'] = similar_images
+    return result
+
+
+def _hash_file(file_path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def iter_upload_batch(
+    items: List[Tuple[bytes, str, str]],
+    *,
+    username: str = 'web_user',
+    tg_user_id: Optional[int] = None,
+    source: str = 'web_upload',
+    auth_token: Optional[str] = None,
+    upload_scene: Optional[str] = None,
+    requested_backend: Optional[str] = None,
+    max_workers: int = 4,
+) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    批量上传：以有限并发把多个文件推送到同一个存储后端
+
+    上传后端只解析一次，每个文件仍走 process_upload 的完整流程（哈希、签名、入库）。
+    结果按完成顺序逐个产出，便于调用方流式返回。
+
+    Args:
+        items: (file_content, filename, content_type) 列表，已经过校验
+        max_workers: 最大并发数
+
+    Yields:
+        (index, result, error) — index 为 items 中的下标；成功时 error 为 None
+    """
+    if not items:
+        return
+
+    scene = (upload_scene or "").strip().lower() or ("token" if auth_token else "guest")
+    backend_name = get_storage_router().resolve_upload_backend(
+        scene=scene,
+        requested_backend=requested_backend,
+        is_admin=(scene == "admin"),
+    )
+
+    workers = max(1, min(int(max_workers or 1), len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-upload') as executor:
+        futures = {
+            executor.submit(
+                process_upload,
+                file_content=content,
+                filename=filename,
+                content_type=content_type,
+                username=username,
+                tg_user_id=tg_user_id,
+                source=source,
+                auth_token=auth_token,
+                upload_scene=scene,
+                backend_name=backend_name,
+            ): index
+            for index, (content, filename, content_type) in enumerate(items)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"批量上传单个文件失败: {items[index][1]} - {e}")
+                yield index, None, '上传失败'
+                continue
+            if result:
+                yield index, result, None
+            else:
+                yield index, None, '上传到存储后端失败'
 
 
 def record_existing_telegram_file(
@@ -202,6 +353,7 @@ def record_existing_telegram_file(
     group_message_id: Optional[int] = None,
     group_chat_id: Optional[int] = None,
     file_unique_id: Optional[str] = None,
+    photo_sizes: Optional[Dict[str, Dict[str, Any]]] = None,
 ) -> Optional[Dict[str, Any]]:
     """
     直接记录已存在于 Telegram 的文件（不做二次上传）
@@ -248,7 +400,12 @@ def record_existing_telegram_file(
             'file_unique_id': file_unique_id,
         },
     }
+    if photo_sizes:
+        # Telegram 预生成的缩略图档位，供 /image/<id>?size= 直接提供
+        file_data['storage_meta']['photo_sizes'] = photo_sizes
     save_file_info(encrypted_id, file_data)
+    schedule_mirror(encrypted_id, 'telegram', file_content)
+    schedule_image_meta(encrypted_id, file_content)
     add_to_cdn_monitor(encrypted_id, upload_time)
 
     logger.info(f"已记录 Telegram 既有文件: {filename} -> {encrypted_id}")
@@ -264,5 +421,6 @@ def record_existing_telegram_file(
 __all__ = [
     'get_fresh_file_path',
     'process_upload',
+    'iter_upload_batch',
     'record_existing_telegram_file',
 ]
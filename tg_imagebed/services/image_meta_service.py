@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片元数据服务模块 - 上传后处理
+
+- 只读文件头解析宽高与 EXIF 方向（不做完整解码）
+- 可选剥离 JPEG/PNG 中的 EXIF/XMP（含 GPS），仅保留方向信息
+- 可选计算 BlurHash 占位图（依赖 Pillow，未安装时跳过）
+- 计算 64 位 dHash 感知哈希，用于近似重复检索（依赖 Pillow）
+
+解析在独立线程池中进行，不阻塞上传响应。图片来源可以是字节，也可以是本地文件路径
+（分片续传合并后的文件），后者只读取文件头并由 Pillow 按需解码，不整体读入内存。
+"""
+import io
+import math
+import os
+import shutil
+import struct
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple, Union
+
+from ..config import logger, DATA_DIR
+from ..database import update_image_meta, get_system_setting, get_system_setting_int
+
+try:
+    from PIL import Image, ImageOps
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+    logger.warning("Pillow 未安装，BlurHash 与感知哈希将不可用。请运行: pip install -r requirements.txt")
+
+# 图片来源：文件字节或本地文件路径
+ImageSource = Union[bytes, str]
+
+# 从文件解析尺寸时读取的文件头长度（覆盖常见的 EXIF/ICC 段）
+_HEADER_BYTES = 512 * 1024
+
+# 异步处理文件来源时的快照目录（硬链接，处理完即删除）
+_META_SPOOL_DIR = os.path.join(DATA_DIR, 'tmp', 'image-meta')
+
+
+# ===================== 文件头解析 =====================
+def _parse_exif_orientation(tiff: bytes) -> Optional[int]:
+    """从 TIFF 结构（EXIF 载荷）的 IFD0 中读取 Orientation 标签"""
+    if len(tiff) < 8:
+        return None
+    if tiff[:2] == b'II':
+        endian = '<'
+    elif tiff[:2] == b'MM':
+        endian = '>'
+    else:
+        return None
+    try:
+        ifd_offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+        count = struct.unpack(endian + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+        for i in range(count):
+            entry = ifd_offset + 2 + i * 12
+            tag = struct.unpack(endian + 'H', tiff[entry:entry + 2])[0]
+            if tag == 0x0112:
+                value = struct.unpack(endian + 'H', tiff[entry + 8:entry + 10])[0]
+                return value if 1 <= value <= 8 else None
+    except (struct.error, IndexError):
+        return None
+    return None
+
+
+def _parse_tiff_size(tiff: bytes) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """读取 TIFF IFD0 中的宽、高与方向"""
+    endian = '<' if tiff[:2] == b'II' else '>'
+    width = height = None
+    try:
+        ifd_offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+        count = struct.unpack(endian + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+        for i in range(count):
+            entry = ifd_offset + 2 + i * 12
+            tag, field_type = struct.unpack(endian + 'HH', tiff[entry:entry + 4])
+            if tag not in (256, 257):
+                continue
+            if field_type == 3:
+                value = struct.unpack(endian + 'H', tiff[entry + 8:entry + 10])[0]
+            else:
+                value = struct.unpack(endian + 'I', tiff[entry + 8:entry + 12])[0]
+            if tag == 256:
+                width = value
+            else:
+                height = value
+    except (struct.error, IndexError):
+        pass
+    return width, height, _parse_exif_orientation(tiff)
+
+
+def _parse_jpeg(data: bytes) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """遍历 JPEG 段，读取 SOFn 中的尺寸和 APP1 EXIF 中的方向"""
+    orientation = None
+    pos = 2
+    size = len(data)
+    while pos + 4 <= size:
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            break
+        seg_len = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        seg = data[pos + 4:pos + 2 + seg_len]
+        if marker == 0xE1 and seg[:6] == b'Exif\x00\x00' and orientation is None:
+            orientation = _parse_exif_orientation(seg[6:])
+        elif 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC) and len(seg) >= 5:
+            height, width = struct.unpack('>HH', seg[1:5])
+            return width, height, orientation
+        pos += 2 + seg_len
+    return None, None, orientation
+
+
+def _parse_webp(data: bytes) -> Tuple[Optional[int], Optional[int]]:
+    chunk = data[12:16]
+    if chunk == b'VP8 ' and len(data) >= 30:
+        width, height = struct.unpack('<HH', data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(data) >= 25:
+        bits = struct.unpack('<I', data[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(data) >= 30:
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return width, height
+    return None, None
+
+
+def _parse_isobmff(data: bytes) -> Tuple[Optional[int], Optional[int]]:
+    """AVIF/HEIF：取第一个 ispe（图像空间尺寸）属性"""
+    idx = data.find(b'ispe', 0, 64 * 1024)
+    if idx < 0 or idx + 16 > len(data):
+        return None, None
+    width, height = struct.unpack('>II', data[idx + 8:idx + 16])
+    return width, height
+
+
+def parse_image_header(data: bytes) -> Dict[str, Optional[int]]:
+    """
+    仅通过文件头解析图片尺寸和 EXIF 方向
+
+    返回的 width/height 为按方向校正后的显示尺寸（方向 5-8 时宽高互换）。
+    无法识别时对应字段为 None。
+    """
+    width = height = orientation = None
+    try:
+        if data.startswith(b'\x89PNG\r\n\x1a\n') and len(data) >= 24:
+            width, height = struct.unpack('>II', data[16:24])
+        elif data.startswith(b'\xff\xd8'):
+            width, height, orientation = _parse_jpeg(data)
+        elif data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 10:
+            width, height = struct.unpack('<HH', data[6:10])
+        elif data.startswith(b'RIFF') and data[8:12] == b'WEBP':
+            width, height = _parse_webp(data)
+        elif data.startswith(b'BM') and len(data) >= 26:
+            width, height = struct.unpack('<ii', data[18:26])
+            height = abs(height)
+        elif data[:4] in (b'II*\x00', b'MM\x00*'):
+            width, height, orientation = _parse_tiff_size(data)
+        elif data.startswith(b'\x00\x00\x01\x00') and len(data) >= 8:
+            width = data[6] or 256
+            height = data[7] or 256
+        elif data[4:8] == b'ftyp':
+            width, height = _parse_isobmff(data)
+    except (struct.error, IndexError) as e:
+        logger.debug(f"解析图片头失败: {e}")
+        return {'width': None, 'height': None, 'orientation': None}
+
+    if width and height and orientation in (5, 6, 7, 8):
+        width, height = height, width
+    return {
+        'width': int(width) if width else None,
+        'height': int(height) if height else None,
+        'orientation': orientation,
+    }
+
+
+# ===================== EXIF 剥离 =====================
+def _minimal_exif_segment(orientation: int) -> bytes:
+    """构造只含 Orientation 的最小 APP1 段，避免剥离后图片方向错乱"""
+    tiff = b'MM\x00*' + struct.pack('>I', 8) + struct.pack('>H', 1)
+    tiff += struct.pack('>HHIHH', 0x0112, 3, 1, orientation, 0) + struct.pack('>I', 0)
+    payload = b'Exif\x00\x00' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+def _strip_jpeg_metadata(data: bytes) -> bytes:
+    """移除 JPEG 中的 EXIF/XMP APP1 段，方向非默认时补回最小 EXIF"""
+    _, _, orientation = _parse_jpeg(data)
+    out = [data[:2]]
+    pos = 2
+    size = len(data)
+    stripped = False
+    while pos + 4 <= size:
+        if data[pos] != 0xFF:
+            return data  # 结构异常，保持原样
+        marker = data[pos + 1]
+        if marker == 0xDA:
+            break
+        seg_len = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        seg_end = pos + 2 + seg_len
+        seg = data[pos + 4:seg_end]
+        if marker == 0xE1 and (seg.startswith(b'Exif\x00\x00') or seg.startswith(b'http://ns.adobe.com/xap/')):
+            stripped = True
+        else:
+            out.append(data[pos:seg_end])
+        pos = seg_end
+
+    if not stripped:
+        return data
+    if orientation and orientation != 1:
+        out.insert(1, _minimal_exif_segment(orientation))
+    out.append(data[pos:])
+    return b''.join(out)
+
+
+def _strip_png_metadata(data: bytes) -> bytes:
+    """移除 PNG 中的 eXIf 与 XMP(iTXt) 块"""
+    out = [data[:8]]
+    pos = 8
+    stripped = False
+    while pos + 12 <= len(data):
+        length = struct.unpack('>I', data[pos:pos + 4])[0]
+        chunk_type = data[pos + 4:pos + 8]
+        chunk_end = pos + 12 + length
+        if chunk_type == b'eXIf' or (chunk_type == b'iTXt' and data[pos + 8:pos + 8 + 17] == b'XML:com.adobe.xmp'):
+            stripped = True
+        else:
+            out.append(data[pos:chunk_end])
+        pos = chunk_end
+        if chunk_type == b'IEND':
+            break
+    return b''.join(out) if stripped else data
+
+
+def strip_image_metadata(data: bytes) -> bytes:
+    """按设置剥离 EXIF/GPS 等隐私元数据（仅支持 JPEG/PNG，其余格式原样返回）"""
+    try:
+        if data.startswith(b'\xff\xd8'):
+            return _strip_jpeg_metadata(data)
+        if data.startswith(b'\x89PNG\r\n\x1a\n'):
+            return _strip_png_metadata(data)
+    except (struct.error, IndexError) as e:
+        logger.debug(f"剥离图片元数据失败，保留原文件: {e}")
+    return data
+
+
+def is_exif_strip_enabled() -> bool:
+    return str(get_system_setting('image_strip_exif') or '0') == '1'
+
+
+# ===================== BlurHash =====================
+_BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+
+def _encode83(value: int, length: int) -> str:
+    result = ''
+    for i in range(1, length + 1):
+        digit = (value // (83 ** (length - i))) % 83
+        result += _BASE83[digit]
+    return result
+
+
+def _srgb_to_linear(value: int) -> float:
+    v = value / 255.0
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * (v ** (1 / 2.4)) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value: float, exp: float) -> float:
+    return math.copysign(abs(value) ** exp, value)
+
+
+def _blurhash_encode(pixels, width: int, height: int, x_components: int = 4, y_components: int = 3) -> str:
+    """标准 BlurHash 编码（pixels 为按行排列的 RGB 元组序列）"""
+    linear = [tuple(_srgb_to_linear(c) for c in px) for px in pixels]
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1.0 if i == 0 and j == 0 else 2.0
+            r = g = b = 0.0
+            for y in range(height):
+                cos_y = math.cos(math.pi * j * y / height)
+                row = y * width
+                for x in range(width):
+                    basis = cos_y * math.cos(math.pi * i * x / width)
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = normalisation / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        max_value = max(abs(c) for f in ac for c in f)
+        quantised = max(0, min(82, int(max_value * 166 - 0.5)))
+        max_ac = (quantised + 1) / 166
+        result += _encode83(quantised, 1)
+    else:
+        max_ac = 1.0
+        result += _encode83(0, 1)
+
+    result += _encode83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for f in ac:
+        quant = [max(0, min(18, int(math.floor(_sign_pow(c / max_ac, 0.5) * 9 + 9.5)))) for c in f]
+        result += _encode83(quant[0] * 19 * 19 + quant[1] * 19 + quant[2], 2)
+    return result
+
+
+def _open_image(data: ImageSource):
+    return Image.open(data if isinstance(data, str) else io.BytesIO(data))
+
+
+def compute_blurhash(data: ImageSource) -> Optional[str]:
+    """计算 BlurHash 占位符（需要 Pillow；缩到 32px 以内再编码）"""
+    if not HAS_PIL:
+        return None
+    try:
+        with _open_image(data) as img:
+            img.draft('RGB', (64, 64))  # JPEG 可直接按 DCT 缩放解码
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            img.thumbnail((32, 32))
+            width, height = img.size
+            return _blurhash_encode(list(img.getdata()), width, height)
+    except Exception as e:
+        logger.debug(f"计算 BlurHash 失败: {e}")
+        return None
+
+
+# ===================== 感知哈希 =====================
+def compute_dhash(data: ImageSource) -> Optional[str]:
+    """
+    计算 64 位 dHash（差异哈希），返回 16 位十六进制字符串
+
+    缩放为 9x8 灰度图，逐行比较相邻像素亮度；需要 Pillow。
+    """
+    if not HAS_PIL:
+        return None
+    try:
+        with _open_image(data) as img:
+            img.draft('L', (64, 64))
+            img = ImageOps.exif_transpose(img).convert('L').resize((9, 8), Image.BILINEAR)
+            pixels = list(img.getdata())
+        value = 0
+        for row in range(8):
+            offset = row * 9
+            for col in range(8):
+                value = (value << 1) | (1 if pixels[offset + col] < pixels[offset + col + 1] else 0)
+        return format(value, '016x')
+    except Exception as e:
+        logger.debug(f"计算 dHash 失败: {e}")
+        return None
+
+
+# ===================== 后处理线程池 =====================
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = get_system_setting_int('image_meta_workers', 2, minimum=1, maximum=16)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-meta')
+            # 上次进程退出时未处理完的快照
+            shutil.rmtree(_META_SPOOL_DIR, ignore_errors=True)
+        return _executor
+
+
+def _read_header(data: ImageSource) -> bytes:
+    if not isinstance(data, str):
+        return data
+    with open(data, 'rb') as f:
+        return f.read(_HEADER_BYTES)
+
+
+def extract_image_meta(data: ImageSource, phash: Optional[str] = None) -> Dict[str, Any]:
+    """解析尺寸/方向，并按设置计算 BlurHash 与 dHash"""
+    meta: Dict[str, Any] = parse_image_header(_read_header(data))
+    meta['blurhash'] = None
+    if str(get_system_setting('image_blurhash_enabled') or '1') == '1':
+        meta['blurhash'] = compute_blurhash(data)
+    meta['phash'] = phash or compute_dhash(data)
+    return meta
+
+
+def _process_image_meta(encrypted_id: str, data: ImageSource, phash: Optional[str] = None,
+                        snapshot: bool = False) -> None:
+    from .similarity_service import index_phash
+
+    try:
+        meta = extract_image_meta(data, phash)
+        if not meta['width'] and not meta['blurhash'] and not meta['phash']:
+            return
+        update_image_meta(
+            encrypted_id, meta['width'], meta['height'], meta['orientation'],
+            meta['blurhash'], meta['phash'],
+        )
+        index_phash(encrypted_id, meta['phash'])
+        logger.debug(f"图片元数据已更新: {encrypted_id} {meta['width']}x{meta['height']}")
+    except Exception as e:
+        logger.error(f"图片元数据处理失败: {encrypted_id} - {e}")
+    finally:
+        if snapshot:
+            try:
+                os.remove(data)
+            except OSError:
+                pass
+
+
+def schedule_image_meta(encrypted_id: str, data: ImageSource, phash: Optional[str] = None) -> None:
+    """
+    提交上传后的元数据解析任务（phash 已在上传时算好则直接复用）
+
+    data 为文件路径时先建立硬链接快照（跨设备时复制），调用方随后删除原文件不受影响。
+    """
+    if not encrypted_id or not data:
+        return
+    try:
+        executor = _get_executor()
+        snapshot = isinstance(data, str)
+        if snapshot:
+            os.makedirs(_META_SPOOL_DIR, exist_ok=True)
+            path = os.path.join(_META_SPOOL_DIR, uuid.uuid4().hex)
+            try:
+                os.link(data, path)
+            except OSError:
+                shutil.copyfile(data, path)
+            data = path
+        executor.submit(_process_image_meta, encrypted_id, data, phash, snapshot)
+    except RuntimeError:
+        # 线程池已关闭（进程退出中）
+        pass
+    except OSError as e:
+        logger.warning(f"创建元数据处理快照失败: {encrypted_id} - {e}")
+
+
+def stop_image_meta_workers() -> None:
+    """关闭后处理线程池（不等待排队任务）"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+__all__ = [
+    'HAS_PIL',
+    'parse_image_header',
+    'strip_image_metadata',
+    'is_exif_strip_enabled',
+    'compute_blurhash',
+    'compute_dhash',
+    'extract_image_meta',
+    'schedule_image_meta',
+    'stop_image_meta_workers',
+]
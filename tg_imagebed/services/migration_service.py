@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储后端迁移服务模块
+
+把某个后端上的存量文件（可按上传时间、大小筛选）复制到另一个后端：
+读取源文件 → 校验 file_hash → 写入目标 → 回读校验 → 以原位置为条件原子切换记录。
+删除源对象时把原位置写入删除队列（与切换同一事务），由删除 GC 清理存储对象与旧 TG 消息。
+
+任务与断点持久化在 storage_migrations 表中，由单个调度线程（storage_jobs.JobRunner）按批次执行，
+批内用有界线程池并行复制，可按 MB/s 限流。每批完成后推进断点，
+暂停/取消在批次边界生效；进程重启后 running 状态的任务从断点继续。
+"""
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple
+
+from ..config import logger
+from ..database import (
+    get_file_replicas, delete_replica, swap_file_storage_location,
+    create_storage_migration, get_storage_migration, list_storage_migrations,
+    set_storage_migration_status, list_migration_batch, checkpoint_storage_migration,
+    record_migration_failure,
+)
+from ..storage.base import close_download
+from ..storage.router import get_storage_router, PENDING_BACKEND_NAME
+from .deletion_service import wake_deletion_gc
+from .storage_jobs import ByteRateLimiter, JobRunner, telegram_message_fields, discard_objects
+
+_MAX_WORKERS = 16
+_BATCH_PER_WORKER = 4
+_POLL_INTERVAL_SECONDS = 5
+
+
+def _normalize_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'workers': max(1, min(_MAX_WORKERS, int(options.get('workers') or 4))),
+        'rate_limit_mb': max(0.0, float(options.get('rate_limit_mb') or 0)),
+        'delete_source': bool(options.get('delete_source')),
+        'verify': options.get('verify', True) is not False,
+    }
+
+
+def create_migration(source_backend: str, target_backend: str,
+                     filters: Optional[Dict[str, Any]] = None,
+                     options: Optional[Dict[str, Any]] = None) -> int:
+    """
+    创建迁移任务并唤醒调度线程
+
+    Args:
+        filters: uploaded_after / uploaded_before（时间戳）、min_size / max_size（字节）
+        options: workers 并发数、rate_limit_mb 限速（MB/s，0 不限）、
+                 delete_source 切换后删除源对象、verify 写入后回读校验
+
+    Raises:
+        ValueError: 参数不合法
+    """
+    backends = get_storage_router().list_backends()
+    source_backend = (source_backend or '').strip()
+    target_backend = (target_backend or '').strip()
+    if source_backend not in backends or target_backend not in backends:
+        raise ValueError('源后端或目标后端未配置')
+    if source_backend == target_backend:
+        raise ValueError('源后端与目标后端不能相同')
+    if PENDING_BACKEND_NAME in (source_backend, target_backend):
+        raise ValueError('写回暂存区不能作为迁移源或目标')
+
+    clean_filters = {}
+    for key in ('uploaded_after', 'uploaded_before', 'min_size', 'max_size'):
+        value = (filters or {}).get(key)
+        if value not in (None, ''):
+            clean_filters[key] = int(value)
+
+    migration_id = create_storage_migration(source_backend, target_backend, clean_filters,
+                                            _normalize_options(options or {}))
+    logger.info(f"已创建存储迁移任务 #{migration_id}: {source_backend} -> {target_backend}")
+    _runner.wake()
+    return migration_id
+
+
+def pause_migration(migration_id: int) -> bool:
+    return _runner.pause(migration_id)
+
+
+def resume_migration(migration_id: int) -> bool:
+    return _runner.resume(migration_id)
+
+
+def cancel_migration(migration_id: int) -> bool:
+    return _runner.cancel(migration_id)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _read_all(backend, record: Dict[str, Any]) -> Optional[bytes]:
+    dl = backend.download(file_info=record, range_header=None)
+    if dl.status_code != 200:
+        close_download(dl)
+        return None
+    return b''.join(dl.body)
+
+
+def _migrate_row(migration: Dict[str, Any], row: Dict[str, Any],
+                 limiter: ByteRateLimiter) -> Tuple[str, int, str]:
+    """
+    迁移单个文件
+
+    Returns:
+        (结果 migrated/skipped/failed, 迁移字节数, 说明)
+    """
+    encrypted_id = row['encrypted_id']
+    options = migration.get('options') or {}
+    router = get_storage_router()
+    target = router.get_backend(migration['target_backend'])
+
+    # 源后端出错时可以从已有副本读取，最终以 file_hash 校验
+    source, dl = router.download_with_failover(row, None)
+    if dl.status_code != 200:
+        return 'failed', 0, f"读取源文件失败: backend={source.name}, status={dl.status_code}"
+    content = b''.join(dl.body)
+    digest = _sha256(content)
+    expected = (row.get('file_hash') or '').strip().lower()
+    if expected and expected != digest:
+        return 'failed', 0, '源文件校验失败（file_hash 不一致）'
+
+    limiter.acquire(len(content))
+    filename = row.get('original_filename') or encrypted_id
+    source_tag = row.get('source') or 'web_upload'
+    put_result = target.put_bytes(
+        file_content=content,
+        filename=filename,
+        content_type=row.get('mime_type') or '',
+        file_size=len(content),
+        caption=f"{source_tag} | 迁移 | 文件名: {filename} | 大小: {len(content)} bytes",
+        source=source_tag,
+        username=row.get('username') or 'web_user',
+    )
+    if not put_result:
+        return 'failed', 0, '写入目标后端失败'
+
+    def _discard_new() -> None:
+        discard_objects(encrypted_id, [put_result])
+
+    new_meta = dict(put_result.storage_meta or {})
+    if options.get('verify', True):
+        copied = _read_all(target, dict(row, storage_key=put_result.storage_key, file_id=put_result.file_id,
+                                        file_path=put_result.file_path, storage_meta=new_meta))
+        if copied is None or _sha256(copied) != digest:
+            _discard_new()
+            return 'failed', 0, '目标文件回读校验失败'
+
+    fields: Dict[str, Any] = {
+        'file_id': put_result.file_id,
+        'file_path': put_result.file_path,
+        'storage_backend': put_result.storage_backend,
+        'storage_key': put_result.storage_key,
+        'storage_meta': new_meta,
+    }
+    if not expected:
+        fields['file_hash'] = digest
+    fields.update(telegram_message_fields(new_meta, target, drop_old=bool(options.get('delete_source'))))
+
+    old_backend = migration['source_backend']
+    old_key = row.get('storage_key') or ''
+    tombstone = row if options.get('delete_source') else None
+    if not swap_file_storage_location(encrypted_id, old_backend, old_key, fields, tombstone=tombstone):
+        _discard_new()
+        return 'skipped', 0, '记录已被删除或改动'
+
+    # 目标后端上原有的镜像/热层副本已与主副本重复：副本对象（含 TG 消息）与记录同一事务登记删除
+    queued = False
+    for replica in get_file_replicas(encrypted_id):
+        if replica['storage_backend'] != target.name:
+            continue
+        queue_cleanup = replica.get('storage_key') != put_result.storage_key
+        if delete_replica(encrypted_id, target.name, queue_cleanup=queue_cleanup) and queue_cleanup:
+            queued = True
+
+    if tombstone or queued:
+        wake_deletion_gc()
+    return 'migrated', len(content), ''
+
+
+def _run_migration(migration_id: int) -> None:
+    """按批执行一个迁移任务，直到完成、暂停、取消或进程停止"""
+    migration = get_storage_migration(migration_id)
+    if not migration:
+        return
+    options = migration.get('options') or {}
+    workers = max(1, min(_MAX_WORKERS, int(options.get('workers') or 4)))
+    limiter = ByteRateLimiter(float(options.get('rate_limit_mb') or 0) * 1024 * 1024, _runner.stop_event)
+    logger.info(f"开始执行存储迁移 #{migration_id}: {migration['source_backend']} -> {migration['target_backend']}")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'migrate-{migration_id}') as pool:
+        while not _runner.stop_event.is_set():
+            migration = get_storage_migration(migration_id)
+            if not migration or migration['status'] != 'running':
+                return
+            batch = list_migration_batch(migration, workers * _BATCH_PER_WORKER)
+            if not batch:
+                set_storage_migration_status(migration_id, 'completed', from_statuses=('running',))
+                logger.info(f"存储迁移 #{migration_id} 完成")
+                return
+
+            def _safe(row):
+                try:
+                    return _migrate_row(migration, row, limiter)
+                except Exception as e:
+                    return 'failed', 0, str(e)
+
+            counts = {'migrated': 0, 'skipped': 0, 'failed': 0}
+            moved = 0
+            for row, (outcome, size, message) in zip(batch, pool.map(_safe, batch)):
+                counts[outcome] += 1
+                moved += size
+                if outcome == 'failed':
+                    record_migration_failure(migration_id, row['encrypted_id'], message)
+                    logger.warning(f"存储迁移 #{migration_id} 文件失败: {row['encrypted_id']} - {message}")
+            checkpoint_storage_migration(
+                migration_id, batch[-1]['encrypted_id'],
+                migrated=counts['migrated'], skipped=counts['skipped'],
+                failed=counts['failed'], migrated_bytes=moved,
+            )
+
+
+_runner = JobRunner(
+    name='storage-migration',
+    label='存储迁移',
+    list_jobs=list_storage_migrations,
+    set_status=set_storage_migration_status,
+    run_job=_run_migration,
+    poll_interval=_POLL_INTERVAL_SECONDS,
+)
+
+
+def start_migration_worker() -> None:
+    """启动迁移调度线程（会续跑重启前未完成的任务）"""
+    _runner.start()
+
+
+def stop_migration_worker() -> None:
+    """停止迁移线程（当前批次结束后退出，任务保持 running，下次启动从断点继续）"""
+    _runner.stop()
+
+
+__all__ = [
+    'create_migration',
+    'pause_migration',
+    'resume_migration',
+    'cancel_migration',
+    'start_migration_worker',
+    'stop_migration_worker',
+]
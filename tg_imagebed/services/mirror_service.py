@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+镜像复制服务模块
+
+镜像策略（storage_mirror_policy_json）为主后端配置若干副本后端：
+上传时主后端同步写入，副本在后台线程异步复制并登记到 file_replicas。
+读取时由 StorageRouter.download_with_failover 在主副本之间切换。
+
+file_replicas 本身就是任务表：重启后重新扫描 pending 记录，
+此时原始字节已不在内存中，会先从现有副本读回再复制。
+主记录删除后副本被触发器标记为 orphaned，由这里把远端对象登记到删除队列
+（Telegram 副本需删除消息，由删除 GC 统一处理）。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List
+
+from ..config import logger
+from ..database import (
+    get_file_info, create_replica_tasks, complete_replica, fail_replica,
+    list_replica_tasks, delete_replica, close_thread_connections,
+)
+from ..storage.router import get_storage_router, PENDING_BACKEND_NAME
+from .deletion_service import wake_deletion_gc
+from .storage_jobs import discard_objects
+
+# 单个副本的最大尝试次数
+_MAX_ATTEMPTS = 5
+_RESCAN_INTERVAL_SECONDS = 300
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_inflight: set = set()       # (encrypted_id, backend)，避免同一副本并发复制
+_inflight_lock = threading.Lock()
+
+_rescan_thread: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='mirror')
+    return _executor
+
+
+def _read_content(encrypted_id: str) -> Optional[bytes]:
+    """从主后端或已有副本读回文件字节（重启后补复制使用）"""
+    file_info = get_file_info(encrypted_id)
+    if not file_info:
+        return None
+    backend, dl = get_storage_router().download_with_failover(file_info, None)
+    if dl.status_code != 200:
+        logger.warning(f"读取镜像源文件失败: {encrypted_id} (backend={backend.name}, status={dl.status_code})")
+        return None
+    return b''.join(dl.body)
+
+
+def _replicate(encrypted_id: str, target_name: str, content: Optional[bytes],
+               attempts: int = 0) -> None:
+    key = (encrypted_id, target_name)
+    try:
+        file_info = get_file_info(encrypted_id)
+        if not file_info:
+            return  # 主记录已删除，触发器会把副本标记为 orphaned
+
+        if content is None:
+            content = _read_content(encrypted_id)
+        if content is None:
+            fail_replica(encrypted_id, target_name, 'source unavailable', give_up=attempts + 1 >= _MAX_ATTEMPTS)
+            return
+
+        router = get_storage_router()
+        target = router.get_backend(target_name)
+        filename = file_info.get('original_filename') or encrypted_id
+        source = file_info.get('source') or 'web_upload'
+        try:
+            put_result = target.put_bytes(
+                file_content=content,
+                filename=filename,
+                content_type=file_info.get('mime_type') or '',
+                file_size=len(content),
+                caption=f"{source} | 镜像副本 | 文件名: {filename} | 大小: {len(content)} bytes",
+                source=source,
+                username=file_info.get('username') or 'web_user',
+            )
+        except Exception as e:
+            put_result = None
+            error = str(e)
+        else:
+            error = None if put_result else 'backend returned no result'
+
+        if error:
+            give_up = attempts + 1 >= _MAX_ATTEMPTS
+            fail_replica(encrypted_id, target_name, error, give_up=give_up)
+            logger.warning(f"镜像复制失败{'（已放弃）' if give_up else ''}: {encrypted_id} -> {target_name}: {error}")
+            return
+
+        if complete_replica(
+            encrypted_id, target_name,
+            file_id=put_result.file_id,
+            file_path=put_result.file_path,
+            storage_key=put_result.storage_key,
+            storage_meta=put_result.storage_meta,
+        ):
+            logger.info(f"镜像复制完成: {encrypted_id} -> {target_name}")
+        else:
+            # 复制期间主记录被删除：刚写入的对象登记到删除队列
+            discard_objects(encrypted_id, [put_result])
+            delete_replica(encrypted_id, target_name)
+    except Exception as e:
+        logger.error(f"镜像复制异常: {encrypted_id} -> {target_name}: {e}")
+    finally:
+        with _inflight_lock:
+            _inflight.discard(key)
+
+
+def _submit(encrypted_id: str, target_name: str, content: Optional[bytes], attempts: int = 0) -> bool:
+    key = (encrypted_id, target_name)
+    with _inflight_lock:
+        if key in _inflight:
+            return False
+        _inflight.add(key)
+    _get_executor().submit(_replicate, encrypted_id, target_name, content, attempts)
+    return True
+
+
+def schedule_mirror(encrypted_id: str, primary_backend: str, content: Optional[bytes]) -> List[str]:
+    """
+    按镜像策略登记并异步复制副本
+
+    Args:
+        primary_backend: 文件的主后端名称（写回模式下为最终目标后端）
+        content: 文件字节；为 None 时复制前从主后端读回
+
+    Returns:
+        需要复制的副本后端列表
+    """
+    if not primary_backend or primary_backend == PENDING_BACKEND_NAME:
+        return []
+    try:
+        targets = get_storage_router().get_mirror_targets(primary_backend)
+        if not targets:
+            return []
+        create_replica_tasks(encrypted_id, targets)
+        for name in targets:
+            _submit(encrypted_id, name, content)
+        return targets
+    except Exception as e:
+        logger.error(f"登记镜像副本失败: {encrypted_id} - {e}")
+        return []
+
+
+def cleanup_orphan_replicas(limit: int = 500) -> int:
+    """把主记录已不存在的副本对象登记到删除队列并删除副本记录，返回清理数量"""
+    configured = get_storage_router().list_backends()
+    removed = 0
+    for replica in list_replica_tasks('orphaned', limit=limit):
+        name = replica['storage_backend']
+        # 后端已从配置中移除时无从清理，只删除记录
+        if delete_replica(replica['encrypted_id'], name, queue_cleanup=name in configured):
+            removed += 1
+    if removed:
+        wake_deletion_gc()
+        logger.info(f"已清理孤儿镜像副本: {removed} 个")
+    return removed
+
+
+def rescan_pending_replicas(limit: int = 500) -> int:
+    """重新提交未完成的副本复制任务，返回提交数量"""
+    submitted = 0
+    for replica in list_replica_tasks('pending', limit=limit):
+        if _submit(replica['encrypted_id'], replica['storage_backend'], None, int(replica.get('attempts') or 0)):
+            submitted += 1
+    if submitted:
+        logger.info(f"镜像复制任务已恢复: {submitted} 个")
+    return submitted
+
+
+def _rescan_worker() -> None:
+    while not _stop_event.is_set():
+        try:
+            cleanup_orphan_replicas()
+            rescan_pending_replicas()
+        except Exception as e:
+            logger.error(f"扫描镜像副本失败: {e}")
+        _stop_event.wait(timeout=_RESCAN_INTERVAL_SECONDS)
+    close_thread_connections()
+
+
+def start_mirror_worker() -> None:
+    """启动镜像补偿线程（恢复未完成复制、清理孤儿副本）"""
+    global _rescan_thread
+    if _rescan_thread and _rescan_thread.is_alive():
+        return
+    _stop_event.clear()
+    _rescan_thread = threading.Thread(target=_rescan_worker, name='mirror-rescan', daemon=True)
+    _rescan_thread.start()
+
+
+def stop_mirror_worker() -> None:
+    """停止镜像线程（未完成的副本保持 pending，下次启动继续）"""
+    global _rescan_thread, _executor
+    _stop_event.set()
+    if _rescan_thread and _rescan_thread.is_alive():
+        _rescan_thread.join(timeout=5)
+    _rescan_thread = None
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+__all__ = [
+    'schedule_mirror',
+    'cleanup_orphan_replicas',
+    'rescan_pending_replicas',
+    'start_mirror_worker',
+    'stop_mirror_worker',
+]
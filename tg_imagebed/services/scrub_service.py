@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储完整性巡检服务模块
+
+后台按 encrypted_id 的 keyset 顺序遍历 file_storage，检查主副本与各镜像/热层副本：
+
+- exists 模式：只读取首字节，确认对象存在（Telegram 的 file_id 是否失效、本地文件是否丢失、S3 key 是否缺失）
+- hash 模式：完整读取并与 file_hash 比对 SHA-256，发现静默损坏
+
+批内用有界线程池并行检查，所有巡检线程共享一个全局带宽上限（storage_scrub_bandwidth_mb）。
+问题写入 storage_scrub_issues，管理员可复查单个文件，或从健康的副本修复。
+任务与断点持久化在 storage_scrub_runs 表中，由 storage_jobs.JobRunner 调度，
+暂停/取消在批次边界生效，重启后从断点继续。
+"""
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+
+from ..config import logger
+from ..database import (
+    get_file_info, get_file_replicas, delete_replica, swap_file_storage_location,
+    get_system_setting, get_system_setting_int,
+    create_scrub_run, get_scrub_run, list_scrub_runs, set_scrub_run_status,
+    list_scrub_batch, checkpoint_scrub_run,
+    record_scrub_issue, clear_scrub_issue,
+)
+from ..storage.base import close_download
+from ..storage.router import get_storage_router, PENDING_BACKEND_NAME
+from .deletion_service import wake_deletion_gc
+from .mirror_service import schedule_mirror
+from .storage_jobs import ByteRateLimiter, JobRunner, telegram_message_fields, discard_objects
+
+SCRUB_MODES = ('exists', 'hash')
+
+_MAX_WORKERS = 16
+_BATCH_PER_WORKER = 8
+_POLL_INTERVAL_SECONDS = 10
+
+
+def _refresh_bandwidth() -> None:
+    _bandwidth.set_rate(
+        get_system_setting_int('storage_scrub_bandwidth_mb', 20, minimum=0, maximum=10000) * 1024 * 1024
+    )
+
+
+def check_object(backend, record: Dict[str, Any], verify_hash: bool,
+                 limiter: Optional[ByteRateLimiter] = None) -> Tuple[str, str, int]:
+    """
+    检查单个存储对象
+
+    Args:
+        record: 指向该对象的文件记录（副本需替换为副本的 storage_key 等字段）
+        verify_hash: 完整读取并比对 file_hash（记录没有 file_hash 时只确认可完整读取）
+
+    Returns:
+        (结果 ok/missing/corrupt/error, 说明, 读取字节数)
+    """
+    limiter = limiter or _bandwidth
+    try:
+        dl = backend.download(file_info=record, range_header=None if verify_hash else 'bytes=0-0')
+    except Exception as e:
+        return 'error', f"读取异常: {e}", 0
+    if dl.status_code in (404, 410):
+        close_download(dl)
+        return 'missing', f"对象不存在 (status={dl.status_code})", 0
+    if dl.status_code not in (200, 206):
+        close_download(dl)
+        return 'error', f"读取失败 (status={dl.status_code})", 0
+    if not verify_hash:
+        close_download(dl)
+        return 'ok', '', 0
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        for chunk in dl.body:
+            if _runner.stop_event.is_set():
+                return 'error', '巡检已停止', size
+            limiter.acquire(len(chunk))
+            digest.update(chunk)
+            size += len(chunk)
+    except Exception as e:
+        return 'error', f"读取中断: {e}", size
+    finally:
+        close_download(dl)
+
+    expected_size = int(record.get('file_size') or 0)
+    if expected_size and size != expected_size:
+        return 'corrupt', f"大小不一致: 期望 {expected_size}，实际 {size}", size
+    expected = (record.get('file_hash') or '').strip().lower()
+    if expected and digest.hexdigest() != expected:
+        return 'corrupt', 'SHA-256 与 file_hash 不一致', size
+    return 'ok', '', size
+
+
+def _targets(row: Dict[str, Any], include_replicas: bool) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """(后端名, 角色, 对象记录)：主副本 + 已完成的副本"""
+    primary = row.get('storage_backend') or 'telegram'
+    targets = [(primary, 'primary', row)]
+    if include_replicas:
+        for replica in get_file_replicas(row['encrypted_id']):
+            if replica['storage_backend'] == primary:
+                continue
+            record = dict(row)
+            record.update({
+                'storage_backend': replica['storage_backend'],
+                'storage_key': replica.get('storage_key'),
+                'file_id': replica.get('file_id'),
+                'file_path': replica.get('file_path'),
+                'storage_meta': replica.get('storage_meta') or {},
+            })
+            targets.append((replica['storage_backend'], replica.get('role') or 'mirror', record))
+    return targets
+
+
+def _scrub_row(row: Dict[str, Any], verify_hash: bool, include_replicas: bool,
+               run_id: Optional[int] = None) -> Tuple[str, int, List[Dict[str, Any]]]:
+    """
+    巡检一个文件的所有副本并更新问题报告
+
+    Returns:
+        (汇总结果 ok/broken/error, 读取字节数, 各副本结果)
+    """
+    router = get_storage_router()
+    configured = router.list_backends()
+    results: List[Dict[str, Any]] = []
+    scanned = 0
+    for name, role, record in _targets(row, include_replicas):
+        if name not in configured and name != PENDING_BACKEND_NAME:
+            status, detail, size = 'error', '后端未配置', 0
+        else:
+            status, detail, size = check_object(router.get_backend(name), record, verify_hash)
+        scanned += size
+        results.append({'storage_backend': name, 'role': role, 'status': status, 'detail': detail})
+        if status == 'ok':
+            clear_scrub_issue(row['encrypted_id'], name)
+        else:
+            record_scrub_issue(row['encrypted_id'], name, storage_key=record.get('storage_key') or '',
+                               role=role, status=status, detail=detail, run_id=run_id)
+
+    statuses = {item['status'] for item in results}
+    if statuses & {'missing', 'corrupt'}:
+        return 'broken', scanned, results
+    if 'error' in statuses:
+        return 'error', scanned, results
+    return 'ok', scanned, results
+
+
+def verify_file(encrypted_id: str, verify_hash: bool = True) -> Optional[List[Dict[str, Any]]]:
+    """立即复查单个文件（主副本 + 全部副本），返回各副本结果；记录不存在时返回 None"""
+    row = get_file_info(encrypted_id)
+    if not row:
+        clear_scrub_issue(encrypted_id)
+        return None
+    _, _, results = _scrub_row(row, verify_hash, include_replicas=True)
+    return results
+
+
+def _read_healthy_copy(row: Dict[str, Any], exclude: str) -> Optional[bytes]:
+    """从其它副本读取一份校验通过的内容"""
+    router = get_storage_router()
+    configured = router.list_backends()
+    expected = (row.get('file_hash') or '').strip().lower()
+    for name, _, record in _targets(row, include_replicas=True):
+        if name == exclude or name not in configured:
+            continue
+        try:
+            dl = router.get_backend(name).download(file_info=record, range_header=None)
+        except Exception as e:
+            logger.warning(f"读取修复源失败: {name} - {e}")
+            continue
+        if dl.status_code != 200:
+            close_download(dl)
+            continue
+        try:
+            content = b''.join(dl.body)
+        except Exception as e:
+            logger.warning(f"读取修复源中断: {name} - {e}")
+            continue
+        if expected and hashlib.sha256(content).hexdigest() != expected:
+            logger.warning(f"修复源校验失败，跳过: {row['encrypted_id']}@{name}")
+            continue
+        return content
+    return None
+
+
+def _repair_primary(row: Dict[str, Any]) -> Tuple[bool, str]:
+    """用健康副本的内容重写主副本，并以原位置为条件切换记录"""
+    encrypted_id = row['encrypted_id']
+    primary_name = row.get('storage_backend') or 'telegram'
+    content = _read_healthy_copy(row, exclude=primary_name)
+    if content is None:
+        return False, '没有可用的健康副本'
+
+    router = get_storage_router()
+    target = router.get_backend(primary_name)
+    filename = row.get('original_filename') or encrypted_id
+    source = row.get('source') or 'web_upload'
+    put_result = target.put_bytes(
+        file_content=content,
+        filename=filename,
+        content_type=row.get('mime_type') or '',
+        file_size=len(content),
+        caption=f"{source} | 巡检修复 | 文件名: {filename} | 大小: {len(content)} bytes",
+        source=source,
+        username=row.get('username') or 'web_user',
+    )
+    if not put_result:
+        return False, '写入主后端失败'
+
+    new_meta = dict(put_result.storage_meta or {})
+    fields: Dict[str, Any] = {
+        'file_id': put_result.file_id,
+        'file_path': put_result.file_path,
+        'storage_key': put_result.storage_key,
+        'storage_meta': new_meta,
+    }
+    # 旧对象（含 TG 旧消息）与切换同一事务登记删除，记录改为指向新消息
+    fields.update(telegram_message_fields(new_meta, target, drop_old=True))
+
+    old_key = row.get('storage_key') or ''
+    tombstone = row if old_key and old_key != put_result.storage_key else None
+    if not swap_file_storage_location(encrypted_id, primary_name, old_key, fields, tombstone=tombstone):
+        discard_objects(encrypted_id, [put_result])
+        return False, '记录已被删除或改动'
+    if tombstone:
+        wake_deletion_gc()
+    return True, '已从副本重写主副本'
+
+
+def _repair_replica(row: Dict[str, Any], backend_name: str) -> Tuple[bool, str]:
+    """丢弃损坏的副本；镜像副本按策略重新复制，热层副本交给分层服务重新晋升"""
+    encrypted_id = row['encrypted_id']
+    replica = next((r for r in get_file_replicas(encrypted_id) if r['storage_backend'] == backend_name), None)
+    if not replica:
+        return True, '副本已不存在'
+    # 损坏对象（含 TG 消息）与副本记录同一事务登记删除，由删除 GC 回收
+    if delete_replica(encrypted_id, backend_name,
+                      queue_cleanup=backend_name in get_storage_router().list_backends()):
+        wake_deletion_gc()
+    if (replica.get('role') or 'mirror') == 'mirror':
+        scheduled = schedule_mirror(encrypted_id, row.get('storage_backend') or 'telegram', None)
+        if backend_name in scheduled:
+            return True, '已丢弃损坏副本并重新复制'
+    return True, '已丢弃损坏副本'
+
+
+def repair_file(encrypted_id: str, backend_name: Optional[str] = None) -> Tuple[bool, str]:
+    """
+    修复文件在某个后端上的副本（默认主副本）
+
+    Returns:
+        (是否成功, 说明)
+    """
+    row = get_file_info(encrypted_id)
+    if not row:
+        clear_scrub_issue(encrypted_id)
+        return False, '文件记录不存在'
+    primary_name = row.get('storage_backend') or 'telegram'
+    backend_name = backend_name or primary_name
+    if backend_name == PENDING_BACKEND_NAME:
+        return False, '写回暂存区中的文件由写回服务处理'
+    if backend_name == primary_name:
+        ok, message = _repair_primary(row)
+        role = 'primary'
+    else:
+        ok, message = _repair_replica(row, backend_name)
+        role = 'replica'
+    if ok:
+        record_scrub_issue(encrypted_id, backend_name, storage_key='', role=role,
+                           status='repaired', detail=message)
+        logger.info(f"巡检修复完成: {encrypted_id}@{backend_name} - {message}")
+    else:
+        logger.warning(f"巡检修复失败: {encrypted_id}@{backend_name} - {message}")
+    return ok, message
+
+
+def create_scrub(mode: str = 'exists', options: Optional[Dict[str, Any]] = None) -> int:
+    """
+    创建巡检任务并唤醒调度线程
+
+    Args:
+        mode: exists 只确认存在；hash 完整读取并比对 SHA-256
+        options: workers 并发数、include_replicas 是否同时检查副本
+
+    Raises:
+        ValueError: 参数不合法
+    """
+    mode = (mode or 'exists').strip().lower()
+    if mode not in SCRUB_MODES:
+        raise ValueError(f"不支持的巡检模式: {mode}")
+    if list_scrub_runs(('pending', 'running'), limit=1):
+        raise ValueError('已有进行中的巡检任务')
+    options = options or {}
+    default_workers = get_system_setting_int('storage_scrub_workers', 4, minimum=1, maximum=_MAX_WORKERS)
+    clean_options = {
+        'workers': max(1, min(_MAX_WORKERS, int(options.get('workers') or default_workers))),
+        'include_replicas': options.get('include_replicas', True) is not False,
+    }
+    run_id = create_scrub_run(mode, clean_options)
+    logger.info(f"已创建存储巡检任务 #{run_id} (mode={mode})")
+    _runner.wake()
+    return run_id
+
+
+def pause_scrub(run_id: int) -> bool:
+    return _runner.pause(run_id)
+
+
+def resume_scrub(run_id: int) -> bool:
+    return _runner.resume(run_id)
+
+
+def cancel_scrub(run_id: int) -> bool:
+    return _runner.cancel(run_id)
+
+
+def _run_scrub(run_id: int) -> None:
+    """按批执行一个巡检任务，直到完成、暂停、取消或进程停止"""
+    run = get_scrub_run(run_id)
+    if not run:
+        return
+    options = run.get('options') or {}
+    workers = max(1, min(_MAX_WORKERS, int(options.get('workers') or 4)))
+    verify_hash = run['mode'] == 'hash'
+    include_replicas = options.get('include_replicas', True) is not False
+    logger.info(f"开始执行存储巡检 #{run_id} (mode={run['mode']}, workers={workers})")
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'scrub-{run_id}') as pool:
+        while not _runner.stop_event.is_set():
+            run = get_scrub_run(run_id)
+            if not run or run['status'] != 'running':
+                return
+            _refresh_bandwidth()
+            batch = list_scrub_batch(run['checkpoint_key'], workers * _BATCH_PER_WORKER)
+            if not batch:
+                set_scrub_run_status(run_id, 'completed', from_statuses=('running',))
+                logger.info(f"存储巡检 #{run_id} 完成")
+                return
+
+            def _safe(row):
+                try:
+                    return _scrub_row(row, verify_hash, include_replicas, run_id=run_id)
+                except Exception as e:
+                    logger.warning(f"巡检文件异常: {row['encrypted_id']} - {e}")
+                    return 'error', 0, []
+
+            counts = {'ok': 0, 'broken': 0, 'error': 0}
+            scanned = 0
+            for outcome, size, _ in pool.map(_safe, batch):
+                counts[outcome] += 1
+                scanned += size
+            if _runner.stop_event.is_set():
+                # 被中断的批次不推进断点，下次启动重新检查
+                return
+            checkpoint_scrub_run(
+                run_id, batch[-1]['encrypted_id'], checked=len(batch),
+                ok=counts['ok'], broken=counts['broken'], errors=counts['error'], scanned_bytes=scanned,
+            )
+            if counts['broken']:
+                logger.warning(f"存储巡检 #{run_id} 本批发现 {counts['broken']} 个损坏/缺失文件")
+
+
+def _maybe_schedule() -> None:
+    """按 storage_scrub_interval_hours 自动创建周期巡检任务（0 表示只手动触发）"""
+    interval_hours = get_system_setting_int('storage_scrub_interval_hours', 0, minimum=0, maximum=24 * 365)
+    if not interval_hours:
+        return
+    runs = list_scrub_runs(limit=1)
+    if runs:
+        last = runs[0]
+        if last['status'] in ('pending', 'running', 'paused'):
+            return
+        if time.time() - (last.get('finished_at') or last['created_at']) < interval_hours * 3600:
+            return
+    mode = 'hash' if str(get_system_setting('storage_scrub_verify_hash') or '0') == '1' else 'exists'
+    create_scrub(mode)
+
+
+_runner = JobRunner(
+    name='storage-scrub',
+    label='存储巡检',
+    list_jobs=list_scrub_runs,
+    set_status=set_scrub_run_status,
+    run_job=_run_scrub,
+    poll_interval=_POLL_INTERVAL_SECONDS,
+    before_poll=_maybe_schedule,
+)
+# 全局读取带宽上限，所有巡检线程共享，速率每批按 storage_scrub_bandwidth_mb 刷新
+_bandwidth = ByteRateLimiter(stop_event=_runner.stop_event)
+
+
+def start_scrub_worker() -> None:
+    """启动巡检调度线程（会续跑重启前未完成的任务）"""
+    _runner.start()
+
+
+def stop_scrub_worker() -> None:
+    """停止巡检线程（任务保持 running，下次启动从断点继续）"""
+    _runner.stop()
+
+
+__all__ = [
+    'SCRUB_MODES',
+    'check_object',
+    'verify_file',
+    'repair_file',
+    'create_scrub',
+    'pause_scrub',
+    'resume_scrub',
+    'cancel_scrub',
+    'start_scrub_worker',
+    'stop_scrub_worker',
+]
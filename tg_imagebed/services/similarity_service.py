@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重复图片检索 - 感知哈希（dHash）索引
+
+64 位 dHash 按 16 位切成 4 段做多索引哈希（Multi-Index Hashing）：
+汉明距离 ≤ r 的两个哈希，至少有一段的距离 ≤ r // 4，
+因此只需在每段枚举半径 r // 4 内的邻居键，再对候选做精确距离校验。
+索引常驻内存，首次使用时从数据库加载，新上传由后处理线程增量加入。
+"""
+import threading
+import time
+from itertools import combinations
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+from ..config import logger
+from ..database.connection import get_connection, close_thread_connections
+
+_BANDS = 4
+_BAND_BITS = 16
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _band_neighbors(value: int, radius: int) -> List[int]:
+    """枚举与 value 汉明距离不超过 radius 的所有 16 位键"""
+    keys = [value]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(_BAND_BITS), r):
+            flipped = value
+            for bit in bits:
+                flipped ^= 1 << bit
+            keys.append(flipped)
+    return keys
+
+
+class PerceptualHashIndex:
+    """dHash 多索引哈希表（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._hashes: Dict[str, int] = {}
+        self._tables: List[Dict[int, Set[str]]] = [{} for _ in range(_BANDS)]
+        self._loaded = False
+
+    @staticmethod
+    def _split(value: int) -> List[int]:
+        return [(value >> (i * _BAND_BITS)) & _BAND_MASK for i in range(_BANDS)]
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, encrypted_id: str, phash: str) -> None:
+        try:
+            value = int(phash, 16)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            self.discard(encrypted_id)
+            self._hashes[encrypted_id] = value
+            for table, key in zip(self._tables, self._split(value)):
+                table.setdefault(key, set()).add(encrypted_id)
+
+    def discard(self, encrypted_id: str) -> None:
+        with self._lock:
+            value = self._hashes.pop(encrypted_id, None)
+            if value is None:
+                return
+            for table, key in zip(self._tables, self._split(value)):
+                bucket = table.get(key)
+                if bucket:
+                    bucket.discard(encrypted_id)
+                    if not bucket:
+                        del table[key]
+
+    def search(self, phash: str, max_distance: int, exclude: Optional[str] = None) -> List[Tuple[str, int]]:
+        """返回 [(encrypted_id, distance)]，按距离升序"""
+        try:
+            value = int(phash, 16)
+        except (TypeError, ValueError):
+            return []
+        max_distance = max(0, min(32, int(max_distance)))
+        band_radius = max_distance // _BANDS
+
+        with self._lock:
+            candidates: Set[str] = set()
+            for table, key in zip(self._tables, self._split(value)):
+                for neighbor in _band_neighbors(key, band_radius):
+                    bucket = table.get(neighbor)
+                    if bucket:
+                        candidates.update(bucket)
+
+            results = []
+            for encrypted_id in candidates:
+                if encrypted_id == exclude:
+                    continue
+                distance = hamming_distance(value, self._hashes[encrypted_id])
+                if distance <= max_distance:
+                    results.append((encrypted_id, distance))
+        results.sort(key=lambda item: (item[1], item[0]))
+        return results
+
+    def items(self) -> List[Tuple[str, int]]:
+        with self._lock:
+            return list(self._hashes.items())
+
+    def ensure_loaded(self) -> None:
+        """首次使用时从数据库加载全部已有哈希"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            with get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT encrypted_id, phash FROM file_storage WHERE phash IS NOT NULL AND phash != ''")
+                rows = cursor.fetchall()
+            for row in rows:
+                self.add(row[0], row[1])
+            self._loaded = True
+            logger.info(f"感知哈希索引已加载: {len(self._hashes)} 条")
+
+
+_index = PerceptualHashIndex()
+
+
+def get_phash_index() -> PerceptualHashIndex:
+    _index.ensure_loaded()
+    return _index
+
+
+def index_phash(encrypted_id: str, phash: Optional[str]) -> None:
+    """新哈希入库后同步加入索引（重复加入是幂等的，可与首次加载并发）"""
+    if phash:
+        _index.add(encrypted_id, phash)
+
+
+def _filter_existing(matches: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    """剔除已删除的图片（索引不跟踪删除，查询时惰性清理）并补全展示字段"""
+    if not matches:
+        return []
+    ids = [m[0] for m in matches]
+    rows: Dict[str, Dict[str, Any]] = {}
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(f'''
+                SELECT encrypted_id, original_filename, file_size, created_at, width, height
+                FROM file_storage WHERE encrypted_id IN ({placeholders})
+            ''', chunk)
+            for row in cursor.fetchall():
+                rows[row['encrypted_id']] = dict(row)
+
+    results = []
+    for encrypted_id, distance in matches:
+        row = rows.get(encrypted_id)
+        if row is None:
+            _index.discard(encrypted_id)
+            continue
+        row['distance'] = distance
+        results.append(row)
+    return results
+
+
+def find_similar_images(phash: str, max_distance: int = 6, limit: int = 20,
+                        exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+    """按感知哈希查找近似图片"""
+    if not phash:
+        return []
+    matches = get_phash_index().search(phash, max_distance, exclude=exclude)
+    return _filter_existing(matches[:max(1, limit) * 2])[:limit]
+
+
+# ===================== 近似重复分组（后台任务） =====================
+# 全量聚类对每张图片做一次近邻检索，图片多时耗时数秒以上，不能在请求线程内同步执行；
+# 由后台线程计算并按距离缓存结果，接口只读缓存。
+_GROUP_CACHE_TTL_SECONDS = 600
+# 聚类允许的最大距离：每段枚举半径 ≤ 2（每张图 4 × 137 次桶查找），更大的半径组合数急剧膨胀
+_MAX_GROUP_DISTANCE = 11
+
+_groups_lock = threading.Lock()
+_groups_cache: Dict[int, Dict[str, Any]] = {}
+_groups_thread: Optional[threading.Thread] = None
+
+
+def _cluster_duplicates(max_distance: int) -> List[List[str]]:
+    """按近似关系做连通分量聚类，返回成员数 ≥ 2 的 ID 分组（成员数降序）"""
+    index = get_phash_index()
+    parent: Dict[str, str] = {}
+
+    def _find(x: str) -> str:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for encrypted_id, value in index.items():
+        for other, _distance in index.search(format(value, '016x'), max_distance, exclude=encrypted_id):
+            parent.setdefault(encrypted_id, encrypted_id)
+            parent.setdefault(other, other)
+            ra, rb = _find(encrypted_id), _find(other)
+            if ra != rb:
+                parent[ra] = rb
+
+    groups: Dict[str, List[str]] = {}
+    for encrypted_id in parent:
+        groups.setdefault(_find(encrypted_id), []).append(encrypted_id)
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def _run_group_job(max_distance: int) -> None:
+    global _groups_thread
+    started = time.time()
+    try:
+        groups = _cluster_duplicates(max_distance)
+        with _groups_lock:
+            _groups_cache[max_distance] = {'groups': groups, 'computed_at': int(started)}
+        logger.info(f"近似重复分组完成: 距离 {max_distance}, {len(groups)} 组, 耗时 {time.time() - started:.1f}s")
+    except Exception as e:
+        logger.error(f"近似重复分组失败: {e}")
+    finally:
+        close_thread_connections()
+        with _groups_lock:
+            _groups_thread = None
+
+
+def _start_group_job(max_distance: int) -> bool:
+    """启动后台分组任务（同一时间只运行一个），返回是否已在运行或成功启动当前距离的任务"""
+    global _groups_thread
+    with _groups_lock:
+        if _groups_thread is not None:
+            return _groups_thread.name == f'phash-groups-{max_distance}'
+        _groups_thread = threading.Thread(target=_run_group_job, args=(max_distance,),
+                                          name=f'phash-groups-{max_distance}', daemon=True)
+        _groups_thread.start()
+        return True
+
+
+def find_duplicate_groups(max_distance: int = 4, limit: int = 50, refresh: bool = False) -> Dict[str, Any]:
+    """
+    返回近似重复分组（读取后台任务的缓存结果）
+
+    缓存缺失、过期或 refresh=True 时在后台重新计算，本次先返回已有结果（可能为空）。
+    分组按成员数降序；每组内第一张为最早上传的图片。
+
+    Returns:
+        {'groups': [...], 'computed_at': 时间戳或 None, 'running': 是否有任务在计算该距离}
+    """
+    max_distance = max(0, min(_MAX_GROUP_DISTANCE, int(max_distance)))
+    with _groups_lock:
+        cached = _groups_cache.get(max_distance)
+    stale = cached is None or time.time() - cached['computed_at'] > _GROUP_CACHE_TTL_SECONDS
+    running = _start_group_job(max_distance) if (stale or refresh) else False
+
+    result = []
+    for members in (cached or {}).get('groups', []):
+        rows = _filter_existing([(m, 0) for m in members])
+        if len(rows) < 2:
+            continue
+        rows.sort(key=lambda r: str(r.get('created_at') or ''))
+        for row in rows:
+            row.pop('distance', None)
+        result.append(rows)
+        if len(result) >= limit:
+            break
+    return {
+        'groups': result,
+        'computed_at': cached['computed_at'] if cached else None,
+        'running': running,
+    }
+
+
+__all__ = [
+    'PerceptualHashIndex',
+    'hamming_distance',
+    'get_phash_index',
+    'index_phash',
+    'find_similar_images',
+    'find_duplicate_groups',
+]
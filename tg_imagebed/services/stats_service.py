@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统计对账服务模块
+
+站点统计、上传日桶与存储用量计数由触发器增量维护；手工改库、从备份恢复单表等操作
+可能让计数与 file_storage 产生偏差。后台线程按 stats_reconcile_interval_hours
+周期全量重算并修正，修正量记录到日志。
+"""
+import threading
+import time
+from typing import Optional
+
+from ..config import logger
+from ..database import get_system_setting_int, reconcile_site_stats, close_thread_connections
+
+_worker_thread: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+
+# 启动后首次对账的延迟（秒），避开启动阶段的写入高峰
+_INITIAL_DELAY_SECONDS = 300
+
+
+def _reconcile_worker() -> None:
+    last_run = time.time() - 86400 * 365
+    if _stop_event.wait(timeout=_INITIAL_DELAY_SECONDS):
+        return
+    while not _stop_event.is_set():
+        hours = get_system_setting_int('stats_reconcile_interval_hours', 24, minimum=0, maximum=24 * 30)
+        if hours and time.time() - last_run >= hours * 3600:
+            last_run = time.time()
+            try:
+                drift = reconcile_site_stats()
+                if drift:
+                    logger.warning(f"统计对账修正 {len(drift)} 项偏差: {dict(list(drift.items())[:10])}")
+                else:
+                    logger.debug("统计对账完成，无偏差")
+            except Exception as e:
+                logger.error(f"统计对账失败: {e}")
+        _stop_event.wait(timeout=600)
+    close_thread_connections()
+
+
+def start_stats_reconciler() -> None:
+    """启动统计对账线程"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return
+    _stop_event.clear()
+    _worker_thread = threading.Thread(target=_reconcile_worker, name='stats-reconcile', daemon=True)
+    _worker_thread.start()
+
+
+def stop_stats_reconciler() -> None:
+    """停止统计对账线程"""
+    global _worker_thread
+    _stop_event.set()
+    if _worker_thread and _worker_thread.is_alive():
+        _worker_thread.join(timeout=5)
+    _worker_thread = None
+
+
+__all__ = [
+    'start_stats_reconciler',
+    'stop_stats_reconciler',
+]
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储后端健康探测服务模块
+
+熔断打开的后端在冷却结束后进入半开状态，由后台线程调用 healthcheck() 做一次探测：
+成功则关闭熔断，失败则重新打开并加倍冷却。这样即使没有用户请求，
+故障后端恢复后也能尽快重新参与读写路由。
+"""
+import threading
+import time
+from typing import Optional, Dict
+
+from ..config import logger
+from ..database import get_system_setting_int, close_thread_connections
+from ..storage.latency import get_latency_tracker, CIRCUIT_CLOSED
+from ..storage.router import get_storage_router, PENDING_BACKEND_NAME
+
+_worker_thread: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+
+
+def probe_open_circuits() -> Dict[str, bool]:
+    """
+    探测所有冷却结束的熔断后端
+
+    Returns:
+        {后端名: 探测是否成功}
+    """
+    tracker = get_latency_tracker()
+    router = get_storage_router()
+    results: Dict[str, bool] = {}
+    for name in router.list_backends():
+        if name == PENDING_BACKEND_NAME or tracker.state(name) == CIRCUIT_CLOSED:
+            continue
+        allowed, _ = tracker.allow_request(name)
+        if not allowed:
+            continue
+        start = time.monotonic()
+        try:
+            ok = bool(router.get_backend(name).healthcheck())
+        except Exception as e:
+            logger.debug(f"后端探测异常: {name} - {e}")
+            ok = False
+        tracker.record(name, time.monotonic() - start, ok, check_slo=False)
+        results[name] = ok
+    return results
+
+
+def _health_worker() -> None:
+    while not _stop_event.is_set():
+        try:
+            probe_open_circuits()
+        except Exception as e:
+            logger.error(f"存储健康探测失败: {e}")
+        interval = get_system_setting_int('storage_health_probe_interval_seconds', 10, minimum=1, maximum=3600)
+        _stop_event.wait(timeout=interval)
+    close_thread_connections()
+
+
+def start_storage_health_prober() -> None:
+    """启动后端健康探测线程"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return
+    _stop_event.clear()
+    _worker_thread = threading.Thread(target=_health_worker, name='storage-health', daemon=True)
+    _worker_thread.start()
+
+
+def stop_storage_health_prober() -> None:
+    """停止后端健康探测线程"""
+    global _worker_thread
+    _stop_event.set()
+    if _worker_thread and _worker_thread.is_alive():
+        _worker_thread.join(timeout=5)
+    _worker_thread = None
+
+
+__all__ = [
+    'probe_open_circuits',
+    'start_storage_health_prober',
+    'stop_storage_health_prober',
+]
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储后台任务公共组件
+
+迁移与巡检共用：
+- ByteRateLimiter：按字节限流（预约式，多线程共享，速率可在运行中调整）
+- JobRunner：单个调度线程按创建顺序执行 running/pending 任务（running 优先，重启后先续跑），
+  暂停/恢复/取消只改任务状态，由任务在批次边界自行检查
+- 切换存储位置时的 TG 消息字段与作废对象的清理（登记到删除队列，由删除 GC 处理）
+"""
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+from ..config import logger
+from ..database import queue_object_cleanup, close_thread_connections
+from .deletion_service import wake_deletion_gc
+
+
+class ByteRateLimiter:
+    """按字节数限流（预约式，多线程共享；rate 为 0 表示不限）"""
+
+    def __init__(self, bytes_per_second: float = 0.0, stop_event: Optional[threading.Event] = None):
+        self._rate = max(0.0, float(bytes_per_second))
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop_event = stop_event or threading.Event()
+
+    def set_rate(self, bytes_per_second: float) -> None:
+        with self._lock:
+            self._rate = max(0.0, float(bytes_per_second))
+
+    def acquire(self, size: int) -> None:
+        with self._lock:
+            if self._rate <= 0 or size <= 0:
+                return
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + size / self._rate
+        if start > now:
+            self._stop_event.wait(timeout=start - now)
+
+
+class JobRunner:
+    """持久化批处理任务的调度线程"""
+
+    def __init__(
+        self,
+        *,
+        name: str,
+        label: str,
+        list_jobs: Callable[..., Sequence[Dict[str, Any]]],
+        set_status: Callable[..., bool],
+        run_job: Callable[[int], None],
+        poll_interval: float,
+        before_poll: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Args:
+            name: 调度线程名
+            label: 日志中的任务名称（如 存储迁移）
+            list_jobs: list_jobs(statuses, limit=...) 返回任务列表
+            set_status: set_status(job_id, status, from_statuses=..., error=...) 条件更新状态
+            run_job: 执行一个任务，直到完成、暂停、取消或 stop_event 置位
+            poll_interval: 无任务时的轮询间隔（秒）
+            before_poll: 每轮调度前的钩子（如按周期自动创建任务）
+        """
+        self.name = name
+        self.label = label
+        self._list_jobs = list_jobs
+        self._set_status = set_status
+        self._run_job = run_job
+        self._poll_interval = poll_interval
+        self._before_poll = before_poll
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def wake(self) -> None:
+        self.wake_event.set()
+
+    def pause(self, job_id: int) -> bool:
+        return self._set_status(job_id, 'paused', from_statuses=('pending', 'running'))
+
+    def resume(self, job_id: int) -> bool:
+        resumed = self._set_status(job_id, 'pending', from_statuses=('paused', 'failed'))
+        if resumed:
+            self.wake()
+        return resumed
+
+    def cancel(self, job_id: int) -> bool:
+        return self._set_status(job_id, 'cancelled', from_statuses=('pending', 'running', 'paused'))
+
+    def _next_runnable(self) -> Optional[int]:
+        """最早创建的 running/pending 任务（running 优先，保证重启后先续跑）"""
+        jobs = self._list_jobs(('running', 'pending'), limit=200)
+        for status in ('running', 'pending'):
+            ids = [job['id'] for job in jobs if job['status'] == status]
+            if ids:
+                return min(ids)
+        return None
+
+    def _loop(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                if self._before_poll:
+                    self._before_poll()
+                job_id = self._next_runnable()
+                if job_id is not None:
+                    self._set_status(job_id, 'running', from_statuses=('pending', 'running'))
+                    try:
+                        self._run_job(job_id)
+                    except Exception as e:
+                        logger.error(f"{self.label} #{job_id} 异常中止: {e}")
+                        self._set_status(job_id, 'failed', from_statuses=('running',), error=str(e))
+                    continue
+            except Exception as e:
+                logger.error(f"{self.label}调度失败: {e}")
+            self.wake_event.wait(timeout=self._poll_interval)
+            self.wake_event.clear()
+        close_thread_connections()
+
+    def start(self) -> None:
+        """启动调度线程（会续跑重启前未完成的任务）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        """停止调度线程（当前批次结束后退出，任务保持 running，下次启动从断点继续）"""
+        self.stop_event.set()
+        self.wake_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
+
+def telegram_message_fields(new_meta: Dict[str, Any], target, *, drop_old: bool) -> Dict[str, Any]:
+    """
+    切换存储位置时记录应指向的 TG 消息
+
+    新位置在 Telegram 上时总是改为新消息；否则在旧消息已登记删除（drop_old）时清空，
+    保留时沿用旧值，以便删除文件时一并清理仍存在的源消息。
+    """
+    if new_meta.get('message_id'):
+        return {
+            'group_message_id': new_meta.get('message_id'),
+            'group_chat_id': new_meta.get('chat_id') or getattr(target, '_chat_id', None),
+        }
+    if drop_old:
+        return {'group_message_id': None, 'group_chat_id': None}
+    return {}
+
+
+def discard_objects(encrypted_id: str, put_results: Iterable[Any]) -> None:
+    """
+    作废刚写入但未被记录引用的对象（切换失败、回读校验失败）
+
+    登记到删除队列而不是直接调用 backend.delete()：Telegram 后端没有 delete，
+    需由删除 GC 通过 deleteMessages 清理消息（含分块消息）。
+    """
+    rows = [{
+        'encrypted_id': encrypted_id,
+        'storage_backend': result.storage_backend,
+        'storage_key': result.storage_key,
+        'storage_meta': json.dumps(result.storage_meta or {}, ensure_ascii=False, separators=(",", ":")),
+    } for result in put_results if result]
+    if not rows:
+        return
+    try:
+        queue_object_cleanup(rows)
+        wake_deletion_gc()
+    except Exception as e:
+        logger.warning(f"登记作废对象失败: {encrypted_id} - {e}")
+
+
+__all__ = [
+    'ByteRateLimiter',
+    'JobRunner',
+    'telegram_message_fields',
+    'discard_objects',
+]
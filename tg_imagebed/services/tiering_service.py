@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+冷热分层服务模块
+
+主副本（通常在 Telegram）保持不动，按 file_storage 的 access_count / last_accessed
+计算热度，把最热的文件复制到热层后端（storage_tiering_hot_backend，本地磁盘或 S3），
+登记为 role='hot' 的副本。读取时 StorageRouter 优先命中热层副本，失败再回落到主后端。
+
+热层总字节数受 storage_tiering_budget_mb 约束：每轮按热度重新规划，
+超出预算或热度下降的副本被淘汰（删除副本记录，热层对象交给删除 GC 回收）。
+晋升每轮受 storage_tiering_max_move_mb 限流，由单个后台线程顺序执行。
+"""
+import time
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+from ..config import logger
+from ..database import (
+    get_file_info, get_system_setting, get_system_setting_int,
+    add_hot_replica, list_hot_replicas, list_tiering_candidates, delete_replica, close_thread_connections,
+)
+from ..storage.router import get_storage_router
+from .deletion_service import wake_deletion_gc
+from .storage_jobs import discard_objects
+
+# 热度半衰期：距上次访问每过该时长，热度减半
+_HALF_LIFE_HOURS = 24.0
+# 已在热层的文件热度加成，避免边界文件反复晋升/淘汰
+_RETAIN_BONUS = 1.25
+# 两次晋升之间的间隔，进一步平滑后台流量
+_PROMOTE_PAUSE_SECONDS = 0.2
+
+_worker_thread: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+_wake_event = threading.Event()
+_last_result: Dict[str, Any] = {}
+
+
+def hotness(access_count: int, last_accessed_ts: Optional[int], now: float) -> float:
+    """访问频次按最近访问时间指数衰减后的热度"""
+    if not access_count:
+        return 0.0
+    age_hours = max(0.0, now - (last_accessed_ts or 0)) / 3600.0
+    return float(access_count) * 0.5 ** (age_hours / _HALF_LIFE_HOURS)
+
+
+def plan_tiering(
+    hot: List[Dict[str, Any]],
+    candidates: List[Dict[str, Any]],
+    budget_bytes: int,
+    now: Optional[float] = None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    在容量预算内按热度挑选热层文件
+
+    Args:
+        hot: 当前热层副本（需含 file_size / access_count / last_accessed_ts）
+        candidates: 待晋升的文件
+
+    Returns:
+        (需要晋升的候选, 需要淘汰的热层副本)
+    """
+    now = time.time() if now is None else now
+    entries = [
+        (hotness(item['access_count'], item['last_accessed_ts'], now) * _RETAIN_BONUS, True, item)
+        for item in hot
+    ] + [
+        (hotness(item['access_count'], item['last_accessed_ts'], now), False, item)
+        for item in candidates
+    ]
+    entries.sort(key=lambda e: e[0], reverse=True)
+
+    used = 0
+    promote: List[Dict[str, Any]] = []
+    evict: List[Dict[str, Any]] = []
+    for score, is_hot, item in entries:
+        size = int(item.get('file_size') or 0)
+        if score > 0 and used + size <= budget_bytes:
+            used += size
+            if not is_hot:
+                promote.append(item)
+        elif is_hot:
+            evict.append(item)
+    return promote, evict
+
+
+def _evict(replica: Dict[str, Any]) -> bool:
+    """淘汰一个热层副本：删除记录（读取立即回落主后端）并在同一事务内把热层对象交给删除 GC"""
+    name = replica['storage_backend']
+    # 返回 False：已被删除或转为持久镜像
+    return bool(delete_replica(replica['encrypted_id'], name, role='hot',
+                               queue_cleanup=name in get_storage_router().list_backends()))
+
+
+def _promote(encrypted_id: str, hot_name: str) -> bool:
+    """从主后端（或已有副本）读回文件并写入热层"""
+    file_info = get_file_info(encrypted_id)
+    if not file_info:
+        return False
+    router = get_storage_router()
+    source, dl = router.download_with_failover(file_info, None)
+    if dl.status_code != 200:
+        logger.warning(f"热层晋升读取失败: {encrypted_id} (backend={source.name}, status={dl.status_code})")
+        return False
+    content = b''.join(dl.body)
+
+    target = router.get_backend(hot_name)
+    filename = file_info.get('original_filename') or encrypted_id
+    source_tag = file_info.get('source') or 'web_upload'
+    put_result = target.put_bytes(
+        file_content=content,
+        filename=filename,
+        content_type=file_info.get('mime_type') or '',
+        file_size=len(content),
+        caption=f"{source_tag} | 热层副本 | 文件名: {filename} | 大小: {len(content)} bytes",
+        source=source_tag,
+        username=file_info.get('username') or 'web_user',
+    )
+    if not put_result:
+        logger.warning(f"热层晋升写入失败: {encrypted_id} -> {hot_name}")
+        return False
+
+    if add_hot_replica(
+        encrypted_id, hot_name,
+        file_id=put_result.file_id,
+        file_path=put_result.file_path,
+        storage_key=put_result.storage_key,
+        storage_meta=put_result.storage_meta,
+    ):
+        return True
+    # 期间主记录被删除或已有同后端副本：撤销刚写入的对象
+    discard_objects(encrypted_id, [put_result])
+    return False
+
+
+def run_tiering_cycle() -> Dict[str, Any]:
+    """执行一轮分层调度：淘汰超预算/冷却的副本，再在限流内晋升热点文件"""
+    global _last_result
+    if str(get_system_setting('storage_tiering_enabled') or '0') != '1':
+        return {'skipped': 'disabled'}
+    hot_name = (get_system_setting('storage_tiering_hot_backend') or '').strip()
+    router = get_storage_router()
+    if not hot_name or hot_name not in router.list_backends():
+        return {'skipped': 'hot backend not configured'}
+
+    budget = get_system_setting_int('storage_tiering_budget_mb', 1024, minimum=0) * 1024 * 1024
+    max_move = get_system_setting_int('storage_tiering_max_move_mb', 256, minimum=1) * 1024 * 1024
+    min_access = get_system_setting_int('storage_tiering_min_access', 5, minimum=1)
+
+    started = time.time()
+    hot = list_hot_replicas()
+    # 热层后端被更换后，旧后端上的热层副本全部淘汰
+    stale = [r for r in hot if r['storage_backend'] != hot_name]
+    current = [r for r in hot if r['storage_backend'] == hot_name]
+    candidates = list_tiering_candidates(hot_name, min_access, max_size=min(budget, max_move))
+    promote, evict = plan_tiering(current, candidates, budget, now=started)
+
+    evicted = sum(1 for replica in stale + evict if _evict(replica))
+    if evicted:
+        wake_deletion_gc()
+
+    promoted = 0
+    moved_bytes = 0
+    for item in promote:
+        if _stop_event.is_set():
+            break
+        size = int(item.get('file_size') or 0)
+        if moved_bytes + size > max_move:
+            continue
+        try:
+            if _promote(item['encrypted_id'], hot_name):
+                promoted += 1
+                moved_bytes += size
+        except Exception as e:
+            logger.warning(f"热层晋升异常: {item['encrypted_id']} - {e}")
+        _stop_event.wait(timeout=_PROMOTE_PAUSE_SECONDS)
+
+    _last_result = {
+        'hot_backend': hot_name,
+        'promoted': promoted,
+        'evicted': evicted,
+        'moved_bytes': moved_bytes,
+        'deferred': len(promote) - promoted,
+        'started_at': int(started),
+        'duration_ms': int((time.time() - started) * 1000),
+    }
+    if promoted or evicted:
+        logger.info(f"冷热分层: 晋升 {promoted} 个（{moved_bytes} bytes），淘汰 {evicted} 个 -> {hot_name}")
+    return _last_result
+
+
+def get_tiering_status() -> Dict[str, Any]:
+    """热层占用与最近一轮调度结果"""
+    hot = list_hot_replicas()
+    usage: Dict[str, Dict[str, int]] = {}
+    for replica in hot:
+        item = usage.setdefault(replica['storage_backend'], {'count': 0, 'bytes': 0})
+        item['count'] += 1
+        item['bytes'] += int(replica.get('file_size') or 0)
+    return {
+        'enabled': str(get_system_setting('storage_tiering_enabled') or '0') == '1',
+        'hot_backend': (get_system_setting('storage_tiering_hot_backend') or '').strip(),
+        'budget_bytes': get_system_setting_int('storage_tiering_budget_mb', 1024, minimum=0) * 1024 * 1024,
+        'usage': usage,
+        'last_run': dict(_last_result),
+    }
+
+
+def trigger_tiering_cycle() -> None:
+    """唤醒后台线程立即执行一轮调度"""
+    _wake_event.set()
+
+
+def _tiering_worker() -> None:
+    while not _stop_event.is_set():
+        try:
+            run_tiering_cycle()
+        except Exception as e:
+            logger.error(f"冷热分层调度失败: {e}")
+        interval = get_system_setting_int('storage_tiering_interval_seconds', 300, minimum=30)
+        _wake_event.wait(timeout=interval)
+        _wake_event.clear()
+    close_thread_connections()
+
+
+def start_tiering_worker() -> None:
+    """启动冷热分层后台线程"""
+    global _worker_thread
+    if _worker_thread and _worker_thread.is_alive():
+        return
+    _stop_event.clear()
+    _worker_thread = threading.Thread(target=_tiering_worker, name='storage-tiering', daemon=True)
+    _worker_thread.start()
+
+
+def stop_tiering_worker() -> None:
+    """停止冷热分层线程（已晋升的副本保留）"""
+    global _worker_thread
+    _stop_event.set()
+    _wake_event.set()
+    if _worker_thread and _worker_thread.is_alive():
+        _worker_thread.join(timeout=5)
+    _worker_thread = None
+
+
+__all__ = [
+    'hotness',
+    'plan_tiering',
+    'run_tiering_cycle',
+    'get_tiering_status',
+    'trigger_tiering_cycle',
+    'start_tiering_worker',
+    'stop_tiering_worker',
+]
@@ -10,8 +10,10 @@ from ..database import (
     admin_create_token,
     admin_delete_token,
     get_system_setting,
+    enqueue_file_deletions,
 )
 from ..database.connection import get_connection
+from .deletion_service import wake_deletion_gc
 
 
 class TokenService:
@@ -38,15 +40,13 @@ class TokenService:
     @staticmethod
     def _delete_images_for_token_str(token_str: str, cursor) -> Dict[str, int]:
         """
-        删除指定 token 关联的所有图片（存储后端 + 数据库记录 + TG消息同步删除）。
-        在已有事务的 cursor 上操作，不自行管理连接。
+        删除指定 token 关联的所有图片（数据库记录 + 删除队列登记）。
+        在已有事务的 cursor 上操作，不自行管理连接；存储后端文件与 TG 消息由后台 GC 清理。
 
         Returns:
-            { "images_deleted": int, "tg_deleted": int }
+            { "images_deleted": int, "tg_deleted": int, "queued": int }
         """
-        import requests as http_requests
-
-        result = {"images_deleted": 0, "tg_deleted": 0}
+        result = {"images_deleted": 0, "tg_deleted": 0, "queued": 0}
 
         # 查询该 token 关联的所有图片
         cursor.execute(
@@ -62,75 +62,10 @@ class TokenService:
         # 检查是否启用 TG 同步删除
         tg_sync_delete_enabled = str(get_system_setting('tg_sync_delete_enabled') or '1') == '1'
 
-        # 获取存储路由器（用于删除存储后端文件）
-        from ..storage.router import get_storage_router
-        router = get_storage_router()
-
-        # 获取 bot_token（用于 TG 消息删除）
-        bot_token = None
-        if tg_sync_delete_enabled:
-            try:
-                from ..bot_control import get_effective_bot_token
-                bot_token, _ = get_effective_bot_token()
-            except Exception:
-                pass
-
-        tg_seen = set()
-        encrypted_ids = []
-
-        for row in files:
-            file_row = dict(row)
-            encrypted_id = file_row['encrypted_id']
-            storage_backend = (file_row.get('storage_backend') or 'telegram').strip()
-            storage_key = file_row.get('storage_key') or ''
-
-            encrypted_ids.append(encrypted_id)
-
-            # 删除存储后端文件（静默忽略失败）
-            if storage_key:
-                try:
-                    backend = router.get_backend(storage_backend)
-                    backend.delete(storage_key=storage_key)
-                except Exception as e:
-                    logger.debug(f"删除存储文件失败: {encrypted_id}, {e}")
-
-            # TG 消息同步删除
-            if tg_sync_delete_enabled and bot_token:
-                chat_id = file_row.get('group_chat_id')
-                message_id = file_row.get('group_message_id')
-
-                # 兼容历史数据：从 storage_meta 中提取 message_id，从后端配置获取 chat_id
-                if not message_id or not chat_id:
-                    try:
-                        import json as _json
-                        meta_raw = file_row.get('storage_meta') or '{}'
-                        meta = _json.loads(meta_raw) if isinstance(meta_raw, str) else (meta_raw or {})
-                        if not message_id:
-                            message_id = meta.get('message_id')
-                        if not chat_id and storage_backend:
-                            try:
-                                be = router.get_backend(storage_backend)
-                                if hasattr(be, '_chat_id'):
-                                    chat_id = be._chat_id
-                            except Exception:
-                                pass
-                    except Exception:
-                        pass
-
-                if chat_id and message_id:
-                    key = (chat_id, message_id)
-                    if key not in tg_seen:
-                        tg_seen.add(key)
-                        try:
-                            resp = http_requests.post(
-                                f"https://api.telegram.org/bot{bot_token}/deleteMessage",
-                                data={'chat_id': chat_id, 'message_id': message_id},
-                                timeout=5,
-                            )
-                            if resp.ok and resp.json().get('ok'):
-                                result["tg_deleted"] += 1
-                        except Exception:
-                            pass
+        # 同一事务内登记删除队列，存储文件与 TG 消息由后台 GC 批量清理
+        file_rows = [dict(row) for row in files]
+        encrypted_ids = [row['encrypted_id'] for row in file_rows]
+        result["queued"] = enqueue_file_deletions(cursor, file_rows, sync_telegram=tg_sync_delete_enabled)
 
         # 批量删除数据库记录（分块处理）
         def _chunked(seq, size=900):
@@ -152,6 +87,8 @@ class TokenService:
                 (result["images_deleted"], token_str),
             )
 
+        if result["queued"]:
+            wake_deletion_gc()
         return result
 
     # ── 级联删除 ──────────────────────────────────────────
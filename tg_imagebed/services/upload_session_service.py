@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片续传服务模块
+
+协议：创建会话 → 按偏移量 PUT 分片 → 查询当前偏移 → 完成合并。
+分片直接落盘到 DATA_DIR/upload_sessions，同时增量计算 SHA256；
+完成时交给 process_upload 走常规存储后端流程。
+闲置超时的会话由后台线程定期回收。
+"""
+import os
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Tuple, BinaryIO, Iterator
+
+from ..config import logger, DATA_DIR
+from ..database import (
+    create_upload_session, get_upload_session, update_upload_session_offset,
+    delete_upload_session, list_stale_upload_sessions, get_system_setting_int, close_thread_connections,
+)
+from .file_service import process_upload
+
+UPLOAD_SPOOL_DIR = os.path.join(DATA_DIR, 'upload_sessions')
+
+# 读取请求体时的缓冲大小
+_COPY_BUFFER_SIZE = 256 * 1024
+
+# 完成时交给校验回调的文件头长度（魔数校验只需前几十字节）
+_VALIDATE_HEADER_BYTES = 64
+
+
+class UploadSessionError(Exception):
+    """续传会话错误（携带 HTTP 状态码）"""
+
+    def __init__(self, message: str, status: int = 400, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+# ===================== 会话锁与哈希状态 =====================
+# 同一会话的分片写入必须串行；哈希对象无法持久化，仅缓存在内存中，
+# 进程重启或缓存失效时从已落盘数据重建。
+# 锁只为库中存在的会话创建，并在会话删除/过期回收时移除，不随无效 upload_id 增长。
+_locks_guard = threading.Lock()
+_session_locks: Dict[str, threading.Lock] = {}
+_hash_states: Dict[str, Tuple[int, Any]] = {}
+
+
+def _get_session_lock(upload_id: str) -> threading.Lock:
+    with _locks_guard:
+        lock = _session_locks.get(upload_id)
+        if lock is None:
+            lock = threading.Lock()
+            _session_locks[upload_id] = lock
+        return lock
+
+
+@contextmanager
+def _locked_session(upload_id: str, auth_token: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """
+    先确认会话存在再取锁，持锁后重新读取会话
+
+    会话在等锁期间被删除时移除刚取得的锁并返回 404。
+    """
+    _load_session(upload_id, auth_token)
+    with _get_session_lock(upload_id):
+        try:
+            session = _load_session(upload_id, auth_token)
+        except UploadSessionError as e:
+            if e.status == 404:
+                _forget_session(upload_id)
+            raise
+        yield session
+
+
+def _forget_session(upload_id: str) -> None:
+    with _locks_guard:
+        _session_locks.pop(upload_id, None)
+    _hash_states.pop(upload_id, None)
+
+
+def _spool_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_SPOOL_DIR, f"{upload_id}.part")
+
+
+def _get_hasher(upload_id: str, offset: int):
+    """获取与当前偏移一致的哈希对象，不一致时从磁盘重建"""
+    state = _hash_states.get(upload_id)
+    if state and state[0] == offset:
+        return state[1]
+
+    hasher = hashlib.sha256()
+    remaining = offset
+    path = _spool_path(upload_id)
+    if remaining > 0 and os.path.exists(path):
+        with open(path, 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(_COPY_BUFFER_SIZE, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+    return hasher
+
+
+def _is_valid_upload_id(upload_id: str) -> bool:
+    return bool(upload_id) and len(upload_id) == 32 and all(c in '0123456789abcdef' for c in upload_id)
+
+
+def _load_session(upload_id: str, auth_token: Optional[str]) -> Dict[str, Any]:
+    """读取会话并校验归属（Token 会话必须由同一个 Token 操作）"""
+    session = get_upload_session(upload_id) if _is_valid_upload_id(upload_id) else None
+    if not session:
+        raise UploadSessionError('上传会话不存在或已过期', 404)
+    if session.get('auth_token') and session['auth_token'] != auth_token:
+        raise UploadSessionError('无权访问该上传会话', 403)
+    return session
+
+
+# ===================== 会话操作 =====================
+def get_chunk_size() -> int:
+    """建议的分片大小（字节），不超过单次请求体上限"""
+    max_mb = get_system_setting_int('max_file_size_mb', 100, minimum=1, maximum=1024)
+    chunk_mb = get_system_setting_int('upload_chunk_size_mb', 8, minimum=1, maximum=1024)
+    return min(chunk_mb, max_mb) * 1024 * 1024
+
+
+def start_session(
+    *,
+    filename: str,
+    content_type: Optional[str],
+    total_size: int,
+    source: str,
+    upload_scene: str,
+    auth_token: Optional[str] = None,
+    client_ip: Optional[str] = None,
+) -> Dict[str, Any]:
+    """创建续传会话并预建空的落盘文件"""
+    upload_id = uuid.uuid4().hex
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    with open(_spool_path(upload_id), 'wb'):
+        pass
+
+    create_upload_session(
+        upload_id,
+        filename=filename,
+        content_type=content_type,
+        total_size=total_size,
+        source=source,
+        upload_scene=upload_scene,
+        auth_token=auth_token,
+        client_ip=client_ip,
+    )
+    _hash_states[upload_id] = (0, hashlib.sha256())
+    logger.info(f"创建续传会话: {upload_id} ({filename}, {total_size} bytes)")
+    return {
+        'upload_id': upload_id,
+        'offset': 0,
+        'total_size': total_size,
+        'chunk_size': get_chunk_size(),
+    }
+
+
+def get_session_status(upload_id: str, auth_token: Optional[str] = None) -> Dict[str, Any]:
+    """查询会话当前偏移"""
+    session = _load_session(upload_id, auth_token)
+    return {
+        'upload_id': upload_id,
+        'filename': session['filename'],
+        'offset': int(session['received_size']),
+        'total_size': int(session['total_size']),
+    }
+
+
+def append_chunk(
+    upload_id: str,
+    offset: int,
+    stream: BinaryIO,
+    auth_token: Optional[str] = None,
+) -> int:
+    """
+    在指定偏移写入一个分片，返回写入后的新偏移
+
+    offset 必须等于服务端已接收的字节数，否则返回 409 让客户端先查询偏移。
+    传输中断时回滚到写入前的偏移，保证落盘数据与记录一致。
+    """
+    with _locked_session(upload_id, auth_token) as session:
+        current = int(session['received_size'])
+        total = int(session['total_size'])
+        if offset != current:
+            raise UploadSessionError('偏移量不匹配', 409, offset=current)
+
+        hasher = _get_hasher(upload_id, current)
+        max_chunk = get_chunk_size()
+        written = 0
+        path = _spool_path(upload_id)
+        try:
+            with open(path, 'r+b' if os.path.exists(path) else 'w+b') as f:
+                f.seek(current)
+                f.truncate()
+                while True:
+                    block = stream.read(_COPY_BUFFER_SIZE)
+                    if not block:
+                        break
+                    written += len(block)
+                    if current + written > total:
+                        raise UploadSessionError('分片超出文件声明大小', 400, offset=current)
+                    if written > max_chunk:
+                        raise UploadSessionError(f'单个分片不能超过 {max_chunk} 字节', 413, offset=current)
+                    f.write(block)
+                    hasher.update(block)
+        except Exception:
+            # 哈希对象已被污染，丢弃后由下一次写入从磁盘重建
+            _hash_states.pop(upload_id, None)
+            try:
+                with open(path, 'r+b') as f:
+                    f.truncate(current)
+            except OSError:
+                pass
+            raise
+
+        new_offset = current + written
+        update_upload_session_offset(upload_id, new_offset)
+        _hash_states[upload_id] = (new_offset, hasher)
+        return new_offset
+
+
+def finalize_session(upload_id: str, auth_token: Optional[str] = None, validator=None) -> Dict[str, Any]:
+    """
+    完成续传：校验完整性后交给 process_upload
+
+    合并后的文件不读入内存，直接以路径交给 process_upload，由存储后端流式上传。
+
+    Args:
+        validator: 可选回调 (filename, header) -> error_message，header 为文件前 64 字节，
+            用于复用上传接口的格式校验
+
+    Returns:
+        包含 process_upload 结果和会话信息的字典
+    """
+    with _locked_session(upload_id, auth_token) as session:
+        received = int(session['received_size'])
+        total = int(session['total_size'])
+        if received != total:
+            raise UploadSessionError('文件尚未上传完整', 409, offset=received)
+
+        hasher = _get_hasher(upload_id, received)
+        path = _spool_path(upload_id)
+
+        if validator:
+            with open(path, 'rb') as f:
+                header = f.read(_VALIDATE_HEADER_BYTES)
+            error = validator(session['filename'], header)
+            if error:
+                abort_session(upload_id, auth_token, _locked=True)
+                raise UploadSessionError(error, 400)
+
+        result = process_upload(
+            file_content=None,
+            file_path=path,
+            filename=session['filename'],
+            content_type=session.get('content_type') or '',
+            username='guest_user' if session.get('auth_token') else 'web_user',
+            source=session['source'],
+            auth_token=session.get('auth_token'),
+            upload_scene=session['upload_scene'],
+            file_hash=hasher.hexdigest(),
+        )
+        if not result:
+            # 保留会话，允许客户端稍后重试完成
+            raise UploadSessionError('上传到存储后端失败', 502)
+
+        abort_session(upload_id, auth_token, _locked=True)
+        return {**result, 'session': session}
+
+
+def abort_session(upload_id: str, auth_token: Optional[str] = None, _locked: bool = False) -> bool:
+    """取消会话并删除落盘文件"""
+    if not _locked:
+        _load_session(upload_id, auth_token)
+    try:
+        os.remove(_spool_path(upload_id))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除续传临时文件失败: {upload_id} - {e}")
+    deleted = delete_upload_session(upload_id)
+    _forget_session(upload_id)
+    return deleted
+
+
+# ===================== 过期会话回收 =====================
+_gc_thread: Optional[threading.Thread] = None
+_gc_stop_event = threading.Event()
+_GC_INTERVAL_SECONDS = 600
+
+
+def cleanup_stale_sessions() -> int:
+    """回收闲置超时的会话及其临时文件，返回回收数量"""
+    ttl_hours = get_system_setting_int('upload_session_ttl_hours', 24, minimum=1, maximum=24 * 30)
+    idle_before = int(time.time()) - ttl_hours * 3600
+    removed = 0
+    for upload_id in list_stale_upload_sessions(idle_before):
+        lock = _get_session_lock(upload_id)
+        if not lock.acquire(blocking=False):
+            continue  # 正在写入，下一轮再处理
+        try:
+            # abort_session 会同时移除该会话的锁
+            abort_session(upload_id, _locked=True)
+            removed += 1
+        finally:
+            lock.release()
+
+    # 清理没有会话记录的孤儿文件（例如创建会话时入库失败）
+    if os.path.isdir(UPLOAD_SPOOL_DIR):
+        for name in os.listdir(UPLOAD_SPOOL_DIR):
+            path = os.path.join(UPLOAD_SPOOL_DIR, name)
+            try:
+                if os.path.getmtime(path) < idle_before and not get_upload_session(name.split('.', 1)[0]):
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+
+    if removed:
+        logger.info(f"已回收过期续传会话: {removed} 个")
+    return removed
+
+
+def _gc_worker() -> None:
+    logger.info('续传会话回收线程启动')
+    while not _gc_stop_event.is_set():
+        try:
+            cleanup_stale_sessions()
+        except Exception as e:
+            logger.error(f"回收续传会话失败: {e}")
+        _gc_stop_event.wait(timeout=_GC_INTERVAL_SECONDS)
+    close_thread_connections()
+    logger.info('续传会话回收线程已停止')
+
+
+def start_upload_session_gc() -> None:
+    """启动过期会话回收线程"""
+    global _gc_thread
+    if _gc_thread and _gc_thread.is_alive():
+        return
+    _gc_stop_event.clear()
+    _gc_thread = threading.Thread(target=_gc_worker, name='upload-session-gc', daemon=True)
+    _gc_thread.start()
+
+
+def stop_upload_session_gc() -> None:
+    """停止过期会话回收线程"""
+    global _gc_thread
+    if not _gc_thread:
+        return
+    _gc_stop_event.set()
+    if _gc_thread.is_alive():
+        _gc_thread.join(timeout=5)
+    _gc_thread = None
+
+
+__all__ = [
+    'UploadSessionError',
+    'get_chunk_size',
+    'start_session',
+    'get_session_status',
+    'append_chunk',
+    'finalize_session',
+    'abort_session',
+    'cleanup_stale_sessions',
+    'start_upload_session_gc',
+    'stop_upload_session_gc',
+]
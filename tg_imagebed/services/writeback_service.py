@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+写回（write-back）服务模块
+
+开启 storage_writeback_enabled 后，上传先写入本地暂存区（storage_backend = 'pending'），
+立即返回 URL 并从暂存区提供访问；后台线程再把文件推送到目标后端，成功后原子切换
+storage_backend/storage_key 并删除暂存文件。
+
+持久化依赖 file_storage 本身：pending 记录就是待办队列，进程重启后重新扫描即可恢复。
+失败按指数退避重试，超过上限后停止重试但继续从暂存区提供访问，不会丢数据。
+
+到期任务放在就绪队列，工作线程阻塞在 get() 上；退避中的任务放在按执行时间排序的
+延迟堆里，由调度线程在最早到期时刻移入就绪队列。
+"""
+import json
+import time
+import heapq
+import queue
+import itertools
+import threading
+from typing import Optional, Dict, Any, List
+
+from ..config import logger
+from ..database import (
+    get_file_info, list_pending_writebacks, update_pending_storage_meta,
+    complete_pending_writeback, get_system_setting, get_system_setting_int, next_cursor, close_thread_connections,
+)
+from ..storage.router import get_storage_router, PENDING_BACKEND_NAME
+from ..storage.backends.local import LocalBackend
+from .storage_jobs import discard_objects
+
+# 重新扫描 pending 记录的间隔（兜底：漏入队、退避到期等）
+_RESCAN_INTERVAL_SECONDS = 300
+_RETRY_BASE_SECONDS = 10
+_RETRY_MAX_SECONDS = 3600
+# 重新扫描时每页读取的 pending 记录数
+_RESCAN_PAGE_SIZE = 1000
+
+_ready_queue: "queue.Queue[Optional[str]]" = queue.Queue()
+_delayed: List[tuple] = []   # (run_at, seq, encrypted_id) 最小堆
+_delayed_cond = threading.Condition()
+_queue_seq = itertools.count()
+_queued_ids: set = set()     # 已入队或正在处理的文件，避免同一文件被并发推送两次
+_queued_lock = threading.Lock()
+
+_worker_threads: List[threading.Thread] = []
+_stop_event = threading.Event()
+
+
+def is_writeback_enabled() -> bool:
+    return str(get_system_setting('storage_writeback_enabled') or '0') == '1'
+
+
+def should_stage(backend) -> bool:
+    """目标后端是否需要走写回暂存（本地后端本身就很快，直接写入）"""
+    return is_writeback_enabled() and not isinstance(backend, LocalBackend)
+
+
+def enqueue_writeback(encrypted_id: str, run_at: float = 0.0) -> None:
+    """加入写回队列（同一文件只保留一个排队项）；run_at 在未来时先进入延迟堆"""
+    with _queued_lock:
+        if encrypted_id in _queued_ids:
+            return
+        _queued_ids.add(encrypted_id)
+    if run_at <= time.time():
+        _ready_queue.put(encrypted_id)
+        return
+    with _delayed_cond:
+        heapq.heappush(_delayed, (run_at, next(_queue_seq), encrypted_id))
+        _delayed_cond.notify()
+
+
+def _load_meta(file_info: Dict[str, Any]) -> Dict[str, Any]:
+    raw = file_info.get('storage_meta')
+    if isinstance(raw, dict):
+        return dict(raw)
+    try:
+        return json.loads(raw or '{}') or {}
+    except Exception:
+        return {}
+
+
+def _read_staged_bytes(staging: LocalBackend, storage_key: str) -> Optional[bytes]:
+    dl = staging.download(file_info={'storage_key': storage_key}, range_header=None)
+    if dl.status_code != 200:
+        return None
+    return b''.join(dl.body)
+
+
+def _process_writeback(encrypted_id: str) -> Optional[float]:
+    """把一个暂存文件推送到目标后端，需要重试时返回下次执行时间"""
+    file_info = get_file_info(encrypted_id)
+    if not file_info or file_info.get('storage_backend') != PENDING_BACKEND_NAME:
+        return None  # 已删除或已完成
+
+    meta = _load_meta(file_info)
+    if meta.get('writeback_failed'):
+        return None
+
+    router = get_storage_router()
+    staging = router.get_backend(PENDING_BACKEND_NAME)
+    staged_key = file_info.get('storage_key') or ''
+    target_name = meta.get('writeback_target') or router.get_active_backend_name()
+
+    content = _read_staged_bytes(staging, staged_key)
+    if content is None:
+        logger.error(f"写回失败，暂存文件缺失: {encrypted_id} ({staged_key})")
+        meta['writeback_failed'] = True
+        meta['writeback_error'] = 'staged file missing'
+        update_pending_storage_meta(encrypted_id, meta)
+        return None
+
+    target = router.get_backend(target_name)
+    filename = file_info.get('original_filename') or staged_key
+    source = file_info.get('source') or 'web_upload'
+    caption = (
+        f"{source} | 文件名: {filename} | 大小: {len(content)} bytes | "
+        f"时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(file_info.get('upload_time') or time.time()))}"
+    )
+
+    error = None
+    put_result = None
+    try:
+        put_result = target.put_bytes(
+            file_content=content,
+            filename=filename,
+            content_type=file_info.get('mime_type') or '',
+            file_size=len(content),
+            caption=caption,
+            source=source,
+            username=file_info.get('username') or 'web_user',
+        )
+        if not put_result:
+            error = 'backend returned no result'
+    except Exception as e:
+        error = str(e)
+
+    if error:
+        attempts = int(meta.get('writeback_attempts') or 0) + 1
+        max_attempts = get_system_setting_int('storage_writeback_max_attempts', 8, minimum=1, maximum=100)
+        meta['writeback_attempts'] = attempts
+        meta['writeback_error'] = error[:500]
+        if attempts >= max_attempts:
+            meta['writeback_failed'] = True
+            logger.error(f"写回放弃（已重试 {attempts} 次，继续由暂存区提供访问）: {encrypted_id} -> {target_name}: {error}")
+            update_pending_storage_meta(encrypted_id, meta)
+            return None
+        delay = min(_RETRY_MAX_SECONDS, _RETRY_BASE_SECONDS * (2 ** (attempts - 1)))
+        meta['writeback_next_at'] = int(time.time() + delay)
+        update_pending_storage_meta(encrypted_id, meta)
+        logger.warning(f"写回失败，{delay}s 后重试（第 {attempts} 次）: {encrypted_id} -> {target_name}: {error}")
+        return time.time() + delay
+
+    new_meta = dict(put_result.storage_meta or {})
+    fields: Dict[str, Any] = {
+        'file_id': put_result.file_id,
+        'file_path': put_result.file_path,
+        'storage_backend': put_result.storage_backend,
+        'storage_key': put_result.storage_key,
+        'storage_meta': new_meta,
+    }
+    # Telegram 目标：与直传一致回填消息信息，供同步删除使用
+    if new_meta.get('message_id') and not file_info.get('group_message_id'):
+        fields['group_message_id'] = new_meta.get('message_id')
+        chat_id = new_meta.get('chat_id') or getattr(target, '_chat_id', None)
+        if chat_id:
+            fields['group_chat_id'] = chat_id
+
+    if complete_pending_writeback(encrypted_id, fields):
+        staging.delete(storage_key=staged_key)
+        logger.info(f"写回完成: {encrypted_id} -> {put_result.storage_backend}")
+    else:
+        # 推送期间记录被删除：刚写入的远端对象（含 TG 消息）交给删除 GC 回收
+        logger.info(f"写回完成时记录已不存在，清理远端对象: {encrypted_id}")
+        discard_objects(encrypted_id, [put_result])
+        staging.delete(storage_key=staged_key)
+    return None
+
+
+def rescan_pending_writebacks() -> int:
+    """分页扫描全部 pending 记录并入队（启动时及周期性调用），返回入队数量"""
+    count = 0
+    now = time.time()
+    cursor = None
+    while True:
+        rows = list_pending_writebacks(limit=_RESCAN_PAGE_SIZE, cursor=cursor)
+        for row in rows:
+            meta = _load_meta(row)
+            if meta.get('writeback_failed'):
+                continue
+            run_at = float(meta.get('writeback_next_at') or 0)
+            enqueue_writeback(row['encrypted_id'], run_at if run_at > now else 0.0)
+            count += 1
+        cursor = next_cursor(rows, _RESCAN_PAGE_SIZE, ('upload_time', 'rowid'))
+        if not cursor:
+            break
+    if count:
+        logger.info(f"写回队列已恢复: {count} 个待推送文件")
+    return count
+
+
+def _delay_scheduler() -> None:
+    """把到期的退避任务从延迟堆移入就绪队列"""
+    with _delayed_cond:
+        while not _stop_event.is_set():
+            now = time.time()
+            while _delayed and _delayed[0][0] <= now:
+                _ready_queue.put(heapq.heappop(_delayed)[2])
+            _delayed_cond.wait(timeout=_delayed[0][0] - now if _delayed else None)
+
+
+def _writeback_worker() -> None:
+    while True:
+        encrypted_id = _ready_queue.get()
+        if encrypted_id is None or _stop_event.is_set():
+            # 停止信号；未处理的记录仍是 pending，下次启动时重新扫描
+            break
+
+        retry_at = None
+        try:
+            retry_at = _process_writeback(encrypted_id)
+        except Exception as e:
+            logger.error(f"写回处理异常: {encrypted_id} - {e}")
+            retry_at = time.time() + _RETRY_BASE_SECONDS
+        finally:
+            with _queued_lock:
+                _queued_ids.discard(encrypted_id)
+        if retry_at:
+            enqueue_writeback(encrypted_id, retry_at)
+    close_thread_connections()
+
+
+def _rescan_worker() -> None:
+    while not _stop_event.is_set():
+        try:
+            rescan_pending_writebacks()
+        except Exception as e:
+            logger.error(f"扫描写回队列失败: {e}")
+        _stop_event.wait(timeout=_RESCAN_INTERVAL_SECONDS)
+    close_thread_connections()
+
+
+def _reset_queues() -> None:
+    """清空内存队列（停止后残留的排队项会在下次启动的扫描中重新入队）"""
+    with _queued_lock:
+        _queued_ids.clear()
+    with _delayed_cond:
+        _delayed.clear()
+    while True:
+        try:
+            _ready_queue.get_nowait()
+        except queue.Empty:
+            break
+
+
+def start_writeback_worker() -> None:
+    """启动写回线程（始终启动：即使关闭了写回，也要把历史 pending 记录推送完）"""
+    if _worker_threads:
+        return
+    _stop_event.clear()
+    _reset_queues()
+    workers = get_system_setting_int('storage_writeback_workers', 2, minimum=1, maximum=16)
+    for i in range(workers):
+        t = threading.Thread(target=_writeback_worker, name=f'writeback-{i}', daemon=True)
+        t.start()
+        _worker_threads.append(t)
+    for target, name in ((_delay_scheduler, 'writeback-delay'), (_rescan_worker, 'writeback-rescan')):
+        t = threading.Thread(target=target, name=name, daemon=True)
+        t.start()
+        _worker_threads.append(t)
+    logger.info(f"写回服务已启动（{workers} 个线程）")
+
+
+def stop_writeback_worker() -> None:
+    """停止写回线程（未完成的记录保持 pending，下次启动继续）"""
+    if not _worker_threads:
+        return
+    _stop_event.set()
+    with _delayed_cond:
+        _delayed_cond.notify_all()
+    for _ in _worker_threads:
+        _ready_queue.put(None)   # 每个工作线程一个停止信号（多余的在下次启动时清空）
+    for t in _worker_threads:
+        if t.is_alive():
+            t.join(timeout=5)
+    _worker_threads.clear()
+    logger.info('写回服务已停止')
+
+
+__all__ = [
+    'is_writeback_enabled',
+    'should_stage',
+    'enqueue_writeback',
+    'rescan_pending_writebacks',
+    'start_writeback_worker',
+    'stop_writeback_worker',
+]
@@ -8,14 +8,19 @@
 from __future__ import annotations
 
 import os
+import shutil
 import uuid
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Iterable, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from ..base import StorageBackend, PutResult, DownloadResult
 from ...config import logger
 
+# 批量删除的并发线程数
+_DELETE_WORKERS = 8
+
 
 def _parse_range(range_header: str, total_size: int) -> Optional[Tuple[int, int]]:
     """解析 HTTP Range 头"""
@@ -83,6 +88,26 @@ class LocalBackend(StorageBackend):
         username: str,
     ) -> Optional[PutResult]:
         """上传文件到本地"""
+        return self._store(lambda path: path.write_bytes(file_content),
+                           filename=filename, content_type=content_type, file_size=file_size)
+
+    def put_file(
+        self,
+        *,
+        file_path: str,
+        filename: str,
+        content_type: str,
+        file_size: int,
+        caption: str,
+        source: str,
+        username: str,
+    ) -> Optional[PutResult]:
+        """从本地文件复制（流式，不整体读入内存）"""
+        return self._store(lambda path: shutil.copyfile(file_path, path),
+                           filename=filename, content_type=content_type, file_size=file_size)
+
+    def _store(self, write, *, filename: str, content_type: str, file_size: int) -> Optional[PutResult]:
+        """生成 key 并通过 write(path) 落盘"""
         try:
             key = self._generate_key(filename)
             path = (self._root / key).resolve()
@@ -96,7 +121,7 @@ class LocalBackend(StorageBackend):
             path.parent.mkdir(parents=True, exist_ok=True)
 
             # 写入文件
-            path.write_bytes(file_content)
+            write(path)
 
             logger.info(f"本地存储上传成功: {key} ({file_size} bytes)")
 
@@ -225,6 +250,16 @@ class LocalBackend(StorageBackend):
             logger.error(f"本地存储删除失败: {e}")
             return False
 
+    def delete_many(self, *, storage_keys: List[str]) -> List[str]:
+        """用线程池并发删除本地文件"""
+        keys = [key for key in dict.fromkeys(storage_keys) if key]
+        if len(keys) <= 1:
+            return [key for key in keys if self.delete(storage_key=key)]
+        with ThreadPoolExecutor(max_workers=min(_DELETE_WORKERS, len(keys)),
+                                thread_name_prefix='local-delete') as pool:
+            results = list(pool.map(lambda key: self.delete(storage_key=key), keys))
+        return [key for key, ok in zip(keys, results) if ok]
+
     def healthcheck(self) -> bool:
         """检查存储目录是否可写"""
         try:
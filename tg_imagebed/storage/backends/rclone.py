@@ -197,52 +197,76 @@ class RcloneBackend(StorageBackend):
         username: str,
     ) -> Optional[PutResult]:
         """上传文件到 rclone remote"""
-        key = self._generate_key(filename)
-        obj = self._object_path(key)
-
         spool_threshold = max(0, self._spool_mb) * 1024 * 1024
         use_spool = file_size >= spool_threshold and spool_threshold > 0
 
+        def run(obj: str) -> subprocess.CompletedProcess:
+            if use_spool:
+                # 大文件：先写临时文件，再用 copyto
+                with tempfile.NamedTemporaryFile(
+                    prefix="img_",
+                    suffix=os.path.splitext(filename or "")[1],
+                    delete=False
+                ) as f:
+                    tmp_path = f.name
+                    f.write(file_content)
+                try:
+                    return self._copyto(tmp_path, obj)
+                finally:
+                    try:
+                        os.remove(tmp_path)
+                    except Exception:
+                        pass
+
+            # 小文件：通过 stdin 使用 rcat
+            args = self._base_cmd() + ["rcat", obj]
+            try:
+                p = subprocess.Popen(
+                    args,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                )
+            except FileNotFoundError as e:
+                raise RuntimeError("rclone binary not found") from e
+            try:
+                stdout, stderr = p.communicate(input=file_content, timeout=self._upload_timeout)
+            except subprocess.TimeoutExpired:
+                p.kill()
+                stdout, stderr = p.communicate()
+                raise TimeoutError("rclone upload timeout")
+            return subprocess.CompletedProcess(args=args, returncode=p.returncode, stdout=stdout, stderr=stderr)
+
+        return self._upload_with_retries(run, filename=filename, content_type=content_type, file_size=file_size)
+
+    def put_file(
+        self,
+        *,
+        file_path: str,
+        filename: str,
+        content_type: str,
+        file_size: int,
+        caption: str,
+        source: str,
+        username: str,
+    ) -> Optional[PutResult]:
+        """从本地文件直接 copyto（不读入内存）"""
+        return self._upload_with_retries(lambda obj: self._copyto(file_path, obj),
+                                         filename=filename, content_type=content_type, file_size=file_size)
+
+    def _copyto(self, local_path: str, obj: str) -> subprocess.CompletedProcess:
+        args = self._base_cmd() + ["copyto", local_path, obj]
+        return self._run_capture(args=args, timeout_seconds=self._upload_timeout)
+
+    def _upload_with_retries(self, run, *, filename: str, content_type: str, file_size: int) -> Optional[PutResult]:
+        """生成 key 后调用 run(obj)，失败按配置重试"""
+        key = self._generate_key(filename)
+        obj = self._object_path(key)
+
         last_err = ""
         for attempt in range(max(1, self._retries) + 1):
             try:
-                if use_spool:
-                    # 大文件：先写临时文件，再用 copyto
-                    with tempfile.NamedTemporaryFile(
-                        prefix="img_",
-                        suffix=os.path.splitext(filename or "")[1],
-                        delete=False
-                    ) as f:
-                        tmp_path = f.name
-                        f.write(file_content)
-                    try:
-                        args = self._base_cmd() + ["copyto", tmp_path, obj]
-                        cp = self._run_capture(args=args, timeout_seconds=self._upload_timeout)
-                    finally:
-                        try:
-                            os.remove(tmp_path)
-                        except Exception:
-                            pass
-                else:
-                    # 小文件：通过 stdin 使用 rcat
-                    args = self._base_cmd() + ["rcat", obj]
-                    try:
-                        p = subprocess.Popen(
-                            args,
-                            stdin=subprocess.PIPE,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                        )
-                    except FileNotFoundError as e:
-                        raise RuntimeError("rclone binary not found") from e
-                    try:
-                        stdout, stderr = p.communicate(input=file_content, timeout=self._upload_timeout)
-                    except subprocess.TimeoutExpired:
-                        p.kill()
-                        stdout, stderr = p.communicate()
-                        raise TimeoutError("rclone upload timeout")
-                    cp = subprocess.CompletedProcess(args=args, returncode=p.returncode, stdout=stdout, stderr=stderr)
-
+                cp = run(obj)
                 if cp.returncode == 0:
                     logger.info(f"rclone 存储上传成功: {key}")
                     return PutResult(
@@ -393,6 +417,38 @@ class RcloneBackend(StorageBackend):
             logger.error(f"rclone delete failed: {e}")
             return False
 
+    def delete_many(self, *, storage_keys: List[str]) -> List[str]:
+        """用一次 rclone delete --files-from 批量删除（失败时回退逐个删除）"""
+        keys = [key for key in dict.fromkeys(storage_keys) if key]
+        # 含换行的 key 无法写入清单文件，单独处理
+        listable = [key for key in keys if "\n" not in key and "\r" not in key]
+        if len(listable) <= 1:
+            return [key for key in keys if self.delete(storage_key=key)]
+
+        root = f"{self._remote}:{(self._base_path or '').strip().strip('/')}"
+        fd, list_path = tempfile.mkstemp(prefix="rclone-delete-", suffix=".txt")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write("\n".join(key.lstrip("/") for key in listable) + "\n")
+            args = self._base_cmd() + ["delete", root, "--files-from", list_path]
+            cp = self._run_capture(args=args, timeout_seconds=30 + len(listable) // 10)
+            ok = cp.returncode == 0
+            if not ok:
+                stderr = (cp.stderr or b"").decode("utf-8", errors="replace").strip()
+                logger.warning(f"rclone 批量删除失败，回退逐个删除: {stderr[:200]}")
+        except Exception as e:
+            logger.warning(f"rclone 批量删除失败，回退逐个删除: {e}")
+            ok = False
+        finally:
+            try:
+                os.remove(list_path)
+            except OSError:
+                pass
+
+        deleted = listable if ok else [key for key in listable if self.delete(storage_key=key)]
+        listed = set(listable)
+        return deleted + [key for key in keys if key not in listed and self.delete(storage_key=key)]
+
     def healthcheck(self) -> bool:
         """检查 rclone 是否可用"""
         try:
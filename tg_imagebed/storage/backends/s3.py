@@ -10,7 +10,7 @@ from __future__ import annotations
 import os
 import time
 import uuid
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 from ..base import StorageBackend, PutResult, DownloadResult
 from ...config import logger
@@ -25,6 +25,9 @@ except ImportError:
     boto3 = None
     BotoConfig = None
 
+# DeleteObjects 单次最多 1000 个 key
+_DELETE_BATCH_SIZE = 1000
+
 
 class S3Backend(StorageBackend):
     """S3 兼容对象存储后端"""
@@ -112,6 +115,21 @@ class S3Backend(StorageBackend):
         uid = uuid.uuid4().hex
         return f"{date_prefix}/{uid}{ext}"
 
+    def _put_result(self, key: str, file_size: int, content_type: str) -> PutResult:
+        return PutResult(
+            file_id=key,
+            file_path=key,
+            file_size=file_size,
+            storage_backend=self.name,
+            storage_key=key,
+            storage_meta={
+                "driver": "s3",
+                "bucket": self._bucket,
+                "endpoint": self._endpoint,
+                "content_type": content_type,
+            },
+        )
+
     def put_bytes(
         self,
         *,
@@ -140,19 +158,35 @@ class S3Backend(StorageBackend):
 
             logger.info(f"S3 存储上传成功: {key}")
 
-            return PutResult(
-                file_id=key,
-                file_path=key,
-                file_size=file_size,
-                storage_backend=self.name,
-                storage_key=key,
-                storage_meta={
-                    "driver": "s3",
-                    "bucket": self._bucket,
-                    "endpoint": self._endpoint,
-                    "content_type": content_type,
-                },
+            return self._put_result(key, file_size, content_type)
+        except Exception as e:
+            logger.error(f"S3 存储上传失败: {e}")
+            return None
+
+    def put_file(
+        self,
+        *,
+        file_path: str,
+        filename: str,
+        content_type: str,
+        file_size: int,
+        caption: str,
+        source: str,
+        username: str,
+    ) -> Optional[PutResult]:
+        """从本地文件上传到 S3（upload_file 按需分段上传，不整体读入内存）"""
+        if not HAS_BOTO3 or not self._client:
+            logger.error("S3 客户端不可用")
+            return None
+
+        try:
+            key = self._generate_key(filename)
+            self._client.upload_file(
+                file_path, self._bucket, key,
+                ExtraArgs={'ContentType': content_type},
             )
+            logger.info(f"S3 存储上传成功: {key}")
+            return self._put_result(key, file_size, content_type)
         except Exception as e:
             logger.error(f"S3 存储上传失败: {e}")
             return None
@@ -259,6 +293,32 @@ class S3Backend(StorageBackend):
             logger.error(f"S3 删除失败: {e}")
             return False
 
+    def delete_many(self, *, storage_keys: List[str]) -> List[str]:
+        """用 DeleteObjects 批量删除（每次最多 1000 个；不支持该接口的服务回退逐个删除）"""
+        keys = [key for key in dict.fromkeys(storage_keys) if key]
+        if not keys or not HAS_BOTO3 or not self._client:
+            return []
+
+        deleted: List[str] = []
+        for i in range(0, len(keys), _DELETE_BATCH_SIZE):
+            batch = keys[i:i + _DELETE_BATCH_SIZE]
+            try:
+                resp = self._client.delete_objects(
+                    Bucket=self._bucket,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+                )
+            except Exception as e:
+                logger.warning(f"S3 批量删除失败，回退逐个删除: {e}")
+                deleted.extend(key for key in batch if self.delete(storage_key=key))
+                continue
+            # Quiet 模式只返回失败项
+            failed = {err.get('Key') for err in resp.get('Errors') or []}
+            for err in (resp.get('Errors') or [])[:5]:
+                logger.warning(f"S3 删除失败: {err.get('Key')} - {err.get('Code')}")
+            deleted.extend(key for key in batch if key not in failed)
+        logger.info(f"S3 批量删除完成: {len(deleted)}/{len(keys)}")
+        return deleted
+
     def get_public_url(self, *, storage_key: str, file_info: Dict[str, Any]) -> Optional[str]:
         """获取公开访问 URL"""
         if self._public_url_prefix:
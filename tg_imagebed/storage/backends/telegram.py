@@ -9,7 +9,10 @@ Telegram Cloud 存储后端
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import io
+import itertools
+import json
 import os
 import queue
 import re
@@ -17,13 +20,13 @@ import shutil
 import threading
 import time
 import uuid
-from typing import Any, Dict, Iterable, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import unquote, urlparse
 
-import requests
-
 from ..base import StorageBackend, PutResult, DownloadResult
 from ...config import DATA_DIR, logger
+from ...telegram_api import TelegramBotClient, get_telegram_client
 
 _BOT_API_PHOTO_LIMIT = 10 * 1024 * 1024
 _KURIGRAM_THRESHOLD = 20 * 1024 * 1024
@@ -32,6 +35,145 @@ _STREAM_CHUNK_SIZE = 8192
 _KURIGRAM_CLIENT_CLASS = None
 _KURIGRAM_CLIENT_CLASS_LOCK = threading.Lock()
 
+# 图片访问路径上 getFile 的最长本地排队时间：超过即放弃刷新，沿用库里的 file_path
+_SERVE_GETFILE_MAX_WAIT_SECONDS = 0.5
+
+# 分块存储：单块默认且最大 19 MB，保证每块都能走 Bot API getFile 下载（上限 20 MB）
+_DEFAULT_CHUNK_SIZE_MB = 19
+_MAX_CHUNK_SIZE_MB = 19
+# 分块下载时每个预取分块最多缓冲的数据块数（每块 _KURIGRAM_STREAM_CHUNK_SIZE）
+_CHUNK_PREFETCH_BUFFERS = 4
+
+# 多存储频道的放置策略；状态放在模块级，后端实例随路由器重建时不丢失
+CHAT_PLACEMENT_POLICIES = ('round_robin', 'hash', 'lru')
+_placement_lock = threading.Lock()
+_round_robin_counters: Dict[str, int] = {}
+_chat_last_used: Dict[Tuple[str, int], float] = {}
+
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+# Telegram 照片预生成的尺寸档位（按最长边划分：s≈90/100, m≈320, x≈800, y≈1280, w≈2560）
+PHOTO_SIZE_LABELS = ('s', 'm', 'x', 'y', 'w')
+_PHOTO_SIZE_BOUNDS = ((100, 's'), (320, 'm'), (800, 'x'), (1280, 'y'), (2560, 'w'))
+
+
+def photo_size_variants(photo_sizes: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    从 PhotoSize 列表（API 返回的 dict 或 python-telegram-bot 对象）提取缩略图档位
+
+    最大的一张是原图本身，不计入；同一档位保留较大的一张。
+    """
+    def field(item, name):
+        return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+    sizes = [s for s in (photo_sizes or []) if field(s, 'file_id')]
+    variants: Dict[str, Dict[str, Any]] = {}
+    for item in sizes[:-1]:
+        width, height = int(field(item, 'width') or 0), int(field(item, 'height') or 0)
+        longest = max(width, height)
+        label = next((name for bound, name in _PHOTO_SIZE_BOUNDS if longest <= bound), None)
+        if not label:
+            continue
+        variants[label] = {
+            'file_id': field(item, 'file_id'),
+            'width': width,
+            'height': height,
+            'file_size': int(field(item, 'file_size') or 0),
+        }
+    return variants
+
+
+def select_photo_variant(storage_meta: Any, label: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    按请求档位挑选缩略图：没有该档位时取更大的一档，都没有返回 None（回退原图）
+
+    Returns:
+        (实际档位, 变体信息)
+    """
+    if label not in PHOTO_SIZE_LABELS:
+        return None
+    if isinstance(storage_meta, str):
+        try:
+            storage_meta = json.loads(storage_meta or '{}')
+        except Exception:
+            return None
+    variants = (storage_meta or {}).get('photo_sizes') if isinstance(storage_meta, dict) else None
+    if not isinstance(variants, dict):
+        return None
+    for name in PHOTO_SIZE_LABELS[PHOTO_SIZE_LABELS.index(label):]:
+        variant = variants.get(name)
+        if isinstance(variant, dict) and variant.get('file_id'):
+            return name, variant
+    return None
+
+
+def _load_chunk_manifest(storage_meta: Any) -> Optional[Dict[str, Any]]:
+    """从 storage_meta（dict 或 JSON 字符串）中取出分块清单"""
+    if isinstance(storage_meta, str):
+        try:
+            storage_meta = json.loads(storage_meta or '{}')
+        except ValueError:
+            return None
+    manifest = (storage_meta or {}).get('chunked') if isinstance(storage_meta, dict) else None
+    return manifest if isinstance(manifest, dict) and manifest.get('parts') else None
+
+
+def chunk_part_messages(storage_meta: Any) -> List[Tuple[int, int]]:
+    """分块文件除首块外的 (chat_id, message_id)，供同步删除 TG 消息使用"""
+    manifest = _load_chunk_manifest(storage_meta)
+    if not manifest:
+        return []
+    return [
+        (part['chat_id'], part['message_id'])
+        for part in sorted(manifest['parts'], key=lambda p: p['index'])[1:]
+        if part.get('chat_id') and part.get('message_id')
+    ]
+
+
+def upload_bot_id(storage_meta: Any) -> Optional[str]:
+    """storage_meta（dict 或 JSON 字符串）中记录的上传 Bot ID"""
+    if isinstance(storage_meta, str):
+        try:
+            storage_meta = json.loads(storage_meta or '{}')
+        except ValueError:
+            return None
+    bot_id = (storage_meta or {}).get('bot_id') if isinstance(storage_meta, dict) else None
+    return str(bot_id) if bot_id else None
+
+
+class BotTokenPool:
+    """
+    多 Bot Token 池：上传轮流使用健康的 Token，读取回到上传该文件的 Bot
+
+    Telegram 的 file_id 只对收到它的 Bot 有效，上传时把 Bot ID 写入 storage_meta，
+    getFile 先用该 Bot，失败再回退默认 Bot（旧记录没有 Bot ID，均由默认 Bot 上传）。
+    """
+
+    def __init__(self, tokens: List[str], client: TelegramBotClient):
+        self.tokens = list(dict.fromkeys(t for t in tokens if t))
+        self._client = client
+        self._by_id = {token.split(':', 1)[0]: token for token in self.tokens}
+        self._counter = itertools.count()
+
+    def upload_token(self) -> str:
+        """轮流选择本次上传使用的 Token（跳过被摘除的）"""
+        if len(self.tokens) <= 1:
+            return self.tokens[0] if self.tokens else ''
+        healthy = [t for t in self.tokens if self._client.is_token_healthy(t)] or self.tokens
+        return healthy[next(self._counter) % len(healthy)]
+
+    def owner(self, bot_id: Optional[str]) -> str:
+        """上传该文件的 Token；未记录或已移出池时为默认 Token"""
+        default = self.tokens[0] if self.tokens else ''
+        return self._by_id.get(str(bot_id), default) if bot_id else default
+
+    def candidates(self, bot_id: Optional[str]) -> List[str]:
+        """getFile 的 Token 尝试顺序：上传 Bot 优先，默认 Bot 兜底"""
+        return list(dict.fromkeys(t for t in (self.owner(bot_id), self.owner(None)) if t))
+
 
 class TelegramBackend(StorageBackend):
     """Telegram Cloud 存储后端"""
@@ -45,6 +187,12 @@ class TelegramBackend(StorageBackend):
         api_id: Optional[str] = None,
         api_hash: Optional[str] = None,
         proxy_url: Optional[str] = None,
+        bot_tokens: Optional[List[str]] = None,
+        chat_ids: Optional[List[int]] = None,
+        chat_placement: str = 'round_robin',
+        chunk_threshold_mb: int = 0,
+        chunk_size_mb: int = _DEFAULT_CHUNK_SIZE_MB,
+        chunk_parallelism: int = 4,
     ):
         """
         初始化 Telegram 存储后端
@@ -56,20 +204,31 @@ class TelegramBackend(StorageBackend):
             api_id: Telegram API ID（启用 Kurigram 大文件通道）
             api_hash: Telegram API Hash（启用 Kurigram 大文件通道）
             proxy_url: 可选代理 URL
+            bot_tokens: 额外的 Bot Token（需同为存储频道管理员），上传轮流使用以分担发送限额
+            chat_ids: 额外的存储频道，上传按 chat_placement 分散到 chat_id + chat_ids
+            chat_placement: 放置策略 round_robin / hash / lru
+            chunk_threshold_mb: 超过该大小的文件按分块布局存储（0 表示关闭）
+            chunk_size_mb: 分块大小（不超过 19 MB，超过 getFile 的 20 MB 下载上限的分块无法读回）
+            chunk_parallelism: 分块上传/下载的并发数
         """
         self.name = name
         self._bot_token = bot_token
         self._chat_id = chat_id
+        self._chat_ids = [c for c in dict.fromkeys([chat_id] + list(chat_ids or [])) if c]
+        self._chat_placement = chat_placement if chat_placement in CHAT_PLACEMENT_POLICIES else 'round_robin'
+        self._chunk_threshold = max(0, int(chunk_threshold_mb or 0)) * 1024 * 1024
+        self._chunk_size = max(1, min(int(chunk_size_mb or _DEFAULT_CHUNK_SIZE_MB), _MAX_CHUNK_SIZE_MB)) * 1024 * 1024
+        self._chunk_parallelism = max(1, min(int(chunk_parallelism or 4), 16))
         self._api_id = str(api_id or "").strip()
         self._api_hash = str(api_hash or "").strip()
-        self._session = requests.Session()
-        self._session.trust_env = True
+        # Bot API 请求统一走共享客户端（连接池 + 限流 + retry_after 处理）
+        self._client = get_telegram_client()
+        self._token_pool = BotTokenPool([bot_token] + list(bot_tokens or []), self._client)
         proxy_url_norm = (proxy_url or "").strip()
         self._proxy_url = proxy_url_norm
         if proxy_url_norm:
             if "://" not in proxy_url_norm:
                 proxy_url_norm = f"http://{proxy_url_norm}"
-            self._session.proxies = {"http": proxy_url_norm, "https": proxy_url_norm}
             # 掩码代理凭据避免日志泄露
             masked = proxy_url_norm
             if "@" in masked:
@@ -89,15 +248,18 @@ class TelegramBackend(StorageBackend):
         return bool(self._bot_token and self._api_id and self._api_hash)
 
     def _should_use_kurigram_upload(self, file_size: int) -> bool:
-        """超过 20 MB 时优先走 Kurigram 大文件上传"""
-        return self._can_use_kurigram() and file_size > _KURIGRAM_THRESHOLD
+        """超过 20 MB 时优先走 Kurigram 大文件上传（自建 local Bot API 无此限制，直接走 Bot API）"""
+        return self._can_use_kurigram() and file_size > _KURIGRAM_THRESHOLD and not self._client.local_mode
 
     def _should_use_kurigram_download(self, *, file_size: int, file_path: str) -> bool:
         """
         大文件下载优先走 Kurigram。
 
         Bot API getFile/file 链路对大文件能力偏弱，文件路径缺失时也回退到 Kurigram。
+        local Bot API 直接读盘，没有大小限制。
         """
+        if self._client.is_local_path(file_path):
+            return False
         return self._can_use_kurigram() and (file_size > _KURIGRAM_THRESHOLD or not file_path)
 
     def _build_kurigram_proxy(self) -> Optional[Dict[str, Any]]:
@@ -208,27 +370,62 @@ class TelegramBackend(StorageBackend):
             raise error["value"]
         return result.get("value")
 
-    def _get_file_path(self, file_id: str) -> Optional[str]:
-        """通过 Telegram API 获取文件路径"""
-        if not self._bot_token or not file_id:
+    def _get_file_path(self, file_id: str, bot_token: Optional[str] = None) -> Optional[str]:
+        """通过 Telegram API 获取文件路径（bot_token 为收到该 file_id 的 Bot，默认主 Token）"""
+        bot_token = bot_token or self._bot_token
+        if not bot_token or not file_id:
             return None
         try:
-            resp = self._session.get(
-                f"https://api.telegram.org/bot{self._bot_token}/getFile",
-                params={'file_id': file_id},
-                timeout=15,
-            )
-            if not resp.ok:
-                return None
-            data = resp.json() or {}
-            if not data.get('ok'):
-                return None
-            result = data.get('result') or {}
-            return result.get('file_path')
+            return self._client.get_file_path(file_id, bot_token=bot_token, proxy_url=self._proxy_url)
         except Exception as e:
             logger.error(f"获取 Telegram 文件路径失败: {e}")
             return None
 
+    def _resolve_file_path(self, file_id: str, *, bot_id: Optional[str] = None,
+                           max_wait: Optional[float] = None) -> Tuple[Optional[str], str]:
+        """
+        通过上传该文件的 Bot 获取文件路径，返回 (file_path, 对应的 bot_token)
+
+        失败时回退默认 Bot；都失败返回 (None, 上传 Bot 的 Token)，调用方可沿用旧路径。
+        max_wait 限制每次 getFile 的本地排队时长，图片访问路径用它快速失败。
+        """
+        owner = self._token_pool.owner(bot_id) or self._bot_token
+        if not file_id:
+            return None, owner
+        for token in self._token_pool.candidates(bot_id):
+            payload = self._client.call(
+                'getFile', {'file_id': file_id}, bot_token=token,
+                proxy_url=self._proxy_url, retry_on_429=False, max_wait=max_wait,
+            )
+            if payload.get('ok'):
+                file_path = (payload.get('result') or {}).get('file_path')
+                if file_path:
+                    return file_path, token
+        return None, owner
+
+    def _pick_chat(self, file_content: Optional[bytes] = None, *, file_path: Optional[str] = None) -> int:
+        """按放置策略为本次上传选择存储频道（内容来自 file_content 或 file_path）"""
+        chats = self._chat_ids
+        if len(chats) <= 1:
+            return chats[0] if chats else self._chat_id
+        if self._chat_placement == 'hash':
+            digest = hashlib.sha1()
+            if file_path:
+                with open(file_path, 'rb') as f:
+                    for block in iter(lambda: f.read(_KURIGRAM_STREAM_CHUNK_SIZE), b''):
+                        digest.update(block)
+            else:
+                digest.update(file_content or b'')
+            return chats[_ring_hash(digest.hexdigest()) % len(chats)]
+        with _placement_lock:
+            if self._chat_placement == 'lru':
+                chat = min(chats, key=lambda c: _chat_last_used.get((self.name, c), 0.0))
+                _chat_last_used[(self.name, chat)] = time.monotonic()
+                return chat
+            index = _round_robin_counters.get(self.name, 0)
+            _round_robin_counters[self.name] = index + 1
+            return chats[index % len(chats)]
+
     def _upload_via_bot_api(
         self,
         *,
@@ -237,45 +434,40 @@ class TelegramBackend(StorageBackend):
         content_type: str,
         file_size: int,
         caption: str,
+        chat_id: int,
     ) -> Optional[PutResult]:
-        """沿用现有 Bot API 上传逻辑"""
+        """沿用现有 Bot API 上传逻辑（多 Token 时轮流发送，上传 Bot 记入 storage_meta）"""
+        bot_token = self._token_pool.upload_token() or self._bot_token
         # Telegram 对 sendPhoto 有 10MB 限制，超过使用 sendDocument
         if file_size <= _BOT_API_PHOTO_LIMIT and content_type.startswith('image/'):
             files = {'photo': (filename, file_content, content_type)}
-            data = {'chat_id': self._chat_id, 'caption': caption or ''}
-            resp = self._session.post(
-                f"https://api.telegram.org/bot{self._bot_token}/sendPhoto",
-                files=files,
-                data=data,
-                timeout=60,
+            data = {'chat_id': chat_id, 'caption': caption or ''}
+            payload = self._client.call(
+                'sendPhoto', data, files=files, bot_token=bot_token,
+                proxy_url=self._proxy_url, timeout=60,
             )
         else:
             files = {'document': (filename, file_content, content_type)}
-            data = {'chat_id': self._chat_id, 'caption': caption or ''}
-            resp = self._session.post(
-                f"https://api.telegram.org/bot{self._bot_token}/sendDocument",
-                files=files,
-                data=data,
-                timeout=120,
+            data = {'chat_id': chat_id, 'caption': caption or ''}
+            payload = self._client.call(
+                'sendDocument', data, files=files, bot_token=bot_token,
+                proxy_url=self._proxy_url, timeout=120,
             )
 
-        if not resp.ok:
-            logger.error(f"Telegram 上传失败: HTTP {resp.status_code}")
-            return None
-
-        payload = resp.json() or {}
         if not payload.get('ok'):
             logger.error(f"Telegram 上传失败: {payload.get('description')}")
             return None
 
         result = payload.get('result') or {}
 
+        photo_sizes: Dict[str, Dict[str, Any]] = {}
         if file_size <= _BOT_API_PHOTO_LIMIT and content_type.startswith('image/'):
             photos = result.get('photo') or []
             if not photos:
                 logger.error("Telegram 上传失败: 无法获取 photo")
                 return None
             file_id = photos[-1].get('file_id')
+            photo_sizes = photo_size_variants(photos)
         else:
             doc = result.get('document') or {}
             file_id = doc.get('file_id')
@@ -284,41 +476,52 @@ class TelegramBackend(StorageBackend):
             logger.error("Telegram 上传失败: 无法获取 file_id")
             return None
 
-        file_path = self._get_file_path(file_id) or ''
+        file_path = self._get_file_path(file_id, bot_token) or ''
         logger.info(f"Telegram 存储上传成功(Bot API): {file_id}")
 
+        storage_meta = {
+            'file_path': file_path,
+            'uploaded_at': int(time.time()),
+            'message_id': result.get('message_id'),
+            'chat_id': chat_id,
+            'bot_id': bot_token.split(':', 1)[0],
+            'upload_transport': 'bot_api',
+        }
+        if photo_sizes:
+            storage_meta['photo_sizes'] = photo_sizes
+
         return PutResult(
             file_id=file_id,
             file_path=file_path,
             file_size=file_size,
             storage_backend=self.name,
             storage_key=file_id,
-            storage_meta={
-                'file_path': file_path,
-                'uploaded_at': int(time.time()),
-                'message_id': result.get('message_id'),
-                'upload_transport': 'bot_api',
-            },
+            storage_meta=storage_meta,
         )
 
     def _upload_via_kurigram(
         self,
         *,
-        file_content: bytes,
+        file_content: Optional[bytes],
         filename: str,
         file_size: int,
         caption: str,
+        chat_id: int,
+        file_path: Optional[str] = None,
     ) -> PutResult:
-        """通过 Kurigram 走 MTProto 上传大文件"""
+        """通过 Kurigram 走 MTProto 上传大文件（给出 file_path 时由 Kurigram 按路径分段读取）"""
 
         async def task():
             app = self._build_kurigram_client()
-            payload = io.BytesIO(file_content)
-            payload.name = filename or "upload.bin"
+            if file_path:
+                payload = file_path
+            else:
+                payload = io.BytesIO(file_content)
+                payload.name = filename or "upload.bin"
 
             async with app:
                 message = await app.send_document(
-                    chat_id=self._chat_id,
+                    chat_id=chat_id,
                     document=payload,
                     file_name=filename or None,
                     caption=caption or "",
@@ -351,6 +554,7 @@ class TelegramBackend(StorageBackend):
                 'file_path': file_path,
                 'uploaded_at': int(time.time()),
                 'message_id': upload_data.get("message_id"),
+                'chat_id': chat_id,
                 'upload_transport': 'kurigram',
             },
         )
@@ -566,13 +770,15 @@ class TelegramBackend(StorageBackend):
         file_info: Dict[str, Any],
         range_header: Optional[str],
         updated_fields: Optional[Dict[str, Any]],
+        cleanup: bool = True,
     ) -> DownloadResult:
-        """将临时文件包装成统一下载响应"""
+        """将本地文件包装成统一下载响应（cleanup=False 用于 local Bot API 的文件，读完不删除）"""
         total_size = os.path.getsize(temp_path)
         parsed_range = self._parse_range_header(range_header or "", total_size) if range_header else None
 
         if range_header and not parsed_range:
-            self._cleanup_local_artifact(temp_path)
+            if cleanup:
+                self._cleanup_local_artifact(temp_path)
             return DownloadResult(
                 status_code=416,
                 content_type='text/plain',
@@ -610,7 +816,8 @@ class TelegramBackend(StorageBackend):
                         remaining -= len(chunk)
                         yield chunk
             finally:
-                self._cleanup_local_artifact(temp_path)
+                if cleanup:
+                    self._cleanup_local_artifact(temp_path)
 
         return DownloadResult(
             status_code=status_code,
@@ -620,6 +827,254 @@ class TelegramBackend(StorageBackend):
             updated_fields=updated_fields,
         )
 
+    # ===================== 分块存储 =====================
+    def _should_chunk(self, file_size: int) -> bool:
+        return bool(self._chunk_threshold) and file_size > self._chunk_threshold
+
+    def _upload_part(self, index: int, data: bytes, filename: str) -> Dict[str, Any]:
+        """以独立文档上传一个分块，返回清单条目（分块各自轮流使用 Token 并记录 Bot ID）"""
+        chat_id = self._pick_chat(data)
+        bot_token = self._token_pool.upload_token() or self._bot_token
+        payload = self._client.call(
+            'sendDocument',
+            {'chat_id': chat_id, 'caption': f"{filename} | part {index + 1}"},
+            files={'document': (f"{filename}.part{index:04d}", data, 'application/octet-stream')},
+            bot_token=bot_token,
+            proxy_url=self._proxy_url,
+            timeout=120,
+        )
+        if not payload.get('ok'):
+            raise RuntimeError(f"分块 {index} 上传失败: {payload.get('description')}")
+        result = payload.get('result') or {}
+        file_id = (result.get('document') or {}).get('file_id')
+        if not file_id:
+            raise RuntimeError(f"分块 {index} 上传失败: 无法获取 file_id")
+        return {
+            'index': index,
+            'file_id': file_id,
+            'size': len(data),
+            'chat_id': chat_id,
+            'message_id': result.get('message_id'),
+            'bot_id': bot_token.split(':', 1)[0],
+        }
+
+    def _upload_chunked(
+        self,
+        *,
+        file_content: Optional[bytes],
+        filename: str,
+        file_size: int,
+        file_path: Optional[str] = None,
+    ) -> Optional[PutResult]:
+        """
+        把大文件切成固定大小的分块并行上传，清单写入 storage_meta
+
+        给出 file_path 时各分块按需从文件读取，内存占用不超过 并发数 × 分块大小。
+        """
+        chunk_size = self._chunk_size
+        offsets = list(range(0, file_size, chunk_size))
+        parts: List[Optional[Dict[str, Any]]] = [None] * len(offsets)
+        errors: List[str] = []
+
+        def read_part(start: int) -> bytes:
+            if file_path is None:
+                return file_content[start:start + chunk_size]
+            with open(file_path, 'rb') as f:
+                f.seek(start)
+                return f.read(chunk_size)
+
+        def task(index: int) -> None:
+            try:
+                parts[index] = self._upload_part(index, read_part(offsets[index]), filename)
+            except Exception as e:
+                errors.append(str(e))
+
+        with ThreadPoolExecutor(max_workers=self._chunk_parallelism, thread_name_prefix=f"{self.name}-chunk") as pool:
+            list(pool.map(task, range(len(offsets))))
+
+        if errors or any(p is None for p in parts):
+            logger.error(f"Telegram 分块上传失败: {errors[:1]}")
+            for part in parts:
+                if part and part.get('message_id'):
+                    self._client.delete_message(part['chat_id'], part['message_id'], bot_token=self._bot_token,
+                                                proxy_url=self._proxy_url)
+            return None
+
+        storage_key = f"chunked:{uuid.uuid4().hex}"
+        logger.info(f"Telegram 存储上传成功(分块): {storage_key}, {len(parts)} 块")
+        return PutResult(
+            file_id=storage_key,
+            file_path='',
+            file_size=file_size,
+            storage_backend=self.name,
+            storage_key=storage_key,
+            storage_meta={
+                'uploaded_at': int(time.time()),
+                'upload_transport': 'chunked',
+                'message_id': parts[0]['message_id'],
+                'chat_id': parts[0]['chat_id'],
+                'chunked': {
+                    'chunk_size': chunk_size,
+                    'total_size': file_size,
+                    'parts': parts,
+                },
+            },
+        )
+
+    def _iter_part_range(self, part: Dict[str, Any], start: int, end: int,
+                         resolved: Optional[Tuple[str, str]] = None) -> Iterable[bytes]:
+        """
+        流式读取分块内 [start, end] 区间（含两端）
+
+        resolved 为预先取得的 (file_path, bot_token)；否则在此按正常排队时长调用 getFile——
+        此时响应头已发出，不能再用访问路径的快速失败上限，否则排队稍久就会截断响应体。
+        """
+        file_path, token = resolved or self._resolve_file_path(part['file_id'], bot_id=part.get('bot_id'))
+        if not file_path:
+            raise RuntimeError(f"分块 {part.get('index')} 无法获取 file_path")
+        remaining = end - start + 1
+        if self._client.is_local_path(file_path):
+            with open(file_path, 'rb') as fh:
+                fh.seek(start)
+                while remaining > 0:
+                    data = fh.read(min(_KURIGRAM_STREAM_CHUNK_SIZE, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+        else:
+            headers = {} if (start == 0 and end == part['size'] - 1) else {'Range': f"bytes={start}-{end}"}
+            resp = self._client.open_file(file_path, bot_token=token, headers=headers, timeout=120,
+                                          proxy_url=self._proxy_url)
+            try:
+                if resp.status_code not in (200, 206):
+                    raise RuntimeError(f"分块 {part.get('index')} 下载失败: HTTP {resp.status_code}")
+                # 服务端忽略 Range 时跳过区间之前的字节
+                skip = start if (resp.status_code == 200 and headers) else 0
+                for data in resp.iter_content(chunk_size=_KURIGRAM_STREAM_CHUNK_SIZE):
+                    if skip:
+                        if len(data) <= skip:
+                            skip -= len(data)
+                            continue
+                        data, skip = data[skip:], 0
+                    data = data[:remaining]
+                    if data:
+                        remaining -= len(data)
+                        yield data
+                    if remaining <= 0:
+                        break
+            finally:
+                resp.close()
+        if remaining > 0:
+            raise RuntimeError(f"分块 {part.get('index')} 数据不完整")
+
+    def _prefetch_part(self, segment: Tuple[Any, ...], buffer: "queue.Queue",
+                       stop: threading.Event) -> None:
+        """把一个分块区间读入有界缓冲区，以 None 结尾；出错时放入异常"""
+        def offer(item: Any) -> bool:
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for data in self._iter_part_range(*segment):
+                if not offer(data):
+                    return
+            offer(None)
+        except Exception as e:
+            offer(e)
+
+    def _download_chunked(
+        self,
+        *,
+        manifest: Dict[str, Any],
+        file_info: Dict[str, Any],
+        range_header: Optional[str],
+    ) -> DownloadResult:
+        """按字节区间映射到分块，窗口式并行预取（每块有界缓冲）并按顺序流式输出"""
+        parts = sorted(manifest.get('parts') or [], key=lambda p: p['index'])
+        total_size = int(manifest.get('total_size') or sum(p['size'] for p in parts))
+        parsed_range = self._parse_range_header(range_header or "", total_size) if range_header else None
+        if range_header and not parsed_range:
+            return DownloadResult(
+                status_code=416,
+                content_type='text/plain',
+                headers={'Content-Range': f'bytes */{total_size}'},
+                body=[b'range not satisfiable'],
+            )
+
+        start, end = parsed_range if parsed_range else (0, total_size - 1)
+
+        # 计算与请求区间相交的分块及块内偏移
+        segments = []
+        offset = 0
+        for part in parts:
+            part_start, part_end = offset, offset + part['size'] - 1
+            offset += part['size']
+            if part_end < start or part_start > end:
+                continue
+            segments.append((part, max(start, part_start) - part_start, min(end, part_end) - part_start))
+
+        # 首块的 file_path 在发出响应头之前按访问路径的快速上限取得：getFile 排队过久直接 503，
+        # 而不是先回 200 再截断；后续分块在预取线程中按正常排队时长获取
+        if segments:
+            first = segments[0][0]
+            file_path, token = self._resolve_file_path(first['file_id'], bot_id=first.get('bot_id'),
+                                                       max_wait=_SERVE_GETFILE_MAX_WAIT_SECONDS)
+            if not file_path:
+                logger.warning(f"分块 {first.get('index')} 获取 file_path 失败，稍后重试")
+                return DownloadResult(
+                    status_code=503,
+                    content_type='text/plain',
+                    headers={'Retry-After': '1'},
+                    body=[b'Storage backend busy'],
+                )
+            segments[0] = segments[0] + ((file_path, token),)
+
+        headers = {'Accept-Ranges': 'bytes', 'Content-Length': str(end - start + 1)}
+        if parsed_range:
+            headers['Content-Range'] = f'bytes {start}-{end}/{total_size}'
+
+        window = self._chunk_parallelism
+
+        def body() -> Iterable[bytes]:
+            pool = ThreadPoolExecutor(max_workers=window, thread_name_prefix=f"{self.name}-fetch")
+            stop = threading.Event()
+
+            def submit(segment) -> "queue.Queue":
+                buffer: "queue.Queue" = queue.Queue(maxsize=_CHUNK_PREFETCH_BUFFERS)
+                pool.submit(self._prefetch_part, segment, buffer, stop)
+                return buffer
+
+            try:
+                buffers = [submit(seg) for seg in segments[:window]]
+                for i in range(len(segments)):
+                    while True:
+                        item = buffers[i].get()
+                        if item is None:
+                            break
+                        if isinstance(item, Exception):
+                            raise item
+                        yield item
+                    buffers[i] = None
+                    if i + window < len(segments):
+                        buffers.append(submit(segments[i + window]))
+            finally:
+                # 客户端断开或出错时让预取线程尽快退出
+                stop.set()
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        return DownloadResult(
+            status_code=206 if parsed_range else 200,
+            content_type=file_info.get('mime_type') or 'application/octet-stream',
+            headers=headers,
+            body=body(),
+        )
+
     def put_bytes(
         self,
         *,
@@ -637,6 +1092,10 @@ class TelegramBackend(StorageBackend):
             return None
 
         try:
+            if self._should_chunk(file_size):
+                return self._upload_chunked(file_content=file_content, filename=filename, file_size=file_size)
+
+            chat_id = self._pick_chat(file_content)
             if self._should_use_kurigram_upload(file_size):
                 try:
                     return self._upload_via_kurigram(
@@ -644,16 +1103,72 @@ class TelegramBackend(StorageBackend):
                         filename=filename,
                         file_size=file_size,
                         caption=caption,
+                        chat_id=chat_id,
+                    )
+                except Exception as e:
+                    logger.warning(f"Kurigram 上传失败，回退 Bot API: {type(e).__name__}: {e}")
+
+            return self._upload_via_bot_api(
+                file_content=file_content,
+                filename=filename,
+                content_type=content_type,
+                file_size=file_size,
+                caption=caption,
+                chat_id=chat_id,
+            )
+        except Exception as e:
+            logger.error(f"Telegram 存储上传异常: {e}")
+            return None
+
+    def put_file(
+        self,
+        *,
+        file_path: str,
+        filename: str,
+        content_type: str,
+        file_size: int,
+        caption: str,
+        source: str,
+        username: str,
+    ) -> Optional[PutResult]:
+        """
+        从本地文件上传到 Telegram
+
+        分块布局与 Kurigram 通道直接从文件读取；单次 Bot API 上传受其大小上限约束，
+        仍读入内存后发送。
+        """
+        if not self._bot_token or not self._chat_id:
+            logger.error("Telegram 存储后端未配置 bot_token 或 chat_id")
+            return None
+
+        try:
+            if self._should_chunk(file_size):
+                return self._upload_chunked(file_content=None, file_path=file_path,
+                                            filename=filename, file_size=file_size)
+
+            chat_id = self._pick_chat(file_path=file_path)
+            if self._should_use_kurigram_upload(file_size):
+                try:
+                    return self._upload_via_kurigram(
+                        file_content=None,
+                        file_path=file_path,
+                        filename=filename,
+                        file_size=file_size,
+                        caption=caption,
+                        chat_id=chat_id,
                     )
                 except Exception as e:
                     logger.warning(f"Kurigram 上传失败，回退 Bot API: {type(e).__name__}: {e}")
 
+            with open(file_path, 'rb') as f:
+                file_content = f.read()
             return self._upload_via_bot_api(
                 file_content=file_content,
                 filename=filename,
                 content_type=content_type,
                 file_size=file_size,
                 caption=caption,
+                chat_id=chat_id,
             )
         except Exception as e:
             logger.error(f"Telegram 存储上传异常: {e}")
@@ -681,12 +1196,20 @@ class TelegramBackend(StorageBackend):
                 body=[b'not found']
             )
 
-        # 刷新 file_path（Telegram 的 file_path 会过期）
-        fresh = self._get_file_path(file_id)
+        manifest = _load_chunk_manifest(file_info.get('storage_meta'))
+        if manifest:
+            return self._download_chunked(manifest=manifest, file_info=file_info, range_header=range_header)
+
+        # 刷新 file_path（Telegram 的 file_path 会过期）；用上传该文件的 Bot 调 getFile。
+        # getFile 排队过久时不等待，直接用库里的旧路径（通常仍在 1 小时有效期内）
+        bot_id = upload_bot_id(file_info.get('storage_meta'))
+        fresh, read_token = self._resolve_file_path(file_id, bot_id=bot_id, max_wait=_SERVE_GETFILE_MAX_WAIT_SECONDS)
         updated_fields: Optional[Dict[str, Any]] = None
         if fresh and fresh != file_path:
             file_path = fresh
-            updated_fields = {'file_path': fresh}
+            # 只持久化上传 Bot 取得的路径，保证库里的 file_path 与上传 Bot 对应
+            if read_token == self._token_pool.owner(bot_id):
+                updated_fields = {'file_path': fresh}
 
         if self._should_use_kurigram_download(file_size=file_size, file_path=file_path):
             try:
@@ -718,11 +1241,24 @@ class TelegramBackend(StorageBackend):
                 updated_fields=updated_fields
             )
 
-        # 构建文件 URL
-        if file_path.startswith('https://'):
-            file_url = file_path
-        else:
-            file_url = f"https://api.telegram.org/file/bot{self._bot_token}/{file_path}"
+        # local Bot API：getFile 返回服务器磁盘上的绝对路径，直接读文件
+        if self._client.is_local_path(file_path):
+            if not os.path.isfile(file_path):
+                logger.warning(f"local Bot API 文件不可读（需与 telegram-bot-api 共享数据目录）: {file_path}")
+                return DownloadResult(
+                    status_code=502,
+                    content_type='text/plain',
+                    headers={},
+                    body=[b'local file not accessible'],
+                    updated_fields=updated_fields
+                )
+            return self._download_from_local_file(
+                temp_path=file_path,
+                file_info=file_info,
+                range_header=range_header,
+                updated_fields=updated_fields,
+                cleanup=False,
+            )
 
         # 请求文件
         headers: Dict[str, str] = {}
@@ -730,7 +1266,10 @@ class TelegramBackend(StorageBackend):
             headers['Range'] = range_header
 
         try:
-            resp = self._session.get(file_url, stream=True, timeout=60, headers=headers)
+            resp = self._client.open_file(
+                file_path, bot_token=read_token, headers=headers,
+                timeout=60, proxy_url=self._proxy_url,
+            )
         except Exception as e:
             logger.error(f"Telegram 下载失败: {e}")
             return DownloadResult(
@@ -742,6 +1281,7 @@ class TelegramBackend(StorageBackend):
             )
 
         if resp.status_code not in (200, 206):
+            resp.close()
             return DownloadResult(
                 status_code=resp.status_code,
                 content_type='text/plain',
@@ -777,10 +1317,13 @@ class TelegramBackend(StorageBackend):
         if not self._bot_token:
             return False
         try:
-            resp = self._session.get(
-                f"https://api.telegram.org/bot{self._bot_token}/getMe",
-                timeout=10
-            )
-            return resp.ok and resp.json().get('ok', False)
+            payload = self._client.call('getMe', bot_token=self._bot_token, proxy_url=self._proxy_url, timeout=10)
+            # 顺带探测额外 Token：恢复的重新加入池，失效的由客户端摘除
+            for token in self._token_pool.tokens[1:]:
+                extra = self._client.call('getMe', bot_token=token, proxy_url=self._proxy_url,
+                                          timeout=10, retry_on_429=False)
+                if extra.get('ok'):
+                    self._client.mark_token_healthy(token)
+            return payload.get('ok') is True
         except Exception:
             return False
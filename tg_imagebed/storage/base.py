@@ -9,7 +9,7 @@ from __future__ import annotations
 
 import abc
 from dataclasses import dataclass, field
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 
 @dataclass(frozen=True)
@@ -33,6 +33,16 @@ class DownloadResult:
     updated_fields: Optional[Dict[str, Any]] = None  # 需要更新的字段（如 file_path）
 
 
+def close_download(dl: Optional[DownloadResult]) -> None:
+    """关闭未读完的下载响应体（流式响应需要释放底层连接）"""
+    close = getattr(getattr(dl, 'body', None), 'close', None)
+    if callable(close):
+        try:
+            close()
+        except Exception:
+            pass
+
+
 class StorageBackend(abc.ABC):
     """存储后端抽象基类"""
 
@@ -67,6 +77,39 @@ class StorageBackend(abc.ABC):
         """
         raise NotImplementedError
 
+    def put_file(
+        self,
+        *,
+        file_path: str,
+        filename: str,
+        content_type: str,
+        file_size: int,
+        caption: str,
+        source: str,
+        username: str,
+    ) -> Optional[PutResult]:
+        """
+        从本地文件上传（默认读入内存后调用 put_bytes，后端可覆盖为流式实现）
+
+        Args:
+            file_path: 本地文件路径（调用方负责其生命周期）
+            其余参数同 put_bytes
+
+        Returns:
+            PutResult 或 None（失败时）
+        """
+        with open(file_path, 'rb') as f:
+            file_content = f.read()
+        return self.put_bytes(
+            file_content=file_content,
+            filename=filename,
+            content_type=content_type,
+            file_size=file_size,
+            caption=caption,
+            source=source,
+            username=username,
+        )
+
     @abc.abstractmethod
     def download(
         self,
@@ -98,6 +141,18 @@ class StorageBackend(abc.ABC):
         """
         return False
 
+    def delete_many(self, *, storage_keys: List[str]) -> List[str]:
+        """
+        批量删除文件（默认逐个调用 delete，后端可覆盖为原生批量接口）
+
+        Args:
+            storage_keys: 存储 key 列表
+
+        Returns:
+            删除成功的 key 列表
+        """
+        return [key for key in dict.fromkeys(storage_keys) if key and self.delete(storage_key=key)]
+
     def healthcheck(self) -> bool:
         """
         健康检查（可选实现）
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后端读延迟跟踪与熔断
+
+记录每个存储后端最近的读取耗时（EWMA）、滑动窗口内的错误率与 P95，
+并为每个后端维护一个熔断器：
+
+- closed：正常放行；连续失败达到阈值，或窗口内请求足够多且错误率过半时打开
+- open：直接拒绝（路由返回 503 + Retry-After），不再等待后端超时
+- half_open：冷却结束后只放行一个探测请求，成功则关闭，失败则重新打开并加倍冷却
+
+超过延迟 SLO 的成功请求同样计为一次失败。
+进程级全局状态，不随路由器重建而丢失。
+"""
+from __future__ import annotations
+
+import time
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from ..config import logger
+
+# EWMA 平滑系数：越大越看重最近一次
+_EWMA_ALPHA = 0.3
+# 默认熔断参数（可由系统设置覆盖，见 configure）
+_DEFAULT_FAILURE_THRESHOLD = 3
+_DEFAULT_OPEN_SECONDS = 30.0
+_MAX_OPEN_SECONDS = 300.0
+_DEFAULT_LATENCY_SLO_SECONDS = 10.0
+# 错误率窗口
+_WINDOW_SECONDS = 60.0
+_WINDOW_MIN_REQUESTS = 20
+_WINDOW_ERROR_RATE = 0.5
+# 半开探测请求超过该时长未返回结果，允许再发一个
+_PROBE_TIMEOUT_SECONDS = 60.0
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half_open'
+
+
+class _BackendState:
+    __slots__ = ('ewma', 'failures', 'state', 'opened_at', 'open_seconds', 'probe_started', 'window')
+
+    def __init__(self):
+        self.ewma: Optional[float] = None
+        self.failures = 0
+        self.state = CIRCUIT_CLOSED
+        self.opened_at = 0.0
+        self.open_seconds = 0.0
+        self.probe_started = 0.0
+        # (时间, 是否成功, 耗时)
+        self.window: Deque[Tuple[float, bool, float]] = deque()
+
+
+class BackendLatencyTracker:
+    """存储后端读延迟、错误率与熔断状态（线程安全）"""
+
+    def __init__(self, failure_threshold: int = _DEFAULT_FAILURE_THRESHOLD,
+                 open_seconds: float = _DEFAULT_OPEN_SECONDS,
+                 latency_slo: float = _DEFAULT_LATENCY_SLO_SECONDS):
+        self._lock = threading.Lock()
+        self._states: Dict[str, _BackendState] = {}
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.latency_slo = latency_slo
+
+    def configure(self, *, failure_threshold: Optional[int] = None, open_seconds: Optional[float] = None,
+                  latency_slo: Optional[float] = None) -> None:
+        """更新熔断参数（不影响已有状态）"""
+        with self._lock:
+            if failure_threshold is not None:
+                self.failure_threshold = max(1, int(failure_threshold))
+            if open_seconds is not None:
+                self.open_seconds = max(1.0, float(open_seconds))
+            if latency_slo is not None:
+                self.latency_slo = max(0.05, float(latency_slo))
+
+    def _state(self, name: str) -> _BackendState:
+        st = self._states.get(name)
+        if st is None:
+            st = self._states[name] = _BackendState()
+        return st
+
+    @staticmethod
+    def _trim(st: _BackendState, now: float) -> None:
+        while st.window and now - st.window[0][0] > _WINDOW_SECONDS:
+            st.window.popleft()
+
+    def _open(self, name: str, st: _BackendState, now: float) -> None:
+        # 半开探测失败时冷却时间加倍
+        if st.state == CIRCUIT_HALF_OPEN and st.open_seconds:
+            st.open_seconds = min(_MAX_OPEN_SECONDS, st.open_seconds * 2)
+        else:
+            st.open_seconds = self.open_seconds
+        st.state = CIRCUIT_OPEN
+        st.opened_at = now
+        st.probe_started = 0.0
+        logger.warning(f"存储后端熔断: {name}（{st.open_seconds:.0f}s 后探测）")
+
+    def record(self, name: str, elapsed: float, ok: bool, check_slo: bool = True) -> None:
+        """
+        记录一次请求结果
+
+        Args:
+            elapsed: 到拿到响应头为止的秒数
+            check_slo: 是否把超过延迟 SLO 的成功请求计为失败（上传等耗时与大小相关的操作应关闭）
+        """
+        now = time.time()
+        with self._lock:
+            st = self._state(name)
+            good = ok and not (check_slo and elapsed > self.latency_slo)
+            st.window.append((now, good, elapsed))
+            self._trim(st, now)
+            if ok:
+                st.ewma = elapsed if st.ewma is None else st.ewma + _EWMA_ALPHA * (elapsed - st.ewma)
+            if good:
+                st.failures = 0
+                if st.state != CIRCUIT_CLOSED:
+                    logger.info(f"存储后端恢复: {name}")
+                st.state = CIRCUIT_CLOSED
+                st.open_seconds = 0.0
+                st.probe_started = 0.0
+                return
+
+            st.failures += 1
+            if st.state == CIRCUIT_HALF_OPEN:
+                self._open(name, st, now)
+            elif st.state == CIRCUIT_CLOSED:
+                errors = sum(1 for _, item_ok, _ in st.window if not item_ok)
+                if st.failures >= self.failure_threshold or (
+                    len(st.window) >= _WINDOW_MIN_REQUESTS and errors / len(st.window) >= _WINDOW_ERROR_RATE
+                ):
+                    self._open(name, st, now)
+
+    def allow_request(self, name: str) -> Tuple[bool, float]:
+        """
+        熔断判断：是否放行本次请求
+
+        Returns:
+            (是否放行, 拒绝时建议的重试秒数)
+        """
+        now = time.time()
+        with self._lock:
+            st = self._states.get(name)
+            if st is None or st.state == CIRCUIT_CLOSED:
+                return True, 0.0
+            if st.state == CIRCUIT_OPEN:
+                remaining = st.opened_at + st.open_seconds - now
+                if remaining > 0:
+                    return False, remaining
+                st.state = CIRCUIT_HALF_OPEN
+                st.probe_started = 0.0
+            # 半开：同一时间只放行一个探测请求
+            if st.probe_started and now - st.probe_started < _PROBE_TIMEOUT_SECONDS:
+                return False, 1.0
+            st.probe_started = now
+            return True, 0.0
+
+    def state(self, name: str) -> str:
+        with self._lock:
+            st = self._states.get(name)
+            return st.state if st else CIRCUIT_CLOSED
+
+    def latency(self, name: str) -> Optional[float]:
+        """平滑后的读延迟（秒），没有样本时返回 None"""
+        with self._lock:
+            st = self._states.get(name)
+            return st.ewma if st else None
+
+    def is_healthy(self, name: str) -> bool:
+        """熔断未打开（或冷却已结束、可以探测）"""
+        with self._lock:
+            st = self._states.get(name)
+            if st is None or st.state != CIRCUIT_OPEN:
+                return True
+            return time.time() >= st.opened_at + st.open_seconds
+
+    def rank(self, names: List[str]) -> List[str]:
+        """按 健康优先、延迟升序 排序；没有样本的后端排在有样本的之后"""
+        def _key(name: str):
+            latency = self.latency(name)
+            return (not self.is_healthy(name), latency is None, latency or 0.0)
+        return sorted(names, key=_key)
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        now = time.time()
+        data: Dict[str, Dict[str, object]] = {}
+        with self._lock:
+            for name, st in self._states.items():
+                self._trim(st, now)
+                samples = sorted(elapsed for _, _, elapsed in st.window)
+                errors = sum(1 for _, ok, _ in st.window if not ok)
+                data[name] = {
+                    'latency_ms': round(st.ewma * 1000, 1) if st.ewma is not None else None,
+                    'p95_ms': round(samples[int(len(samples) * 0.95) - 1 if len(samples) > 1 else 0] * 1000, 1)
+                    if samples else None,
+                    'window_requests': len(st.window),
+                    'error_rate': round(errors / len(st.window), 3) if st.window else 0.0,
+                    'consecutive_failures': st.failures,
+                    'circuit': st.state,
+                    'retry_after': max(0, int(st.opened_at + st.open_seconds - now))
+                    if st.state == CIRCUIT_OPEN else 0,
+                }
+        for name, item in data.items():
+            item['healthy'] = self.is_healthy(name)
+        return data
+
+
+_tracker = BackendLatencyTracker()
+
+
+def get_latency_tracker() -> BackendLatencyTracker:
+    return _tracker
+
+
+__all__ = [
+    "BackendLatencyTracker", "get_latency_tracker",
+    "CIRCUIT_CLOSED", "CIRCUIT_OPEN", "CIRCUIT_HALF_OPEN",
+]
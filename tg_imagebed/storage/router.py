@@ -8,20 +8,30 @@
 from __future__ import annotations
 
 import json
+import math
 import os
 import time
 import threading
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Dict, List, Optional, Tuple
 
-from .base import PutResult, StorageBackend
+from .base import PutResult, DownloadResult, StorageBackend, close_download
+from .latency import get_latency_tracker
 from .backends.telegram import TelegramBackend
 from .backends.local import LocalBackend
 from .backends.rclone import RcloneBackend
 from .backends.s3 import S3Backend
 
-from ..config import get_proxy_url, logger
+from ..config import get_proxy_url, logger, DATA_DIR
 from ..bot_control import get_effective_bot_token
 
+# 写回暂存区：开启 write-back 时文件先落到这里，后台再推送到目标后端
+PENDING_BACKEND_NAME = "pending"
+STAGING_DIR = os.path.join(DATA_DIR, "staging")
+
+# 镜像读取的共享线程池（主副本与备用副本并发请求）
+_read_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="storage-read")
+
 
 def _resolve_env_ref(value: Any) -> Any:
     """解析环境变量引用（如 'env:BOT_TOKEN'）"""
@@ -43,6 +53,20 @@ def _resolve_config(cfg: Dict[str, Any]) -> Dict[str, Any]:
     return result
 
 
+def _parse_chat_ids(backend_name: str, values: List[Any]) -> List[int]:
+    """解析附加存储频道 ID；Bot API 上传需要数字 chat_id，非法项（如 @username）跳过并告警"""
+    chat_ids: List[int] = []
+    for value in values:
+        text = str(value).strip()
+        if not text:
+            continue
+        try:
+            chat_ids.append(int(text))
+        except ValueError:
+            logger.warning(f"忽略无效的存储频道 ID: backend={backend_name}, chat_id={text!r}")
+    return chat_ids
+
+
 class StorageRouter:
     """存储路由器"""
 
@@ -78,6 +102,12 @@ class StorageRouter:
             api_id = str(cfg2.get("api_id") or "")
             api_hash = str(cfg2.get("api_hash") or "")
             proxy_url = str(cfg2.get("proxy_url") or get_proxy_url() or "").strip() or None
+            extra_tokens = cfg2.get("bot_tokens") or []
+            if isinstance(extra_tokens, str):
+                extra_tokens = extra_tokens.split(",")
+            extra_chats = cfg2.get("chat_ids") or []
+            if isinstance(extra_chats, str):
+                extra_chats = extra_chats.split(",")
             return TelegramBackend(
                 name=name,
                 bot_token=bot_token,
@@ -85,6 +115,12 @@ class StorageRouter:
                 api_id=api_id,
                 api_hash=api_hash,
                 proxy_url=proxy_url,
+                bot_tokens=[str(t).strip() for t in extra_tokens if str(t).strip()],
+                chat_ids=_parse_chat_ids(name, extra_chats),
+                chat_placement=str(cfg2.get("chat_placement") or "round_robin").strip(),
+                chunk_threshold_mb=int(cfg2.get("chunk_threshold_mb") or 0),
+                chunk_size_mb=int(cfg2.get("chunk_size_mb") or 19),
+                chunk_parallelism=int(cfg2.get("chunk_parallelism") or 4),
             )
 
         if driver == "local":
@@ -122,6 +158,11 @@ class StorageRouter:
         if name in self._cache:
             return self._cache[name]
 
+        if name == PENDING_BACKEND_NAME:
+            backend = LocalBackend(name=PENDING_BACKEND_NAME, root_dir=STAGING_DIR)
+            self._cache[name] = backend
+            return backend
+
         backends_cfg = self._config.get("backends") or {}
         cfg = backends_cfg.get(name)
 
@@ -140,6 +181,163 @@ class StorageRouter:
         name = (file_info.get("storage_backend") or "telegram").strip() or "telegram"
         return self.get_backend(name)
 
+    # ===================== 镜像策略 =====================
+    def get_mirror_policy(self) -> Dict[str, List[str]]:
+        """读取镜像策略（storage_mirror_policy_json）：{主后端: [副本后端, ...]}"""
+        try:
+            from ..database import get_system_setting
+            raw = (get_system_setting("storage_mirror_policy_json") or "").strip()
+            data = json.loads(raw) if raw else {}
+        except Exception:
+            data = {}
+        if not isinstance(data, dict):
+            return {}
+
+        result: Dict[str, List[str]] = {}
+        for primary, targets in data.items():
+            primary = str(primary).strip()
+            if isinstance(targets, str):
+                targets = [targets]
+            if not primary or not isinstance(targets, list):
+                continue
+            names = [str(t).strip() for t in targets if str(t).strip() and str(t).strip() != primary]
+            if names:
+                result[primary] = list(dict.fromkeys(names))
+        return result
+
+    def get_mirror_targets(self, primary: str) -> List[str]:
+        """获取主后端需要异步复制到的副本后端（忽略未配置的后端）"""
+        backends = self.list_backends()
+        return [name for name in self.get_mirror_policy().get(primary, []) if name in backends]
+
+    def _get_read_latency_budget(self) -> float:
+        from ..database import get_system_setting_int
+        return get_system_setting_int(
+            "storage_mirror_latency_budget_ms", 1500, minimum=50, maximum=60000
+        ) / 1000.0
+
+    @staticmethod
+    def _timed_download(
+        backend: StorageBackend,
+        file_info: Dict[str, Any],
+        range_header: Optional[str],
+    ) -> DownloadResult:
+        """下载并记录耗时（异常视为 502；熔断打开时直接返回 503 + Retry-After）"""
+        tracker = get_latency_tracker()
+        allowed, retry_after = tracker.allow_request(backend.name)
+        if not allowed:
+            return DownloadResult(
+                status_code=503,
+                content_type="text/plain",
+                headers={"Retry-After": str(max(1, int(math.ceil(retry_after))))},
+                body=[b"Storage backend unavailable"],
+            )
+        start = time.monotonic()
+        try:
+            dl = backend.download(file_info=file_info, range_header=range_header)
+        except Exception as e:
+            logger.warning(f"后端读取异常: backend={backend.name} - {e}")
+            tracker.record(backend.name, time.monotonic() - start, False)
+            return DownloadResult(status_code=502, content_type="text/plain", headers={}, body=[])
+        # 404/416 是确定性结果，不算后端故障
+        tracker.record(backend.name, time.monotonic() - start, dl.status_code in (200, 206, 404, 416))
+        return dl
+
+    def _read_candidates(self, file_info: Dict[str, Any]) -> List[Tuple[StorageBackend, Dict[str, Any]]]:
+        """主后端 + 已完成的副本，按健康状态与观测延迟排序"""
+        primary = self.get_backend_for_record(file_info)
+        encrypted_id = file_info.get("encrypted_id")
+        if not encrypted_id:
+            return [(primary, file_info)]
+
+        from ..database import get_file_replicas
+        configured = self.list_backends()
+        replicas: Dict[str, Tuple[StorageBackend, Dict[str, Any]]] = {}
+        hot_names = set()
+        for replica in get_file_replicas(encrypted_id):
+            name = replica["storage_backend"]
+            if name not in configured or name == primary.name:
+                continue
+            if replica.get("role") == "hot":
+                hot_names.add(name)
+            record = dict(file_info)
+            record.update({
+                "storage_backend": name,
+                "storage_key": replica.get("storage_key"),
+                "file_id": replica.get("file_id"),
+                "file_path": replica.get("file_path"),
+                "storage_meta": replica.get("storage_meta") or {},
+            })
+            replicas[name] = (self.get_backend(name), record)
+        if not replicas:
+            return [(primary, file_info)]
+
+        tracker = get_latency_tracker()
+        # 冷热分层晋升的热层副本健康时排在主后端之前
+        hot = [name for name in tracker.rank(list(hot_names)) if tracker.is_healthy(name)]
+        others = [name for name in replicas if name not in hot]
+        head = [replicas[name] for name in hot]
+        if tracker.is_healthy(primary.name):
+            return head + [(primary, file_info)] + [replicas[name] for name in tracker.rank(others)]
+        # 主后端不健康：按延迟与其余副本一起排序
+        ranked = tracker.rank([primary.name] + others)
+        return head + [(primary, file_info) if name == primary.name else replicas[name] for name in ranked]
+
+    def download_with_failover(
+        self,
+        file_info: Dict[str, Any],
+        range_header: Optional[str],
+    ) -> Tuple[StorageBackend, DownloadResult]:
+        """
+        读取文件，主后端出错或超过延迟预算时切换/并发到最快的健康副本
+
+        没有副本的文件直接读取记录所在后端。先返回 2xx 的一方胜出，
+        其余请求的响应体会被关闭。全部失败时返回第一个候选的结果。
+
+        Returns:
+            (实际提供数据的后端, DownloadResult)
+        """
+        candidates = self._read_candidates(file_info)
+        if len(candidates) == 1:
+            backend, record = candidates[0]
+            return backend, self._timed_download(backend, record, range_header)
+
+        budget = self._get_read_latency_budget()
+        queue_ = list(candidates)
+        running: Dict[Any, StorageBackend] = {}
+        first_failure: Optional[Tuple[int, StorageBackend, DownloadResult]] = None
+
+        def _launch() -> None:
+            backend, record = queue_.pop(0)
+            future = _read_executor.submit(self._timed_download, backend, record, range_header)
+            running[future] = backend
+
+        _launch()
+        while running:
+            done, _ = wait(list(running), timeout=budget, return_when=FIRST_COMPLETED)
+            for future in done:
+                backend = running.pop(future)
+                dl = future.result()
+                if dl.status_code in (200, 206):
+                    # 关闭仍在进行的其余请求
+                    for other in running:
+                        other.add_done_callback(lambda f: close_download(f.result()))
+                    return backend, dl
+                order = next(i for i, c in enumerate(candidates) if c[0] is backend)
+                if first_failure is None or order < first_failure[0]:
+                    if first_failure:
+                        close_download(first_failure[2])
+                    first_failure = (order, backend, dl)
+                else:
+                    close_download(dl)
+                logger.warning(f"副本读取失败，切换下一个: backend={backend.name}, status={dl.status_code}")
+            # 出错或超出延迟预算：再发起一个候选
+            if queue_:
+                _launch()
+
+        _, backend, dl = first_failure
+        return backend, dl
+
     def put_bytes(
         self,
         *,
@@ -222,7 +420,35 @@ class StorageRouter:
         active = self.get_active_backend_name()
         backends = self.list_backends()
         policy = self.get_effective_upload_policy()
-
+        target = self._select_upload_backend(scene, requested_backend, is_admin, active, backends, policy)
+        # 管理员显式指定的后端不做替换
+        if requested_backend and (is_admin or scene == "admin"):
+            return target
+        return self._avoid_open_circuit(target, active, backends)
+
+    @staticmethod
+    def _avoid_open_circuit(target: str, active: str, backends: Dict[str, Dict[str, Any]]) -> str:
+        """目标后端熔断中时改用激活后端或其它健康后端；都不健康则保持原目标"""
+        from ..database import get_system_setting
+        tracker = get_latency_tracker()
+        if tracker.is_healthy(target) or str(get_system_setting("storage_upload_avoid_degraded") or "1") != "1":
+            return target
+        for name in [active] + [n for n in backends if n != active]:
+            if name not in (target, PENDING_BACKEND_NAME) and name in backends and tracker.is_healthy(name):
+                logger.warning(f"上传目标后端熔断中，改用: {target} -> {name}")
+                return name
+        return target
+
+    @staticmethod
+    def _select_upload_backend(
+        scene: str,
+        requested_backend: Optional[str],
+        is_admin: bool,
+        active: str,
+        backends: Dict[str, Dict[str, Any]],
+        policy: Dict[str, Any],
+    ) -> str:
+        """按上传策略选择后端（不考虑健康状态）"""
         def normalize(name: str) -> str:
             name = (name or "").strip()
             return name or active
@@ -293,6 +519,22 @@ def _load_storage_config() -> Dict[str, Any]:
     }
 
 
+def _apply_health_settings() -> None:
+    """把熔断相关系统设置同步到延迟跟踪器"""
+    try:
+        from ..database import get_system_setting_int
+        get_latency_tracker().configure(
+            failure_threshold=get_system_setting_int(
+                "storage_circuit_failure_threshold", 3, minimum=1, maximum=100),
+            open_seconds=get_system_setting_int(
+                "storage_circuit_open_seconds", 30, minimum=1, maximum=3600),
+            latency_slo=get_system_setting_int(
+                "storage_read_latency_slo_ms", 10000, minimum=50, maximum=600000) / 1000.0,
+        )
+    except Exception as e:
+        logger.debug(f"读取熔断设置失败: {e}")
+
+
 def get_storage_router(*, ttl_seconds: int = 5) -> StorageRouter:
     """
     获取存储路由器实例（带缓存，线程安全）
@@ -314,6 +556,7 @@ def get_storage_router(*, ttl_seconds: int = 5) -> StorageRouter:
         if _router and (now - _router_ts) < ttl_seconds:
             return _router
         cfg = _load_storage_config()
+        _apply_health_settings()
         _router = StorageRouter(cfg)
         _router_ts = now
         return _router
@@ -324,6 +567,7 @@ def reload_storage_router() -> StorageRouter:
     global _router, _router_ts
     with _router_lock:
         cfg = _load_storage_config()
+        _apply_health_settings()
         _router = StorageRouter(cfg)
         _router_ts = time.time()
         return _router
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Telegram Bot API 统一客户端
+
+所有 HTTP 形式的 Bot API 调用（存储后端上传/下载、getFile 刷新、deleteMessage）
+都经过这里：
+- 共享连接池的 requests.Session
+- 令牌桶限流：按 Bot 全局、按方法、按聊天三级排队，突发请求平滑排队而不是触发 flood 限制；
+  getFile 只受自己的方法桶约束，不占用发送类请求的全局配额
+- 调用方可指定最长排队时间：图片访问路径排队稍久即失败，由调用方退回旧的 file_path
+- 自动处理 429 的 retry_after：冻结对应作用域并在等待后重试
+- 按方法统计请求数、失败数、限流次数与耗时
+- 记录 Bot Token 健康状态：401 或全局 429 的 Token 暂时摘除，供多 Bot 池跳过
+
+bot 线程内的 python-telegram-bot 使用自己的 HTTP 客户端和限流器，不经过这里。
+
+服务地址可指向自建的 telegram-bot-api；以 --local 运行时 getFile 返回服务器上的
+绝对路径，与本进程共享磁盘时直接读文件（不经网络，也没有 20MB 下载限制）。
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import logger, get_bot_api_settings
+
+TELEGRAM_API_BASE = "https://api.telegram.org"
+
+# Bot 全局限制（Telegram 官方建议约 30 次/秒）
+_GLOBAL_RATE = 30.0
+_GLOBAL_BURST = 30
+# 按方法的全局限制：(每秒速率, 突发容量)
+_METHOD_LIMITS: Dict[str, Tuple[float, int]] = {
+    'getFile': (20.0, 40),
+}
+# 不计入 Bot 全局桶的方法（只读请求，避免图片访问与上传/删除互相挤占配额）
+_GLOBAL_EXEMPT_METHODS = frozenset({'getFile'})
+# 按聊天的限制（发送类约 1 条/秒；删除较宽松）
+_CHAT_DEFAULT_LIMIT: Tuple[float, int] = (1.0, 5)
+_CHAT_LIMITS: Dict[str, Tuple[float, int]] = {
+    'deleteMessage': (10.0, 30),
+    'deleteMessages': (2.0, 5),
+}
+# deleteMessages 单次最多 100 条
+_DELETE_MESSAGES_BATCH = 100
+# 排队超过该时长直接返回本地 429，避免请求线程被长时间挂起（调用方可通过 max_wait 收紧）
+_MAX_QUEUE_WAIT_SECONDS = 30.0
+# 服务端 retry_after 超过该值时不再自动重试
+_MAX_RETRY_AFTER_SECONDS = 30.0
+_MAX_RETRIES = 3
+# 401（Token 失效/被吊销）后的摘除时长，过后重新尝试
+_UNAUTHORIZED_COOLDOWN_SECONDS = 600.0
+# 服务地址配置的重新读取间隔
+_SETTINGS_REFRESH_SECONDS = 5.0
+
+
+def is_request_failure(payload: Dict[str, Any]) -> bool:
+    """请求本身失败（网络错误、限流、服务端 5xx），而不是 Telegram 拒绝了请求内容"""
+    code = payload.get('error_code')
+    return not payload.get('ok') and (code in (None, 0, 429) or (isinstance(code, int) and code >= 500))
+
+
+class TelegramRequestError(Exception):
+    """批量操作中有请求本身失败；failed_ids 需稍后重试，deleted 为已确认删除的消息"""
+
+    def __init__(self, message: str, *, failed_ids: List[Any], deleted: List[Any]):
+        super().__init__(message)
+        self.failed_ids = failed_ids
+        self.deleted = deleted
+
+
+class TokenBucket:
+    """令牌桶（预约式：先扣令牌再按欠额计算等待时间，保证排队顺序）"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """预约一个令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def refund(self) -> None:
+        """归还一次未使用的预约"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+    def block_for(self, seconds: float) -> None:
+        """服务端要求等待（retry_after）时冻结该桶"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class TelegramBotClient:
+    """Bot API 客户端（线程安全，进程内共享）"""
+
+    def __init__(self, api_base: str = TELEGRAM_API_BASE, local_mode: bool = False):
+        self.api_base = (api_base or TELEGRAM_API_BASE).rstrip('/')
+        self.local_mode = bool(local_mode)
+        self._session = requests.Session()
+        self._session.trust_env = True
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=0)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+        self._buckets: Dict[Tuple, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self._metrics_lock = threading.Lock()
+        self._unhealthy_until: Dict[str, float] = {}
+        self._health_lock = threading.Lock()
+
+    # ===================== Token 健康状态 =====================
+    def mark_token_unhealthy(self, bot_token: str, seconds: float) -> None:
+        with self._health_lock:
+            until = time.monotonic() + seconds
+            self._unhealthy_until[bot_token] = max(self._unhealthy_until.get(bot_token, 0.0), until)
+
+    def mark_token_healthy(self, bot_token: str) -> None:
+        with self._health_lock:
+            self._unhealthy_until.pop(bot_token, None)
+
+    def is_token_healthy(self, bot_token: str) -> bool:
+        with self._health_lock:
+            return self._unhealthy_until.get(bot_token, 0.0) <= time.monotonic()
+
+    def get_token_health(self) -> Dict[str, float]:
+        """返回被摘除的 Token（以 Bot ID 表示）及剩余摘除秒数"""
+        now = time.monotonic()
+        with self._health_lock:
+            return {
+                token.split(':', 1)[0]: round(until - now, 1)
+                for token, until in self._unhealthy_until.items() if until > now
+            }
+
+    # ===================== 限流 =====================
+    def _bucket(self, key: Tuple, limit: Tuple[float, int]) -> TokenBucket:
+        with self._buckets_lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(*limit)
+                self._buckets[key] = bucket
+            return bucket
+
+    def _buckets_for(self, bot_token: str, method: str, chat_id: Any) -> list:
+        buckets = []
+        if method not in _GLOBAL_EXEMPT_METHODS:
+            buckets.append(self._bucket(('bot', bot_token), (_GLOBAL_RATE, _GLOBAL_BURST)))
+        if method in _METHOD_LIMITS:
+            buckets.append(self._bucket(('method', bot_token, method), _METHOD_LIMITS[method]))
+        if chat_id not in (None, '', 0):
+            limit = _CHAT_LIMITS.get(method, _CHAT_DEFAULT_LIMIT)
+            buckets.append(self._bucket(('chat', bot_token, str(chat_id), method), limit))
+        return buckets
+
+    def _acquire(self, buckets: list, max_wait: float = _MAX_QUEUE_WAIT_SECONDS) -> Optional[float]:
+        """排队获取所有令牌；等待超过 max_wait 时归还预约并返回需要等待的秒数"""
+        wait = max(bucket.reserve() for bucket in buckets)
+        if wait > max_wait:
+            for bucket in buckets:
+                bucket.refund()
+            return wait
+        if wait > 0:
+            time.sleep(wait)
+        return None
+
+    # ===================== 统计 =====================
+    def _record(self, method: str, **deltas: float) -> None:
+        with self._metrics_lock:
+            item = self._metrics.setdefault(method, {
+                'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0,
+                'retries': 0, 'throttle_wait_seconds': 0.0, 'latency_seconds': 0.0,
+            })
+            for key, value in deltas.items():
+                item[key] += value
+
+    def get_metrics(self) -> Dict[str, Dict[str, float]]:
+        """按方法返回请求统计快照"""
+        with self._metrics_lock:
+            result = {}
+            for method, item in self._metrics.items():
+                data = dict(item)
+                data['avg_latency_ms'] = round(item['latency_seconds'] / item['requests'] * 1000, 1) if item['requests'] else 0.0
+                data['throttle_wait_seconds'] = round(item['throttle_wait_seconds'], 3)
+                data['latency_seconds'] = round(item['latency_seconds'], 3)
+                result[method] = data
+            return result
+
+    # ===================== 请求 =====================
+    @staticmethod
+    def _proxies(proxy_url: Optional[str]) -> Optional[Dict[str, str]]:
+        proxy_url = (proxy_url or '').strip()
+        if not proxy_url:
+            return None
+        if '://' not in proxy_url:
+            proxy_url = f"http://{proxy_url}"
+        return {'http': proxy_url, 'https': proxy_url}
+
+    def call(
+        self,
+        method: str,
+        params: Optional[Dict[str, Any]] = None,
+        *,
+        bot_token: str,
+        files: Optional[Dict[str, Any]] = None,
+        timeout: float = 15,
+        proxy_url: Optional[str] = None,
+        retry_on_429: bool = True,
+        max_wait: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        调用 Bot API 方法
+
+        Args:
+            retry_on_429: 被限流时是否等待 retry_after 后重试；多 Bot 池会关闭它以便换下一个 Token
+            max_wait: 本地排队的最长等待秒数（默认 _MAX_QUEUE_WAIT_SECONDS），超过时立即返回本地 429
+
+        Returns:
+            Telegram 返回的 JSON；网络错误或非 JSON 响应时返回
+            {'ok': False, 'error_code': ..., 'description': ...}
+        """
+        params = dict(params or {})
+        chat_id = params.get('chat_id')
+        buckets = self._buckets_for(bot_token, method, chat_id)
+        url = f"{self.api_base}/bot{bot_token}/{method}"
+        proxies = self._proxies(proxy_url)
+        if max_wait is None:
+            max_wait = _MAX_QUEUE_WAIT_SECONDS
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            queued = self._acquire(buckets, max_wait)
+            if queued is not None:
+                self._record(method, rate_limited=1)
+                logger.warning(f"Telegram {method} 本地排队过长（{queued:.1f}s），暂缓请求")
+                return {
+                    'ok': False, 'error_code': 429,
+                    'description': 'Too Many Requests: local queue is full',
+                    'parameters': {'retry_after': int(queued) + 1},
+                }
+            waited = time.monotonic() - start
+
+            sent = time.monotonic()
+            try:
+                resp = self._session.post(url, data=params, files=files, timeout=timeout, proxies=proxies)
+                try:
+                    payload = resp.json() or {}
+                except ValueError:
+                    payload = {'ok': False, 'error_code': resp.status_code, 'description': f"HTTP {resp.status_code}"}
+            except requests.RequestException as e:
+                self._record(method, requests=1, errors=1, throttle_wait_seconds=waited,
+                             latency_seconds=time.monotonic() - sent)
+                return {'ok': False, 'error_code': 0, 'description': str(e)}
+
+            self._record(method, requests=1, throttle_wait_seconds=waited,
+                         latency_seconds=time.monotonic() - sent)
+            if payload.get('ok'):
+                self._record(method, ok=1)
+                return payload
+
+            if payload.get('error_code') == 429 or resp.status_code == 429:
+                retry_after = float((payload.get('parameters') or {}).get('retry_after') or 1)
+                self._record(method, rate_limited=1)
+                # chat 维度的限流只冻结该聊天，否则冻结整个 Bot（getFile 为其方法桶）
+                scope = buckets[-1] if chat_id not in (None, '', 0) else buckets[0]
+                scope.block_for(retry_after)
+                if chat_id in (None, '', 0):
+                    self.mark_token_unhealthy(bot_token, retry_after)
+                if (retry_on_429 and attempt < _MAX_RETRIES
+                        and retry_after <= min(max_wait, _MAX_RETRY_AFTER_SECONDS)):
+                    attempt += 1
+                    self._record(method, retries=1)
+                    logger.warning(f"Telegram {method} 被限流，{retry_after:.0f}s 后重试（第 {attempt} 次）")
+                    continue
+            if payload.get('error_code') == 401:
+                self.mark_token_unhealthy(bot_token, _UNAUTHORIZED_COOLDOWN_SECONDS)
+                logger.warning(f"Telegram Bot {bot_token.split(':', 1)[0]} 返回 401，暂时摘除")
+            self._record(method, errors=1)
+            return payload
+
+    def get_file_path(self, file_id: str, *, bot_token: str, proxy_url: Optional[str] = None,
+                      timeout: float = 15) -> Optional[str]:
+        """getFile 获取文件下载路径"""
+        if not bot_token or not file_id:
+            return None
+        payload = self.call('getFile', {'file_id': file_id}, bot_token=bot_token,
+                            proxy_url=proxy_url, timeout=timeout)
+        if not payload.get('ok'):
+            logger.debug(f"getFile 失败: {payload.get('description')}")
+            return None
+        return (payload.get('result') or {}).get('file_path')
+
+    def delete_message(self, chat_id: Any, message_id: Any, *, bot_token: str,
+                       proxy_url: Optional[str] = None) -> bool:
+        """删除一条消息"""
+        if not bot_token or not chat_id or not message_id:
+            return False
+        payload = self.call('deleteMessage', {'chat_id': chat_id, 'message_id': message_id},
+                            bot_token=bot_token, proxy_url=proxy_url, timeout=10)
+        return payload.get('ok') is True
+
+    def delete_messages(self, chat_id: Any, message_ids: List[Any], *, bot_token: str,
+                        proxy_url: Optional[str] = None) -> List[Any]:
+        """
+        批量删除同一聊天的消息（deleteMessages，每次最多 100 条）
+
+        批量请求被拒绝时（旧版 local Bot API 不支持、含超过 48 小时的消息等）逐条删除；
+        消息已不存在等被拒绝的单条删除视为无需重试。
+
+        Returns:
+            删除成功的消息 ID 列表
+
+        Raises:
+            TelegramRequestError: 有请求本身失败（网络错误、429、5xx），其中的消息需稍后重试
+        """
+        ids = list(dict.fromkeys(m for m in message_ids if m))
+        if not bot_token or not chat_id or not ids:
+            return []
+        deleted: List[Any] = []
+        failed: List[Any] = []
+        for i in range(0, len(ids), _DELETE_MESSAGES_BATCH):
+            batch = ids[i:i + _DELETE_MESSAGES_BATCH]
+            if len(batch) > 1:
+                payload = self.call('deleteMessages',
+                                    {'chat_id': chat_id, 'message_ids': json.dumps([int(m) for m in batch])},
+                                    bot_token=bot_token, proxy_url=proxy_url, timeout=15)
+                if payload.get('ok') is True:
+                    deleted.extend(batch)
+                    continue
+                if is_request_failure(payload):
+                    failed.extend(batch)
+                    continue
+                logger.debug(f"deleteMessages 失败，逐条删除: {payload.get('description')}")
+            for message_id in batch:
+                payload = self.call('deleteMessage', {'chat_id': chat_id, 'message_id': message_id},
+                                    bot_token=bot_token, proxy_url=proxy_url, timeout=10)
+                if payload.get('ok') is True:
+                    deleted.append(message_id)
+                elif is_request_failure(payload):
+                    failed.append(message_id)
+        if failed:
+            raise TelegramRequestError(f"删除消息请求失败: chat={chat_id}, {len(failed)} 条",
+                                       failed_ids=failed, deleted=deleted)
+        return deleted
+
+    def is_local_path(self, file_path: Optional[str]) -> bool:
+        """local 模式下 getFile 返回的绝对路径"""
+        return bool(self.local_mode and file_path and os.path.isabs(file_path))
+
+    def build_file_url(self, file_path: str, *, bot_token: str) -> str:
+        if file_path.startswith('https://') or file_path.startswith('http://'):
+            return file_path
+        return f"{self.api_base}/file/bot{bot_token}/{file_path}"
+
+    def open_file(
+        self,
+        file_path: str,
+        *,
+        bot_token: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 60,
+        proxy_url: Optional[str] = None,
+    ) -> requests.Response:
+        """流式打开文件下载链接（调用方负责关闭响应）"""
+        url = self.build_file_url(file_path, bot_token=bot_token)
+        start = time.monotonic()
+        try:
+            resp = self._session.get(url, stream=True, timeout=timeout, headers=headers or {},
+                                     proxies=self._proxies(proxy_url))
+        except requests.RequestException:
+            self._record('file', requests=1, errors=1, latency_seconds=time.monotonic() - start)
+            raise
+        ok = resp.status_code in (200, 206)
+        self._record('file', requests=1, ok=1 if ok else 0, errors=0 if ok else 1,
+                     rate_limited=1 if resp.status_code == 429 else 0,
+                     latency_seconds=time.monotonic() - start)
+        return resp
+
+
+_client: Optional[TelegramBotClient] = None
+_client_lock = threading.Lock()
+_settings_checked_at = 0.0
+
+
+def get_telegram_client() -> TelegramBotClient:
+    """获取进程内共享的 Bot API 客户端（服务地址变更时原地更新，限流状态保留）"""
+    global _client, _settings_checked_at
+    now = time.monotonic()
+    if _client is None or now - _settings_checked_at >= _SETTINGS_REFRESH_SECONDS:
+        with _client_lock:
+            base_url, local_mode = get_bot_api_settings()
+            base_url = (base_url or TELEGRAM_API_BASE).rstrip('/')
+            if _client is None:
+                _client = TelegramBotClient(base_url, local_mode=local_mode)
+            elif (_client.api_base, _client.local_mode) != (base_url, local_mode):
+                logger.info(f"Bot API 服务地址已切换: {base_url} (local={'on' if local_mode else 'off'})")
+                _client.api_base, _client.local_mode = base_url, local_mode
+            _settings_checked_at = now
+    return _client
+
+
+__all__ = [
+    'TELEGRAM_API_BASE',
+    'TokenBucket',
+    'TelegramBotClient',
+    'TelegramRequestError',
+    'is_request_failure',
+    'get_telegram_client',
+]